@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta, timezone
 
-from flask import Flask, redirect, render_template, request, session, url_for
+from flask import Flask, jsonify, redirect, render_template, request, session, url_for
 from flask_login import LoginManager, login_required, current_user
 import os 
 from sqlalchemy import text
@@ -13,6 +13,10 @@ from Models.UsuarioModel import UsuarioSistema
 from Configuracoes import ConfiguracaoAtual # Importação da Configuração
 from Services.VersaoService import VersaoService
 from Services.LogService import LogService
+from Services.RespostaHttpService import RespostaHttpService
+from Services.DesempenhoService import DesempenhoService
+from Services.PerfiladorService import PerfiladorService
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
 # Importação das Rotas e Modelos
 from Routes.Global.APIs import GlobalBp
 from Routes.Auth import AuthBp
@@ -30,6 +34,11 @@ from Routes.Global.ConfiguracaoSeguranca import Seguranca_BP
 from Routes.ServicosClientes import ServicosClientesBp
 
 
+# Processos do pool de cálculo de rotas (spawn) reexecutam o script principal como "__mp_main__".
+# Com "python App.py" esse script é este arquivo: lá só os imports acima interessam, sem logs,
+# observador de caches nem consultas de versão (que truncariam o session.log do processo pai).
+PROCESSO_APLICACAO = __name__ != "__mp_main__"
+
 # --- REGISTRO DE ROTAS (BLUEPRINTS) ---
 # Pega o prefixo definido no .env ou padrão (ex: /Luft-ConnectAir)
 Prefix = ConfiguracaoAtual.ROUTE_PREFIX
@@ -41,13 +50,28 @@ app = Flask(ConfiguracaoAtual.APP_NAME,
 
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
 
+# Tempo total/banco, queries e tamanho por endpoint (registrado primeiro: mede até a compressão)
+DesempenhoService.Configurar(app)
+
+# Perfil sob demanda das próximas N requisições de um endpoint/usuário (armado em /Configuracoes/Perfis)
+PerfiladorService.Configurar(app)
+
+# JSON via orjson, compressão e métricas de payload (registrado antes dos demais after_request)
+RespostaHttpService.Configurar(app)
+
 # Chave secreta para sessões, criptografia ou outras operações sensíveis.
 app.secret_key = ConfiguracaoAtual.APP_SECRET_KEY # Trocar por algo seguro depois
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=ConfiguracaoAtual.SESSAO_TIMEOUT_MINUTOS)
 app.config['SESSION_REFRESH_EACH_REQUEST'] = True
 
-LogService.Inicializar()
-LogService.Info("App", f"Iniciando aplicação no ambiente: {os.getenv('AMBIENTE_APP', 'DEV')}")
+if PROCESSO_APLICACAO:
+    LogService.Inicializar()
+    LogService.Info("App", f"Iniciando aplicação no ambiente: {os.getenv('AMBIENTE_APP', 'DEV')}")
+
+    # Invalidações vindas dos outros processos do servidor (modo multiprocesso, WSGI.py)
+    CacheCompartilhadoService.Iniciar()
+
+# O pool de cálculo de rotas (RouteComputePool) sobe na primeira busca; o WSGI.py o aquece antes de servir
 
 # Configuração do Flask-Login
 GerenciadorLogin = LoginManager() # Instancia o gerenciador de login
@@ -150,24 +174,25 @@ gerenciador_usuario = LuftUser(
     attr_nome='Login',          # Mapeia para self.Nome
     cargo='Grupo',             # Mapeia para self.Grupo (Que você configurou lindamente no AuthService.py!)
 )
-# 2. Injeção do Framework na Aplicação
-luftcore_app = LuftCorePackages(
-    app=app,
-    app_name=ConfiguracaoAtual.APP_NAME,
-    app_version=VersaoService.ObterVersaoAtual()['NumeroVersao'],
-    app_version_type=VersaoService.ObterVersaoAtual()['Estagio'],
-    gerenciador_usuario=gerenciador_usuario,
-    inject_theme=True,         # Injeta CSS de temas
-    inject_global=True,        # Injeta CSS global estrutural
-    inject_animations=True,    # Injeta animações CSS
-    inject_js=True,             # Injeta o base.js do LuftCore
-
-    show_topbar=True,         # Se meteres False, a barra de cima desaparece toda
-    show_search=False,        # Oculta a barra de pesquisa
-    show_notifications=False, # Oculta o botão do sininho
-    show_breadcrumb=True,      # Mantém os breadcrumbs automáticos ativados
-    #favicon=f"{Prefix}/Static/Img/Logos/LUFT-HANSA.ico" # Usa o favicon com o prefixo correto (certifique-se de que o caminho está certo!)
-)
+# 2. Injeção do Framework na Aplicação (consulta a versão no banco)
+if PROCESSO_APLICACAO:
+    luftcore_app = LuftCorePackages(
+        app=app,
+        app_name=ConfiguracaoAtual.APP_NAME,
+        app_version=VersaoService.ObterVersaoAtual()['NumeroVersao'],
+        app_version_type=VersaoService.ObterVersaoAtual()['Estagio'],
+        gerenciador_usuario=gerenciador_usuario,
+        inject_theme=True,         # Injeta CSS de temas
+        inject_global=True,        # Injeta CSS global estrutural
+        inject_animations=True,    # Injeta animações CSS
+        inject_js=True,             # Injeta o base.js do LuftCore
+
+        show_topbar=True,         # Se meteres False, a barra de cima desaparece toda
+        show_search=False,        # Oculta a barra de pesquisa
+        show_notifications=False, # Oculta o botão do sininho
+        show_breadcrumb=True,      # Mantém os breadcrumbs automáticos ativados
+        #favicon=f"{Prefix}/Static/Img/Logos/LUFT-HANSA.ico" # Usa o favicon com o prefixo correto (certifique-se de que o caminho está certo!)
+    )
 
 # O Auth geralmente fica separado, ex: /Luft-ConnectAir/auth
 app.register_blueprint(AuthBp, url_prefix='/auth')
@@ -194,6 +219,11 @@ app.register_blueprint(GlobalBp, url_prefix='/Global')
 def Dashboard():
     return render_template('HomeDashboard.html')
 
+# Checagem de saúde do supervisor (WSGI.py multiprocesso); sem login, então não expõe nada do processo
+@app.route('/Saude')
+def Saude():
+    return jsonify({'Status': 'ok'})
+
 # Redirecionamento da raiz absoluta para o Dashboard correto
 @app.route('/')
 def IndexRoot():
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, insert
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 from Configuracoes import ConfiguracaoAtual
@@ -8,30 +8,48 @@ URL_BANCO_SQL = ConfiguracaoAtual.ObterUrlSqlServer()
 URL_BANCO_PG  = ConfiguracaoAtual.ObterUrlPostgres()
 
 # --- SQL SERVER ---
-def ObterEngineSqlServer():
+def ObterEngineSqlServer(CargaEmLote=False):
     """
     Cria e retorna a Engine de conexão com o SQL Server (ERP).
     Usa NullPool para evitar travamentos de sessão no servidor legado.
+    CargaEmLote=True liga o fast_executemany do pyodbc (parâmetros enviados em
+    array, um round-trip por lote) — usar só nas importações de remessas.
     """
     try:
+        Opcoes = {'fast_executemany': True} if CargaEmLote else {}
         Engine = create_engine(
             URL_BANCO_SQL, 
             poolclass=NullPool, # Desativa pooling para evitar conexões travadas no SQL Server legado 
             pool_pre_ping=True, # Verifica se a conexão tá ativa antes de usar, evitando erros de timeout
             # echo=ConfiguracaoAtual.MOSTRAR_LOGS_DB
-            echo=False
+            echo=False,
+            **Opcoes
         )
         return Engine
     except Exception as Erro:
         print(f"❌ Erro crítico ao criar engine do SQL Server: {Erro}")
         return None
 
-def ObterSessaoSqlServer():
-    Engine = ObterEngineSqlServer()
+def ObterSessaoSqlServer(CargaEmLote=False):
+    Engine = ObterEngineSqlServer(CargaEmLote)
     if Engine:
         return sessionmaker(bind=Engine)()
     return None
 
+def InserirEmLotes(Sessao, Modelo, Registros, TamanhoLote=5000):
+    """
+    INSERT executemany em fatias de TamanhoLote (lista de dicts → tabela do Modelo).
+    Não faz commit: a transação continua sendo da Sessao de quem chamou.
+    Retorna o total de linhas enviadas.
+    """
+    Tabela = Modelo.__table__
+    Total = 0
+    for Inicio in range(0, len(Registros), TamanhoLote):
+        Lote = Registros[Inicio:Inicio + TamanhoLote]
+        Sessao.execute(insert(Tabela), Lote)
+        Total += len(Lote)
+    return Total
+
 # --- POSTGRESQL ---
 def ObterEnginePostgres():
     """
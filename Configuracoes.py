@@ -42,7 +42,10 @@ class ConfiguracaoBase:
     DIR_UPLOADS = os.path.join(DIR_BASE, "Data", "Uploads")
     DIR_TEMP    = os.path.join(DIR_BASE, "Data", "Temp")
     DIR_LOGS    = os.path.join(DIR_BASE, "Logs")
+    DIR_PERFIS  = os.path.join(DIR_LOGS, "Perfis")  # Perfis de requisição (PerfiladorService)
     DIR_MODELS  = os.path.join(DIR_SERVER, "Data", "ML_Models")
+    DIR_CACHE   = os.path.join(DIR_BASE, "Data", "Cache")  # Caches locais (não vão para o share)
+    DIR_CACHE_COMPARTILHADO = os.path.join(DIR_CACHE, "Compartilhado")  # Snapshots mmap entre processos (CacheCompartilhadoService)
 
     HOST = os.getenv("HOST", "127.0.0.1")
     PORT = int(os.getenv("PORT", "5000"))
@@ -51,6 +54,104 @@ class ConfiguracaoBase:
     SQL_CONNECT_RETRY_COUNT = int(os.getenv("SQL_CONNECT_RETRY_COUNT", "3"))
     SQL_CONNECT_RETRY_INTERVAL = int(os.getenv("SQL_CONNECT_RETRY_INTERVAL", "5"))
 
+    # --- Treino do modelo de rotas (RouteMLEngine) ---
+    # Orçamento de inferência: só é promovido o modelo que pontua 100 candidatos dentro deste tempo (ms)
+    ML_LATENCIA_MAX_MS_100 = float(os.getenv("ML_LATENCY_BUDGET_MS_100", "100"))
+    # Processos usados na validação cruzada / grade de hiperparâmetros (-1 = todos os núcleos)
+    ML_TREINO_N_JOBS = int(os.getenv("ML_TRAIN_N_JOBS", "-1"))
+    # Intervalo (s) entre conferências da versão ativa do modelo no banco (hot-swap entre processos)
+    ML_INTERVALO_VERIFICACAO_MODELO = int(os.getenv("ML_MODEL_CHECK_INTERVAL_SECONDS", "60"))
+    # Abre o modelo com mmap (arrays das árvores compartilhados entre os processos do servidor)
+    ML_MODELO_MMAP = os.getenv("ML_MODEL_MMAP", "True").lower() == "true"
+
+    # --- Último status de AWB materializado (AwbStatusAtualService) ---
+    # Intervalo mínimo (s) entre atualizações incrementais de Tb_PLN_AwbStatusAtual
+    AWB_STATUS_INTERVALO_ATUALIZACAO = int(os.getenv("AWB_STATUS_REFRESH_SECONDS", "60"))
+
+    # --- Índice em memória número do voo -> trechos da malha (IndiceVoosMalhaService) ---
+    # Intervalo (s) entre conferências das remessas ativas (malha trocada por outro processo)
+    MALHA_INDICE_INTERVALO_VERIFICACAO = int(os.getenv("FLIGHT_INDEX_CHECK_SECONDS", "120"))
+
+    # --- Índice em memória raiz do CNPJ -> serviço contratado (IndiceServicoClienteService) ---
+    # Intervalo (s) entre recargas em segundo plano (cadastro de clientes alterado fora da tela)
+    SERVICO_CLIENTE_INDICE_INTERVALO = int(os.getenv("CLIENT_SERVICE_INDEX_REFRESH_SECONDS", "300"))
+
+    # --- Permissões em cache na sessão (PermissaoService) ---
+    # Intervalo (s) entre conferências da versão das permissões (vínculos/grupos alterados por outro processo)
+    PERMISSOES_VERSAO_INTERVALO = int(os.getenv("PERMISSIONS_VERSION_CHECK_SECONDS", "30"))
+
+    # --- Abertura do editor de planejamento (EditorPlanejamentoService) ---
+    # Threads para as consultas independentes da abertura (detalhe do CTC, consolidação, geocodificação...)
+    EDITOR_PLANEJAMENTO_THREADS = int(os.getenv("PLANNING_EDITOR_THREADS", "6"))
+    # Validade (s) do contexto montado na abertura, reaproveitado pela busca assíncrona de rotas
+    EDITOR_PLANEJAMENTO_CACHE_SEGUNDOS = int(os.getenv("PLANNING_EDITOR_CACHE_SECONDS", "90"))
+
+    # --- Respostas HTTP (RespostaHttpService) ---
+    # Tamanho mínimo (bytes) para comprimir com brotli/gzip
+    RESPOSTA_COMPRESSAO_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+    # max-age (s) dos endpoints de dados de referência (aeroportos, cias, cortes); revalidados por ETag
+    RESPOSTA_CACHE_REFERENCIA_SEGUNDOS = int(os.getenv("REFERENCE_DATA_MAX_AGE_SECONDS", "300"))
+
+    # --- Métricas de desempenho por requisição (DesempenhoService) ---
+    DESEMPENHO_ATIVO = os.getenv("PERF_METRICS_ENABLED", "True").lower() == "true"
+    # Últimas N requisições guardadas por endpoint (base dos percentis p50/p95/p99)
+    DESEMPENHO_AMOSTRAS_POR_ENDPOINT = int(os.getenv("PERF_METRICS_WINDOW", "500"))
+    # Acima de N queries numa única requisição, registra aviso de possível N+1
+    DESEMPENHO_LIMITE_QUERIES = int(os.getenv("PERF_N_PLUS_ONE_THRESHOLD", "30"))
+
+    # --- Perfil de requisições sob demanda (PerfiladorService) ---
+    # Intervalo de amostragem da pilha (ms): menor = mais detalhe e mais custo na requisição perfilada
+    PERFILADOR_INTERVALO_MS = float(os.getenv("PROFILER_SAMPLE_INTERVAL_MS", "5"))
+    # Amostragem para depois de N segundos, mesmo que a requisição continue
+    PERFILADOR_DURACAO_MAX_SEGUNDOS = int(os.getenv("PROFILER_MAX_SECONDS", "120"))
+    # Alvo armado e não consumido expira depois de N minutos
+    PERFILADOR_VALIDADE_MINUTOS = int(os.getenv("PROFILER_TARGET_TTL_MINUTES", "30"))
+    PERFILADOR_MAX_ARQUIVOS = int(os.getenv("PROFILER_MAX_FILES", "50"))
+    # Máximo de requisições por armação (cada uma vira uma vaga e um arquivo de perfil)
+    PERFILADOR_MAX_REQUISICOES = int(os.getenv("PROFILER_MAX_REQUESTS", "20"))
+
+    # --- Modo multiprocesso (WSGI.py / Supervisor.py) ---
+    # Processos waitress atrás do despachante local; 1 = processo único (modo tradicional)
+    SERVIDOR_PROCESSOS = int(os.getenv("SERVER_WORKERS", "1"))
+    SERVIDOR_THREADS = int(os.getenv("SERVER_THREADS", "6"))
+    # Cada processo escuta em 127.0.0.1:(base + índice)
+    SERVIDOR_PORTA_BASE_PROCESSOS = int(os.getenv("SERVER_WORKER_BASE_PORT", "9100"))
+    # Checagem de saúde ({prefixo}/Saude): intervalo (s), timeout (s) e falhas seguidas até reiniciar o processo
+    SERVIDOR_SAUDE_INTERVALO = int(os.getenv("SERVER_HEALTH_INTERVAL_SECONDS", "10"))
+    SERVIDOR_SAUDE_TIMEOUT = float(os.getenv("SERVER_HEALTH_TIMEOUT_SECONDS", "5"))
+    SERVIDOR_SAUDE_FALHAS = int(os.getenv("SERVER_HEALTH_MAX_FAILURES", "3"))
+
+    # --- Processos de cálculo da busca de rotas (RouteComputePool) ---
+    # Processos dedicados a grafo/score/ML da busca; 0 (padrão) = calcula na thread da requisição.
+    # Cada processo carrega grafo e modelo ML próprios: ligar só onde houver memória para isso.
+    # No modo multiprocesso, cada processo do servidor tem o seu pool.
+    ROTAS_PROCESSOS_CALCULO = int(os.getenv("ROUTE_COMPUTE_WORKERS", "0"))
+    # Buscas aguardando processo livre (além das em execução); acima disso calcula na própria requisição
+    ROTAS_FILA_MAXIMA = int(os.getenv("ROUTE_COMPUTE_MAX_QUEUE", "4"))
+    # Espera máxima (s) na fila e, depois, no cálculo; se a busca nem começou, calcula na própria requisição
+    ROTAS_TIMEOUT_SEGUNDOS = float(os.getenv("ROUTE_COMPUTE_TIMEOUT_SECONDS", "60"))
+
+    # --- Caches compartilhados entre processos (CacheCompartilhadoService) ---
+    CACHE_COMPARTILHADO_ATIVO = os.getenv("SHARED_CACHE_ENABLED", "True").lower() == "true"
+    # Intervalo (s) entre releituras da versão publicada e dos sinais de invalidação
+    CACHE_COMPARTILHADO_INTERVALO = float(os.getenv("SHARED_CACHE_POLL_SECONDS", "5"))
+    # Intervalo (s) entre conferências da assinatura no banco (dados trocados fora da aplicação)
+    CACHE_COMPARTILHADO_VERIFICACAO = int(os.getenv("SHARED_CACHE_SIGNATURE_CHECK_SECONDS", "120"))
+
+    # --- Logs (LogService) ---
+    # Nível geral (DEBUG, INFO, WARNING...). Produção tem padrão próprio, mais abaixo.
+    LOG_NIVEL = os.getenv("LOG_LEVEL", "DEBUG")
+    # Nível por origem, sobrepondo o geral. Ex.: "RouteIntelligenceService=INFO,RespostaHttpService=WARNING"
+    LOG_NIVEIS_ORIGEM = os.getenv("LOG_LEVELS", "")
+    # Rotação do application.log: por tamanho (MB) e/ou por tempo ('midnight', 'H', 'D'...; vazio = só tamanho)
+    LOG_ROTACAO_MAX_MB = int(os.getenv("LOG_ROTATE_MAX_MB", "20"))
+    LOG_ROTACAO_QUANDO = os.getenv("LOG_ROTATE_WHEN", "midnight")
+    LOG_ROTACAO_BACKUPS = int(os.getenv("LOG_ROTATE_BACKUPS", "14"))
+    LOG_CONSOLE = os.getenv("LOG_CONSOLE", "True").lower() == "true"
+    # Mensagens com Chave (LogService.Debug(..., Chave=...)): no máximo N por janela de X segundos
+    LOG_LIMITE_POR_JANELA = int(os.getenv("LOG_RATE_LIMIT_COUNT", "5"))
+    LOG_JANELA_SEGUNDOS = int(os.getenv("LOG_RATE_LIMIT_WINDOW_SECONDS", "60"))
+
     # --- Lógica de Segurança da SECRET_KEY ---
     _chave_env = os.getenv("APP_SECRET_KEY")
     
@@ -106,6 +207,7 @@ class ConfiguracaoHomologacao(ConfiguracaoBase):
 
 class ConfiguracaoProducao(ConfiguracaoBase):
     DEBUG = True
+    LOG_NIVEL = os.getenv("LOG_LEVEL", "INFO")
     PG_DB_NAME = os.getenv("PGDB_NAME_PROD", "Luft-ConnectAir")
 
 # Mapa de seleção do ambiente
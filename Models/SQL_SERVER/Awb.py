@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Numeric, Date, Boolean, Text
+from sqlalchemy import Column, Integer, String, DateTime, Numeric, Date, Boolean, Text, func
 from Models.SQL_SERVER.Base import Base
 
 class Awb(Base):
@@ -154,4 +154,35 @@ class AwbStatus(Base):
     TIPO_INCLUSAO = Column(String(1))
     Usuario = Column(String(30))
     F_EnvComprovei = Column(Boolean) # bit -> Boolean
-    Protocolo_EnvComp = Column(String(500))
\ No newline at end of file
+    Protocolo_EnvComp = Column(String(500))
+
+class AwbStatusAtual(Base):
+    """
+    Último status de cada AWB (uma linha por CODAWB), materializado a partir de
+    TB_AWB_STATUS por AwbStatusAtualService — leitura O(1) para as telas.
+    Script de criação: SQL/Migracoes/V006__Tb_PLN_AwbStatusAtual.sql
+    """
+    __tablename__ = 'Tb_PLN_AwbStatusAtual'
+    __table_args__ = {'schema': 'intec.dbo'}
+
+    CODAWB = Column(String(15), primary_key=True)
+    STATUS_AWB = Column(String(50))
+    DATAHORA_STATUS = Column(DateTime)
+    DATA_INSERT = Column(DateTime)
+    VOO = Column(String(20))
+    LOCAL_STATUS = Column(String(50))
+    DataAtualizacao = Column(DateTime, server_default=func.now())
+
+
+class ControleSincronizacao(Base):
+    """
+    Marca d'água das sincronizações incrementais (uma linha por rotina).
+    Ex.: Chave 'AWB_STATUS_ATUAL' → maior DATA_INSERT de TB_AWB_STATUS já processado.
+    """
+    __tablename__ = 'Tb_PLN_ControleSincronizacao'
+    __table_args__ = {'schema': 'intec.dbo'}
+
+    Chave = Column(String(50), primary_key=True)
+    MarcaDagua = Column(DateTime)
+    DataExecucao = Column(DateTime)
+    LinhasUltimaExecucao = Column(Integer)
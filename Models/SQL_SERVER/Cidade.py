@@ -26,6 +26,7 @@ class Cidade(Base):
     CodigoIbge = Column(Integer, index=True)
     Uf = Column(String(5))
     NomeCidade = Column(String(255))
+    NomeNormalizado = Column(String(255))  # NormalizarTexto(NomeCidade), gravado na importação
     Latitude = Column(Float)
     Longitude = Column(Float)
 
@@ -116,6 +116,8 @@ class ML_ModeloVersao(Base):
 
     TotalAmostras   = Column(Integer, nullable=False)
     AucCrossVal     = Column(Float,   nullable=True)
+    TempoTreinoMs   = Column(Float, nullable=True)  # fit no dataset completo
+    LatenciaPredicao100Ms = Column(Float, nullable=True)  # pontuar 100 candidatos, um a um
 
     IsAtivo         = Column(Boolean, nullable=False, default=False)
     CaminhoArquivo  = Column(String(500), nullable=True)
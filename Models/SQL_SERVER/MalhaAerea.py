@@ -1,5 +1,5 @@
 from sqlalchemy import Column, Integer, String, Date, Time, DateTime, Boolean, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from Models.SQL_SERVER.Base import Base
 
@@ -25,6 +25,9 @@ class VooMalha(Base):
     
     CiaAerea = Column(String(10), nullable=False) 
     NumeroVoo = Column(String(20), nullable=False)
+    # Dígitos invertidos, p/ busca por sufixo (Utils.Texto.ChaveSufixoVoo). Criada pela migração V002:
+    # deferred para que carregar VooMalha não a selecione (só filtros e a importação a usam)
+    NumeroVooReverso = deferred(Column(String(20), nullable=True))
     DataPartida = Column(Date, nullable=False)
     AeroportoOrigem = Column(String(5), nullable=False)
     HorarioSaida = Column(Time, nullable=False)
@@ -4,8 +4,11 @@ from flask_login import UserMixin
 class UsuarioSistema(UserMixin):
     """
     Representa o usuário logado na sessão.
+    Permissoes/VersaoPermissoes: Id_Permissao efetivos e a versão das permissões em que foram
+    calculados (PermissaoService); viajam na sessão para a checagem não ir ao banco.
     """
-    def __init__(self, Login, Nome, Email=None, Grupo=None, IdBanco=None, Id_Grupo_Banco=None):
+    def __init__(self, Login, Nome, Email=None, Grupo=None, IdBanco=None, Id_Grupo_Banco=None,
+                 Permissoes=None, VersaoPermissoes=None):
         self.id = Login
         self.Login = Login
         self.Nome = Nome
@@ -13,6 +16,8 @@ class UsuarioSistema(UserMixin):
         self.Grupo = Grupo
         self.IdBanco = IdBanco # ID do Usuário (LogAcesso / PermissaoUsuario)
         self.Id_Grupo_Banco = Id_Grupo_Banco # ID do Grupo (PermissaoGrupo)
+        self.Permissoes = frozenset(Permissoes) if Permissoes is not None else None
+        self.VersaoPermissoes = VersaoPermissoes
         
         # Cache simples para não consultar o banco 50x na mesma requisição
         self._cache_permissoes = {} 
@@ -25,6 +30,8 @@ class UsuarioSistema(UserMixin):
             'Grupo': self.Grupo,
             'IdBanco': self.IdBanco,
             'Id_Grupo_Banco': self.Id_Grupo_Banco,
+            'Permissoes': sorted(self.Permissoes) if self.Permissoes is not None else None,
+            'VersaoPermissoes': self.VersaoPermissoes,
         }
 
     @classmethod
@@ -43,7 +50,9 @@ class UsuarioSistema(UserMixin):
             Email=DadosSessao.get('Email'),
             Grupo=DadosSessao.get('Grupo'),
             IdBanco=DadosSessao.get('IdBanco'),
-            Id_Grupo_Banco=DadosSessao.get('Id_Grupo_Banco')
+            Id_Grupo_Banco=DadosSessao.get('Id_Grupo_Banco'),
+            Permissoes=DadosSessao.get('Permissoes'),
+            VersaoPermissoes=DadosSessao.get('VersaoPermissoes')
         )
 
     def TemPermissao(self, ChavePermissao):
@@ -58,7 +67,7 @@ class UsuarioSistema(UserMixin):
         # 2. Importa o serviço aqui dentro (Lazy Import) para não travar o App.py
         from Services.PermissaoService import PermissaoService
         
-        # 3. Verifica no banco
+        # 3. Verifica no conjunto da sessão (só vai ao banco se as permissões mudaram)
         Tem = PermissaoService.VerificarPermissao(self, ChavePermissao)
         
         # 4. Guarda no cache e retorna
@@ -1,5 +1,6 @@
+import json
 from datetime import datetime
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 from Services.AcompanhamentoService import AcompanhamentoService
 from Services.LogService import LogService
@@ -29,20 +30,58 @@ def painel():
         dataHoje = datetime.now().strftime('%Y-%m-%d')
         return render_template('Pages/Acompanhamento/Index.html', resumo={}, data_inicio=dataHoje, data_fim=dataHoje)
 
-@AcompanhamentoBP.route('/Api/ListarAwbs', methods=['GET'])
-@login_required
-@require_ajax
-@RequerPermissao('ACOMPANHAMENTO.PAINEL.VISUALIZAR')
-def apiListarAwbs():
-    dictFiltros = {
+def _FiltrosListagem():
+    return {
         'DataInicio': request.args.get('dataInicio'),
         'DataFim': request.args.get('dataFim'),
         'NumeroAwb': request.args.get('numeroAwb'),
         'FilialCtc': request.args.get('filialCtc') 
     }
+
+@AcompanhamentoBP.route('/Api/ListarAwbs', methods=['GET'])
+@login_required
+@require_ajax
+@RequerPermissao('ACOMPANHAMENTO.PAINEL.VISUALIZAR')
+def apiListarAwbs():
+    """
+    Sem 'cursor' nem 'limite': lista simples, como sempre foi (até TAMANHO_LISTA_SIMPLES AWBs).
+    Paginado (keyset): informe 'limite' e/ou 'cursor' = proximoCursor da resposta anterior;
+    a resposta passa a ser {'itens': [...], 'proximoCursor': str|None}.
+    """
+    dictFiltros = _FiltrosListagem()
     LogService.Debug("AcompanhamentoRoute", f"API /ListarAwbs chamada. Parametros: {dictFiltros}")
-    listaDados = AcompanhamentoService.ListarAwbs(dictFiltros)
-    return jsonify(listaDados)
+    if 'cursor' not in request.args and 'limite' not in request.args:
+        dictPagina = AcompanhamentoService.ListarAwbs(dictFiltros, limite=AcompanhamentoService.TAMANHO_LISTA_SIMPLES)
+        return jsonify(dictPagina['itens'])
+
+    dictPagina = AcompanhamentoService.ListarAwbs(
+        dictFiltros,
+        cursor=request.args.get('cursor'),
+        limite=request.args.get('limite', type=int)
+    )
+    return jsonify({'itens': dictPagina['itens'], 'proximoCursor': dictPagina['proximo_cursor']})
+
+@AcompanhamentoBP.route('/Api/ListarAwbs/Stream', methods=['GET'])
+@login_required
+@require_ajax
+@RequerPermissao('ACOMPANHAMENTO.PAINEL.VISUALIZAR')
+def apiListarAwbsStream():
+    """
+    Todas as AWBs do filtro em NDJSON (um objeto JSON por linha), enviadas conforme
+    cada página sai do banco. A tela vai desenhando enquanto o restante chega.
+    """
+    dictFiltros = _FiltrosListagem()
+    LogService.Debug("AcompanhamentoRoute", f"API /ListarAwbs/Stream chamada. Parametros: {dictFiltros}")
+
+    def gerarLinhas():
+        for item in AcompanhamentoService.IterarAwbs(dictFiltros):
+            yield json.dumps(item, ensure_ascii=False, default=str) + '\n'
+
+    return Response(
+        stream_with_context(gerarLinhas()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'}
+    )
 
 @AcompanhamentoBP.route('/Api/Historico/<path:numero_awb>', methods=['GET'])
 @login_required
@@ -53,15 +92,40 @@ def apiHistorico(numero_awb):
     listaHistorico = AcompanhamentoService.ObterHistoricoAwb(numero_awb)
     return jsonify(listaHistorico)
 
+@AcompanhamentoBP.route('/Api/HistoricoLote', methods=['POST'])
+@login_required
+@require_ajax
+@RequerPermissao('ACOMPANHAMENTO.PAINEL.VISUALIZAR')
+def apiHistoricoLote():
+    """
+    Trajetos de várias AWBs de uma vez (mapa do painel). Corpo: {"awbs": ["...", ...]}.
+    Resposta compacta: trechos por AWB e coordenadas dos aeroportos uma única vez.
+    """
+    dadosRequisicao = request.get_json(silent=True) or {}
+    listaAwbs = dadosRequisicao.get('awbs')
+    if not isinstance(listaAwbs, list):
+        return jsonify({'sucesso': False, 'msg': 'Informe a lista de AWBs.'}), 400
+
+    listaAwbs = [str(numero) for numero in listaAwbs if numero]
+    if len(listaAwbs) > AcompanhamentoService.MAX_AWBS_HISTORICO_LOTE:
+        return jsonify({
+            'sucesso': False,
+            'msg': f'Máximo de {AcompanhamentoService.MAX_AWBS_HISTORICO_LOTE} AWBs por requisição.'
+        }), 400
+
+    LogService.Debug("AcompanhamentoRoute", f"API /HistoricoLote chamada para {len(listaAwbs)} AWB(s)")
+    return jsonify(AcompanhamentoService.ObterTrajetosAwbs(listaAwbs))
+
 @AcompanhamentoBP.route('/Api/DetalhesVooModal', methods=['GET'])
 @login_required
 @require_ajax
 def apiDetalhesVooModal():
     numeroVooConsulta = request.args.get('numeroVoo')
     dataRefConsulta = request.args.get('dataRef') 
+    ciaConsulta = request.args.get('cia')
     
-    LogService.Debug("AcompanhamentoRoute", f"API /DetalhesVooModal chamada para voo {numeroVooConsulta} em {dataRefConsulta}")
-    dictDetalhes = AcompanhamentoService.BuscarDetalhesVooModal(numeroVooConsulta, dataRefConsulta)
+    LogService.Debug("AcompanhamentoRoute", f"API /DetalhesVooModal chamada para voo {numeroVooConsulta} ({ciaConsulta}) em {dataRefConsulta}")
+    dictDetalhes = AcompanhamentoService.BuscarDetalhesVooModal(numeroVooConsulta, dataRefConsulta, ciaConsulta)
     
     if dictDetalhes:
         return jsonify({'sucesso': True, 'dados': dictDetalhes})
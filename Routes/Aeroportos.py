@@ -4,6 +4,7 @@ from datetime import datetime
 from Services.AeroportosService import AeroportoService
 from Services.LogService import LogService
 from Services.PermissaoService import RequerPermissao 
+from Services.RespostaHttpService import RespostaCacheavel
 from luftcore.extensions.flask_extension import require_ajax
 
 AeroportoBp = Blueprint('Aeroporto', __name__)
@@ -12,6 +13,7 @@ AeroportoBp = Blueprint('Aeroporto', __name__)
 @login_required
 @require_ajax
 @RequerPermissao('CADASTROS.AEROPORTOS.VISUALIZAR')
+@RespostaCacheavel()
 def apiListarSimples():
     try:
         dados = AeroportoService.ListarTodosParaSelect()
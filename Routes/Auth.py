@@ -3,6 +3,7 @@ from datetime import datetime, timedelta, timezone
 from flask import Blueprint, flash, jsonify, redirect, render_template, request, session, url_for
 from flask_login import current_user, login_user, logout_user
 from Services.AuthService import AuthService
+from Services.PermissaoService import PermissaoService
 from Models.UsuarioModel import UsuarioSistema
 from Services.LogService import LogService
 from Configuracoes import ConfiguracaoAtual
@@ -43,6 +44,9 @@ def login():
                 Id_Grupo_Banco=dadosUsuario.get('id_grupo')
             )
 
+            # Conjunto de permissões calculado uma vez no login e guardado na sessão
+            PermissaoService.CarregarPermissoes(usuarioLogado)
+
             login_user(usuarioLogado, duration=timedelta(hours=8))
             _MarcarSessaoAutenticada(usuarioLogado)
 
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, jsonify
 from flask_login import login_required, current_user
 from Services.PermissaoService import RequerPermissao
 from Services.CorteService import CorteService
+from Services.RespostaHttpService import RespostaCacheavel
 from luftcore.extensions.flask_extension import require_ajax
 
 CortesBp = Blueprint('Cortes', __name__)
@@ -17,6 +18,7 @@ def gerenciar():
 @login_required
 @require_ajax
 @RequerPermissao('CADASTROS.CORTES.VISUALIZAR')
+@RespostaCacheavel(MaxAgeSegundos=0)
 def apiListarPlanejamento():
     return jsonify(CorteService.ListarCortesPlanejamentoAgrupado())
 
@@ -24,6 +26,7 @@ def apiListarPlanejamento():
 @login_required
 @require_ajax
 @RequerPermissao('CADASTROS.CORTES.VISUALIZAR')
+@RespostaCacheavel(MaxAgeSegundos=0)
 def apiListarEmissao():
     return jsonify(CorteService.ListarCortesEmissaoAgrupado())
 
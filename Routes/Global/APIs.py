@@ -7,6 +7,9 @@ from luftcore.extensions.flask_extension import require_ajax
 from Services.Shared.AwbService import AwbService
 from Services.Shared.CtcService import CtcService
 from Services.LogService import LogService
+from Services.DesempenhoService import DesempenhoService
+from Services.RespostaHttpService import RespostaHttpService
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
 from Services.Shared.VoosDataService import ObterTotalVoosData
 
 GlobalBp = Blueprint('Global', __name__)
@@ -50,4 +53,14 @@ def apiDetalhesAwbModal():
 def apiVoosHoje():
     hojeData = datetime.now()
     quantidadeVoos = ObterTotalVoosData(hojeData)
-    return jsonify(quantidadeVoos)
\ No newline at end of file
+    return jsonify(quantidadeVoos)
+
+@GlobalBp.route('/API/Metricas')
+@login_required
+@RequerPermissao('SISTEMA.CONFIGURACOES.VISUALIZAR')
+def apiMetricas():
+    """Latência (p50/p95/p99), tempo de banco e queries por endpoint e usuário, os payloads HTTP e os snapshots abertos."""
+    metricas = DesempenhoService.ObterMetricas()
+    metricas['Respostas'] = RespostaHttpService.ObterMetricas()
+    metricas['Caches'] = CacheCompartilhadoService.ObterEstado()
+    return jsonify(metricas)
@@ -8,6 +8,7 @@ from Models.SQL_SERVER.Permissoes import Tb_Permissao, Tb_PermissaoGrupo, Tb_Per
 from Models.SQL_SERVER.Usuario import Usuario, UsuarioGrupo  
 
 from Services.PermissaoService import PermissaoService, RequerPermissao
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
 from luftcore.extensions.flask_extension import require_ajax
 
 sistemaId = int(os.getenv("SISTEMA_ID", 1))
@@ -84,6 +85,8 @@ def criarNovaPermissao():
         )
         sessaoDb.add(novaPermissaoObj)
         sessaoDb.commit()
+        PermissaoService.Reconstruir()
+        CacheCompartilhadoService.Invalidar('permissoes')
         flash("Permissão criada com sucesso!", "success")
         
     except Exception as e:
@@ -177,6 +180,9 @@ def salvarVinculo():
                     sessaoDb.add(Tb_PermissaoUsuario(Codigo_Usuario=idAlvoReq, Id_Permissao=idPermissaoReq, Conceder=concederAcesso))
 
         sessaoDb.commit()
+        # Nova versão: sessões recalculam o conjunto de permissões na próxima checagem
+        PermissaoService.Reconstruir()
+        CacheCompartilhadoService.Invalidar('permissoes')
         return jsonify({"sucesso": True})
     except Exception as e:
         sessaoDb.rollback()
@@ -1,6 +1,7 @@
-from flask import Blueprint, render_template, request, jsonify, flash, url_for
-from flask_login import login_required
+from flask import Blueprint, render_template, request, jsonify, flash, url_for, redirect, send_from_directory
+from flask_login import login_required, current_user
 from Services.CiaAereaService import CiaAereaService
+from Services.PerfiladorService import PerfiladorService
 from Services.PermissaoService import RequerPermissao
 
 ConfiguracoesBp = Blueprint('Configuracoes', __name__)
@@ -32,4 +33,53 @@ def salvarScoreCia():
         
         return jsonify({'sucesso': False, 'msg': 'Erro no Service'}), 500
     except Exception as e:
-        return jsonify({'sucesso': False, 'msg': str(e)}), 500
\ No newline at end of file
+        return jsonify({'sucesso': False, 'msg': str(e)}), 500
+
+@ConfiguracoesBp.route('/Perfis')
+@login_required
+@RequerPermissao('SISTEMA.CONFIGURACOES.VISUALIZAR')
+def perfis():
+    return _RenderizarPerfis()
+
+def _RenderizarPerfis():
+    return render_template(
+        'Pages/Configs/Perfis.html',
+        Alvo=PerfiladorService.ObterAlvo(),
+        Perfis=PerfiladorService.ListarPerfis(),
+        MaxRequisicoes=PerfiladorService.MAX_REQUISICOES
+    )
+
+@ConfiguracoesBp.route('/Perfis/Armar', methods=['POST'])
+@login_required
+@RequerPermissao('SISTEMA.CONFIGURACOES.EDITAR')
+def armarPerfil():
+    endpoint = request.form.get('endpoint', '')
+    usuario = request.form.get('usuario', '')
+    if not endpoint.strip() and not usuario.strip():
+        flash('Informe o endpoint ou o usuário a perfilar.', 'warning')
+        return redirect(url_for('Configuracoes.perfis'))
+
+    try:
+        PerfiladorService.Armar(
+            endpoint, usuario, request.form.get('quantidade') or 1, armado_por=getattr(current_user, 'Login', None)
+        )
+    except ValueError:
+        flash(f'Informe de 1 a {PerfiladorService.MAX_REQUISICOES} requisições.', 'warning')
+        return _RenderizarPerfis(), 400
+
+    flash('Perfilador armado. Os perfis aparecem aqui assim que as requisições terminarem.', 'success')
+    return redirect(url_for('Configuracoes.perfis'))
+
+@ConfiguracoesBp.route('/Perfis/Cancelar', methods=['POST'])
+@login_required
+@RequerPermissao('SISTEMA.CONFIGURACOES.EDITAR')
+def cancelarPerfil():
+    PerfiladorService.Cancelar()
+    flash('Perfilador desarmado.', 'info')
+    return redirect(url_for('Configuracoes.perfis'))
+
+@ConfiguracoesBp.route('/Perfis/Baixar/<path:nome>')
+@login_required
+@RequerPermissao('SISTEMA.CONFIGURACOES.VISUALIZAR')
+def baixarPerfil(nome):
+    return send_from_directory(PerfiladorService.DIR_PERFIS, nome, as_attachment=True)
@@ -6,7 +6,8 @@ from luftcore.extensions.flask_extension import require_ajax
 # Import dos Serviços
 from Services.PermissaoService import RequerPermissao
 from Services.PlanejamentoService import PlanejamentoService
-from Services.Shared.GeoService import BuscarCoordenadasCidade, BuscarAeroportoEstrategico, BuscarTopAeroportos
+from Services.EditorPlanejamentoService import EditorPlanejamentoService
+from Services.Shared.GeoService import BuscarCoordenadasCidade, BuscarAeroportoEstrategico
 from Services.LogService import LogService
 from Services.Logic.RouteIntelligenceService import RouteIntelligenceService
 from Services.Logic.RouteMLEngine import RouteMLEngine
@@ -35,19 +36,26 @@ def _carregar_dados_editor_planejamento(filial, serie, ctc, servicos_escolhidos=
     return PlanejamentoService.MontarDadosPlanejamento(filial, serie, ctc, servicos_escolhidos)
 
 
-def _calcular_contexto_rotas_editor(dados_ctc, dados_unificados, emitir_flash=False, ml_context=None):
-    coord_origem = BuscarCoordenadasCidade(dados_ctc['origem_cidade'], dados_ctc['origem_uf'])
-    coord_destino = BuscarCoordenadasCidade(dados_ctc['destino_cidade'], dados_ctc['destino_uf'])
-
-    lista_origem = BuscarTopAeroportos(coord_origem['lat'], coord_origem['lon'], limite=5) if coord_origem else []
-    lista_destino = BuscarTopAeroportos(coord_destino['lat'], coord_destino['lon'], limite=5) if coord_destino else []
+def _calcular_contexto_rotas_editor(contexto, emitir_flash=False, ml_context=None, buscar_rotas=True):
+    """
+    Busca de rotas sobre o contexto do editor (EditorPlanejamentoService.CarregarContexto).
+    buscar_rotas=False só valida: 'busca_pendente' indica que a página deve pedir as rotas depois.
+    """
+    dados_unificados = contexto['unificados']
+    coord_origem = contexto['coord_origem']
+    coord_destino = contexto['coord_destino']
+    lista_origem = contexto['aeroportos_origem']
+    lista_destino = contexto['aeroportos_destino']
 
     opcoes_rotas = {}
+    busca_pendente = False
     if dados_unificados and not dados_unificados.get('servico_pendente'):
         iatas_origem = [a['iata'] for a in lista_origem]
         iatas_destino = [a['iata'] for a in lista_destino]
 
-        if iatas_origem and iatas_destino:
+        if iatas_origem and iatas_destino and not buscar_rotas:
+            busca_pendente = True
+        elif iatas_origem and iatas_destino:
             data_inicio_busca = dados_unificados['data_busca']
             peso_total = float(dados_unificados.get('peso_taxado', 0.0))
             if peso_total <= 0:
@@ -81,7 +89,8 @@ def _calcular_contexto_rotas_editor(dados_ctc, dados_unificados, emitir_flash=Fa
         'coord_destino': coord_destino,
         'aero_origem_principal': lista_origem[0] if lista_origem else None,
         'aero_destino_principal': lista_destino[0] if lista_destino else None,
-        'opcoes_rotas': opcoes_rotas
+        'opcoes_rotas': opcoes_rotas,
+        'busca_pendente': busca_pendente
     }
 
 @PlanejamentoBp.route('/Dashboard')
@@ -110,8 +119,8 @@ def apiCtcsHoje():
             f"Sincronização AWB concluída antes da listagem. Planejamentos atualizados: {sincronizacao['planejamentos_atualizados']}"
         )
 
-    dadosCtc = PlanejamentoService.BuscarCtcsPlanejamento()
-    return jsonify(dadosCtc)
+    quadroCtcs = PlanejamentoService.BuscarQuadroPlanejamento()
+    return jsonify(quadroCtcs)
 
 @PlanejamentoBp.route('/Montar/<string:filial>/<string:serie>/<string:ctc>')
 @login_required
@@ -119,46 +128,47 @@ def apiCtcsHoje():
 def montarPlanejamento(filial, serie, ctc):
     LogService.Info("Routes.Planejamento", f"Iniciando Montagem Planejamento: {filial}-{serie}-{ctc}")
 
-    dadosCtc, _, dadosUnificados = _carregar_dados_editor_planejamento(filial, serie, ctc)
+    # Consultas independentes em paralelo; as rotas são pedidas pela página depois (/API/OpcoesRotas)
+    contexto = EditorPlanejamentoService.CarregarContexto(filial, serie, ctc)
     
     # Se os dados do CTC não forem encontrados ou já tiverem sido processados, redireciona de volta com mensagem de erro
-    if not dadosCtc: 
+    if not contexto: 
         flash(f"Erro: O CTC {filial}-{serie}-{ctc} não foi encontrado ou já foi processado.", "danger")
         return redirect(url_for('Planejamento.dashboard'))
 
+    dadosUnificados = contexto['unificados']
+
     # Se houver consolidação, exibe uma mensagem informando quantos CTCs foram consolidados para este planejamento
     if dadosUnificados.get('is_consolidado'):
         flash(f"Lote virtual criado: {dadosUnificados.get('qtd_docs')} CTCs foram consolidados para esta rota.", "success")
 
     # Se já existe planejamento ativo para este CTC, abre direto em modo visualização
     # sem calcular rotas (evita o processo caro de ~2 minutos)
-    planejamentoSalvo = PlanejamentoService.ObterPlanejamentoPorCtc(filial, serie, ctc)
+    planejamentoSalvo = contexto['planejamento_salvo']
 
     if planejamentoSalvo:
         LogService.Info("Routes.Planejamento", f"Planejamento ativo encontrado (ID {planejamentoSalvo['id_planejamento']}) — abrindo modo visualização.")
-        coord_origem = BuscarCoordenadasCidade(dadosCtc['origem_cidade'], dadosCtc['origem_uf'])
-        coord_destino = BuscarCoordenadasCidade(dadosCtc['destino_cidade'], dadosCtc['destino_uf'])
         return render_template('Pages/Planejamento/Editor.html',
                                Ctc=dadosUnificados,
-                               Origem=coord_origem,
-                               Destino=coord_destino,
+                               Origem=contexto['coord_origem'],
+                               Destino=contexto['coord_destino'],
                                AeroOrigem=None,
                                AeroDestino=None,
                                OpcoesRotas={},
+                               RotasAssincronas=False,
                                PlanejamentoSalvo=planejamentoSalvo)
 
-    # Sem planejamento ativo (primeira montagem ou após cancelamento) — monta rotas completo
-    contexto_rotas = _calcular_contexto_rotas_editor(
-        dadosCtc, dadosUnificados, emitir_flash=True,
-        ml_context={'filial': filial, 'serie': serie, 'ctc': ctc, 'usuario': current_user.id}
-    )
+    # Sem planejamento ativo (primeira montagem ou após cancelamento): a tela abre já,
+    # e a busca de rotas (a parte cara) chega depois pela API
+    contexto_rotas = _calcular_contexto_rotas_editor(contexto, emitir_flash=True, buscar_rotas=False)
 
     return render_template('Pages/Planejamento/Editor.html', 
                            Ctc=dadosUnificados, 
                            Origem=contexto_rotas['coord_origem'], Destino=contexto_rotas['coord_destino'],
                            AeroOrigem=contexto_rotas['aero_origem_principal'],
                            AeroDestino=contexto_rotas['aero_destino_principal'],
-                           OpcoesRotas=contexto_rotas['opcoes_rotas'],
+                           OpcoesRotas={},
+                           RotasAssincronas=contexto_rotas['busca_pendente'],
                            PlanejamentoSalvo=None) 
 
 
@@ -174,21 +184,26 @@ def apiOpcoesRotasPlanejamento():
         ctc = dadosFront.get('ctc')
         servicos_escolhidos = dadosFront.get('servicos_escolhidos', {})
 
-        dadosCtc, _, dadosUnificados = _carregar_dados_editor_planejamento(
+        # Só a busca disparada pela abertura do editor reaproveita o contexto em cache;
+        # recálculo pedido pelo usuário remonta (consolidação/CTC podem ter mudado)
+        contexto = EditorPlanejamentoService.CarregarContexto(
             filial,
             serie,
             ctc,
-            servicos_escolhidos=servicos_escolhidos
+            servicos_escolhidos=servicos_escolhidos,
+            UsarCache=bool(dadosFront.get('usar_cache'))
         )
 
-        if not dadosCtc or not dadosUnificados:
+        if not contexto or not contexto['unificados']:
             return jsonify({'sucesso': False, 'msg': 'CTC não encontrado para cálculo de rotas.'}), 404
 
+        dadosUnificados = contexto['unificados']
+
         if dadosUnificados.get('servico_pendente'):
             return jsonify({'sucesso': False, 'msg': 'Existem clientes com serviço pendente de definição.', 'ctc': dadosUnificados}), 400
 
         contexto_rotas = _calcular_contexto_rotas_editor(
-            dadosCtc, dadosUnificados, emitir_flash=False,
+            contexto, emitir_flash=False,
             ml_context={'filial': filial, 'serie': serie, 'ctc': ctc, 'usuario': current_user.id}
         )
         return jsonify({
@@ -214,6 +229,7 @@ def cancelarPlanejamentoRota():
     sucesso, msg = PlanejamentoService.CancelarPlanejamento(idPlan, current_user.id)
     
     if sucesso:
+        EditorPlanejamentoService.Invalidar()
         RouteMLEngine.DesvincularPlanejamento(idPlan)
         msg = "Planejamento cancelado com sucesso. Os CTCs retornaram para a fila de pendências."
         
@@ -281,6 +297,7 @@ def salvarPlanejamento():
         
         if idPlanejamento: 
             LogService.Info("Routes.Planejamento", f"Planejamento salvo com sucesso. ID Retornado: {idPlanejamento}")
+            EditorPlanejamentoService.Invalidar()
             RouteMLEngine.VincularPlanejamento(
                 filial=filial,
                 serie=serie,
@@ -333,43 +350,12 @@ def exportarPlanejamentosExcel():
 def mapaGlobal():
     try:
         LogService.Debug("Routes.Planejamento", "Gerando Mapa Global...")
-        listaCtcs = PlanejamentoService.BuscarCtcsPlanejamento()
-        agrupamentoCtcs = {}
-
-        for ctcItem in listaCtcs:
-            try:
-                _, ufOrig = ctcItem['origem'].split('/')
-                ufOrig = ufOrig.strip().upper()
-                
-                if ufOrig not in agrupamentoCtcs:
-                    agrupamentoCtcs[ufOrig] = {
-                        'uf': ufOrig,
-                        'coords': COORDENADAS_UFS.get(ufOrig, {'lat': -15, 'lon': -47}),
-                        'qtd_docs': 0,
-                        'qtd_vols': 0,
-                        'valor_total': 0.0,
-                        'tem_urgencia': False,
-                        'lista_ctcs': []
-                    }
-                
-                agrupamentoCtcs[ufOrig]['qtd_docs'] += 1
-                agrupamentoCtcs[ufOrig]['qtd_vols'] += int(ctcItem['volumes'])
-                agrupamentoCtcs[ufOrig]['valor_total'] += ctcItem['raw_val_mercadoria']
-                
-                if 'URGENTE' in str(ctcItem['prioridade']).upper():
-                    agrupamentoCtcs[ufOrig]['tem_urgencia'] = True
-                    ctcItem['eh_urgente'] = True 
-                else:
-                    ctcItem['eh_urgente'] = False
-
-                agrupamentoCtcs[ufOrig]['lista_ctcs'].append(ctcItem)
-
-            except Exception as e:
-                LogService.Warning("Routes.Planejamento", f"Erro ao agrupar item no mapa: {e}")
-                continue
-        
-        dadosMapa = list(agrupamentoCtcs.values())
-        return render_template('Pages/Planejamento/Map.html', Dados=dadosMapa)
+        # Agregados por UF de origem vêm da mesma passada que monta o quadro colunar
+        quadroCtcs = PlanejamentoService.BuscarQuadroPlanejamento(IncluirUfs=True)
+        for estado in quadroCtcs['ufs']:
+            estado['coords'] = COORDENADAS_UFS.get(estado['uf'], {'lat': -15, 'lon': -47})
+
+        return render_template('Pages/Planejamento/Map.html', Dados=quadroCtcs)
     except Exception as e:
         LogService.Error("Routes.Planejamento", "Erro fatal ao renderizar Mapa Global", e)
         flash("Erro de Conexão: Não foi possível carregar os dados do mapa. Tente novamente em instantes.", "danger")
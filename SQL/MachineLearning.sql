@@ -114,6 +114,8 @@ CREATE TABLE [dbo].[Tb_PLN_ML_ModeloVersao] (
     -- Métricas de qualidade
     TotalAmostras         INT           NOT NULL,
     AucCrossVal           FLOAT         NULL,  -- AUC-ROC médio na validação cruzada
+    TempoTreinoMs         FLOAT         NULL,  -- tempo do fit no dataset completo (ms)
+    LatenciaPredicao100Ms FLOAT         NULL,  -- tempo para pontuar 100 candidatos (ms)
 
     -- Estado
     IsAtivo               BIT           NOT NULL  DEFAULT 0,  -- somente o modelo em uso ativo
@@ -136,6 +138,13 @@ GO
 CREATE INDEX IX_ML_Modelo_Ativo  ON [dbo].[Tb_PLN_ML_ModeloVersao] (IsAtivo);
 GO
 
+-- Bases criadas antes das métricas de latência: acrescenta as colunas (idempotente)
+IF COL_LENGTH('dbo.Tb_PLN_ML_ModeloVersao', 'TempoTreinoMs') IS NULL
+    ALTER TABLE [dbo].[Tb_PLN_ML_ModeloVersao] ADD TempoTreinoMs FLOAT NULL;
+IF COL_LENGTH('dbo.Tb_PLN_ML_ModeloVersao', 'LatenciaPredicao100Ms') IS NULL
+    ALTER TABLE [dbo].[Tb_PLN_ML_ModeloVersao] ADD LatenciaPredicao100Ms FLOAT NULL;
+GO
+
 -- -----------------------------------------------------------------------------
 -- 4. IMPORTÂNCIA DE FEATURES
 --    Detalha o peso de cada feature no modelo treinado.
@@ -204,6 +213,8 @@ SELECT
     m.DataTreino,
     m.TotalAmostras,
     m.AucCrossVal,
+    m.TempoTreinoMs,
+    m.LatenciaPredicao100Ms,
     m.IsAtivo,
     m.Algoritmo,
     m.UsuarioTreino,
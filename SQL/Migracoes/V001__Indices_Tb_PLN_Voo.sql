@@ -0,0 +1,53 @@
+-- =============================================================================
+-- V001 | Índices de acesso da malha aérea (Tb_PLN_Voo)
+--
+-- Caminhos cobertos:
+--   RouteIntelligenceService._buscar_voos_disponiveis → faixa de DataPartida + remessa ativa
+--   PlanejamentoService.buscar_id_voo                  → (CiaAerea, NumeroVoo, DataPartida, AeroportoOrigem)
+-- Idempotente: cada índice só é criado se ainda não existir.
+-- =============================================================================
+
+USE [intec];
+GO
+
+-- Busca de rotas: seek por data, remessa filtrada no join e todas as colunas
+-- que viram VooRota no INCLUDE (sem key lookup no índice clusterizado)
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_PLN_Voo_DataPartida_Remessa'
+      AND object_id = OBJECT_ID(N'dbo.Tb_PLN_Voo')
+)
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_PLN_Voo_DataPartida_Remessa
+        ON [dbo].[Tb_PLN_Voo] (DataPartida, IdRemessa)
+        INCLUDE (CiaAerea, NumeroVoo, AeroportoOrigem, AeroportoDestino, HorarioSaida, HorarioChegada)
+        WITH (SORT_IN_TEMPDB = ON);
+END;
+GO
+
+-- Vínculo do trecho planejado com o voo da malha (save do planejamento)
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_PLN_Voo_Cia_Numero_Data_Origem'
+      AND object_id = OBJECT_ID(N'dbo.Tb_PLN_Voo')
+)
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_PLN_Voo_Cia_Numero_Data_Origem
+        ON [dbo].[Tb_PLN_Voo] (CiaAerea, NumeroVoo, DataPartida, AeroportoOrigem)
+        INCLUDE (IdRemessa)
+        WITH (SORT_IN_TEMPDB = ON);
+END;
+GO
+
+-- Remessas ativas: tabela pequena, mas entra em todo join da malha
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_PLN_RemessaVoo_Ativo'
+      AND object_id = OBJECT_ID(N'dbo.Tb_PLN_RemessaVoo')
+)
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_PLN_RemessaVoo_Ativo
+        ON [dbo].[Tb_PLN_RemessaVoo] (Ativo)
+        INCLUDE (MesReferencia);
+END;
+GO
@@ -0,0 +1,64 @@
+-- =============================================================================
+-- V002 | Coluna normalizada para busca de voo por sufixo (Tb_PLN_Voo)
+--
+-- O modal de voo do Acompanhamento procura "NumeroVoo termina com <dígitos>"
+-- (LIKE '%1234'), o que obriga a varrer a tabela inteira. NumeroVooReverso
+-- guarda só os dígitos de NumeroVoo, invertidos: o sufixo vira prefixo e a
+-- busca passa a ser LIKE '4321%', que usa índice.
+--
+-- A aplicação preenche a coluna na importação da malha (Utils.Texto.ChaveSufixoVoo);
+-- aqui só é feito o backfill das linhas existentes, em lotes.
+--
+-- Rodar ANTES de subir o código: a importação de malha grava a coluna. As
+-- consultas que só leem VooMalha não a selecionam (coluna deferred no model).
+-- =============================================================================
+
+USE [intec];
+GO
+
+IF COL_LENGTH('dbo.Tb_PLN_Voo', 'NumeroVooReverso') IS NULL
+    ALTER TABLE [dbo].[Tb_PLN_Voo] ADD NumeroVooReverso VARCHAR(20) NULL;
+GO
+
+-- Função auxiliar só para o backfill (removida no fim)
+CREATE OR ALTER FUNCTION dbo.fn_PLN_SomenteDigitos (@Texto VARCHAR(50))
+RETURNS VARCHAR(50)
+WITH SCHEMABINDING
+AS
+BEGIN
+    DECLARE @Pos INT = PATINDEX('%[^0-9]%', @Texto);
+    WHILE @Pos > 0
+    BEGIN
+        SET @Texto = STUFF(@Texto, @Pos, 1, '');
+        SET @Pos   = PATINDEX('%[^0-9]%', @Texto);
+    END;
+    RETURN @Texto;
+END;
+GO
+
+DECLARE @Lote INT = 50000;
+WHILE 1 = 1
+BEGIN
+    UPDATE TOP (@Lote) [dbo].[Tb_PLN_Voo]
+       SET NumeroVooReverso = REVERSE(dbo.fn_PLN_SomenteDigitos(NumeroVoo))
+     WHERE NumeroVooReverso IS NULL;
+
+    IF @@ROWCOUNT < @Lote BREAK;
+END;
+GO
+
+DROP FUNCTION IF EXISTS dbo.fn_PLN_SomenteDigitos;
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_PLN_Voo_NumeroVooReverso_Data'
+      AND object_id = OBJECT_ID(N'dbo.Tb_PLN_Voo')
+)
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_PLN_Voo_NumeroVooReverso_Data
+        ON [dbo].[Tb_PLN_Voo] (NumeroVooReverso, DataPartida)
+        INCLUDE (IdRemessa)
+        WITH (SORT_IN_TEMPDB = ON);
+END;
+GO
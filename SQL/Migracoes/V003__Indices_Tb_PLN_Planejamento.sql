@@ -0,0 +1,43 @@
+-- =============================================================================
+-- V003 | Índices das tabelas de planejamento
+--
+-- O quadro de planejamento, a exportação e o save cruzam os itens pelo CTC
+-- (Filial, Serie, Ctc) e buscam os trechos de cada planejamento em ordem.
+-- =============================================================================
+
+USE [intec];
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_PLN_PlanejamentoItem_Ctc'
+      AND object_id = OBJECT_ID(N'dbo.Tb_PLN_PlanejamentoItem')
+)
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_PLN_PlanejamentoItem_Ctc
+        ON [dbo].[Tb_PLN_PlanejamentoItem] (Filial, Serie, Ctc)
+        INCLUDE (IdPlanejamento, PesoTaxado);
+END;
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_PLN_PlanejamentoItem_IdPlanejamento'
+      AND object_id = OBJECT_ID(N'dbo.Tb_PLN_PlanejamentoItem')
+)
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_PLN_PlanejamentoItem_IdPlanejamento
+        ON [dbo].[Tb_PLN_PlanejamentoItem] (IdPlanejamento);
+END;
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_PLN_PlanejamentoTrecho_Plan_Ordem'
+      AND object_id = OBJECT_ID(N'dbo.Tb_PLN_PlanejamentoTrecho')
+)
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_PLN_PlanejamentoTrecho_Plan_Ordem
+        ON [dbo].[Tb_PLN_PlanejamentoTrecho] (IdPlanejamento, Ordem);
+END;
+GO
@@ -0,0 +1,13 @@
+-- =============================================================================
+-- V004 | Métricas de latência do modelo de rotas (Tb_PLN_ML_ModeloVersao)
+-- Mesmo bloco de SQL/MachineLearning.sql, para bases criadas antes dele.
+-- =============================================================================
+
+USE [intec];
+GO
+
+IF COL_LENGTH('dbo.Tb_PLN_ML_ModeloVersao', 'TempoTreinoMs') IS NULL
+    ALTER TABLE [dbo].[Tb_PLN_ML_ModeloVersao] ADD TempoTreinoMs FLOAT NULL;
+IF COL_LENGTH('dbo.Tb_PLN_ML_ModeloVersao', 'LatenciaPredicao100Ms') IS NULL
+    ALTER TABLE [dbo].[Tb_PLN_ML_ModeloVersao] ADD LatenciaPredicao100Ms FLOAT NULL;
+GO
@@ -0,0 +1,46 @@
+-- =============================================================================
+-- V005 | Nome normalizado e índice de busca de cidades (Tb_PLN_Cidade)
+--
+-- A busca de coordenadas (GeoService.BuscarCoordenadasCidade) trazia todas as
+-- cidades da UF e normalizava o nome de cada uma em Python a cada chamada.
+-- NomeNormalizado guarda NormalizarTexto(NomeCidade) (maiúsculo, sem acento),
+-- preenchido pela importação de cidades; a busca vira um seek no índice abaixo.
+--
+-- Backfill das linhas existentes: a conversão NVARCHAR -> VARCHAR na página de
+-- código 1253 descarta os acentos (best-fit). A próxima importação regrava a
+-- coluna com a normalização da aplicação.
+-- =============================================================================
+
+USE [intec];
+GO
+
+IF COL_LENGTH('dbo.Tb_PLN_Cidade', 'NomeNormalizado') IS NULL
+    ALTER TABLE [dbo].[Tb_PLN_Cidade] ADD NomeNormalizado VARCHAR(255) NULL;
+GO
+
+DECLARE @Lote INT = 10000;
+WHILE 1 = 1
+BEGIN
+    UPDATE TOP (@Lote) [dbo].[Tb_PLN_Cidade]
+       SET NomeNormalizado = UPPER(LTRIM(RTRIM(
+               CAST(CAST(NomeCidade AS NVARCHAR(255)) COLLATE SQL_Latin1_General_CP1253_CI_AI AS VARCHAR(255))
+           )))
+     WHERE NomeNormalizado IS NULL
+       AND NomeCidade IS NOT NULL;
+
+    IF @@ROWCOUNT < @Lote BREAK;
+END;
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_PLN_Cidade_Uf_NomeNormalizado'
+      AND object_id = OBJECT_ID(N'dbo.Tb_PLN_Cidade')
+)
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_PLN_Cidade_Uf_NomeNormalizado
+        ON [dbo].[Tb_PLN_Cidade] (Uf, NomeNormalizado, IdRemessa)
+        INCLUDE (NomeCidade, Latitude, Longitude)
+        WITH (SORT_IN_TEMPDB = ON);
+END;
+GO
@@ -0,0 +1,60 @@
+-- =============================================================================
+-- V006 | Último status de AWB materializado (Tb_PLN_AwbStatusAtual)
+--
+-- Listagem do Acompanhamento, sincronização de planejamentos e modal de AWB
+-- recalculavam o último TB_AWB_STATUS de cada AWB sobre o histórico inteiro.
+-- Tb_PLN_AwbStatusAtual guarda uma linha por CODAWB com o status mais recente;
+-- AwbStatusAtualService a mantém por MERGE incremental, a partir da marca
+-- d'água de DATA_INSERT gravada em Tb_PLN_ControleSincronizacao.
+--
+-- Carga inicial OBRIGATÓRIA logo após esta migração, antes de subir o código:
+--     python Scripts/AtualizarStatusAwb.py --completo
+-- A aplicação só dispara a atualização incremental em segundo plano, sem
+-- esperar por ela; com a tabela vazia as telas mostram AWBs sem status.
+-- =============================================================================
+
+USE [intec];
+GO
+
+IF OBJECT_ID(N'dbo.Tb_PLN_AwbStatusAtual', N'U') IS NULL
+BEGIN
+    CREATE TABLE [dbo].[Tb_PLN_AwbStatusAtual] (
+        CODAWB            VARCHAR(15)   NOT NULL,
+        STATUS_AWB        VARCHAR(50)   NULL,
+        DATAHORA_STATUS   DATETIME      NULL,
+        DATA_INSERT       DATETIME      NULL,
+        VOO               VARCHAR(20)   NULL,
+        LOCAL_STATUS      VARCHAR(50)   NULL,
+        DataAtualizacao   DATETIME2     NOT NULL  DEFAULT GETDATE(),
+
+        CONSTRAINT PK_PLN_AwbStatusAtual PRIMARY KEY (CODAWB)
+    );
+END;
+GO
+
+IF OBJECT_ID(N'dbo.Tb_PLN_ControleSincronizacao', N'U') IS NULL
+BEGIN
+    CREATE TABLE [dbo].[Tb_PLN_ControleSincronizacao] (
+        Chave                 VARCHAR(50)  NOT NULL,
+        MarcaDagua            DATETIME     NULL,   -- maior valor de origem já processado
+        DataExecucao          DATETIME2    NULL,
+        LinhasUltimaExecucao  INT          NULL,
+
+        CONSTRAINT PK_PLN_ControleSincronizacao PRIMARY KEY (Chave)
+    );
+END;
+GO
+
+-- Leitura incremental: "o que entrou depois da marca" vira seek em DATA_INSERT
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_AWB_STATUS_DataInsert'
+      AND object_id = OBJECT_ID(N'dbo.TB_AWB_STATUS')
+)
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_AWB_STATUS_DataInsert
+        ON [dbo].[TB_AWB_STATUS] (DATA_INSERT)
+        INCLUDE (CODAWB)
+        WITH (SORT_IN_TEMPDB = ON, ONLINE = OFF);
+END;
+GO
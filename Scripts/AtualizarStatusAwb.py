@@ -0,0 +1,46 @@
+"""
+AtualizarStatusAwb.py — Atualização manual de Tb_PLN_AwbStatusAtual
+
+Uso:
+    # Incremental (o mesmo que a aplicação faz em segundo plano)
+    python Scripts/AtualizarStatusAwb.py
+
+    # Recalcula todas as AWBs do histórico (carga inicial / conferência)
+    python Scripts/AtualizarStatusAwb.py --completo
+"""
+
+import sys
+import os
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Services.Shared.AwbStatusAtualService import AwbStatusAtualService
+
+
+def Executar():
+    parser = argparse.ArgumentParser(
+        description='Atualiza o último status materializado das AWBs (Tb_PLN_AwbStatusAtual)'
+    )
+    parser.add_argument(
+        '--completo',
+        action='store_true',
+        help='Ignora a marca d\'água e recalcula todas as AWBs do histórico.'
+    )
+    args = parser.parse_args()
+
+    print("\n🔨 Atualizando status atual das AWBs...")
+    resultado = AwbStatusAtualService.Atualizar(completo=args.completo)
+
+    if resultado['modo'] == 'erro':
+        print(f"\n❌ Erro durante a atualização: {resultado.get('erro')}\n")
+        sys.exit(1)
+
+    print(f"   Modo              : {resultado['modo']}")
+    print(f"   AWBs atualizadas  : {resultado['awbs_atualizadas']}")
+    print(f"   Marca d'água      : {resultado['marca_dagua']}")
+    print("\n✅ Concluído.\n")
+
+
+if __name__ == "__main__":
+    Executar()
@@ -70,6 +70,15 @@ def _limpar_tudo(db):
     print(f"   🗑  Candidatos removidos   : {cand}")
     print(f"   🗑  Sessões removidas      : {sess}")
 
+    # O feature store local se corrige sozinho na próxima sincronização,
+    # mas sem histórico não há motivo para manter o arquivo
+    from pathlib import Path
+    from Configuracoes import ConfiguracaoAtual
+    caminho_features = Path(ConfiguracaoAtual.DIR_CACHE) / 'ML' / 'feature_store.npz'
+    if caminho_features.exists():
+        caminho_features.unlink()
+        print(f"   🗑  Feature store removido : {caminho_features}")
+
 
 def _limpar_sessoes_livres(db):
     """Remove apenas sessões sem vínculo com planejamento (e seus candidatos via cascade)."""
@@ -92,14 +101,17 @@ def _limpar_modelo(db):
     print(f"   🗑  Importâncias removidas : {imp}")
     print(f"   🗑  Modelos removidos      : {mod}")
 
-    # Remove o arquivo joblib se existir
+    # Remove os arquivos joblib (share e cópias locais), um por versão de modelo
     from pathlib import Path
     from Configuracoes import ConfiguracaoAtual
-    caminho_modelo = Path(ConfiguracaoAtual.DIR_MODELS) / 'modelo_rotas.joblib'
-    if caminho_modelo.exists():
+    arquivos = [
+        *Path(ConfiguracaoAtual.DIR_MODELS).glob('modelo_rotas*.joblib'),
+        *(Path(ConfiguracaoAtual.DIR_CACHE) / 'ML').glob('modelo_rotas*.joblib'),
+    ]
+    for caminho_modelo in arquivos:
         caminho_modelo.unlink()
         print(f"   🗑  Arquivo joblib removido: {caminho_modelo}")
-    else:
+    if not arquivos:
         print(f"   ℹ  Arquivo joblib não encontrado (já removido ou nunca treinado)")
 
 
@@ -1,6 +1,10 @@
+import base64
 from datetime import datetime, timedelta
-from sqlalchemy import func, case, and_, or_, Date, cast, desc, text # Adicionado text
+from sqlalchemy import func, case, and_, or_, Date, cast, desc
+from sqlalchemy.dialects import mssql
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql.expression import Cast
 
 # --- LOG SERVICE ---
 from Services.LogService import LogService
@@ -13,11 +17,38 @@ from Conexoes import ObterEngineSqlServer
 
 # --- MODELS POSTGRES (NOVO - MALHA) ---
 from Models.SQL_SERVER.MalhaAerea import VooMalha, RemessaMalha
-from Models.SQL_SERVER.Aeroporto import Aeroporto
 from Conexoes import ObterSessaoSqlServer
 
+# --- UTILS ---
+from Utils.Texto import ChaveSufixoVoo, SepararNumeroVoo
+
 # --- SERVICES ---
 from Services.AeroportosService import AeroportoService
+from Services.Shared.AwbStatusAtualService import AwbStatusAtualService
+from Services.Shared.IndiceVoosMalhaService import IndiceVoosMalhaService, TrechoMalha
+
+class _DatetimeSqlServer(Cast):
+    """
+    Parâmetro datetime comparado com coluna DATETIME: no SQL Server vira CAST(? AS DATETIME).
+    O pyodbc envia datetime do Python como datetime2 e, no nível de compatibilidade 130+,
+    a coluna é convertida para datetime2 na comparação: '.003' vira '.0033333' e deixa de
+    ser igual ao valor lido dela. Nos outros bancos (testes em SQLite) é o parâmetro puro.
+    """
+    inherit_cache = True
+
+    def __init__(self, valor):
+        super().__init__(valor, mssql.DATETIME)
+
+
+@compiles(_DatetimeSqlServer)
+def _ParametroDatetime(elemento, compilador, **kw):
+    return compilador.process(elemento.clause, **kw)
+
+
+@compiles(_DatetimeSqlServer, 'mssql')
+def _ParametroDatetimeSqlServer(elemento, compilador, **kw):
+    return compilador.visit_cast(elemento, **kw)
+
 
 class AcompanhamentoService:
     
@@ -44,262 +75,408 @@ class AcompanhamentoService:
         finally: session.close()
 
     # --- LISTAGEM PRINCIPAL (TABELA) ---
+    # Paginação por chave (keyset): ordem fixa (data desc, codawb desc) e o cursor guarda
+    # a posição do último item entregue. Cada página é um seek no índice, sem OFFSET.
+    TAMANHO_PAGINA_AWB = 200
+    TAMANHO_PAGINA_AWB_MAX = 1000
+    TAMANHO_LISTA_SIMPLES = 300     # /Api/ListarAwbs sem cursor: mesma lista de antes da paginação
+
+    @staticmethod
+    def _CodificarCursor(posicao):
+        if not posicao: return None
+        data, codawb = posicao
+        bruto = f"{data.isoformat() if data else ''}|{codawb}"
+        return base64.urlsafe_b64encode(bruto.encode('utf-8')).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def _DecodificarCursor(cursor):
+        if not cursor: return None
+        try:
+            bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+            data_str, codawb = bruto.split('|', 1)
+            return (datetime.fromisoformat(data_str) if data_str else None), codawb
+        except Exception:
+            LogService.Warning("AcompanhamentoService", f"Cursor de paginação inválido ignorado: {cursor!r}")
+            return None
+
+    @staticmethod
+    def _QueryAwbs(session, filtros):
+        """Query base da listagem com os filtros aplicados (sem ordem/limite)."""
+        # Une com a tabela de Cia Aérea para pegar o nome fantasia
+        query = session.query(Awb, CompanhiaAerea.Fantasia)\
+            .outerjoin(CompanhiaAerea, Awb.cia.collate('DATABASE_DEFAULT') == CompanhiaAerea.CodCia.collate('DATABASE_DEFAULT'))
+
+        if not filtros:
+            return query
+
+        # 1. Filtro por Número da AWB (Prioridade Alta)
+        if filtros.get('NumeroAwb'):
+            return query.filter(Awb.awb.like(f"%{filtros['NumeroAwb']}%"))
+
+        # 2. Filial CTC / Documento Vinculado
+        # EXISTS (não duplica a AWB com várias notas); busca por trecho em qualquer posição do documento
+        if filtros.get('FilialCtc'):
+            valor_busca = filtros['FilialCtc'].strip()
+            return query.filter(
+                session.query(AwbNota.Id)
+                .filter(AwbNota.codawb == Awb.codawb, AwbNota.filialctc.like(f"%{valor_busca}%"))
+                .exists()
+            )
+
+        # 3. Filtro de Data (Padrão se não houver busca específica)
+        # Intervalo semiaberto direto na coluna (sargável): [inicio 00:00, fim+1 00:00)
+        DataInicio = datetime.now().date()
+        DataFim = datetime.now().date()
+
+        if filtros.get('DataInicio'):
+            try: DataInicio = datetime.strptime(filtros['DataInicio'], '%Y-%m-%d').date()
+            except: pass
+
+        if filtros.get('DataFim'):
+            try: DataFim = datetime.strptime(filtros['DataFim'], '%Y-%m-%d').date()
+            except: pass
+
+        return query.filter(
+            Awb.data >= datetime.combine(DataInicio, datetime.min.time()),
+            Awb.data < datetime.combine(DataFim + timedelta(days=1), datetime.min.time())
+        )
+
     @staticmethod
-    def ListarAwbs(filtros=None):
-        LogService.Info("AcompanhamentoService", f"Iniciando listagem de AWBs. Filtros: {filtros}")
+    def _FiltroAposPosicao(posicao):
+        """Predicado keyset: tudo que vem depois de (data, codawb) em ORDER BY data DESC, codawb DESC (NULLs no fim)."""
+        data, codawb = posicao
+        if data is None:
+            return and_(Awb.data.is_(None), Awb.codawb < codawb)
+        data = _DatetimeSqlServer(data)
+        return or_(
+            Awb.data < data,
+            and_(Awb.data == data, Awb.codawb < codawb),
+            Awb.data.is_(None)
+        )
+
+    @staticmethod
+    def _UltimoStatusPorAwb(session, lista_numeros):
+        """Último status de cada AWB, lido da tabela materializada (Tb_PLN_AwbStatusAtual)."""
+        return AwbStatusAtualService.BuscarPorAwbs(session, lista_numeros)
+
+    @staticmethod
+    def _CoordenadasAeroportos(session, siglas):
+        """Coordenadas por IATA para a página inteira (cache compartilhado de AeroportoService)."""
+        return AeroportoService.BuscarCoordenadas(siglas, session)
+
+    @staticmethod
+    def _BuscarPaginaAwbs(session, filtros, posicao, limite):
+        """Retorna (itens da página, posição do último item ou None se acabou)."""
+        query = AcompanhamentoService._QueryAwbs(session, filtros)
+        if posicao:
+            query = query.filter(AcompanhamentoService._FiltroAposPosicao(posicao))
+
+        # Busca 1 a mais só para saber se existe próxima página
+        resultados_awb = query.order_by(Awb.data.desc(), Awb.codawb.desc()).limit(limite + 1).all()
+        tem_mais = len(resultados_awb) > limite
+        resultados_awb = resultados_awb[:limite]
+
+        dicionario_status = AcompanhamentoService._UltimoStatusPorAwb(
+            session, list({r[0].awb for r in resultados_awb if r[0].awb})
+        )
+        coordenadas = AcompanhamentoService._CoordenadasAeroportos(
+            session, [r[0].siglaorigem for r in resultados_awb] + [r[0].siglades for r in resultados_awb]
+        )
+
+        # --- MONTAGEM DA LISTA FINAL ---
+        lista_final = []
+        for awb_obj, cia_nome in resultados_awb:
+            d_st = dicionario_status.get(awb_obj.awb, {
+                'Status': 'AGUARDANDO', 
+                'Data': None, 
+                'Voo': '', 
+                'DataInsert': None
+            })
+
+            lista_final.append({
+                "CodigoId": awb_obj.codawb,
+                "Numero": awb_obj.awb,
+                "CiaAerea": cia_nome or awb_obj.nomecia,
+                "Origem": awb_obj.siglaorigem,
+                "Destino": awb_obj.siglades,
+                "Volumes": awb_obj.volumes,
+                "Peso": float(awb_obj.pesoreal or 0),
+                "Status": d_st['Status'],
+                "DataStatus": d_st['Data'].strftime('%d/%m %H:%M') if d_st['Data'] else '',
+                "DataInsert": d_st['DataInsert'].strftime('%d/%m/%Y %H:%M') if d_st['DataInsert'] else '',
+                "Voo": d_st['Voo'] or '',
+                "RotaMap": {
+                    "Origem": coordenadas.get((awb_obj.siglaorigem or '').upper().strip()),
+                    "Destino": coordenadas.get((awb_obj.siglades or '').upper().strip())
+                }
+            })
+
+        proxima = (resultados_awb[-1][0].data, resultados_awb[-1][0].codawb) if tem_mais else None
+        return lista_final, proxima
+
+    @staticmethod
+    def ListarAwbs(filtros=None, cursor=None, limite=None):
+        """
+        Uma página da listagem. Retorna {'itens': [...], 'proximo_cursor': str|None};
+        o cursor devolvido é passado de volta para buscar a página seguinte.
+        """
+        LogService.Info("AcompanhamentoService", f"Iniciando listagem de AWBs. Filtros: {filtros} | Cursor: {cursor}")
+        limite = max(1, min(int(limite or AcompanhamentoService.TAMANHO_PAGINA_AWB), AcompanhamentoService.TAMANHO_PAGINA_AWB_MAX))
         session = AcompanhamentoService._ObterSessaoSql()
         try:
-            # Inicia a query base unindo com a tabela de Cia Aérea para pegar o nome fantasia
-            query = session.query(Awb, CompanhiaAerea.Fantasia)\
-                .outerjoin(CompanhiaAerea, Awb.cia.collate('DATABASE_DEFAULT') == CompanhiaAerea.CodCia.collate('DATABASE_DEFAULT'))
-
-            # --- APLICAÇÃO DOS FILTROS ---
-            if filtros:
-                # 1. Filtro por Número da AWB (Prioridade Alta)
-                if filtros.get('NumeroAwb'):
-                    query = query.filter(Awb.awb.like(f"%{filtros['NumeroAwb']}%"))
-                
-                # 2. NOVO FILTRO: Filial CTC / Documento Vinculado
-                elif filtros.get('FilialCtc'):
-                    valor_busca = filtros['FilialCtc'].strip()
-                    query = query.join(AwbNota, Awb.codawb == AwbNota.codawb)\
-                        .filter(
-                            or_(
-                                AwbNota.filialctc.like(f"%{valor_busca}%"),
-                            )
-                        )
-                
-                # 3. Filtro de Data (Padrão se não houver busca específica)
-                else:
-                    DataInicio = datetime.now().date()
-                    DataFim = datetime.now().date()
-                    
-                    if filtros.get('DataInicio'):
-                        try: DataInicio = datetime.strptime(filtros['DataInicio'], '%Y-%m-%d').date()
-                        except: pass
-                    
-                    if filtros.get('DataFim'):
-                        try: DataFim = datetime.strptime(filtros['DataFim'], '%Y-%m-%d').date()
-                        except: pass
-                    
-                    query = query.filter(cast(Awb.data, Date) >= DataInicio, cast(Awb.data, Date) <= DataFim)
-
-            # Executa a query limitando a 300 resultados para performance
-            resultados_awb = query.order_by(Awb.data.desc()).limit(300).all()
-            
-            # --- OTIMIZAÇÃO: BUSCA DE STATUS EM LOTE ---
-            lista_numeros = [r[0].awb for r in resultados_awb if r[0].awb]
-            dicionario_status = {}
-            
-            if lista_numeros:
-                st_q = session.query(
-                    AwbStatus.CODAWB, 
-                    AwbStatus.STATUS_AWB, 
-                    AwbStatus.DATAHORA_STATUS, 
-                    AwbStatus.DATA_INSERT, 
-                    AwbStatus.VOO
-                ).filter(AwbStatus.CODAWB.in_(lista_numeros))\
-                 .order_by(AwbStatus.DATAHORA_STATUS.asc()).all()
-                
-                for st in st_q:
-                    dicionario_status[st.CODAWB] = {
-                        'Status': st.STATUS_AWB, 
-                        'Data': st.DATAHORA_STATUS, 
-                        'Voo': st.VOO, 
-                        'DataInsert': st.DATA_INSERT
-                    }
-
-            # --- MONTAGEM DA LISTA FINAL ---
-            lista_final = []
-            for awb_obj, cia_nome in resultados_awb:
-                d_st = dicionario_status.get(awb_obj.awb, {
-                    'Status': 'AGUARDANDO', 
-                    'Data': None, 
-                    'Voo': '', 
-                    'DataInsert': None
-                })
-                
-                geo_o = AeroportoService.BuscarPorSigla(awb_obj.siglaorigem)
-                geo_d = AeroportoService.BuscarPorSigla(awb_obj.siglades)
-
-                lista_final.append({
-                    "CodigoId": awb_obj.codawb,
-                    "Numero": awb_obj.awb,
-                    "CiaAerea": cia_nome or awb_obj.nomecia,
-                    "Origem": awb_obj.siglaorigem,
-                    "Destino": awb_obj.siglades,
-                    "Volumes": awb_obj.volumes,
-                    "Peso": float(awb_obj.pesoreal or 0),
-                    "Status": d_st['Status'],
-                    "DataStatus": d_st['Data'].strftime('%d/%m %H:%M') if d_st['Data'] else '',
-                    "DataInsert": d_st['DataInsert'].strftime('%d/%m/%Y %H:%M') if d_st['DataInsert'] else '',
-                    "Voo": d_st['Voo'] or '',
-                    "RotaMap": {
-                        "Origem": [geo_o.Latitude, geo_o.Longitude] if geo_o and geo_o.Latitude else None,
-                        "Destino": [geo_d.Latitude, geo_d.Longitude] if geo_d and geo_d.Latitude else None
-                    }
-                })
-            
-            LogService.Info("AcompanhamentoService", f"Listagem concluída. {len(lista_final)} registros retornados.")
-            return lista_final
+            itens, proxima = AcompanhamentoService._BuscarPaginaAwbs(
+                session, filtros, AcompanhamentoService._DecodificarCursor(cursor), limite
+            )
+            LogService.Info("AcompanhamentoService", f"Listagem concluída. {len(itens)} registros retornados.")
+            return {'itens': itens, 'proximo_cursor': AcompanhamentoService._CodificarCursor(proxima)}
 
         except Exception as e:
             LogService.Error("AcompanhamentoService", "Erro crítico ao listar AWBs.", e)
-            return []
+            return {'itens': [], 'proximo_cursor': None}
+        finally:
+            session.close()
+
+    @staticmethod
+    def IterarAwbs(filtros=None, tamanho_lote=None):
+        """
+        Gerador para a resposta em streaming: percorre todas as páginas (keyset) numa
+        mesma sessão e entrega item a item, sem teto de quantidade. Se o banco falhar no
+        meio, o último item é {'erro': mensagem}, para a tela não tomar a lista por completa.
+        """
+        LogService.Info("AcompanhamentoService", f"Iniciando streaming de AWBs. Filtros: {filtros}")
+        tamanho_lote = tamanho_lote or AcompanhamentoService.TAMANHO_PAGINA_AWB
+        session = AcompanhamentoService._ObterSessaoSql()
+        total = 0
+        try:
+            posicao = None
+            while True:
+                itens, posicao = AcompanhamentoService._BuscarPaginaAwbs(session, filtros, posicao, tamanho_lote)
+                total += len(itens)
+                yield from itens
+                if not posicao: break
+            LogService.Info("AcompanhamentoService", f"Streaming concluído. {total} registros enviados.")
+        except Exception as e:
+            LogService.Error("AcompanhamentoService", f"Erro no streaming de AWBs (após {total} registros).", e)
+            yield {'erro': f'Listagem interrompida após {total} registros.'}
         finally:
             session.close()
 
     # --- HELPER: LIMPEZA DE NÚMERO DE VOO ---
     @staticmethod
     def _LimparNumeroVoo(numero_voo):
-        if not numero_voo: return ""
-        base = numero_voo.split('/')[0].upper().strip()
-        prefixos = ['G3', 'JJ', 'LA', 'AD', 'TP', 'QR', 'H2', 'CM', 'AC', 'AF', 'UX']
-        for p in prefixos:
-            base = base.replace(p, '')
-        return "".join(filter(str.isdigit, base))
-
-    # --- HISTÓRICO PARA O MAPA/TIMELINE (REFATORADO COM RAW SQL) ---
+        # Só os dígitos, com zeros à esquerda: é o sufixo procurado no NumeroVooReverso.
+        # A chave do índice em memória (ChaveNumeroVoo) corta zeros e dígitos LATAM e
+        # casaria '0034' com '1234' num LIKE de sufixo.
+        return SepararNumeroVoo(numero_voo)[1]
+
+    # --- HISTÓRICO PARA O MAPA/TIMELINE ---
+    # Montado em lote: status de todas as AWBs numa consulta (GROUP BY), trechos pelo índice
+    # da malha em memória e coordenadas pelo cache compartilhado de aeroportos.
+    TAMANHO_LOTE_IN = 1000          # SQL Server aceita no máximo 2100 parâmetros por comando
+    MAX_AWBS_HISTORICO_LOTE = 500
+
     @staticmethod
-    def ObterHistoricoAwb(numero_awb):
-        LogService.Info("AcompanhamentoService", f"Buscando histórico para AWB: {numero_awb} via SQL Otimizado")
-        session = AcompanhamentoService._ObterSessaoSql()
-        try:
-            # 1. Recupera AWB Mestre para saber Origem/Destino previstos (usado para rota pendente)
-            awb_master = session.query(Awb).filter(Awb.awb == numero_awb).first()
-            destino_final_esperado = awb_master.siglades if awb_master else None
-            origem_inicial = awb_master.siglaorigem if awb_master else None
-
-            # 2. Query SQL Otimizada fornecida (elimina duplicatas e traz malha SQL Server)
-            sql_query = text("""
-                WITH xVOO (Cia, Voo, Orig, Dest) AS (
-                    SELECT 
-                        CiaAerea,
-                        CASE 
-                            WHEN ciaaerea = 'LATAM' THEN LEFT(numerovoo, 2) + RIGHT(numerovoo, 4) 
-                            ELSE numerovoo 
-                        END AS Voo, 
-                        aeroportoorigem, 
-                        aeroportodestino 
-                    FROM intec..Tb_VooMalha
-                    GROUP BY ciaaerea, numerovoo, aeroportoorigem, aeroportodestino
-                )
-                SELECT  
-                    CONVERT(VARCHAR, MAX(s.DATAHORA_STATUS), 103) AS Data,
-                    CONVERT(VARCHAR, MAX(s.DATAHORA_STATUS), 108) AS Hora,
-                    s.STATUS_AWB AS Status,
-                    s.VOO AS Voo,
-                    xVOO.Orig AS Origem,
-                    xVOO.Dest AS Destino,
-                    xVOO.Cia AS Companhia,
-                    MAX(s.Usuario) as Usuario
-                FROM
-                    intec.dbo.TB_AWB_STATUS s
-                LEFT JOIN xVOO ON s.VOO = xVOO.voo
-                WHERE
-                    s.CODAWB = :cod_awb
-                GROUP BY
-                    s.STATUS_AWB,
-                    s.VOO,
-                    xVOO.Orig,
-                    xVOO.Dest,
-                    xVOO.Cia
-                ORDER BY
-                    MAX(s.DATAHORA_STATUS) ASC;
-            """)
-
-            resultado_sql = session.execute(sql_query, {'cod_awb': numero_awb}).fetchall()
-
-            dados_retorno = []
-            trajeto_consolidado = []
-            
-            # Variável para rastrear o local atual baseado no último status válido
-            ultimo_local_mapa = None 
-            
-            for row in resultado_sql:
-                # row keys: Data, Hora, Status, Voo, Origem, Destino, Companhia, Usuario
-                
+    def _StatusPorAwbs(session, numeros):
+        """{numero: [linhas (DataHora, Status, Voo, Usuario)]} em ordem cronológica, status/voo distintos."""
+        por_awb = {}
+        for i in range(0, len(numeros), AcompanhamentoService.TAMANHO_LOTE_IN):
+            lote = numeros[i:i + AcompanhamentoService.TAMANHO_LOTE_IN]
+            data_hora = func.max(AwbStatus.DATAHORA_STATUS)
+            linhas = session.query(
+                AwbStatus.CODAWB,
+                data_hora.label('DataHora'),
+                AwbStatus.STATUS_AWB.label('Status'),
+                AwbStatus.VOO.label('Voo'),
+                func.max(AwbStatus.Usuario).label('Usuario')
+            ).filter(AwbStatus.CODAWB.in_(lote))\
+             .group_by(AwbStatus.CODAWB, AwbStatus.STATUS_AWB, AwbStatus.VOO)\
+             .order_by(AwbStatus.CODAWB, data_hora)\
+             .all()
+            for linha in linhas:
+                por_awb.setdefault(linha.CODAWB, []).append(linha)
+        return por_awb
+
+    @staticmethod
+    def _TrechosDoStatus(voo, data_hora, cia):
+        """
+        Trechos da malha do voo do status, na cia da AWB: dia do status ou dia anterior.
+        Fora dessas datas não há como saber qual perna voou, então o status fica sem trecho.
+        """
+        if not voo or not data_hora: return []
+        datas = [data_hora.date(), data_hora.date() - timedelta(days=1)]
+        return IndiceVoosMalhaService.BuscarTrechos(voo, datas, cia) or []
+
+    @staticmethod
+    def _MontarHistorico(linhas, origem_inicial, destino_final_esperado, coords):
+        """Timeline, trajeto voado e rota pendente de uma AWB, a partir das linhas já com os trechos."""
+        dados_retorno = []
+        trajeto_consolidado = []
+
+        # Variável para rastrear o local atual baseado no último status válido
+        ultimo_local_mapa = None
+
+        for row, trechos in linhas:
+            # Voo com mais de uma perna gera um item por trecho
+            for trecho in trechos or [None]:
                 detalhes_voo = None
-                
-                # Se a query trouxe Origem e Destino do Voo, montamos o objeto de detalhes
+
+                # Se o voo está na malha, montamos o objeto de detalhes
                 # e adicionamos ao trajeto consolidado para desenhar no mapa.
-                if row.Origem and row.Destino:
-                    
-                    # Precisamos das coordenadas (Lat/Lon) para o mapa, buscamos no Service de Aeroportos
-                    go = AeroportoService.BuscarPorSigla(row.Origem)
-                    gd = AeroportoService.BuscarPorSigla(row.Destino)
-                    
-                    if go and gd:
+                if trecho:
+                    co, cd = coords.get(trecho.Origem), coords.get(trecho.Destino)
+
+                    if co and cd:
                         detalhes_voo = {
-                            "Voo": row.Voo, 
+                            "Voo": row.Voo,
                             "VooNumerico": AcompanhamentoService._LimparNumeroVoo(row.Voo),
-                            "Origem": row.Origem, 
-                            "Destino": row.Destino,
-                            "CoordOrigem": [go.Latitude, go.Longitude], 
-                            "CoordDestino": [gd.Latitude, gd.Longitude],
-                            "HorarioPartida": '--:--', # SQL agrupado não traz horário exato do voo, apenas status
-                            "HorarioChegada": '--:--'
+                            "Origem": trecho.Origem,
+                            "Destino": trecho.Destino,
+                            "CoordOrigem": co,
+                            "CoordDestino": cd,
+                            "HorarioPartida": trecho.HorarioSaida.strftime('%H:%M') if trecho.HorarioSaida else '--:--',
+                            "HorarioChegada": trecho.HorarioChegada.strftime('%H:%M') if trecho.HorarioChegada else '--:--'
                         }
-                        
+
                         # Adiciona ao trajeto se for um segmento novo
                         if not trajeto_consolidado or \
                            (trajeto_consolidado[-1]['VooNumerico'] != detalhes_voo['VooNumerico'] or \
                             trajeto_consolidado[-1]['Origem'] != detalhes_voo['Origem']):
                             trajeto_consolidado.append(detalhes_voo)
-                            
+
                         # Atualiza local atual para o destino deste voo
-                        ultimo_local_mapa = row.Destino
+                        ultimo_local_mapa = trecho.Destino
                     else:
                         # Se tem voo mas não achou coordenada, assume Origem do voo como local atual
-                        ultimo_local_mapa = row.Origem
+                        ultimo_local_mapa = trecho.Origem
 
                 # Monta item do histórico visual
-                item = {
-                    "Status": row.Status, 
-                    "Data": f"{row.Data} {row.Hora}",
-                    "Local": row.Origem if row.Origem else '-', # Mostra Origem do voo como local se disponível
-                    "Usuario": row.Usuario or '-', 
-                    "Voo": row.Voo or '-', 
+                dados_retorno.append({
+                    "Status": row.Status,
+                    "Data": row.DataHora.strftime('%d/%m/%Y %H:%M:%S') if row.DataHora else '-',
+                    "Local": trecho.Origem if trecho else '-', # Mostra Origem do voo como local se disponível
+                    "Usuario": row.Usuario or '-',
+                    "Voo": row.Voo or '-',
                     "DetalhesVoo": detalhes_voo
+                })
+
+        # --- CÁLCULO DE ROTA PENDENTE (Tracejado no Mapa) ---
+        rota_pendente = None
+
+        # Se não determinou local pelos voos, tenta pegar do primeiro status ou origem inicial
+        if not ultimo_local_mapa and origem_inicial:
+            ultimo_local_mapa = origem_inicial
+
+        # Se temos onde estamos e para onde devemos ir, e eles são diferentes
+        if ultimo_local_mapa and destino_final_esperado and ultimo_local_mapa != destino_final_esperado:
+            geo_atual = coords.get(ultimo_local_mapa)
+            geo_final = coords.get(destino_final_esperado)
+
+            if geo_atual and geo_final:
+                rota_pendente = {
+                    "Origem": ultimo_local_mapa,
+                    "Destino": destino_final_esperado,
+                    "CoordOrigem": geo_atual,
+                    "CoordDestino": geo_final
                 }
-                dados_retorno.append(item)
 
-            # --- CÁLCULO DE ROTA PENDENTE (Tracejado no Mapa) ---
-            rota_pendente = None
-            
-            # Se não determinou local pelos voos, tenta pegar do primeiro status ou origem inicial
-            if not ultimo_local_mapa and origem_inicial:
-                ultimo_local_mapa = origem_inicial
-
-            # Se temos onde estamos e para onde devemos ir, e eles são diferentes
-            if ultimo_local_mapa and destino_final_esperado and ultimo_local_mapa != destino_final_esperado:
-                geo_atual = AeroportoService.BuscarPorSigla(ultimo_local_mapa)
-                geo_final = AeroportoService.BuscarPorSigla(destino_final_esperado)
-                
-                if geo_atual and geo_final:
-                    rota_pendente = {
-                        "Origem": ultimo_local_mapa,
-                        "Destino": destino_final_esperado,
-                        "CoordOrigem": [geo_atual.Latitude, geo_atual.Longitude],
-                        "CoordDestino": [geo_final.Latitude, geo_final.Longitude]
-                    }
-
-            # Inverte para mostrar o mais recente primeiro na lista (timeline)
-            # Mas mantemos ordem cronológica para montar o mapa
-            return { 
-                "Historico": dados_retorno[::-1], 
-                "TrajetoCompleto": trajeto_consolidado,
-                "RotaPendente": rota_pendente 
-            }
+        # Inverte para mostrar o mais recente primeiro na lista (timeline)
+        # Mas mantemos ordem cronológica para montar o mapa
+        return {
+            "Historico": dados_retorno[::-1],
+            "TrajetoCompleto": trajeto_consolidado,
+            "RotaPendente": rota_pendente
+        }
+
+    @staticmethod
+    def _HistoricosPorAwbs(session, numeros):
+        """Retorna ({numero: histórico}, coordenadas usadas) para a lista de AWBs."""
+        numeros = list(dict.fromkeys(n.strip() for n in numeros if n and n.strip()))
+        if not numeros: return {}, {}
+
+        # 1. AWB Mestre de cada número: Origem/Destino previstos (usados para rota pendente) e cia
+        mestres = {}
+        for i in range(0, len(numeros), AcompanhamentoService.TAMANHO_LOTE_IN):
+            lote = numeros[i:i + AcompanhamentoService.TAMANHO_LOTE_IN]
+            for numero, origem, destino, cia, nome_cia in session.query(
+                    Awb.awb, Awb.siglaorigem, Awb.siglades, Awb.cia, Awb.nomecia
+            ).filter(Awb.awb.in_(lote)).all():
+                mestres.setdefault(numero, (origem, destino, cia or nome_cia))
+
+        # 2. Status distintos de todas as AWBs, com os trechos de cada voo na cia da AWB
+        status = {
+            numero: [
+                (row, AcompanhamentoService._TrechosDoStatus(row.Voo, row.DataHora, mestres.get(numero, (None,) * 3)[2]))
+                for row in linhas
+            ]
+            for numero, linhas in AcompanhamentoService._StatusPorAwbs(session, numeros).items()
+        }
+
+        # 3. Coordenadas de todos os aeroportos envolvidos de uma vez
+        siglas = {s for origem, destino, _ in mestres.values() for s in (origem, destino)}
+        siglas.update(s for linhas in status.values() for _, trechos in linhas for t in trechos for s in (t.Origem, t.Destino))
+        coords = AeroportoService.BuscarCoordenadas(siglas, session)
+
+        historicos = {}
+        for numero in numeros:
+            origem_inicial, destino_final_esperado, cia = mestres.get(numero, (None, None, None))
+            historicos[numero] = AcompanhamentoService._MontarHistorico(
+                status.get(numero, []), origem_inicial, destino_final_esperado, coords
+            )
+            historicos[numero]['CiaAerea'] = cia
+        return historicos, coords
+
+    @staticmethod
+    def ObterHistoricoAwb(numero_awb):
+        LogService.Info("AcompanhamentoService", f"Buscando histórico para AWB: {numero_awb}")
+        session = AcompanhamentoService._ObterSessaoSql()
+        try:
+            historicos, _ = AcompanhamentoService._HistoricosPorAwbs(session, [numero_awb])
+            return historicos.get(numero_awb.strip()) or { "Historico": [], "TrajetoCompleto": [], "RotaPendente": None, "CiaAerea": None }
 
         except Exception as e: 
             LogService.Error("AcompanhamentoService", f"Erro ao montar histórico da AWB {numero_awb}", e)
-            return { "Historico": [], "TrajetoCompleto": [], "RotaPendente": None }
+            return { "Historico": [], "TrajetoCompleto": [], "RotaPendente": None, "CiaAerea": None }
+        finally: session.close()
+
+    @staticmethod
+    def ObterTrajetosAwbs(lista_awbs):
+        """
+        Trajetos do mapa para várias AWBs numa ida ao banco, em formato compacto:
+        {'Awbs': {numero: {'Trechos': [[orig, dest, voo, partida, chegada]], 'Pendente': [orig, dest] | None,
+                           'Status': último status}},
+         'Aeroportos': {IATA: [lat, lon]}}  — coordenadas enviadas uma vez só, referenciadas pela sigla.
+        """
+        lista_awbs = (lista_awbs or [])[:AcompanhamentoService.MAX_AWBS_HISTORICO_LOTE]
+        LogService.Debug("AcompanhamentoService", f"Buscando trajetos em lote para {len(lista_awbs)} AWB(s).")
+        session = AcompanhamentoService._ObterSessaoSql()
+        try:
+            historicos, coords = AcompanhamentoService._HistoricosPorAwbs(session, lista_awbs)
+
+            awbs, usadas = {}, set()
+            for numero, hist in historicos.items():
+                trechos = [
+                    [t['Origem'], t['Destino'], t['Voo'], t['HorarioPartida'], t['HorarioChegada']]
+                    for t in hist['TrajetoCompleto']
+                ]
+                pendente = hist['RotaPendente']
+                awbs[numero] = {
+                    'Trechos': trechos,
+                    'Pendente': [pendente['Origem'], pendente['Destino']] if pendente else None,
+                    'Status': hist['Historico'][0]['Status'] if hist['Historico'] else None
+                }
+                usadas.update(s for t in trechos for s in t[:2])
+                if pendente: usadas.update((pendente['Origem'], pendente['Destino']))
+
+            return {'Awbs': awbs, 'Aeroportos': {s: coords[s] for s in usadas if coords.get(s)}}
+
+        except Exception as e:
+            LogService.Error("AcompanhamentoService", f"Erro ao montar trajetos em lote ({len(lista_awbs)} AWBs)", e)
+            return {'Awbs': {}, 'Aeroportos': {}}
         finally: session.close()
 
     # --- MODAL VOO (MALHA PREVISTA) ---
     @staticmethod
-    def BuscarDetalhesVooModal(numero_voo, data_ref_str):
+    def BuscarDetalhesVooModal(numero_voo, data_ref_str, cia=None):
         session = ObterSessaoSqlServer()
         try:
             voo_numerico = AcompanhamentoService._LimparNumeroVoo(numero_voo)
@@ -310,33 +487,42 @@ class AcompanhamentoService:
                 try: data_busca = datetime.strptime(data_ref_str, '%Y-%m-%d').date()
                 except: data_busca = datetime.now().date()
 
-            def query_voo(data):
-                # FIX: Substituido regexp_replace (Postgres) por LIKE (SQL Server)
-                # Como voo_numerico contem apenas digitos, buscamos se o campo contem esses digitos
-                return session.query(VooMalha).join(RemessaMalha)\
+            # Índice da malha em memória: dia da referência primeiro, depois o dia anterior, na cia da AWB
+            cia_malha = IndiceVoosMalhaService.CiaDaMalha(cia) or \
+                IndiceVoosMalhaService.CIA_POR_CODIGO.get(SepararNumeroVoo(numero_voo)[0], '')
+            trechos = IndiceVoosMalhaService.BuscarTrechos(numero_voo, [data_busca, data_busca - timedelta(days=1)], cia_malha)
+            if trechos is None:
+                # Índice indisponível: "NumeroVoo termina com voo_numerico" via NumeroVooReverso
+                # (dígitos invertidos): o sufixo vira prefixo e o LIKE usa o índice (NumeroVooReverso, DataPartida).
+                voo_db = session.query(VooMalha).join(RemessaMalha)\
                     .filter(
                         RemessaMalha.Ativo == True,
-                        cast(VooMalha.DataPartida, Date) == data,
-                        VooMalha.NumeroVoo.like(f"%{voo_numerico}")
-                    ).first()
-
-            voo = query_voo(data_busca)
-            if not voo: voo = query_voo(data_busca - timedelta(days=1))
+                        VooMalha.DataPartida.in_([data_busca, data_busca - timedelta(days=1)]),
+                        VooMalha.NumeroVooReverso.like(f"{ChaveSufixoVoo(voo_numerico)}%"),
+                        *([VooMalha.CiaAerea == cia_malha] if cia_malha else [])
+                    )\
+                    .order_by(desc(VooMalha.DataPartida))\
+                    .first()
+                trechos = [TrechoMalha(
+                    voo_db.CiaAerea, voo_db.NumeroVoo, voo_db.DataPartida, voo_db.AeroportoOrigem,
+                    voo_db.AeroportoDestino, voo_db.HorarioSaida, voo_db.HorarioChegada
+                )] if voo_db else []
+            voo = trechos[0] if trechos else None
 
             if not voo: 
                 LogService.Debug("AcompanhamentoService", f"Voo {numero_voo} não encontrado na malha para a data {data_ref_str}")
                 return None
 
-            origem = AeroportoService.BuscarPorSigla(voo.AeroportoOrigem)
-            destino = AeroportoService.BuscarPorSigla(voo.AeroportoDestino)
+            origem = AeroportoService.BuscarPorSigla(voo.Origem)
+            destino = AeroportoService.BuscarPorSigla(voo.Destino)
 
             return {
-                "Cia": voo.CiaAerea,
+                "Cia": voo.Cia,
                 "Numero": voo.NumeroVoo,
                 "Data": voo.DataPartida.strftime('%d/%m/%Y'),
-                "OrigemIata": voo.AeroportoOrigem,
+                "OrigemIata": voo.Origem,
                 "OrigemNome": origem.NomeAeroporto if origem else "Aeroporto de Origem",
-                "DestinoIata": voo.AeroportoDestino,
+                "DestinoIata": voo.Destino,
                 "DestinoNome": destino.NomeAeroporto if destino else "Aeroporto de Destino",
                 "HorarioSaida": voo.HorarioSaida.strftime('%H:%M'),
                 "HorarioChegada": voo.HorarioChegada.strftime('%H:%M'),
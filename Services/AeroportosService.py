@@ -1,4 +1,7 @@
 import os
+import csv
+import codecs
+import time
 import pandas as pd
 import math # Importante para verificações numéricas se necessário
 from datetime import datetime, date
@@ -6,16 +9,43 @@ from sqlalchemy import desc, text
 # AJUSTE 1: Importar a conexão correta (se você renomeou no Conexoes.py, ajuste aqui)
 # Se você manteve o nome da função mas mudou o conteúdo, pode manter. 
 # Recomendado: Usar a conexão do SQL Server explicitamente.
-from Conexoes import ObterSessaoSqlServer as ObterSessao 
+from Conexoes import ObterSessaoSqlServer as ObterSessao, InserirEmLotes
 # AJUSTE 2: Importar os modelos da pasta SQL_SERVER
 from Models.SQL_SERVER.Aeroporto import RemessaAeroportos, Aeroporto
 from Configuracoes import ConfiguracaoBase
 from Models.SQL_SERVER.Planejamento import RankingAeroportos
 from Services.LogService import LogService
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
+from Utils.Formatadores import ConverterDecimaisSerie, DescreverFalhas
 
 DIR_TEMP = ConfiguracaoBase.DIR_TEMP
 
+try:
+    import pyarrow  # noqa: F401 — só habilita o engine 'pyarrow' do read_csv
+    _PYARROW_DISPONIVEL = True
+except ImportError:
+    _PYARROW_DISPONIVEL = False
+
 class AeroportoService:
+
+    # Colunas do CSV (nome normalizado) → colunas de Tb_PLN_Aeroporto
+    MAPA_COLUNAS = {
+        'country_code': 'CodigoPais',
+        'region_name': 'NomeRegiao',
+        'iata': 'CodigoIata',
+        'icao': 'CodigoIcao',
+        'airport': 'NomeAeroporto',
+        'latitude': 'Latitude',
+        'longitude': 'Longitude'
+    }
+    BYTES_AMOSTRA_CSV = 64 * 1024   # começo do arquivo usado para detectar encoding/dialeto
+    TAMANHO_LOTE_INSERT = 5000
+
+    # Cache de coordenadas por IATA compartilhado entre requisições (mapa do Acompanhamento).
+    # Limpo ao importar/excluir remessa; a validade cobre trocas feitas por outro processo.
+    VALIDADE_CACHE_COORDENADAS = 3600
+    _CacheCoordenadas: dict = {}
+    _CacheCoordenadasExpira: float = 0.0
     
     @staticmethod
     def BuscarPorSigla(Sigla):
@@ -33,6 +63,44 @@ class AeroportoService:
         finally:
             Sessao.close()
 
+    @classmethod
+    def BuscarCoordenadas(cls, Siglas, Sessao=None):
+        """
+        {IATA: [lat, lon] ou None} para as siglas pedidas. Só as que não estão no cache
+        vão ao banco, numa única consulta. Sessao opcional: reaproveita a de quem chama.
+        """
+        Siglas = {s.upper().strip() for s in Siglas if s}
+        if not Siglas: return {}
+
+        if time.monotonic() >= cls._CacheCoordenadasExpira:
+            cls._CacheCoordenadas = {}
+            cls._CacheCoordenadasExpira = time.monotonic() + cls.VALIDADE_CACHE_COORDENADAS
+        Cache = cls._CacheCoordenadas
+
+        Faltantes = [s for s in Siglas if s not in Cache]
+        if Faltantes:
+            SessaoPropria = Sessao is None
+            Sessao = Sessao or ObterSessao()
+            try:
+                Novas = {}
+                for Iata, Lat, Lon in Sessao.query(Aeroporto.CodigoIata, Aeroporto.Latitude, Aeroporto.Longitude)\
+                        .filter(Aeroporto.CodigoIata.in_(Faltantes)).all():
+                    # Mesma regra de BuscarPorSigla: vale o primeiro encontrado
+                    if Iata not in Novas:
+                        Novas[Iata] = [Lat, Lon] if Lat else None
+                # Sigla inexistente também entra (None), para não voltar ao banco a cada pedido
+                Cache.update({s: Novas.get(s) for s in Faltantes})
+            except Exception as e:
+                LogService.Error("AeroportoService", "Erro ao buscar coordenadas de aeroportos.", e)
+            finally:
+                if SessaoPropria: Sessao.close()
+
+        return {s: Cache.get(s) for s in Siglas}
+
+    @classmethod
+    def LimparCacheCoordenadas(cls):
+        cls._CacheCoordenadas = {}
+
     @staticmethod
     def ListarRemessasAeroportos():
         Sessao = ObterSessao()
@@ -54,6 +122,8 @@ class AeroportoService:
                 Sessao.delete(Remessa)
                 Sessao.commit()
                 LogService.Info("AeroportoService", f"Remessa de aeroportos {IdRemessa} excluída.")
+                AeroportoService.LimparCacheCoordenadas()
+                CacheCompartilhadoService.Invalidar('aeroportos')
                 return True, "Versão da base de aeroportos excluída."
             
             LogService.Warning("AeroportoService", f"Remessa {IdRemessa} não encontrada para exclusão.")
@@ -97,49 +167,116 @@ class AeroportoService:
             return False, f"Erro ao analisar arquivo: {e}"
 
     @staticmethod
-    def ProcessarAeroportosFinal(CaminhoArquivo, DataRef, NomeOriginal, Usuario, TipoAcao):
-        LogService.Info("AeroportoService", f"Processando arquivo {NomeOriginal} (Ação: {TipoAcao})")
-        Sessao = ObterSessao()
+    def _DetectarFormatoCsv(CaminhoArquivo):
+        """
+        Decide encoding, separador e aspas uma única vez, olhando só o começo do arquivo.
+        Retorna dict com encoding, sep, quotechar, sem_aspas e o cabeçalho bruto.
+        """
+        with open(CaminhoArquivo, 'rb') as Arquivo:
+            Amostra = Arquivo.read(AeroportoService.BYTES_AMOSTRA_CSV)
+
+        if Amostra.startswith(codecs.BOM_UTF8):
+            Encoding = 'utf-8-sig'
+        else:
+            try:
+                Amostra.decode('utf-8')
+                Encoding = 'utf-8'
+            except UnicodeDecodeError as Erro:
+                # Amostra cortada no meio de um caractere multibyte não conta como falha
+                Encoding = 'utf-8' if Erro.start >= len(Amostra) - 3 else 'latin1'
+
+        Linhas = Amostra.decode(Encoding, errors='ignore').splitlines()
+        if len(Amostra) == AeroportoService.BYTES_AMOSTRA_CSV and len(Linhas) > 1:
+            Linhas = Linhas[:-1]  # última linha da amostra está incompleta
+        if not Linhas:
+            return None
+
         try:
-            # 1. Ler CSV
+            Dialeto = csv.Sniffer().sniff('\n'.join(Linhas[:50]), delimiters=',;\t|')
+            Sep, Aspas = Dialeto.delimiter or ',', Dialeto.quotechar or '"'
+        except csv.Error:
+            Sep, Aspas = ',', '"'
+
+        Cabecalho = next(csv.reader([Linhas[0]], delimiter=Sep, quotechar=Aspas))
+        # Arquivo com a linha inteira entre aspas: lê sem tratar aspas e limpa depois
+        SemAspas = len(Cabecalho) < 2
+        if SemAspas:
+            Cabecalho = Linhas[0].split(Sep)
+
+        return {
+            'encoding': Encoding,
+            'sep': Sep,
+            'quotechar': Aspas,
+            'sem_aspas': SemAspas,
+            'cabecalho': Cabecalho,
+        }
+
+    @staticmethod
+    def _LimparNomeColuna(Nome):
+        return Nome.replace('"', '').replace("'", "").strip().lower()
+
+    @staticmethod
+    def _LerCsvAeroportos(CaminhoArquivo):
+        """
+        Leitura em passada única (engine C ou pyarrow) só das colunas do MAPA_COLUNAS.
+        Retorna o DataFrame já com os nomes do banco, ou (None, headers) se nada bater.
+        """
+        Formato = AeroportoService._DetectarFormatoCsv(CaminhoArquivo)
+        if not Formato:
+            return None, []
+
+        # Nome limpo → nome bruto do arquivo (usecols precisa do bruto)
+        Brutos = {AeroportoService._LimparNomeColuna(c): c for c in Formato['cabecalho']}
+        ColunasUteis = {Brutos[c]: Destino for c, Destino in AeroportoService.MAPA_COLUNAS.items() if c in Brutos}
+        if not ColunasUteis:
+            return None, list(Brutos.keys())
+
+        Opcoes = {
+            'sep': Formato['sep'],
+            'encoding': Formato['encoding'],
+            'usecols': list(ColunasUteis.keys()),
+            'dtype': {c: 'str' for c in ColunasUteis},
+            # 'NA' é código de país (Namíbia): só célula vazia vira nulo
+            'keep_default_na': False,
+            'na_values': [''],
+        }
+        if Formato['sem_aspas']:
+            Df = pd.read_csv(CaminhoArquivo, engine='c', quoting=csv.QUOTE_NONE, **Opcoes)
+        else:
+            Engine = 'pyarrow' if _PYARROW_DISPONIVEL else 'c'
             try:
-                Df = pd.read_csv(CaminhoArquivo, sep=',', engine='python')
-            except UnicodeDecodeError:
-                LogService.Warning("AeroportoService", "Falha com UTF-8, tentando Latin1.")
-                Df = pd.read_csv(CaminhoArquivo, sep=',', engine='python', encoding='latin1')
+                Df = pd.read_csv(CaminhoArquivo, engine=Engine, quotechar=Formato['quotechar'], **Opcoes)
             except Exception as e:
-                LogService.Warning("AeroportoService", f"Falha na leitura padrão: {e}. Tentando sem aspas.")
-                import csv
-                Df = pd.read_csv(CaminhoArquivo, sep=',', quoting=csv.QUOTE_NONE, engine='python')
-            
-            if len(Df.columns) < 2:
-                 import csv
-                 Df = pd.read_csv(CaminhoArquivo, sep=',', quoting=csv.QUOTE_NONE, engine='python')
+                if Engine == 'c':
+                    raise
+                LogService.Warning("AeroportoService", f"Engine pyarrow falhou ({e}). Relendo com engine C.")
+                Df = pd.read_csv(CaminhoArquivo, engine='c', quotechar=Formato['quotechar'], **Opcoes)
 
-            # 2. Limpeza dos Nomes das Colunas
-            Df.columns = [c.replace('"', '').replace("'", "").strip().lower() for c in Df.columns]
-            
-            Mapa = {
-                'country_code': 'CodigoPais',
-                'region_name': 'NomeRegiao',
-                'iata': 'CodigoIata',
-                'icao': 'CodigoIcao',
-                'airport': 'NomeAeroporto',
-                'latitude': 'Latitude',
-                'longitude': 'Longitude'
-            }
-            
-            ColunasUteis = [c for c in Mapa.keys() if c in Df.columns]
-            
-            if not ColunasUteis:
-                LogService.Error("AeroportoService", f"Colunas não identificadas. Headers encontrados: {list(Df.columns)}")
-                return False, f"Colunas não identificadas. Encontradas: {list(Df.columns)}"
+        LogService.Debug(
+            "AeroportoService",
+            f"CSV lido ({Formato['encoding']}, sep='{Formato['sep']}', sem_aspas={Formato['sem_aspas']}): {len(Df)} linhas"
+        )
+        return Df.rename(columns=ColunasUteis), None
 
-            Df = Df[ColunasUteis].rename(columns=Mapa)
-            
-            # --- CORREÇÃO PRINCIPAL: Substituir NaN por None ---
-            # SQL Server não aceita float('nan'). Deve ser None (NULL no banco).
-            Df = Df.where(pd.notnull(Df), None)
+    @staticmethod
+    def ProcessarAeroportosFinal(CaminhoArquivo, DataRef, NomeOriginal, Usuario, TipoAcao):
+        LogService.Info("AeroportoService", f"Processando arquivo {NomeOriginal} (Ação: {TipoAcao})")
+        Sessao = ObterSessao(CargaEmLote=True)
+        try:
+            # 1. Ler CSV (formato detectado uma vez, leitura em passada única)
+            Df, HeadersEncontrados = AeroportoService._LerCsvAeroportos(CaminhoArquivo)
+            if Df is None:
+                LogService.Error("AeroportoService", f"Colunas não identificadas. Headers encontrados: {HeadersEncontrados}")
+                return False, f"Colunas não identificadas. Encontradas: {HeadersEncontrados}"
+
+            # 2. Limpeza vetorizada: aspas residuais e espaços nos textos, coordenadas em float
+            for Coluna in Df.columns:
+                if Coluna in ('Latitude', 'Longitude'):
+                    Df[Coluna], Falhas = ConverterDecimaisSerie(Df[Coluna])
+                    if Falhas:
+                        LogService.Warning("AeroportoService", f"{Coluna} inválida gravada como NULL: {DescreverFalhas(Falhas)}")
+                else:
+                    Df[Coluna] = Df[Coluna].str.replace('"', '', regex=False).str.strip()
 
             # 3. Gerenciar Histórico
             Anterior = Sessao.query(RemessaAeroportos).filter_by(MesReferencia=DataRef, Ativo=True).first()
@@ -158,34 +295,20 @@ class AeroportoService:
             Sessao.add(NovaRemessa)
             Sessao.flush()
 
-            # 5. Preparar Dados para Inserção
-            ListaAeroportos = Df.to_dict(orient='records')
-            
-            for Aero in ListaAeroportos:
-                Aero['IdRemessa'] = NovaRemessa.Id
-                
-                # Limpeza extra de strings caso tenha sobrado aspas
-                for key, val in Aero.items():
-                    if isinstance(val, str):
-                        Aero[key] = val.replace('"', '').strip()
-                
-                # Garantia final de numéricos (redundante mas segura)
-                if Aero.get('Latitude') is not None:
-                     try: Aero['Latitude'] = float(Aero['Latitude'])
-                     except: Aero['Latitude'] = None
-                     
-                if Aero.get('Longitude') is not None:
-                     try: Aero['Longitude'] = float(Aero['Longitude'])
-                     except: Aero['Longitude'] = None
-
-            Sessao.bulk_insert_mappings(Aeroporto, ListaAeroportos)
+            # 5. Inserção em lotes (executemany)
+            # SQL Server não aceita float('nan'): nulos do pandas viram None (NULL no banco)
+            Df['IdRemessa'] = NovaRemessa.Id
+            Df = Df.astype(object).where(Df.notna(), None)
+            Total = InserirEmLotes(Sessao, Aeroporto, Df.to_dict(orient='records'), AeroportoService.TAMANHO_LOTE_INSERT)
             Sessao.commit()
 
-            LogService.Info("AeroportoService", f"Sucesso! {len(ListaAeroportos)} aeroportos importados na Remessa {NovaRemessa.Id}.")
+            LogService.Info("AeroportoService", f"Sucesso! {Total} aeroportos importados na Remessa {NovaRemessa.Id}.")
+            AeroportoService.LimparCacheCoordenadas()
+            CacheCompartilhadoService.Invalidar('aeroportos')
 
             if os.path.exists(CaminhoArquivo): os.remove(CaminhoArquivo)
 
-            return True, f"Base atualizada! {len(ListaAeroportos)} aeroportos importados."
+            return True, f"Base atualizada! {Total} aeroportos importados."
 
         except Exception as e:
             Sessao.rollback()
@@ -411,4 +534,7 @@ class AeroportoService:
             LogService.Error("AeroportosService", "Erro ao recalcular uso de aeroportos.", e)
             return False, str(e)
         finally:
-            Sessao.close()
\ No newline at end of file
+            Sessao.close()
+
+
+CacheCompartilhadoService.AoInvalidar('aeroportos', AeroportoService.LimparCacheCoordenadas)
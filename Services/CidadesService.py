@@ -1,11 +1,15 @@
 import os
 import pandas as pd
 from datetime import date
-from sqlalchemy import desc
-from Conexoes import ObterSessaoSqlServer
+from openpyxl import load_workbook
+from sqlalchemy import desc, text
+from Conexoes import ObterSessaoSqlServer, InserirEmLotes
 from Configuracoes import ConfiguracaoBase
 from Models.SQL_SERVER.Cidade import RemessaCidade, Cidade
 from Services.LogService import LogService  # <--- Import do Log
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
+from Utils.Formatadores import ConverterDecimaisSerie, DescreverFalhas
+from Utils.Texto import NormalizarTextoSerie
 
 DIR_TEMP = ConfiguracaoBase.DIR_TEMP
 
@@ -17,6 +21,8 @@ class CidadesService:
     
     # Constante da Classe para organizar a bagunça
     DIR_TEMP = 'Data/Temp_Cidades'
+    TAMANHO_BLOCO = 2000   # linhas da planilha por bloco de parsing/insert
+    INDICE_BUSCA = 'IX_PLN_Cidade_Uf_NomeNormalizado'
 
     @staticmethod
     def _GarantirDiretorio():
@@ -52,6 +58,7 @@ class CidadesService:
                 Sessao.delete(Remessa)
                 Sessao.commit()
                 LogService.Info("CidadesService", f"Remessa {id_remessa} excluída com sucesso.")
+                CacheCompartilhadoService.Invalidar('cidades')
                 return True, "Base de cidades excluída com sucesso."
             
             LogService.Warning("CidadesService", f"Remessa {id_remessa} não encontrada para exclusão.")
@@ -101,34 +108,116 @@ class CidadesService:
             LogService.Error("CidadesService", "Erro na análise do arquivo de cidades.", e)
             return False, f"Erro na análise do arquivo: {e}"
 
+    @staticmethod
+    def _LerLinhasEmBlocos(caminho_arquivo, tamanho_bloco):
+        """
+        Percorre a 1ª coluna da 1ª aba em modo read-only (sem carregar a planilha inteira),
+        entregando blocos de linhas como pd.Series de texto. O índice é a linha da
+        planilha (base 0), para o log de falhas apontar a linha certa.
+        """
+        Livro = load_workbook(caminho_arquivo, read_only=True, data_only=True)
+        try:
+            Bloco, Inicio = [], 0
+            for (Valor,) in Livro.worksheets[0].iter_rows(min_col=1, max_col=1, values_only=True):
+                Bloco.append(Valor)
+                if len(Bloco) >= tamanho_bloco:
+                    yield pd.Series(Bloco, index=range(Inicio, Inicio + len(Bloco)), dtype=object).astype(str)
+                    Inicio += len(Bloco)
+                    Bloco = []
+            if Bloco:
+                yield pd.Series(Bloco, index=range(Inicio, Inicio + len(Bloco)), dtype=object).astype(str)
+        finally:
+            Livro.close()
+
+    @staticmethod
+    def _ParsearBloco(SerieDados, id_remessa):
+        """
+        Parsing por coluna de um bloco: a string concatenada vira colunas de uma vez.
+        id_municipio; uf; municipio; longitude; latitude
+        Retorna (registros para insert, rótulos das linhas descartadas).
+        """
+        Partes = (
+            SerieDados.str.replace('"', '', regex=False)
+            .str.replace("'", "", regex=False)
+            .str.strip()
+            .str.split(';', expand=True)
+        )
+        if Partes.shape[1] < 5:
+            return [], []
+
+        # Descarta linhas incompletas e o cabeçalho
+        Partes = Partes[Partes[4].notna()]
+        EhCabecalho = Partes[2].str.lower().str.contains('municipio', na=False) | Partes[1].str.lower().str.contains('uf', na=False)
+        Partes = Partes[~EhCabecalho]
+
+        CodigosIbge = pd.to_numeric(Partes[0], errors='coerce')
+        Latitudes, FalhasLat = ConverterDecimaisSerie(Partes[4])
+        Longitudes, FalhasLon = ConverterDecimaisSerie(Partes[3])
+
+        # Coordenada vazia = 0.0 (como antes); código ou coordenada inválidos descartam a linha
+        Invalidas = CodigosIbge.isna() | CodigosIbge.index.isin(FalhasLat) | CodigosIbge.index.isin(FalhasLon)
+        Validas = ~Invalidas
+
+        Nomes = Partes[2][Validas].str.strip()
+        Registros = [
+            {
+                'IdRemessa': id_remessa,
+                'CodigoIbge': int(Codigo),
+                'Uf': Uf,
+                'NomeCidade': Nome,
+                'NomeNormalizado': NomeNorm,
+                'Longitude': float(Lon),
+                'Latitude': float(Lat),
+            }
+            for Codigo, Uf, Nome, NomeNorm, Lon, Lat in zip(
+                CodigosIbge[Validas],
+                Partes[1][Validas].str.strip(),
+                Nomes,
+                NormalizarTextoSerie(Nomes),
+                Longitudes[Validas].fillna(0.0),
+                Latitudes[Validas].fillna(0.0),
+            )
+        ]
+        return Registros, Partes.index[Invalidas].tolist()
+
+    @staticmethod
+    def _ReconstruirIndiceCidades(Sessao):
+        """
+        Depois da carga, reconstrói o índice de busca por nome (V005) e atualiza
+        as estatísticas da tabela. Só existe no SQL Server; falha aqui não desfaz a carga.
+        """
+        if Sessao.get_bind().dialect.name != 'mssql':
+            return
+        try:
+            Sessao.execute(text(
+                f"ALTER INDEX {CidadesService.INDICE_BUSCA} ON intec.dbo.Tb_PLN_Cidade REBUILD"
+            ))
+            Sessao.execute(text("UPDATE STATISTICS intec.dbo.Tb_PLN_Cidade"))
+            Sessao.commit()
+            LogService.Debug("CidadesService", f"Índice {CidadesService.INDICE_BUSCA} reconstruído.")
+        except Exception as e:
+            Sessao.rollback()
+            LogService.FalhaSilenciosa("CidadesService", "Reconstrução do índice de cidades", e)
+
     @staticmethod
     def ProcessarArquivoFinal(caminho_arquivo, data_ref, nome_original, usuario, tipo_acao):
         """
         O Motorzão V8:
-        1. Lê o Excel (que na verdade é um CSV disfarçado).
-        2. Desativa a remessa anterior.
-        3. Cria a nova remessa.
-        4. Faz o parsing manual linha a linha.
-        5. Bulk Insert no banco.
+        1. Desativa a remessa anterior e cria a nova.
+        2. Lê o Excel (que na verdade é um CSV disfarçado) em blocos, sem carregar tudo.
+        3. Faz o parsing por coluna de cada bloco (split, decimais e nome normalizado vetorizados).
+        4. Insere cada bloco via executemany.
+        5. Reconstrói o índice de busca de cidades.
         """
         LogService.Info("CidadesService", f"Iniciando processamento final (Ação: {tipo_acao}) - Arquivo: {nome_original}")
-        Sessao = ObterSessaoSqlServer()
+        Sessao = ObterSessaoSqlServer(CargaEmLote=True)
         try:
-            # 1. Ler Excel (engine openpyxl para .xlsx)
-            # header=None pois o arquivo parece não ter cabeçalho padrão ou é processado bruto
-            DfRaw = pd.read_excel(caminho_arquivo, header=None, engine='openpyxl')
-            
-            # Pega a primeira coluna (índice 0) que contém o texto concatenado
-            SerieDados = DfRaw.iloc[:, 0].astype(str)
-            LogService.Debug("CidadesService", f"Arquivo lido. Total de linhas brutas: {len(SerieDados)}")
-
-            # 2. Desativar remessa anterior (se houver)
+            # 1. Desativar remessa anterior (se houver) e criar a nova
             Anterior = Sessao.query(RemessaCidade).filter_by(MesReferencia=data_ref, Ativo=True).first()
             if Anterior:
                 Anterior.Ativo = False
                 LogService.Info("CidadesService", f"Remessa anterior (ID: {Anterior.Id}) desativada.")
 
-            # 3. Criar Cabeçalho da Nova Remessa
             NovaRemessa = RemessaCidade(
                 MesReferencia=data_ref,
                 NomeArquivoOriginal=nome_original,
@@ -139,53 +228,34 @@ class CidadesService:
             Sessao.add(NovaRemessa)
             Sessao.flush() # Garante que NovaRemessa ganhe um ID
 
-            # 4. Processar Linha a Linha (Parsing Manual da string concatenada)
-            ListaCidades = []
-            
-            for Linha in SerieDados:
-                # Limpeza: Remove aspas e espaços extras
-                LinhaLimpa = Linha.replace('"', '').replace("'", "").strip()
-                
-                # Quebra pelo ponto e vírgula
-                Partes = LinhaLimpa.split(';')
-                
-                # Validação básica: Precisa ter pelo menos 5 colunas
-                # id_municipio; uf; municipio; longitude; latitude
-                if len(Partes) < 5:
-                    continue
-
-                # Pula o cabeçalho se encontrar a palavra 'municipio' ou 'uf'
-                if 'municipio' in Partes[2].lower() or 'uf' in Partes[1].lower():
-                    continue
-
-                try:
-                    # Tratamento de erro na conversão de decimais (virgula para ponto)
-                    Lat = float(Partes[4].replace(',', '.')) if Partes[4] else 0.0
-                    Lon = float(Partes[3].replace(',', '.')) if Partes[3] else 0.0
-                    
-                    CidadeObj = Cidade(
-                        IdRemessa=NovaRemessa.Id,
-                        CodigoIbge=int(Partes[0]),
-                        Uf=Partes[1].strip(),
-                        NomeCidade=Partes[2].strip(),
-                        Longitude=Lon,
-                        Latitude=Lat
-                    )
-                    ListaCidades.append(CidadeObj)
-                except ValueError:
-                    continue # Pula linha se falhar a conversão
-
-            # 5. Bulk Insert (Performance Extrema)
-            Sessao.bulk_save_objects(ListaCidades)
+            # 2-4. Streaming: lê, parseia e insere bloco a bloco
+            Total, Descartadas, LinhasBrutas = 0, [], 0
+            for SerieDados in CidadesService._LerLinhasEmBlocos(caminho_arquivo, CidadesService.TAMANHO_BLOCO):
+                LinhasBrutas += len(SerieDados)
+                Registros, Falhas = CidadesService._ParsearBloco(SerieDados, NovaRemessa.Id)
+                Descartadas.extend(Falhas)
+                Total += InserirEmLotes(Sessao, Cidade, Registros, CidadesService.TAMANHO_BLOCO)
+
+            LogService.Debug("CidadesService", f"Arquivo lido. Total de linhas brutas: {LinhasBrutas}")
+            if Descartadas:
+                LogService.Warning("CidadesService", f"Linhas descartadas na conversão: {DescreverFalhas(Descartadas, Deslocamento=1)}")
+
+            if not Total:
+                Sessao.rollback()
+                return False, "Nenhuma cidade válida encontrada (esperado: id_municipio; uf; municipio; longitude; latitude)."
+
             Sessao.commit()
-            
-            LogService.Info("CidadesService", f"Processamento concluído. {len(ListaCidades)} cidades importadas na Remessa {NovaRemessa.Id}.")
+            LogService.Info("CidadesService", f"Processamento concluído. {Total} cidades importadas na Remessa {NovaRemessa.Id}.")
+
+            # 5. Índice de busca (GeoService / vínculo de planejamento)
+            CidadesService._ReconstruirIndiceCidades(Sessao)
+            CacheCompartilhadoService.Invalidar('cidades')
 
             # Limpa o arquivo temporário
             if os.path.exists(caminho_arquivo): 
                 os.remove(caminho_arquivo)
                 
-            return True, f"Base de Cidades processada! {len(ListaCidades)} registros importados."
+            return True, f"Base de Cidades processada! {Total} registros importados."
 
         except Exception as e:
             Sessao.rollback()
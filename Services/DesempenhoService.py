@@ -0,0 +1,254 @@
+import threading
+import time
+from collections import deque
+
+from flask import g, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from Configuracoes import ConfiguracaoAtual
+from Services.LogService import LogService
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
+
+
+class DesempenhoService:
+    """
+    Métricas de desempenho por requisição, ligadas em App.py por Configurar(app):
+    tempo total, tempo dentro do banco (eventos de cursor do SQLAlchemy, em qualquer Engine),
+    quantidade de queries e tamanho da resposta, por endpoint e por usuário.
+
+    Cada endpoint guarda as últimas AMOSTRAS_POR_ENDPOINT requisições (janela móvel), de onde
+    saem p50/p95/p99. A própria requisição recebe o cabeçalho Server-Timing (app/db) e, se
+    passar de LIMITE_QUERIES queries, gera um aviso de possível N+1 com a query mais repetida.
+    Só contam as queries feitas na thread da requisição (pools de threads ficam de fora).
+
+    No modo multiprocesso cada processo exporta as próprias janelas (CacheCompartilhadoService,
+    estado 'desempenho') e ObterMetricas soma as dos demais: percentis sobre as amostras de todos.
+    """
+
+    AMOSTRAS_POR_ENDPOINT: int = ConfiguracaoAtual.DESEMPENHO_AMOSTRAS_POR_ENDPOINT
+    LIMITE_QUERIES: int = ConfiguracaoAtual.DESEMPENHO_LIMITE_QUERIES
+    PERCENTIS = (50, 95, 99)
+
+    _endpoints: dict = {}     # {endpoint: {'Amostras': deque[(total_ms, db_ms, queries, bytes)], ...}}
+    _usuarios: dict = {}      # {login: {'Requisicoes', 'TotalMs', 'DbMs', 'Queries', 'Bytes'}}
+    _lock_metricas = threading.Lock()
+    _eventos_registrados = False
+
+    @classmethod
+    def Configurar(cls, app):
+        """
+        Registra os hooks de requisição e os eventos de banco.
+        Chamar antes de RespostaHttpService.Configurar: o after_request registrado primeiro roda
+        por último, então o tempo medido inclui a compressão e o tamanho é o enviado.
+        """
+        if not ConfiguracaoAtual.DESEMPENHO_ATIVO:
+            LogService.Info("DesempenhoService", "Métricas de desempenho desligadas (PERF_METRICS_ENABLED).")
+            return
+
+        if not cls._eventos_registrados:
+            event.listen(Engine, 'before_cursor_execute', cls._AntesQuery)
+            event.listen(Engine, 'after_cursor_execute', cls._DepoisQuery)
+            event.listen(Engine, 'handle_error', cls._ErroQuery)
+            cls._eventos_registrados = True
+
+        app.before_request(cls._IniciarRequisicao)
+        app.after_request(cls._FinalizarRequisicao)
+        LogService.Info(
+            "DesempenhoService",
+            f"Métricas de desempenho ativas: janela de {cls.AMOSTRAS_POR_ENDPOINT} requisições por endpoint, "
+            f"aviso de N+1 acima de {cls.LIMITE_QUERIES} queries."
+        )
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # BANCO (eventos do SQLAlchemy)
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _Medindo():
+        return has_request_context() and 'desempenho_inicio' in g
+
+    @classmethod
+    def _AntesQuery(cls, conn, cursor, statement, parameters, context, executemany):
+        if cls._Medindo():
+            conn.info.setdefault('desempenho_queries', []).append(time.perf_counter())
+
+    @classmethod
+    def _DepoisQuery(cls, conn, cursor, statement, parameters, context, executemany):
+        cls._ContabilizarQuery(conn, statement)
+
+    @classmethod
+    def _ErroQuery(cls, contexto):
+        # Query que falhou não passa por after_cursor_execute: sem isso o início dela ficaria
+        # na pilha da conexão (que volta ao pool) e as medições seguintes sairiam trocadas
+        if contexto.connection is not None:
+            cls._ContabilizarQuery(contexto.connection, contexto.statement)
+
+    @classmethod
+    def _ContabilizarQuery(cls, conn, statement):
+        pilha = conn.info.get('desempenho_queries')
+        if not pilha:
+            return
+        inicio = pilha.pop()
+        if not cls._Medindo():
+            return
+        g.desempenho_db_ms += (time.perf_counter() - inicio) * 1000
+        g.desempenho_queries += 1
+        repeticoes = g.desempenho_sqls
+        repeticoes[statement] = repeticoes.get(statement, 0) + 1
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # REQUISIÇÃO
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _IniciarRequisicao():
+        if request.endpoint == 'static':
+            return
+        g.desempenho_inicio = time.perf_counter()
+        g.desempenho_db_ms = 0.0
+        g.desempenho_queries = 0
+        g.desempenho_sqls = {}
+
+    @staticmethod
+    def _UsuarioAtual():
+        try:
+            if current_user and current_user.is_authenticated:
+                return getattr(current_user, 'Login', None) or current_user.get_id()
+        except Exception:
+            pass
+        return 'anonimo'
+
+    @classmethod
+    def _FinalizarRequisicao(cls, resposta):
+        inicio = g.pop('desempenho_inicio', None)
+        if inicio is None:
+            return resposta
+        try:
+            total_ms = (time.perf_counter() - inicio) * 1000
+            db_ms, queries = g.desempenho_db_ms, g.desempenho_queries
+            endpoint = request.endpoint or request.path
+            tamanho = resposta.content_length or 0
+
+            cls._RegistrarMetrica(endpoint, cls._UsuarioAtual(), total_ms, db_ms, queries, tamanho)
+
+            resposta.headers.add(
+                'Server-Timing',
+                f'app;dur={total_ms:.1f}, db;dur={db_ms:.1f};desc="{queries} queries"'
+            )
+
+            if queries > cls.LIMITE_QUERIES:
+                sql, vezes = max(g.desempenho_sqls.items(), key=lambda x: x[1])
+                LogService.Warning(
+                    "DesempenhoService",
+                    f"Possível N+1 em {endpoint}: {queries} queries numa requisição ({db_ms:.0f} ms no banco). "
+                    f"Mais repetida ({vezes}x): {' '.join(sql.split())[:200]}",
+                    Chave=endpoint
+                )
+        except Exception as e:
+            LogService.FalhaSilenciosa("DesempenhoService", "Registro de métricas", e)
+        return resposta
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # MÉTRICAS
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def _RegistrarMetrica(cls, endpoint, usuario, total_ms, db_ms, queries, tamanho):
+        with cls._lock_metricas:
+            m = cls._endpoints.get(endpoint)
+            if m is None:
+                m = cls._endpoints[endpoint] = {
+                    'Amostras': deque(maxlen=cls.AMOSTRAS_POR_ENDPOINT), 'Requisicoes': 0, 'Usuarios': {}
+                }
+            m['Amostras'].append((total_ms, db_ms, queries, tamanho))
+            m['Requisicoes'] += 1
+            m['Usuarios'][usuario] = m['Usuarios'].get(usuario, 0) + 1
+
+            u = cls._usuarios.get(usuario)
+            if u is None:
+                u = cls._usuarios[usuario] = {'Requisicoes': 0, 'TotalMs': 0.0, 'DbMs': 0.0, 'Queries': 0, 'Bytes': 0}
+            u['Requisicoes'] += 1
+            u['TotalMs'] += total_ms
+            u['DbMs'] += db_ms
+            u['Queries'] += queries
+            u['Bytes'] += tamanho
+
+    @classmethod
+    def _Percentis(cls, valores):
+        """Percentis por posição (nearest-rank) de uma lista já ordenada."""
+        n = len(valores)
+        return {f"p{p}": round(valores[min(n - 1, max(0, -(-p * n // 100) - 1))], 1) for p in cls.PERCENTIS}
+
+    @classmethod
+    def _Exportar(cls):
+        """Estado deste processo em formato JSON (lido pelos outros processos em ObterMetricas)."""
+        with cls._lock_metricas:
+            return {
+                'Endpoints': {
+                    k: {'Amostras': list(v['Amostras']), 'Requisicoes': v['Requisicoes'], 'Usuarios': dict(v['Usuarios'])}
+                    for k, v in cls._endpoints.items()
+                },
+                'Usuarios': {k: dict(v) for k, v in cls._usuarios.items()},
+            }
+
+    @classmethod
+    def ObterMetricas(cls):
+        """
+        {'Endpoints': [...], 'Usuarios': [...], 'Processos': n}. Por endpoint: percentis de tempo
+        total e de banco sobre a janela atual, médias de queries/bytes e quem mais chamou.
+        Mais lentos (p95) primeiro. No modo multiprocesso, soma todos os processos vivos.
+        """
+        estados = [cls._Exportar(), *CacheCompartilhadoService.LerEstadosProcessos('desempenho')]
+
+        endpoints, usuarios = {}, {}
+        for estado in estados:
+            for endpoint, m in estado['Endpoints'].items():
+                soma = endpoints.setdefault(endpoint, {'Amostras': [], 'Requisicoes': 0, 'Usuarios': {}})
+                soma['Amostras'].extend(m['Amostras'])
+                soma['Requisicoes'] += m['Requisicoes']
+                for usuario, n in m['Usuarios'].items():
+                    soma['Usuarios'][usuario] = soma['Usuarios'].get(usuario, 0) + n
+            for usuario, u in estado['Usuarios'].items():
+                soma = usuarios.setdefault(usuario, dict.fromkeys(u, 0))
+                for campo, valor in u.items():
+                    soma[campo] += valor
+
+        resultado = []
+        for endpoint, m in endpoints.items():
+            amostras, por_usuario = m['Amostras'], m['Usuarios']
+            if not amostras:
+                continue
+            n = len(amostras)
+            total, db, queries, tamanhos = zip(*amostras)
+            resultado.append({
+                'Endpoint': endpoint,
+                'Requisicoes': m['Requisicoes'],
+                'Amostras': n,
+                'TotalMs': cls._Percentis(sorted(total)),
+                'DbMs': cls._Percentis(sorted(db)),
+                'QueriesMedio': round(sum(queries) / n, 1),
+                'MaxQueries': max(queries),
+                'BytesMedio': round(sum(tamanhos) / n),
+                'Usuarios': dict(sorted(por_usuario.items(), key=lambda x: x[1], reverse=True)[:10]),
+            })
+        resultado.sort(key=lambda x: x['TotalMs']['p95'], reverse=True)
+
+        lista_usuarios = []
+        for usuario, u in usuarios.items():
+            n = u['Requisicoes'] or 1
+            lista_usuarios.append({
+                'Usuario': usuario,
+                'Requisicoes': u['Requisicoes'],
+                'TotalMsMedio': round(u['TotalMs'] / n, 1),
+                'DbMsMedio': round(u['DbMs'] / n, 1),
+                'QueriesMedio': round(u['Queries'] / n, 1),
+                'BytesTotal': u['Bytes'],
+            })
+        lista_usuarios.sort(key=lambda x: x['Requisicoes'], reverse=True)
+
+        return {'Endpoints': resultado, 'Usuarios': lista_usuarios, 'Processos': len(estados)}
+
+
+CacheCompartilhadoService.RegistrarEstadoProcesso('desempenho', DesempenhoService._Exportar)
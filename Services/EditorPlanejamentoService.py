@@ -0,0 +1,149 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Configuracoes import ConfiguracaoAtual
+from Services.LogService import LogService
+from Services.PlanejamentoService import PlanejamentoService
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
+from Services.Shared.GeoService import BuscarCoordenadasCidade, ListarAeroportosAtivos, OrdenarAeroportosPorDistancia
+
+
+class EditorPlanejamentoService:
+    """
+    Abertura do editor de planejamento (/Planejamento/Montar) em duas etapas paralelas:
+    1. detalhe do CTC, planejamento já salvo, mapa de planejamentos e aeroportos ativos;
+    2. (com o CTC em mãos) candidatos à consolidação e geocodificação de origem/destino.
+    Cada consulta abre a própria sessão, então rodam em threads sem dividir conexão.
+
+    O contexto montado fica guardado por VALIDADE_CACHE_SEGUNDOS: a busca de rotas, que a
+    página dispara logo depois de abrir (/API/OpcoesRotas), reaproveita tudo isso. Recálculo
+    pedido pelo usuário sempre remonta, e gravar/cancelar um planejamento (que muda a
+    consolidação de outros CTCs) limpa o cache de todos os processos (Invalidar).
+    """
+
+    THREADS: int = ConfiguracaoAtual.EDITOR_PLANEJAMENTO_THREADS
+    VALIDADE_CACHE_SEGUNDOS: int = ConfiguracaoAtual.EDITOR_PLANEJAMENTO_CACHE_SEGUNDOS
+    MAX_CONTEXTOS = 200
+    NOME_CACHE = 'editor_planejamento'
+    LIMITE_AEROPORTOS = 5
+
+    _executor = None
+    _lock_executor = threading.Lock()
+    _contextos: dict = {}         # {chave: (expira_em, contexto)}
+    _lock_contextos = threading.Lock()
+
+    @classmethod
+    def _Executor(cls):
+        if cls._executor is None:
+            with cls._lock_executor:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(max_workers=cls.THREADS, thread_name_prefix='editor-planejamento')
+        return cls._executor
+
+    @staticmethod
+    def _Chave(filial, serie, ctc, servicos_escolhidos):
+        servicos = tuple(sorted((str(k), str(v)) for k, v in (servicos_escolhidos or {}).items()))
+        return (str(filial).strip(), str(serie).strip(), str(ctc).strip(), servicos)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # CONTEXTO
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def CarregarContexto(cls, filial, serie, ctc, servicos_escolhidos=None, UsarCache=False):
+        """
+        Tudo o que o editor precisa antes da busca de rotas:
+        {'dados_ctc', 'candidatos', 'unificados', 'planejamento_salvo', 'coord_origem', 'coord_destino',
+         'aeroportos_origem', 'aeroportos_destino'}. None se o CTC não foi encontrado.
+        UsarCache=True aceita um contexto montado há menos de VALIDADE_CACHE_SEGUNDOS.
+        """
+        chave = cls._Chave(filial, serie, ctc, servicos_escolhidos)
+        if UsarCache:
+            contexto = cls._ObterDoCache(chave)
+            if contexto is not None:
+                return contexto
+
+        inicio = time.perf_counter()
+        executor = cls._Executor()
+
+        # Etapa 1: independentes entre si
+        f_ctc = executor.submit(PlanejamentoService.ObterCtcDetalhado, filial, serie, ctc)
+        f_salvo = executor.submit(PlanejamentoService.ObterPlanejamentoPorCtc, filial, serie, ctc)
+        f_mapa = executor.submit(PlanejamentoService._ObterMapaCache)
+        f_aeroportos = executor.submit(ListarAeroportosAtivos)
+
+        dados_ctc = f_ctc.result()
+        if not dados_ctc:
+            return None
+
+        # Etapa 2: dependem do CTC. O mapa é aguardado aqui, e não dentro de outra tarefa,
+        # para nenhuma thread do pool ficar presa esperando uma tarefa ainda na fila.
+        f_candidatos = executor.submit(
+            PlanejamentoService.BuscarCtcsConsolidaveis,
+            dados_ctc['origem_cidade'], dados_ctc['origem_uf'],
+            dados_ctc['destino_cidade'], dados_ctc['destino_uf'],
+            dados_ctc['data_emissao_real'], filial, ctc,
+            dados_ctc['tipo_carga'],
+            servico_alvo=dados_ctc.get('servico_contratado'),
+            mapa_cache=f_mapa.result()
+        )
+        f_origem = executor.submit(BuscarCoordenadasCidade, dados_ctc['origem_cidade'], dados_ctc['origem_uf'])
+        f_destino = executor.submit(BuscarCoordenadasCidade, dados_ctc['destino_cidade'], dados_ctc['destino_uf'])
+
+        aeroportos = f_aeroportos.result()
+        coord_origem, coord_destino = f_origem.result(), f_destino.result()
+        candidatos = f_candidatos.result()
+
+        contexto = {
+            'dados_ctc': dados_ctc,
+            'candidatos': candidatos,
+            'unificados': PlanejamentoService.UnificarConsolidacao(dados_ctc, candidatos, servicos_escolhidos=servicos_escolhidos),
+            'planejamento_salvo': f_salvo.result(),
+            'coord_origem': coord_origem,
+            'coord_destino': coord_destino,
+            'aeroportos_origem': OrdenarAeroportosPorDistancia(
+                aeroportos, coord_origem['lat'], coord_origem['lon'], cls.LIMITE_AEROPORTOS) if coord_origem else [],
+            'aeroportos_destino': OrdenarAeroportosPorDistancia(
+                aeroportos, coord_destino['lat'], coord_destino['lon'], cls.LIMITE_AEROPORTOS) if coord_destino else [],
+        }
+        cls._GuardarNoCache(chave, contexto)
+
+        LogService.Debug(
+            "EditorPlanejamentoService",
+            f"Contexto do editor {filial}-{serie}-{ctc} montado em {(time.perf_counter() - inicio) * 1000:.0f} ms "
+            f"({len(candidatos)} candidatos à consolidação)."
+        )
+        return contexto
+
+    @classmethod
+    def _ObterDoCache(cls, chave):
+        with cls._lock_contextos:
+            item = cls._contextos.get(chave)
+        if item and item[0] > time.monotonic():
+            return item[1]
+        return None
+
+    @classmethod
+    def _GuardarNoCache(cls, chave, contexto):
+        agora = time.monotonic()
+        with cls._lock_contextos:
+            if len(cls._contextos) >= cls.MAX_CONTEXTOS:
+                cls._contextos = {k: v for k, v in cls._contextos.items() if v[0] > agora}
+                if len(cls._contextos) >= cls.MAX_CONTEXTOS:
+                    cls._contextos.pop(next(iter(cls._contextos)))
+            cls._contextos[chave] = (agora + cls.VALIDADE_CACHE_SEGUNDOS, contexto)
+
+    @classmethod
+    def LimparCache(cls):
+        with cls._lock_contextos:
+            cls._contextos = {}
+
+    @classmethod
+    def Invalidar(cls):
+        """Chamar depois de gravar ou cancelar um planejamento: descarta os contextos deste e dos outros processos."""
+        cls.LimparCache()
+        CacheCompartilhadoService.Invalidar(cls.NOME_CACHE)
+
+
+CacheCompartilhadoService.AoInvalidar(EditorPlanejamentoService.NOME_CACHE, EditorPlanejamentoService.LimparCache)
@@ -1,80 +1,277 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+import time
 import traceback
-from datetime import datetime
 from Configuracoes import ConfiguracaoAtual
 
+
+class _RotacaoTamanhoTempo(logging.handlers.TimedRotatingFileHandler):
+    """
+    application.log: rotaciona no horário configurado (when) ou ao passar de max_bytes,
+    o que vier primeiro. Sem 'when', rotaciona só por tamanho.
+    Várias rotações no mesmo período ganham sufixo .1, .2... em vez de sobrescrever.
+    """
+
+    def __init__(self, caminho, max_bytes, when, backups):
+        super().__init__(caminho, when=when or 'midnight', backupCount=backups, encoding='utf-8', delay=True)
+        self.max_bytes = max_bytes
+        self.so_tamanho = not when
+
+    def shouldRollover(self, record):
+        if self.max_bytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.stream.tell() >= self.max_bytes:
+                return True
+        if self.so_tamanho:
+            return False
+        return super().shouldRollover(record)
+
+    def rotation_filename(self, default_name):
+        nome, n = default_name, 1
+        while os.path.exists(nome):
+            nome = f"{default_name}.{n}"
+            n += 1
+        return nome
+
+
+class _LimitadorFrequencia:
+    """No máximo 'limite' mensagens por chave a cada 'janela' segundos; conta as suprimidas."""
+
+    def __init__(self, limite, janela):
+        self.limite = limite
+        self.janela = janela
+        self._estado = {}   # {chave: (inicio_janela, emitidas, suprimidas)}
+        self._lock = threading.Lock()
+
+    def Permitir(self, chave):
+        """(permitida, quantas foram suprimidas desde a última permitida)."""
+        agora = time.monotonic()
+        with self._lock:
+            inicio, emitidas, suprimidas = self._estado.get(chave, (agora, 0, 0))
+            if agora - inicio >= self.janela:
+                inicio, emitidas = agora, 0
+            if emitidas < self.limite:
+                self._estado[chave] = (inicio, emitidas + 1, 0)
+                return True, suprimidas
+            self._estado[chave] = (inicio, emitidas, suprimidas + 1)
+            return False, 0
+
+
 class LogService:
     """
     Serviço centralizado de Logs.
-    Gerencia logs de sessão (voláteis) e logs gerais (persistentes).
+    Gerencia logs de sessão (voláteis) e logs gerais (persistentes, com rotação).
+
+    Quem loga só enfileira o registro (QueueHandler); uma única thread (QueueListener)
+    formata e grava em session.log, application.log e console. Assim a requisição não
+    espera disco nem terminal.
+    Níveis: LOG_LEVEL (geral) e LOG_LEVELS (por origem). Mensagens frequentes podem passar
+    Chave=...: no máximo LOG_RATE_LIMIT_COUNT por janela, com a contagem das suprimidas.
     """
     _logger = None
     _inicializado = False
+    _listener = None
+    _handlers = []
+    _loggers = {}
+    _limitador = None
+    _lock_inicializacao = threading.Lock()
+
+    @staticmethod
+    def _ConverterNivel(nome, padrao=logging.INFO):
+        nivel = logging.getLevelName(str(nome or '').strip().upper())
+        return nivel if isinstance(nivel, int) else padrao
+
+    @staticmethod
+    def _NiveisPorOrigem():
+        """'Origem=NIVEL,Outra=NIVEL' (LOG_LEVELS) -> {origem: nível}."""
+        niveis = {}
+        for item in ConfiguracaoAtual.LOG_NIVEIS_ORIGEM.replace(';', ',').split(','):
+            if '=' in item:
+                origem, nivel = item.split('=', 1)
+                if origem.strip():
+                    niveis[origem.strip()] = LogService._ConverterNivel(nivel)
+        return niveis
 
     @staticmethod
     def Inicializar():
-        if LogService._inicializado:
-            return
+        with LogService._lock_inicializacao:
+            if LogService._inicializado:
+                return
+
+            # Garante que o diretório de logs existe
+            os.makedirs(ConfiguracaoAtual.DIR_LOGS, exist_ok=True)
+
+            # Definição dos caminhos. No modo multiprocesso (WSGI.py) cada processo tem os seus:
+            # a rotação não renomeia arquivo aberto por outro processo (falha no Windows)
+            processo = os.getenv("SERVIDOR_PROCESSO_ID")
+            sufixo = f".p{processo}" if processo else ""
+            caminho_sessao = os.path.join(ConfiguracaoAtual.DIR_LOGS, f"session{sufixo}.log")
+            caminho_geral = os.path.join(ConfiguracaoAtual.DIR_LOGS, f"application{sufixo}.log")
+
+            # Formatação Profissional: DATA HORA | NIVEL | ORIGEM | MENSAGEM
+            formatter = logging.Formatter(
+                '%(asctime)s | %(levelname)-8s | %(name)-25s | %(message)s',
+                datefmt='%Y-%m-%d %H:%M:%S'
+            )
+
+            # 1. Handler de Sessão (Reinicia a cada start da aplicação - mode='w')
+            # encoding='utf-8' é crucial para evitar erros com acentos
+            handler_sessao = logging.FileHandler(caminho_sessao, mode='w', encoding='utf-8')
+            handler_sessao.setLevel(logging.DEBUG)
+            handler_sessao.setFormatter(formatter)
+
+            # 2. Handler Geral (Histórico - rotação por tamanho/tempo, LOG_ROTATE_*)
+            handler_geral = _RotacaoTamanhoTempo(
+                caminho_geral,
+                max_bytes=ConfiguracaoAtual.LOG_ROTACAO_MAX_MB * 1024 * 1024,
+                when=ConfiguracaoAtual.LOG_ROTACAO_QUANDO,
+                backups=ConfiguracaoAtual.LOG_ROTACAO_BACKUPS
+            )
+            handler_geral.setLevel(logging.INFO) # No histórico geral, sem DEBUG para não encher o disco
+            handler_geral.setFormatter(formatter)
+
+            handlers = [handler_sessao, handler_geral]
+
+            # 3. Handler de Console (Para ver no terminal enquanto desenvolve)
+            if ConfiguracaoAtual.LOG_CONSOLE:
+                handler_console = logging.StreamHandler()
+                handler_console.setLevel(logging.DEBUG)
+                handler_console.setFormatter(formatter)
+                handlers.append(handler_console)
+
+            # Configuração do Logger Principal: só enfileira, quem grava é o listener
+            fila = queue.SimpleQueue()
+            logger = logging.getLogger("Luft-ConnectAir")
+            logger.setLevel(LogService._ConverterNivel(ConfiguracaoAtual.LOG_NIVEL, logging.DEBUG))
+            logger.handlers = [logging.handlers.QueueHandler(fila)]  # Limpa handlers anteriores para evitar duplicação
+            logger.propagate = False
+
+            for origem, nivel in LogService._NiveisPorOrigem().items():
+                logging.getLogger(f"Luft-ConnectAir.{origem}").setLevel(nivel)
+
+            listener = logging.handlers.QueueListener(fila, *handlers, respect_handler_level=True)
+            listener.start()
+            atexit.register(LogService.Finalizar)
+
+            LogService._limitador = _LimitadorFrequencia(
+                ConfiguracaoAtual.LOG_LIMITE_POR_JANELA, ConfiguracaoAtual.LOG_JANELA_SEGUNDOS
+            )
+            LogService._handlers = handlers
+            LogService._listener = listener
+            LogService._logger = logger
+            LogService._inicializado = True
 
-        # Garante que o diretório de logs existe
-        if not os.path.exists(ConfiguracaoAtual.DIR_LOGS):
-            os.makedirs(ConfiguracaoAtual.DIR_LOGS)
-
-        # Definição dos caminhos
-        caminho_sessao = os.path.join(ConfiguracaoAtual.DIR_LOGS, "session.log")
-        caminho_geral = os.path.join(ConfiguracaoAtual.DIR_LOGS, "application.log")
-
-        # Configuração do Logger Principal
-        logger = logging.getLogger("Luft-ConnectAir")
-        logger.setLevel(logging.DEBUG if ConfiguracaoAtual.DEBUG else logging.INFO)
-        logger.handlers = []  # Limpa handlers anteriores para evitar duplicação
-        logger.propagate = False
-
-        # Formatação Profissional: DATA HORA | NIVEL | ORIGEM | MENSAGEM
-        formatter = logging.Formatter(
-            '%(asctime)s | %(levelname)-8s | %(name)-25s | %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-
-        # 1. Handler de Sessão (Reinicia a cada start da aplicação - mode='w')
-        # encoding='utf-8' é crucial para evitar erros com acentos
-        handler_sessao = logging.FileHandler(caminho_sessao, mode='w', encoding='utf-8')
-        handler_sessao.setLevel(logging.DEBUG)
-        handler_sessao.setFormatter(formatter)
-        logger.addHandler(handler_sessao)
-
-        # 2. Handler Geral (Histórico Eterno - mode='a')
-        handler_geral = logging.FileHandler(caminho_geral, mode='a', encoding='utf-8')
-        handler_geral.setLevel(logging.INFO) # No histórico geral, talvez não queira DEBUG para não encher o disco
-        handler_geral.setFormatter(formatter)
-        logger.addHandler(handler_geral)
-
-        # 3. Handler de Console (Para ver no terminal enquanto desenvolve)
-        handler_console = logging.StreamHandler()
-        handler_console.setLevel(logging.DEBUG)
-        handler_console.setFormatter(formatter)
-        logger.addHandler(handler_console)
-
-        LogService._logger = logger
-        LogService._inicializado = True
-        
         LogService.Info("LogService", "Sistema de logs inicializado com sucesso.")
 
     @staticmethod
-    def _obter_logger(origem):
+    def CriarFilaProcessos(contexto):
+        """
+        Fila (multiprocessing) para processos auxiliares deste processo, como o pool de cálculo
+        de rotas: eles chamam InicializarEmProcessoFilho(fila) e uma thread daqui grava os
+        registros recebidos nos arquivos deste processo.
+        """
+        LogService.Inicializar()
+        fila = contexto.Queue()
+
+        def Repassar():
+            while True:
+                try:
+                    registro = fila.get()
+                except (EOFError, OSError):
+                    return
+                logging.getLogger(registro.name).handle(registro)
+
+        threading.Thread(target=Repassar, daemon=True, name='log-processos').start()
+        return fila
+
+    @staticmethod
+    def InicializarEmProcessoFilho(fila):
+        """Processo auxiliar: em vez de abrir (e truncar) os arquivos de log, envia os registros pela fila do pai."""
+        with LogService._lock_inicializacao:
+            logger = logging.getLogger("Luft-ConnectAir")
+            logger.setLevel(LogService._ConverterNivel(ConfiguracaoAtual.LOG_NIVEL, logging.DEBUG))
+            logger.handlers = [logging.handlers.QueueHandler(fila)]
+            logger.propagate = False
+
+            for origem, nivel in LogService._NiveisPorOrigem().items():
+                logging.getLogger(f"Luft-ConnectAir.{origem}").setLevel(nivel)
+
+            LogService._limitador = _LimitadorFrequencia(
+                ConfiguracaoAtual.LOG_LIMITE_POR_JANELA, ConfiguracaoAtual.LOG_JANELA_SEGUNDOS
+            )
+            LogService._logger = logger
+            LogService._inicializado = True
+
+    @staticmethod
+    def Finalizar():
+        """Grava o que ainda está na fila e fecha os arquivos (chamado no encerramento do processo)."""
+        with LogService._lock_inicializacao:
+            if LogService._listener is None:
+                return
+            LogService._listener.stop()
+            for handler in LogService._handlers:
+                handler.close()
+            LogService._listener = None
+            LogService._handlers = []
+            LogService._logger = None
+            LogService._loggers = {}
+            LogService._inicializado = False
+
+    @staticmethod
+    def DefinirNivel(origem, nivel):
+        """Troca o nível de uma origem em tempo de execução (origem=None: nível geral)."""
         if not LogService._logger:
             LogService.Inicializar()
-        # Retorna um adaptador para injetar o nome da origem (Classe/Modulo) no log
-        return logging.getLogger(f"Luft-ConnectAir.{origem}")
+        nome = "Luft-ConnectAir" if origem is None else f"Luft-ConnectAir.{origem}"
+        logging.getLogger(nome).setLevel(LogService._ConverterNivel(nivel, logging.NOTSET))
 
     @staticmethod
-    def Info(origem, mensagem):
-        LogService._obter_logger(origem).info(mensagem)
+    def _obter_logger(origem):
+        logger = LogService._loggers.get(origem)
+        if logger is None:
+            if not LogService._logger:
+                LogService.Inicializar()
+            # Logger filho com o nome da origem (Classe/Modulo); herda o nível geral se não tiver o seu
+            logger = LogService._loggers[origem] = logging.getLogger(f"Luft-ConnectAir.{origem}")
+        return logger
 
     @staticmethod
-    def Warning(origem, mensagem):
-        LogService._obter_logger(origem).warning(mensagem)
+    def _Limitar(origem, chave, mensagem):
+        if chave is None:
+            return mensagem
+        permitida, suprimidas = LogService._limitador.Permitir((origem, chave))
+        if not permitida:
+            return None
+        if suprimidas:
+            return f"{mensagem} (+{suprimidas} mensagens semelhantes suprimidas)"
+        return mensagem
+
+    @staticmethod
+    def _Registrar(nivel, origem, mensagem, chave):
+        logger = LogService._obter_logger(origem)
+        if not logger.isEnabledFor(nivel):
+            return
+        mensagem = LogService._Limitar(origem, chave, mensagem)
+        if mensagem is not None:
+            logger.log(nivel, mensagem)
+
+    @staticmethod
+    def Info(origem, mensagem, Chave=None):
+        LogService._Registrar(logging.INFO, origem, mensagem, Chave)
+
+    @staticmethod
+    def Warning(origem, mensagem, Chave=None):
+        LogService._Registrar(logging.WARNING, origem, mensagem, Chave)
+
+    @staticmethod
+    def FalhaSilenciosa(origem, acao, excecao, Chave=None):
+        """Aviso de quem engole a exceção e segue (tarefas de fundo, caches): '<acao> falhou silenciosamente: <erro>'."""
+        LogService._Registrar(logging.WARNING, origem, f"{acao} falhou silenciosamente: {excecao}", Chave)
 
     @staticmethod
     def Error(origem, mensagem, excecao=None):
@@ -86,10 +283,10 @@ class LogService:
             # Formata o traceback para string
             tb_str = "".join(traceback.format_exception(None, excecao, excecao.__traceback__))
             detalhes = f"{mensagem} | Exception: {str(excecao)}\nTraceback:\n{tb_str}"
-        
+
         LogService._obter_logger(origem).error(detalhes)
 
     @staticmethod
-    def Debug(origem, mensagem):
-        # Só grava se DEBUG=True no .env (controlado pelo setLevel no Inicializar)
-        LogService._obter_logger(origem).debug(mensagem)
\ No newline at end of file
+    def Debug(origem, mensagem, Chave=None):
+        # Só grava se o nível (LOG_LEVEL / LOG_LEVELS) permitir DEBUG para a origem
+        LogService._Registrar(logging.DEBUG, origem, mensagem, Chave)
@@ -0,0 +1,281 @@
+import atexit
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from Configuracoes import ConfiguracaoAtual
+from Services.LogService import LogService
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
+from Services.Shared.SnapshotMalhaService import SnapshotMalhaService
+
+
+class RouteComputePool:
+    """
+    Pool de processos para a parte CPU da busca de rotas (grafo, candidatos, score e ML de
+    RouteIntelligenceService.AnalisarEEncontrarRotas). Dentro do processo web essa parte
+    segura o GIL do começo ao fim, e as demais requisições esperam; aqui a thread da
+    requisição só aguarda o resultado.
+
+    A requisição manda a versão do snapshot da malha (SnapshotMalhaService) e os parâmetros
+    da busca; o processo de cálculo abre exatamente essa versão (mmap, sem banco) e devolve o
+    resultado bruto categorizado. Os processos sobem na primeira busca (ou antes de servir, pelo
+    WSGI.py, com Iniciar) e já aquecidos (_inicializar_processo): snapshots de
+    malha/tarifas/aeroportos abertos e modelo de ML carregado. Só importar App não cria processos.
+
+    Calcular() devolve None quando o pool não pode atender — desligado, sem snapshot, fila
+    acima de FILA_MAXIMA, pool quebrado ou busca que esperou TIMEOUT_SEGUNDOS sem começar —
+    e quem chama calcula na própria thread, como antes.
+
+    Cada busca ocupa uma posição de _estado (memória compartilhada com os processos): 0 = na
+    fila, -1 = abandonada antes de começar, > 0 = hora em que o processo começou a calcular.
+    Busca abandonada na fila (mesmo já entregue ao processo) é descartada sem calcular. Busca
+    que passou de TIMEOUT_SEGUNDOS depois de começar não tem como ser interrompida: o processo
+    termina o cálculo, o resultado é descartado e, até lá, ela continua contando na fila.
+    """
+
+    PROCESSOS: int = ConfiguracaoAtual.ROTAS_PROCESSOS_CALCULO
+    FILA_MAXIMA: int = ConfiguracaoAtual.ROTAS_FILA_MAXIMA
+    TIMEOUT_SEGUNDOS: float = ConfiguracaoAtual.ROTAS_TIMEOUT_SEGUNDOS
+
+    _executor = None
+    _fila_log = None
+    _estado = None                  # Array('d') compartilhado: uma posição por busca em andamento
+    _posicoes_livres: list = []
+    _em_andamento: int = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def Ativo(cls) -> bool:
+        # Processo filho (o próprio pool) nunca abre outro pool
+        return cls.PROCESSOS > 0 and multiprocessing.parent_process() is None
+
+    @classmethod
+    def Iniciar(cls) -> None:
+        """Sobe e aquece os processos antes da primeira busca (chamado pelo WSGI.py antes de servir)."""
+        if not cls.Ativo():
+            return
+        try:
+            executor = cls._obter_executor()
+            for _ in range(cls.PROCESSOS):
+                executor.submit(_aquecer)
+        except Exception as e:
+            LogService.FalhaSilenciosa("RouteComputePool", "Início do pool de cálculo", e)
+
+    @classmethod
+    def Calcular(cls, versao_malha, parametros: dict):
+        """
+        Roda AnalisarEEncontrarRotas num processo do pool sobre a versão 'versao_malha' da malha.
+        parametros: data_inicio, data_fim, lista_origens, lista_destinos, peso_total, tipo_carga,
+        servico_contratado, regras. Retorna o dict de categorias, ou None (calcular na requisição).
+        Erro dentro do cálculo é repassado; resultado que não chega em TIMEOUT_SEGUNDOS contados
+        do início do cálculo levanta TimeoutError.
+        """
+        if versao_malha is None or not cls.Ativo():
+            return None
+
+        with cls._lock:
+            if cls._em_andamento >= cls.PROCESSOS + cls.FILA_MAXIMA:
+                LogService.Warning(
+                    "RouteComputePool",
+                    f"Pool de cálculo cheio ({cls._em_andamento} buscas): calculando na própria requisição.",
+                    Chave="fila-cheia"
+                )
+                return None
+            cls._em_andamento += 1
+
+        executor = None
+        posicao = None
+        try:
+            executor, estado, posicao = cls._reservar_posicao()
+            futuro = executor.submit(_calcular, posicao, versao_malha, parametros)
+        except (BrokenProcessPool, RuntimeError, OSError) as e:
+            cls._liberar(posicao)
+            cls._descartar_executor(executor)
+            LogService.Warning("RouteComputePool", f"Pool de cálculo indisponível ({e}): calculando na própria requisição.")
+            return None
+        futuro.add_done_callback(lambda _futuro: cls._liberar(posicao))
+
+        try:
+            try:
+                return futuro.result(timeout=cls.TIMEOUT_SEGUNDOS)
+            except FuturesTimeoutError:
+                pass
+
+            with estado.get_lock():
+                inicio = estado[posicao]
+                if inicio == 0.0:
+                    estado[posicao] = _ABANDONADA
+            if inicio == 0.0:
+                futuro.cancel()
+                LogService.Warning(
+                    "RouteComputePool",
+                    f"Busca esperou {cls.TIMEOUT_SEGUNDOS:.0f} s na fila do pool: calculando na própria requisição.",
+                    Chave="fila-timeout"
+                )
+                return None
+
+            # O prazo conta do início real do cálculo, não da entrada na fila
+            restante = inicio + cls.TIMEOUT_SEGUNDOS - time.time()
+            try:
+                return futuro.result(timeout=max(restante, 0.0))
+            except FuturesTimeoutError:
+                LogService.Warning(
+                    "RouteComputePool",
+                    f"Busca passou de {cls.TIMEOUT_SEGUNDOS:.0f} s calculando: o processo termina o cálculo e o resultado é descartado.",
+                    Chave="calculo-timeout"
+                )
+                raise TimeoutError(f"Cálculo de rotas passou de {cls.TIMEOUT_SEGUNDOS:.0f} s no pool de processos.")
+        except BrokenProcessPool as e:
+            cls._descartar_executor(executor)
+            LogService.Warning("RouteComputePool", f"Processo de cálculo caiu ({e}): calculando na própria requisição.")
+            return None
+
+    @classmethod
+    def _reservar_posicao(cls):
+        """(executor, estado, posição livre de estado zerada); o limite de _em_andamento garante que sobra uma."""
+        executor = cls._obter_executor()
+        with cls._lock:
+            estado = cls._estado
+            posicao = cls._posicoes_livres.pop()
+        with estado.get_lock():
+            estado[posicao] = 0.0
+        return executor, estado, posicao
+
+    @classmethod
+    def _liberar(cls, posicao=None) -> None:
+        with cls._lock:
+            cls._em_andamento -= 1
+            if posicao is not None:
+                cls._posicoes_livres.append(posicao)
+
+    @classmethod
+    def _obter_executor(cls) -> ProcessPoolExecutor:
+        with cls._lock:
+            if cls._executor is None:
+                # spawn também fora do Windows: fork de um processo com threads (waitress) herda locks travados
+                contexto = multiprocessing.get_context('spawn')
+                if cls._fila_log is None:
+                    cls._fila_log = LogService.CriarFilaProcessos(contexto)
+                if cls._estado is None:
+                    # Criado uma vez: um pool recriado herda as mesmas posições (as reservadas continuam reservadas)
+                    cls._estado = contexto.Array('d', cls.PROCESSOS + cls.FILA_MAXIMA)
+                    cls._posicoes_livres = list(range(cls.PROCESSOS + cls.FILA_MAXIMA))
+                cls._executor = ProcessPoolExecutor(
+                    max_workers=cls.PROCESSOS,
+                    mp_context=contexto,
+                    initializer=_inicializar_processo,
+                    initargs=(cls._fila_log, cls._estado),
+                )
+                LogService.Info(
+                    "RouteComputePool",
+                    f"Pool de cálculo de rotas: {cls.PROCESSOS} processos, fila de até {cls.FILA_MAXIMA}, "
+                    f"timeout {cls.TIMEOUT_SEGUNDOS:.0f} s."
+                )
+            return cls._executor
+
+    @classmethod
+    def _descartar_executor(cls, executor) -> None:
+        """Pool quebrado (processo morreu): a próxima busca cria outro."""
+        with cls._lock:
+            if executor is None or cls._executor is not executor:
+                return
+            cls._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    @classmethod
+    def Finalizar(cls) -> None:
+        with cls._lock:
+            executor, cls._executor = cls._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(RouteComputePool.Finalizar)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# LADO DO PROCESSO DE CÁLCULO
+# ─────────────────────────────────────────────────────────────────────────────
+
+# Voos já montados por (versão da malha, janela de datas): buscas seguidas do mesmo
+# período (várias AWBs do mesmo planejamento) não remontam os VooRota
+_VOOS_MANTIDOS = 4
+_voos_por_janela = OrderedDict()
+
+# Posição de RouteComputePool._estado marcada pelo processo web: busca abandonada antes de começar
+_ABANDONADA = -1.0
+_estado_buscas = None
+
+
+def _inicializar_processo(fila_log, estado) -> None:
+    global _estado_buscas
+    _estado_buscas = estado
+    LogService.InicializarEmProcessoFilho(fila_log)
+    try:
+        from Services.Logic.RouteGraphEngine import RouteGraphEngine
+        from Services.Logic.RouteMLEngine import RouteMLEngine
+
+        SnapshotMalhaService.Obter()
+        CacheCompartilhadoService.Obter('tarifas')
+        RouteGraphEngine.CarregarCoordenadas()
+        RouteMLEngine._bundle_atual(aguardar=True)
+    except Exception as e:
+        LogService.FalhaSilenciosa("RouteComputePool", "Aquecimento do processo de cálculo", e)
+
+
+def _aquecer() -> None:
+    """Tarefa vazia: só força o ProcessPoolExecutor a subir o processo (e rodar o initializer)."""
+
+
+def _voos_da_versao(versao_malha, data_inicio, data_limite):
+    chave = (versao_malha, data_inicio, data_limite)
+    voos = _voos_por_janela.get(chave)
+    if voos is not None:
+        _voos_por_janela.move_to_end(chave)
+        return voos
+
+    from Services.Logic.RouteFlight import montar_voos_rota
+
+    snapshot = CacheCompartilhadoService.ObterVersao(SnapshotMalhaService.NOME, versao_malha)
+    if snapshot is None:
+        raise RuntimeError(f"Versão {versao_malha} da malha não está mais disponível no disco.")
+    voos = montar_voos_rota(SnapshotMalhaService.LinhasEntre(data_inicio, data_limite, snapshot))
+    _voos_por_janela[chave] = voos
+    while len(_voos_por_janela) > _VOOS_MANTIDOS:
+        _voos_por_janela.popitem(last=False)
+    return voos
+
+
+def _calcular(posicao, versao_malha, parametros: dict):
+    with _estado_buscas.get_lock():
+        if _estado_buscas[posicao] == _ABANDONADA:
+            # O processo web desistiu de esperar e já calculou na requisição
+            return None
+        _estado_buscas[posicao] = time.time()
+
+    from Services.Logic.RouteIntelligenceService import RouteIntelligenceService
+
+    regras = parametros['regras']
+    data_inicio, data_limite = RouteIntelligenceService._janela_busca(parametros['data_inicio'], parametros['data_fim'], regras)
+    voos_db = _voos_da_versao(versao_malha, data_inicio, data_limite)
+    LogService.Info(
+        "RouteIntelligence",
+        f"Processo de cálculo: {len(voos_db)} voos entre {data_inicio} e {data_limite} (malha v{versao_malha})"
+    )
+    if not voos_db:
+        LogService.Warning("RouteIntelligence", "FALHA: Nenhum voo foi encontrado no banco de dados para as datas solicitadas!")
+        return RouteIntelligenceService._novo_resultado_bruto()
+
+    return RouteIntelligenceService.AnalisarEEncontrarRotas(
+        voos_db=voos_db,
+        data_inicio=parametros['data_inicio'],
+        lista_origens=parametros['lista_origens'],
+        lista_destinos=parametros['lista_destinos'],
+        peso_total=parametros['peso_total'],
+        tipo_carga=parametros['tipo_carga'],
+        servico_contratado=parametros['servico_contratado'],
+        regras=regras,
+    )
@@ -0,0 +1,98 @@
+import sys
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple
+
+from Services.TabelaFreteService import TabelaFreteService
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  REGISTRO COMPACTO DE VOO
+#  Substitui as instâncias ORM de VooMalha no caminho quente do roteamento.
+#  Tudo que a busca, o score e o custo precisam já vem normalizado na carga.
+# ─────────────────────────────────────────────────────────────────────────────
+
+def epoch_segundos(ordinal: int, hora: int, minuto: int, segundo: int) -> int:
+    """Segundos desde o dia ordinal 0 — inteiro comparável sem montar datetime."""
+    return ordinal * 86400 + hora * 3600 + minuto * 60 + segundo
+
+
+class VooRota(NamedTuple):
+    """
+    Voo imutável e leve usado por RouteGraphEngine e RouteIntelligenceService.
+
+    Os nomes de atributo espelham VooMalha para que o código de rota leia igual;
+    cia e IATAs já chegam em strip().upper() e internados, e partida/chegada já
+    resolvem a virada de dia (chegada antes da saída = dia seguinte).
+    """
+
+    Id:               int
+    CiaAerea:         str
+    CiaTarifaria:     str        # cia no formato de TabelaFreteService._NormalizarNomeCia
+    NumeroVoo:        str
+    AeroportoOrigem:  str
+    AeroportoDestino: str
+    DataPartida:      date
+    HorarioSaida:     time
+    HorarioChegada:   time
+    Partida:          datetime
+    Chegada:          datetime
+    EpochPartida:     int
+    EpochChegada:     int
+
+    @classmethod
+    def DeLinha(cls, linha, cache_cias: dict) -> 'VooRota':
+        """
+        Monta o registro a partir de uma linha (Id, CiaAerea, NumeroVoo, DataPartida,
+        AeroportoOrigem, HorarioSaida, HorarioChegada, AeroportoDestino).
+        cache_cias evita renormalizar a mesma cia a cada voo da carga.
+        """
+        cia_bruta = linha.CiaAerea
+        cias = cache_cias.get(cia_bruta)
+        if cias is None:
+            cia = sys.intern(str(cia_bruta or '').strip().upper())
+            cias = (cia, sys.intern(TabelaFreteService._NormalizarNomeCia(cia)))
+            cache_cias[cia_bruta] = cias
+
+        data_partida = linha.DataPartida.date() if isinstance(linha.DataPartida, datetime) else linha.DataPartida
+        saida = linha.HorarioSaida
+        chegada = linha.HorarioChegada
+
+        partida = datetime.combine(data_partida, saida)
+        dt_chegada = datetime.combine(data_partida, chegada)
+        epoch_partida = epoch_segundos(data_partida.toordinal(), saida.hour, saida.minute, saida.second)
+        epoch_chegada = epoch_segundos(data_partida.toordinal(), chegada.hour, chegada.minute, chegada.second)
+        if chegada < saida:
+            dt_chegada += timedelta(days=1)
+            epoch_chegada += 86400
+
+        return cls(
+            Id=linha.Id,
+            CiaAerea=cias[0],
+            CiaTarifaria=cias[1],
+            NumeroVoo=str(linha.NumeroVoo or '').strip(),
+            AeroportoOrigem=sys.intern(str(linha.AeroportoOrigem or '').strip().upper()),
+            AeroportoDestino=sys.intern(str(linha.AeroportoDestino or '').strip().upper()),
+            DataPartida=data_partida,
+            HorarioSaida=saida,
+            HorarioChegada=chegada,
+            Partida=partida,
+            Chegada=dt_chegada,
+            EpochPartida=epoch_partida,
+            EpochChegada=epoch_chegada,
+        )
+
+    def ParaExibicao(self) -> dict:
+        """Hidratação para a tela: só é chamada para os trechos das rotas retornadas."""
+        return {
+            'cia': self.CiaAerea,
+            'voo': self.NumeroVoo,
+            'data': self.DataPartida.strftime('%d/%m/%Y'),
+            'horario_saida': self.HorarioSaida.strftime('%H:%M'),
+            'horario_chegada': self.HorarioChegada.strftime('%H:%M'),
+        }
+
+
+def montar_voos_rota(linhas) -> list[VooRota]:
+    """Converte as linhas da consulta de malha em VooRota, compartilhando o cache de cias."""
+    cache_cias = {}
+    return [VooRota.DeLinha(linha, cache_cias) for linha in linhas]
@@ -1,11 +1,14 @@
 import networkx as nx
-from datetime import datetime, timedelta, time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time
 from typing import Optional
 
 from Conexoes import ObterSessaoSqlServer
 from Models.SQL_SERVER.Aeroporto import Aeroporto, RemessaAeroportos
 from Services.LogService import LogService
 from Services.Logic.RouteConfig import RouteSearchRules
+from Services.Logic.RouteFlight import epoch_segundos
+from Services.Shared.GeoService import CoordenadasAeroportosAtivos
 from Utils.Geometria import Haversine
 
 
@@ -15,6 +18,7 @@ class RouteGraphEngine:
 
     Responsável apenas por transformar a malha aérea em sequências válidas de voos.
     Não calcula score, não categoriza e não aplica ML.
+    Trabalha sobre registros VooRota (Services/Logic/RouteFlight.py), já normalizados.
     """
 
     @classmethod
@@ -62,7 +66,11 @@ class RouteGraphEngine:
 
     @staticmethod
     def CarregarCoordenadas() -> dict:
-        """Retorna {IATA: (lat, lon)} usando a remessa ativa de aeroportos."""
+        """Retorna {IATA: (lat, lon)} usando a remessa ativa de aeroportos (snapshot compartilhado, se houver)."""
+        coords = CoordenadasAeroportosAtivos()
+        if coords is not None:
+            return coords
+
         sessao = ObterSessaoSqlServer()
         try:
             rows = (
@@ -93,7 +101,7 @@ class RouteGraphEngine:
         if len(voos) < 2:
             return 1.0
 
-        iatas = [voos[0].AeroportoOrigem.upper()] + [v.AeroportoDestino.upper() for v in voos]
+        iatas = [voos[0].AeroportoOrigem] + [v.AeroportoDestino for v in voos]
         origem, destino = iatas[0], iatas[-1]
         if origem not in coords or destino not in coords:
             return 1.0
@@ -113,14 +121,17 @@ class RouteGraphEngine:
 
     @staticmethod
     def _construir_grafo(voos_db, scores_parceria: dict, regras: RouteSearchRules) -> nx.DiGraph:
+        """
+        Monta o grafo origem→destino. Cada aresta guarda os voos já ordenados por
+        partida, com arrays paralelos de partida/chegada (epoch em segundos) e cia,
+        para que as janelas de conexão sejam resolvidas por busca binária.
+        """
         grafo = nx.DiGraph()
         for voo in voos_db:
-            cia = str(voo.CiaAerea or '').strip().upper()
-            if scores_parceria.get(cia, regras.score_parceria_padrao) <= regras.score_parceria_minimo_elegivel:
+            if scores_parceria.get(voo.CiaAerea, regras.score_parceria_padrao) <= regras.score_parceria_minimo_elegivel:
                 continue
 
-            origem = str(voo.AeroportoOrigem or '').strip().upper()
-            destino = str(voo.AeroportoDestino or '').strip().upper()
+            origem, destino = voo.AeroportoOrigem, voo.AeroportoDestino
             if not origem or not destino:
                 continue
 
@@ -129,6 +140,13 @@ class RouteGraphEngine:
             else:
                 grafo.add_edge(origem, destino, voos=[voo])
 
+        for _, _, aresta in grafo.edges(data=True):
+            voos = sorted(aresta['voos'], key=lambda voo: voo.EpochPartida)
+            aresta['voos'] = voos
+            aresta['partidas'] = [voo.EpochPartida for voo in voos]
+            aresta['chegadas'] = [voo.EpochChegada for voo in voos]
+            aresta['cias'] = [voo.CiaAerea for voo in voos]
+
         return grafo
 
     @classmethod
@@ -138,26 +156,26 @@ class RouteGraphEngine:
         respeitando a janela mínima e máxima entre conexões.
         """
         inicio = data_inicio if isinstance(data_inicio, datetime) else datetime.combine(data_inicio, time.min)
+        inicio_epoch = epoch_segundos(inicio.toordinal(), inicio.hour, inicio.minute, inicio.second)
 
         origem_0, destino_0 = nos[0], nos[1]
         if not grafo.has_edge(origem_0, destino_0):
             return None
 
-        primeiros_voos = sorted(
-            [
-                voo for voo in grafo[origem_0][destino_0]['voos']
-                if datetime.combine(voo.DataPartida, voo.HorarioSaida) >= inicio
-            ],
-            key=lambda voo: (voo.DataPartida, voo.HorarioSaida),
-        )
+        aresta = grafo[origem_0][destino_0]
+        minimo = regras.min_horas_conexao * 3600
+        maximo = regras.max_horas_conexao * 3600
 
-        for primeiro_voo in primeiros_voos:
+        for idx in range(bisect_left(aresta['partidas'], inicio_epoch), len(aresta['partidas'])):
             resultado = cls._construir_cadeia_cronologica(
                 grafo,
                 nos,
-                [primeiro_voo],
+                [aresta['voos'][idx]],
                 trecho_idx=1,
-                regras=regras,
+                chegada_anterior=aresta['chegadas'][idx],
+                cia_anterior=aresta['cias'][idx],
+                minimo=minimo,
+                maximo=maximo,
             )
             if resultado is not None:
                 return resultado
@@ -171,7 +189,10 @@ class RouteGraphEngine:
         nos: list,
         voos_ate_agora: list,
         trecho_idx: int,
-        regras: RouteSearchRules,
+        chegada_anterior: int,
+        cia_anterior: str,
+        minimo: int,
+        maximo: int,
     ) -> Optional[list]:
         if trecho_idx == len(nos) - 1:
             return voos_ate_agora
@@ -181,33 +202,34 @@ class RouteGraphEngine:
         if not grafo.has_edge(origem, destino):
             return None
 
-        opcoes = sorted(grafo[origem][destino]['voos'], key=lambda voo: (voo.DataPartida, voo.HorarioSaida))
+        aresta = grafo[origem][destino]
+        partidas = aresta['partidas']
+        cias = aresta['cias']
+
+        # Janela [chegada + mínimo, chegada + máximo] resolvida por busca binária
+        ini = bisect_left(partidas, chegada_anterior + minimo)
+        fim = bisect_right(partidas, chegada_anterior + maximo)
+        if ini >= fim:
+            return None
 
-        cia_anterior = voos_ate_agora[-1].CiaAerea
-        opcoes = [voo for voo in opcoes if voo.CiaAerea == cia_anterior] + [
-            voo for voo in opcoes if voo.CiaAerea != cia_anterior
+        # Mesma cia primeiro, preservando a ordem de partida dentro de cada grupo
+        janela = range(ini, fim)
+        ordem = [idx for idx in janela if cias[idx] == cia_anterior] + [
+            idx for idx in janela if cias[idx] != cia_anterior
         ]
 
-        chegada_anterior = cls._chegada(voos_ate_agora[-1])
-        minimo = timedelta(hours=regras.min_horas_conexao)
-        maximo = timedelta(hours=regras.max_horas_conexao)
-
-        for voo in opcoes:
-            saida = datetime.combine(voo.DataPartida, voo.HorarioSaida)
-            if chegada_anterior + minimo <= saida <= chegada_anterior + maximo:
-                resultado = cls._construir_cadeia_cronologica(
-                    grafo,
-                    nos,
-                    voos_ate_agora + [voo],
-                    trecho_idx + 1,
-                    regras,
-                )
-                if resultado is not None:
-                    return resultado
+        for idx in ordem:
+            resultado = cls._construir_cadeia_cronologica(
+                grafo,
+                nos,
+                voos_ate_agora + [aresta['voos'][idx]],
+                trecho_idx + 1,
+                aresta['chegadas'][idx],
+                cias[idx],
+                minimo,
+                maximo,
+            )
+            if resultado is not None:
+                return resultado
 
         return None
-
-    @staticmethod
-    def _chegada(voo) -> datetime:
-        data_hora_chegada = datetime.combine(voo.DataPartida, voo.HorarioChegada)
-        return data_hora_chegada + timedelta(days=1) if voo.HorarioChegada < voo.HorarioSaida else data_hora_chegada
\ No newline at end of file
@@ -6,6 +6,7 @@ from Models.SQL_SERVER.Aeroporto import Aeroporto
 from Models.SQL_SERVER.MalhaAerea import RemessaMalha, VooMalha
 from Services.CiaAereaService import CiaAereaService
 from Services.LogService import LogService
+from Services.Logic.RouteComputePool import RouteComputePool
 from Services.Logic.RouteConfig import (
     ContextoRota,
     REGRAS_BUSCA_PADRAO,
@@ -14,8 +15,10 @@ from Services.Logic.RouteConfig import (
     normalizar_iatas,
     resolver_contexto,
 )
+from Services.Logic.RouteFlight import montar_voos_rota
 from Services.Logic.RouteGraphEngine import RouteGraphEngine
 from Services.Logic.RouteMLEngine import RouteMLEngine
+from Services.Shared.SnapshotMalhaService import SnapshotMalhaService
 from Services.TabelaFreteService import TabelaFreteService
 
 
@@ -70,21 +73,35 @@ class RouteIntelligenceService:
             LogService.Warning("RouteIntelligence", "=== BUSCA INTELIGENTE INICIADA ===")
             LogService.Info("RouteIntelligence", f"IATAs Buscados -> Origens: {origens} | Destinos: {destinos}")
 
-            voos_db = cls._buscar_voos_disponiveis(sessao, data_inicio, data_fim, REGRAS_BUSCA_PADRAO)
-            if not voos_db:
-                LogService.Warning("RouteIntelligence", "FALHA: Nenhum voo foi encontrado no banco de dados para as datas solicitadas!")
-                return resultados
-
-            opcoes_brutas = cls.AnalisarEEncontrarRotas(
-                voos_db=voos_db,
-                data_inicio=data_inicio,
-                lista_origens=origens,
-                lista_destinos=destinos,
-                peso_total=peso_total,
-                tipo_carga=tipo_carga,
-                servico_contratado=servico_contratado,
-                regras=REGRAS_BUSCA_PADRAO,
-            )
+            # Grafo/score/ML num processo do pool (não segura o GIL deste processo);
+            # None = pool desligado, cheio ou indisponível: calcula aqui mesmo
+            opcoes_brutas = RouteComputePool.Calcular(SnapshotMalhaService.Versao(), {
+                'data_inicio': data_inicio,
+                'data_fim': data_fim,
+                'lista_origens': origens,
+                'lista_destinos': destinos,
+                'peso_total': peso_total,
+                'tipo_carga': tipo_carga,
+                'servico_contratado': servico_contratado,
+                'regras': REGRAS_BUSCA_PADRAO,
+            })
+
+            if opcoes_brutas is None:
+                voos_db = cls._buscar_voos_disponiveis(sessao, data_inicio, data_fim, REGRAS_BUSCA_PADRAO)
+                if not voos_db:
+                    LogService.Warning("RouteIntelligence", "FALHA: Nenhum voo foi encontrado no banco de dados para as datas solicitadas!")
+                    return resultados
+
+                opcoes_brutas = cls.AnalisarEEncontrarRotas(
+                    voos_db=voos_db,
+                    data_inicio=data_inicio,
+                    lista_origens=origens,
+                    lista_destinos=destinos,
+                    peso_total=peso_total,
+                    tipo_carga=tipo_carga,
+                    servico_contratado=servico_contratado,
+                    regras=REGRAS_BUSCA_PADRAO,
+                )
 
             if ml_context and any(valor for valor in opcoes_brutas.values() if valor):
                 RouteMLEngine.RegistrarSessaoAnalise(
@@ -154,21 +171,41 @@ class RouteIntelligenceService:
     # -------------------------------------------------------------------------
 
     @staticmethod
-    def _buscar_voos_disponiveis(sessao, data_inicio, data_fim, regras: RouteSearchRules) -> list:
+    def _janela_busca(data_inicio, data_fim, regras: RouteSearchRules) -> tuple:
+        """(primeiro, último) dia de partida dos voos considerados na busca."""
         filtro_data_inicio = data_inicio.date() if isinstance(data_inicio, datetime) else data_inicio
         filtro_data_fim = data_fim.date() if isinstance(data_fim, datetime) else data_fim
-        data_limite = filtro_data_fim + timedelta(days=regras.dias_adicionais_busca)
-
-        voos_db = (
-            sessao.query(VooMalha)
-            .join(RemessaMalha)
-            .filter(
-                RemessaMalha.Ativo == True,
-                VooMalha.DataPartida >= filtro_data_inicio,
-                VooMalha.DataPartida <= data_limite,
+        return filtro_data_inicio, filtro_data_fim + timedelta(days=regras.dias_adicionais_busca)
+
+    @staticmethod
+    def _buscar_voos_disponiveis(sessao, data_inicio, data_fim, regras: RouteSearchRules) -> list:
+        filtro_data_inicio, data_limite = RouteIntelligenceService._janela_busca(data_inicio, data_fim, regras)
+
+        # Snapshot compartilhado da malha (mmap); sem ele, consulta direta.
+        # Consulta por colunas: as linhas não entram no identity map da sessão
+        # e viram VooRota compactos, já normalizados para o caminho quente.
+        linhas = SnapshotMalhaService.LinhasEntre(filtro_data_inicio, data_limite)
+        if linhas is None:
+            linhas = (
+                sessao.query(
+                    VooMalha.Id,
+                    VooMalha.CiaAerea,
+                    VooMalha.NumeroVoo,
+                    VooMalha.DataPartida,
+                    VooMalha.AeroportoOrigem,
+                    VooMalha.HorarioSaida,
+                    VooMalha.HorarioChegada,
+                    VooMalha.AeroportoDestino,
+                )
+                .join(RemessaMalha)
+                .filter(
+                    RemessaMalha.Ativo == True,
+                    VooMalha.DataPartida >= filtro_data_inicio,
+                    VooMalha.DataPartida <= data_limite,
+                )
+                .all()
             )
-            .all()
-        )
+        voos_db = montar_voos_rota(linhas)
 
         LogService.Info("RouteIntelligence", f"Buscando voos entre {filtro_data_inicio} e {data_limite}")
         LogService.Info("RouteIntelligence", f"Quantidade de voos totais resgatados da base: {len(voos_db)}")
@@ -186,34 +223,50 @@ class RouteIntelligenceService:
         cache_tarifas=None,
     ) -> list:
         candidatos = []
+        if not rotas:
+            return candidatos
 
-        for voos in rotas:
-            financeiro = cls.CalcularCustoRota(
-                voos,
-                peso_total,
-                servicos_alvo,
-                cache_tarifas=cache_tarifas,
-            )
+        # Com cache de tarifas o custo sai em lote (NumPy); os detalhes por trecho
+        # só viram dicts para os candidatos que chegarem à formatação.
+        lote = cls.CalcularCustoRotasEmLote(rotas, peso_total, servicos_alvo, cache_tarifas) \
+            if cache_tarifas is not None else None
+
+        for idx, voos in enumerate(rotas):
+            if lote is not None:
+                custo_total      = float(lote['custo_total'][idx])
+                sem_tarifa       = bool(lote['sem_tarifa'][idx])
+                servico_alinhado = float(lote['servico_alinhado'][idx])
+                detalhes         = None
+            else:
+                financeiro = cls.CalcularCustoRota(voos, peso_total, servicos_alvo)
+                custo_total      = financeiro['custo_total']
+                sem_tarifa       = financeiro['sem_tarifa']
+                servico_alinhado = float(cls._servico_alinhado(financeiro['detalhes'], servicos_alvo))
+                detalhes         = financeiro['detalhes']
 
             parceria_media = sum(
-                scores_parceria.get(str(voo.CiaAerea or '').strip().upper(), regras.score_parceria_padrao)
+                scores_parceria.get(voo.CiaAerea, regras.score_parceria_padrao)
                 for voo in voos
             ) / len(voos)
 
-            candidatos.append({
+            candidato = {
                 'rota': voos,
-                'detalhes_tarifas': financeiro['detalhes'],
+                'detalhes_tarifas': detalhes,
                 'metricas': {
                     'duracao': cls._duracao(voos),
-                    'custo': financeiro['custo_total'],
+                    'custo': custo_total,
                     'escalas': len(voos) - 1,
                     'trocas_cia': cls._trocas_cia(voos),
                     'indice_parceria': parceria_media,
-                    'sem_tarifa': financeiro['sem_tarifa'],
+                    'sem_tarifa': sem_tarifa,
+                    'servico_alinhado': servico_alinhado,
                     'fator_desvio': RouteGraphEngine.CalcularDesvio(voos, coords),
                     'score': 0.0,
                 },
-            })
+            }
+            if lote is not None:
+                candidato['_lote_custo'] = (lote, idx)
+            candidatos.append(candidato)
 
         return candidatos
 
@@ -296,16 +349,11 @@ class RouteIntelligenceService:
             custo_trecho = dados_frete.get('custo_calculado', 0.0)
 
             cia_tabela = dados_frete.get('cia_tarifaria')
-            cia_voo = str(voo.CiaAerea or '').strip()
-            cia_final = cia_tabela if cia_tabela else cia_voo
+            cia_final = cia_tabela if cia_tabela else voo.CiaAerea
 
             resultado.append({
                 'tipo_resultado': tipo,
-                'cia': cia_voo,
-                'voo': voo.NumeroVoo,
-                'data': voo.DataPartida.strftime('%d/%m/%Y'),
-                'horario_saida': voo.HorarioSaida.strftime('%H:%M'),
-                'horario_chegada': voo.HorarioChegada.strftime('%H:%M'),
+                **voo.ParaExibicao(),
                 'origem': {
                     'iata': voo.AeroportoOrigem,
                     'nome': origem.get('nome'),
@@ -370,14 +418,7 @@ class RouteIntelligenceService:
         parcerias = col('indice_parceria')  # score médio de parceria das CIAs (0–100)
         sem_tar   = col('sem_tarifa')       # 1 se algum trecho está sem tarifa cadastrada
         desvios   = col('fator_desvio')     # razão dist_percorrida / dist_direta (1.0 = ótimo)
-
-        # Verifica se o serviço do primeiro trecho bate com o serviço contratado
-        svcs_usados = [
-            str(c['detalhes_tarifas'][0].get('servico', '')).upper().strip()
-            if c.get('detalhes_tarifas') else ''
-            for c in candidatos
-        ]
-        alinhado = np.array([s in servicos_alvo for s in svcs_usados], dtype=float)
+        alinhado  = col('servico_alinhado') # 1 se o serviço do primeiro trecho bate com o contratado
 
         # ── 1. Penalidade de TEMPO ────────────────────────────────────────────
         # Cada minuto extra na rota adiciona peso_tempo ao score.
@@ -466,8 +507,8 @@ class RouteIntelligenceService:
                 'servico_alinhado':      alinhado[i],
             }
             rota_voos = c.get('rota', [])
-            aero_orig = rota_voos[0].AeroportoOrigem.strip().upper() if rota_voos else None
-            aero_dest = rota_voos[-1].AeroportoDestino.strip().upper() if rota_voos else None
+            aero_orig = rota_voos[0].AeroportoOrigem if rota_voos else None
+            aero_dest = rota_voos[-1].AeroportoDestino if rota_voos else None
 
             bonus                  = RouteMLEngine.PredizirBonus(features, aero_orig=aero_orig, aero_dest=aero_dest)
             scores[i]             += bonus
@@ -503,7 +544,8 @@ class RouteIntelligenceService:
                     f"ML: ajuste parcial ({ativos}/{len(candidatos)} candidatos) — vencedor sem cobertura ML, score base mantido")
         else:
             LogService.Debug("RouteIntelligence",
-                "ML: sem modelo treinado ou confiança insuficiente — ranking por score algorítmico puro")
+                "ML: sem modelo treinado ou confiança insuficiente — ranking por score algorítmico puro",
+                Chave='ml-sem-modelo')
 
         return candidatos
 
@@ -551,6 +593,12 @@ class RouteIntelligenceService:
         interline = [c for c in by_score if c['metricas']['trocas_cia'] > 0]
         resultado['interline'] = interline[0] if interline else None
 
+        # Só os candidatos escolhidos ganham o detalhamento por trecho em dict
+        for candidato in resultado.values():
+            if candidato and candidato.get('detalhes_tarifas') is None and '_lote_custo' in candidato:
+                lote, idx = candidato.pop('_lote_custo')
+                candidato['detalhes_tarifas'] = cls._detalhes_do_lote(lote, idx, len(candidato['rota']))
+
         n_cat = sum(1 for v in resultado.values() if v)
         LogService.Info("RouteIntelligence", f"Categorizacao: {n_cat}/6 categorias preenchidas.")
         return resultado
@@ -567,10 +615,7 @@ class RouteIntelligenceService:
 
         for voo in lista_voos:
             if cache_tarifas is not None:
-                cia_norm   = TabelaFreteService._NormalizarNomeCia(voo.CiaAerea)
-                orig       = str(voo.AeroportoOrigem or '').strip().upper()
-                dest       = str(voo.AeroportoDestino or '').strip().upper()
-                info_cache = cache_tarifas.get((cia_norm, orig, dest))
+                info_cache = cache_tarifas.get((voo.CiaTarifaria, voo.AeroportoOrigem, voo.AeroportoDestino))
                 if info_cache:
                     info  = dict(info_cache)  # cópia para não mutar o cache compartilhado
                     custo = info['tarifa_base'] * float(peso_total)
@@ -597,21 +642,109 @@ class RouteIntelligenceService:
 
         return {'custo_total': custo_total, 'detalhes': detalhes, 'sem_tarifa': sem_tarifa}
 
+    @staticmethod
+    def CalcularCustoRotasEmLote(rotas: list[list], peso_total, lista_servicos_alvo=None, cache_tarifas=None) -> dict:
+        """
+        Versão em lote de CalcularCustoRota para todos os candidatos de uma vez.
+
+        Cada trecho vira um índice inteiro na tabela de tarifas do cache
+        (-1 = sem tarifa, -2 = trecho inexistente na rota), e custo, sem_tarifa,
+        alinhamento de serviço e custo por trecho saem de operações NumPy.
+        Os valores batem com CalcularCustoRota trecho a trecho
+        (conferência: _Tests/test_CustoRotasEmLote.py).
+
+        Retorna:
+          {'custo_total': (n,), 'sem_tarifa': (n,), 'servico_alinhado': (n,),
+           'custos_trecho': (n, max_trechos), 'idx_tarifa': (n, max_trechos),
+           'tarifas': [info do cache por índice], 'peso': float}
+        """
+        cache_tarifas = cache_tarifas or {}
+        servicos_alvo = lista_servicos_alvo or []
+        peso          = float(peso_total)
+
+        n_rotas    = len(rotas)
+        max_trecho = max((len(voos) for voos in rotas), default=0)
+        idx_tarifa = np.full((n_rotas, max_trecho), -2, dtype=np.int32)
+
+        tarifas      = []   # infos do cache, na ordem do índice inteiro
+        idx_por_chave = {}  # (cia_tarifaria, origem, destino) → índice
+        idx_por_voo   = {}  # Id do voo → índice (evita remontar a chave a cada rota)
+
+        for i, voos in enumerate(rotas):
+            for j, voo in enumerate(voos):
+                k = idx_por_voo.get(voo.Id)
+                if k is None:
+                    chave = (voo.CiaTarifaria, voo.AeroportoOrigem, voo.AeroportoDestino)
+                    k = idx_por_chave.get(chave)
+                    if k is None:
+                        info = cache_tarifas.get(chave)
+                        if info:
+                            k = len(tarifas)
+                            tarifas.append(info)
+                        else:
+                            k = -1
+                        idx_por_chave[chave] = k
+                    idx_por_voo[voo.Id] = k
+                idx_tarifa[i, j] = k
+
+        # Posição extra no fim da tabela = valor neutro para sem tarifa / sem trecho
+        neutro       = len(tarifas)
+        base         = np.array([info['tarifa_base'] for info in tarifas] + [0.0], dtype=float)
+        alinhado_tab = np.array(
+            [str(info.get('servico', '')).upper().strip() in servicos_alvo for info in tarifas]
+            + ['' in servicos_alvo],
+            dtype=float,
+        )
+
+        gather        = np.where(idx_tarifa >= 0, idx_tarifa, neutro)
+        custos_trecho = base[gather] * peso
+        primeiro      = gather[:, 0] if max_trecho else np.full(n_rotas, neutro)
+
+        return {
+            'custo_total':      custos_trecho.sum(axis=1),
+            'sem_tarifa':       (idx_tarifa == -1).any(axis=1),
+            'servico_alinhado': alinhado_tab[primeiro],
+            'custos_trecho':    custos_trecho,
+            'idx_tarifa':       idx_tarifa,
+            'tarifas':          tarifas,
+            'peso':             peso,
+        }
+
+    @staticmethod
+    def _detalhes_do_lote(lote: dict, idx: int, n_trechos: int) -> list[dict]:
+        """Reconstrói a lista 'detalhes' de CalcularCustoRota para um candidato do lote."""
+        detalhes = []
+        peso     = lote['peso']
+        for j in range(n_trechos):
+            k = int(lote['idx_tarifa'][idx, j])
+            if k >= 0:
+                info = dict(lote['tarifas'][k])  # cópia para não mutar o cache compartilhado
+                info['peso_calculado']  = peso
+                info['custo_calculado'] = float(lote['custos_trecho'][idx, j])
+            else:
+                info = {
+                    'tarifa_missing':  True,
+                    'custo_calculado': 0.0,
+                    'peso_calculado':  peso,
+                }
+            detalhes.append(info)
+        return detalhes
+
+    @staticmethod
+    def _servico_alinhado(detalhes: list, servicos_alvo: list) -> bool:
+        servico = str(detalhes[0].get('servico', '')).upper().strip() if detalhes else ''
+        return servico in (servicos_alvo or [])
+
     # -------------------------------------------------------------------------
     # HELPERS DE DATA/HORA
     # -------------------------------------------------------------------------
 
-    @staticmethod
-    def _chegada(voo) -> datetime:
-        dt = datetime.combine(voo.DataPartida, voo.HorarioChegada)
-        return dt + timedelta(days=1) if voo.HorarioChegada < voo.HorarioSaida else dt
-
     @staticmethod
     def _duracao(voos: list) -> float:
         if not voos:
             return 0.0
-        inicio = datetime.combine(voos[0].DataPartida, voos[0].HorarioSaida)
-        fim    = RouteIntelligenceService._chegada(voos[-1])
+        inicio = voos[0].Partida
+        fim    = voos[-1].Chegada
         while fim < inicio:
             fim += timedelta(days=1)
         return (fim - inicio).total_seconds() / 60
@@ -23,24 +23,37 @@ COMO FUNCIONA — CICLO DE VIDA
 
     ANÁLISE   → RegistrarSessaoAnalise()
                              Chamado dentro de RouteIntelligenceService.BuscarOpcoesDeRotas().
-               Grava todas as rotas apresentadas + métricas de cada uma.
+               Enfileira todas as rotas apresentadas + métricas de cada uma e
+               retorna na hora. Uma thread gravadora agrupa várias sessões e
+               grava em INSERTs multi-linha (IdSessao via OUTPUT em lote).
                Banco: Tb_PLN_ML_SessaoAnalise + Tb_PLN_ML_CandidatoSessao
 
   ESCOLHA   → VincularPlanejamento()
-               Chamado quando o planejador SALVA um planejamento.
+               Chamado quando o planejador SALVA um planejamento; enfileira o
+               vínculo na mesma thread gravadora (depois das sessões já na fila)
+               e retorna na hora. Sessão gravada por outro processo do servidor
+               e ainda não visível no banco: nova tentativa em segundo plano.
                Marca qual categoria foi escolhida (FoiEscolhida = True).
                As demais ficam com FoiEscolhida = False (exemplos negativos).
                Dispara auto-treino em thread background se há amostras suficientes.
 
   TREINO    → Treinar() / _verificar_e_treinar_automatico()
-               Lê todo o histórico vinculado. Treina GradientBoostingClassifier.
-               Salva modelo em: Data/ML_Models/modelo_rotas.joblib
+               Sincroniza o feature store local (Data/Cache/ML/feature_store.npz)
+               lendo só as sessões vinculadas desde a última marca d'água.
+               Treino completo: grade de GradientBoosting/HistGradientBoosting
+               avaliada em validação cruzada paralela (joblib); promove o melhor
+               AUC cujo tempo para pontuar 100 candidatos cabe no orçamento.
+               Com poucas amostras novas, faz warm-start (mais árvores no ativo).
+               Salva modelo em: Data/ML_Models/modelo_rotas_v<IdModelo>.joblib
                Dispara automaticamente a cada novo vínculo (mín. MIN_AMOSTRAS).
 
   PREDIÇÃO  → PredizirBonus()
                Consultado para cada candidato em _calcular_scores().
                Retorna ±pontos de ajuste APENAS quando o modelo está confiante
                (|prob - 0.5| > CONFIANCA_MINIMA). Sem modelo treinado = 0 pontos.
+               Usa o BundleModelo em memória; a versão ativa é conferida no banco
+               em background (INTERVALO_VERIFICACAO_SEGUNDOS) e trocada de uma vez,
+               a partir de uma cópia local do arquivo (Data/Cache/ML/).
 
 RELAÇÃO COM O SCORE ALGORÍTMICO
 ────────────────────────────────
@@ -55,43 +68,110 @@ Treinar manualmente via script:
   print(RouteMLEngine.Status())
 """
 
+import atexit
+import copy
 import json
+import os
+import queue
+import shutil
 import threading
+import time
 import numpy as np
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import NamedTuple, Optional
 
 from Configuracoes import ConfiguracaoAtual
 from Services.LogService import LogService
+from Services.Shared.TarefaSegundoPlano import TarefaSegundoPlano
 
 try:
-    from sklearn.ensemble import GradientBoostingClassifier
+    from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
+    from sklearn.inspection import permutation_importance
+    from sklearn.metrics import roc_auc_score
     from sklearn.preprocessing import StandardScaler
-    from sklearn.model_selection import cross_val_score
+    from sklearn.model_selection import StratifiedKFold
     import joblib
     _ML_DISPONIVEL = True
 except ImportError:
     _ML_DISPONIVEL = False
 
 
+# Parâmetro que conta as árvores/iterações de cada algoritmo da grade
+# (é o que o warm-start incrementa).
+_PARAM_ARVORES = {
+    'GradientBoostingClassifier':     'n_estimators',
+    'HistGradientBoostingClassifier': 'max_iter',
+}
+
+
+def _instanciar_modelo(algoritmo: str, params: dict):
+    """Cria um estimador da grade. Fica fora da classe para ser enviado aos workers do joblib."""
+    classe = {
+        'GradientBoostingClassifier':     GradientBoostingClassifier,
+        'HistGradientBoostingClassifier': HistGradientBoostingClassifier,
+    }[algoritmo]
+    # Sem early stopping no Hist: o nº de iterações tem que ser o da grade (e do warm-start)
+    extras = {'early_stopping': False} if algoritmo == 'HistGradientBoostingClassifier' else {}
+    return classe(**{'random_state': 42, **extras, **params})
+
+
+def _auc_fold(algoritmo: str, params: dict, X: np.ndarray, y: np.ndarray, treino, teste) -> float:
+    """Treina uma configuração num fold e devolve o AUC do fold de validação."""
+    modelo = _instanciar_modelo(algoritmo, params)
+    modelo.fit(X[treino], y[treino])
+    return float(roc_auc_score(y[teste], modelo.predict_proba(X[teste])[:, 1]))
+
+
+def _auc_fold_warm(modelo_base, X: np.ndarray, y: np.ndarray, treino, teste) -> float:
+    """
+    Warm-start num fold: uma cópia do modelo a promover (ativo + INCREMENTO_ARVORES) recebe
+    as árvores novas só com o treino do fold e é pontuada na validação.
+    """
+    modelo = copy.deepcopy(modelo_base)
+    modelo.fit(X[treino], y[treino])
+    return float(roc_auc_score(y[teste], modelo.predict_proba(X[teste])[:, 1]))
+
+
+class BundleModelo(NamedTuple):
+    """
+    Versão do modelo em memória. Imutável: uma troca de versão cria um bundle
+    novo e o publica numa única atribuição, então quem leu cls._bundle usa
+    modelo, scaler e cobertura sempre da mesma versão.
+    """
+
+    IdModelo:              int
+    modelo:                object
+    scaler:                object
+    aeroportos_conhecidos: frozenset
+    importancias:          np.ndarray   # ordem de RouteMLEngine.FEATURES
+    total_amostras:        int
+
+
 class RouteMLEngine:
     """
     Motor de aprendizado para melhoria contínua das recomendações de rota.
-    Usa GradientBoostingClassifier treinado com o histórico de decisões dos planejadores.
+    Usa GradientBoosting (ou HistGradientBoosting, conforme a seleção de modelo)
+    treinado com o histórico de decisões dos planejadores.
 
     Armazenamento histórico: Tb_PLN_ML_SessaoAnalise + Tb_PLN_ML_CandidatoSessao (SQL Server)
-    Modelo binário:          Models/ML_Models/modelo_rotas.joblib (joblib)
+    Modelo binário:          Data/ML_Models/modelo_rotas_v<IdModelo>.joblib (share) + cópia em Data/Cache/ML/
     Versionamento de modelo: Tb_PLN_ML_ModeloVersao + Tb_PLN_ML_FeatureImportancia (SQL Server)
     """
 
     DIR_ML         = Path(ConfiguracaoAtual.DIR_MODELS)
-    CAMINHO_MODELO = DIR_ML / "modelo_rotas.joblib"
     MIN_AMOSTRAS   = 20
 
     # Garante que a pasta existe na inicialização
     DIR_ML.mkdir(parents=True, exist_ok=True)
 
+    # Feature store local: cópia compacta (NPZ) das amostras vinculadas, chaveada
+    # por IdCandidato. Cada treino só busca no banco o que foi vinculado depois
+    # da marca d'água (DataVinculo) e mescla com os arrays já em cache.
+    DIR_CACHE_ML     = Path(ConfiguracaoAtual.DIR_CACHE) / "ML"
+    CAMINHO_FEATURES = DIR_CACHE_ML / "feature_store.npz"
+    MAX_SESSOES_FALTANTES = 1000  # acima disso a sincronização relê o histórico inteiro
+
     # ─────────────────────────────────────────────────────────────────────────────
     # VETOR DE FEATURES — O que o modelo aprende e o que cada uma representa
     #
@@ -131,10 +211,22 @@ class RouteMLEngine:
         'servico_alinhado',
     ]
 
-    _modelo: Optional[object] = None
-    _scaler: Optional[object] = None
-    _aeroportos_conhecidos: Optional[set] = None
+    # Registro do modelo ativo: um único BundleModelo, trocado por atribuição.
+    # A versão ativa (Tb_PLN_ML_ModeloVersao.IsAtivo) é conferida no máximo a cada
+    # INTERVALO_VERIFICACAO_SEGUNDOS, numa thread própria; o arquivo da versão é
+    # copiado do share (DIR_MODELS) para DIR_CACHE/ML e carregado de lá. A
+    # predição só lê cls._bundle — nunca espera banco nem rede.
+    INTERVALO_VERIFICACAO_SEGUNDOS: int = ConfiguracaoAtual.ML_INTERVALO_VERIFICACAO_MODELO
+    COPIAS_LOCAIS_MANTIDAS: int = 2
+    # Cópia local aberta com mmap: os arrays das árvores ficam no cache de páginas do
+    # sistema, uma vez só para todos os processos do servidor (modo multiprocesso)
+    MMAP_MODELO: bool = ConfiguracaoAtual.ML_MODELO_MMAP
+    _bundle: Optional[BundleModelo] = None
+    _verificacao = TarefaSegundoPlano('ml-registro-modelo', INTERVALO_VERIFICACAO_SEGUNDOS)
+    _lock_registro = threading.Lock()  # serializa a troca de versão
+
     _treinando: bool = False  # flag para evitar treinamentos concorrentes
+    _lock_features = threading.Lock()
 
     # Limiar de confiança do modelo. O ajuste ML só é aplicado quando
     # |prob - 0.5| > CONFIANCA_MINIMA. Evita que sinais fracos (prob ≈ 0.5)
@@ -144,6 +236,42 @@ class RouteMLEngine:
     # Mínimo de novas amostras desde o último treino para disparar re-treino automático.
     DELTA_RETREINO_MIN: int = 10
 
+    # Seleção de modelo no treino completo: cada configuração da grade é avaliada
+    # em validação cruzada, com folds × configurações rodando em paralelo
+    # (N_JOBS_TREINO processos). Vence o melhor AUC que caiba no orçamento de
+    # inferência LATENCIA_MAX_MS_100 (ms para pontuar 100 candidatos).
+    GRADE_MODELOS: list[tuple[str, dict]] = [
+        ('GradientBoostingClassifier',     {'n_estimators': 100, 'max_depth': 3}),
+        ('GradientBoostingClassifier',     {'n_estimators': 200, 'max_depth': 2, 'learning_rate': 0.05}),
+        ('HistGradientBoostingClassifier', {'max_iter': 100, 'max_depth': 3}),
+        ('HistGradientBoostingClassifier', {'max_iter': 200, 'max_leaf_nodes': 15, 'learning_rate': 0.05}),
+    ]
+    LATENCIA_MAX_MS_100: float = ConfiguracaoAtual.ML_LATENCIA_MAX_MS_100
+    N_JOBS_TREINO: int = ConfiguracaoAtual.ML_TREINO_N_JOBS
+
+    # Warm-start: em vez de refazer o modelo, acrescenta INCREMENTO_ARVORES árvores
+    # ao modelo ativo. Volta ao treino completo quando o modelo passaria de
+    # MAX_ARVORES_WARM árvores ou quando as amostras novas passam de
+    # FRACAO_MAX_WARM do total usado no último treino.
+    INCREMENTO_ARVORES: int = 25
+    MAX_ARVORES_WARM: int = 300
+    FRACAO_MAX_WARM: float = 0.5
+
+    # Gravação assíncrona das sessões de análise (fora da thread da requisição).
+    # A gravadora junta até LOTE_MAX_SESSOES sessões que cheguem dentro de
+    # JANELA_LOTE_SEGUNDOS e grava tudo numa única transação.
+    LOTE_MAX_SESSOES: int = 50
+    JANELA_LOTE_SEGUNDOS: float = 0.5
+    # Vínculo sem sessão no banco (gravadora de outro processo ainda não gravou):
+    # nova tentativa a cada INTERVALO_VINCULO_SEGUNDOS * n, até TENTATIVAS_VINCULO vezes
+    TENTATIVAS_VINCULO: int = 4
+    INTERVALO_VINCULO_SEGUNDOS: float = 2.0
+    _fila_sessoes: queue.Queue = queue.Queue()   # itens {'sessao', 'candidatos'} ou {'vinculo'}
+    _gravador: Optional[threading.Thread] = None
+    _lock_gravador = threading.Lock()
+    _cond_pendentes = threading.Condition()
+    _sessoes_pendentes: int = 0
+
     # ─────────────────────────────────────────────────────────────────────────
     # PREDIÇÃO
     # ─────────────────────────────────────────────────────────────────────────
@@ -174,18 +302,19 @@ class RouteMLEngine:
         Retorna 0.0 se: modelo não treinado | aeroporto fora da cobertura | confiança baixa.
         Escala máxima do ajuste: ±13 pontos (sobre um score base típico de 5–130).
         """
-        if not cls._carregar_modelo():
+        bundle = cls._bundle_atual()
+        if bundle is None:
             return 0.0
 
         # Aeroportos que o modelo nunca viu durante o treinamento → sem base histórica
-        if cls._aeroportos_conhecidos and (aero_orig or aero_dest):
-            orig_ok = (not aero_orig) or (aero_orig in cls._aeroportos_conhecidos)
-            dest_ok = (not aero_dest) or (aero_dest in cls._aeroportos_conhecidos)
+        if bundle.aeroportos_conhecidos and (aero_orig or aero_dest):
+            orig_ok = (not aero_orig) or (aero_orig in bundle.aeroportos_conhecidos)
+            dest_ok = (not aero_dest) or (aero_dest in bundle.aeroportos_conhecidos)
             if not orig_ok or not dest_ok:
                 return 0.0
 
         X    = np.array([[features.get(f, 0) for f in cls.FEATURES]])
-        prob = cls._modelo.predict_proba(cls._scaler.transform(X))[0][1]
+        prob = bundle.modelo.predict_proba(bundle.scaler.transform(X))[0][1]
 
         # Só aplica o ajuste quando o modelo está suficientemente confiante
         confianca = abs(prob - 0.5)
@@ -220,17 +349,18 @@ class RouteMLEngine:
         Exemplo quando não aplicado:
           {'aplicado': False, 'motivo': 'confiança insuficiente (0.12 < 0.25)'}
         """
-        if not cls._carregar_modelo():
+        bundle = cls._bundle_atual()
+        if bundle is None:
             return {'aplicado': False, 'motivo': 'modelo não treinado'}
 
-        if cls._aeroportos_conhecidos and (aero_orig or aero_dest):
-            orig_ok = (not aero_orig) or (aero_orig in cls._aeroportos_conhecidos)
-            dest_ok = (not aero_dest) or (aero_dest in cls._aeroportos_conhecidos)
+        if bundle.aeroportos_conhecidos and (aero_orig or aero_dest):
+            orig_ok = (not aero_orig) or (aero_orig in bundle.aeroportos_conhecidos)
+            dest_ok = (not aero_dest) or (aero_dest in bundle.aeroportos_conhecidos)
             if not orig_ok or not dest_ok:
                 return {'aplicado': False, 'motivo': f'aeroporto fora da cobertura ({aero_orig}/{aero_dest})'}
 
         X         = np.array([[features.get(f, 0) for f in cls.FEATURES]])
-        prob      = cls._modelo.predict_proba(cls._scaler.transform(X))[0][1]
+        prob      = bundle.modelo.predict_proba(bundle.scaler.transform(X))[0][1]
         confianca = abs(prob - 0.5)
 
         if confianca < cls.CONFIANCA_MINIMA:
@@ -244,7 +374,7 @@ class RouteMLEngine:
         nivel  = 'muito alta' if confianca > 0.4 else ('alta' if confianca > 0.3 else 'moderada')
 
         # Identifica as features que mais influenciaram a decisão do modelo
-        importancias  = cls._modelo.feature_importances_
+        importancias  = bundle.importancias
         contribuicoes = sorted(
             zip(cls.FEATURES, importancias, [features.get(f, 0) for f in cls.FEATURES]),
             key=lambda x: -x[1],
@@ -277,19 +407,18 @@ class RouteMLEngine:
         tipo_carga: str,
         servico_contratado: str,
         usuario: str = '',
-    ) -> Optional[int]:
+    ) -> bool:
         """
-        Persiste a sessão de análise e cada candidato de rota no banco de dados.
+        Enfileira a sessão de análise e cada candidato de rota para gravação em background.
         Deve ser chamado com OpcoesBrutas (vindas de AnalisarEEncontrarRotas),
         antes da formatação visual — os candidatos ainda carregam '_ml_features',
         '_score_base' e '_bonus_ml'.
 
-        Retorna o IdSessao criado, ou None em caso de falha.
+        Só monta as linhas em memória; o INSERT acontece na thread gravadora
+        (_gravar_lote_sessoes). Retorna True se a sessão foi enfileirada.
         Nunca levanta exceção — o fluxo principal nunca deve ser bloqueado aqui.
         """
         try:
-            from Conexoes import ObterSessaoSqlServer
-            from Models.SQL_SERVER.MachineLearning import ML_SessaoAnalise, ML_CandidatoSessao
             from Services.Logic.RouteConfig import ContextoRota, REGRAS_BUSCA_PADRAO, resolver_contexto
 
             ctx = ContextoRota(tipo_carga, servico_contratado)
@@ -297,67 +426,148 @@ class RouteMLEngine:
 
             candidatos_validos = {k: v for k, v in opcoes_brutas.items() if v and '_ml_features' in v}
             if not candidatos_validos:
-                return None
+                return False
+
+            linha_sessao = {
+                # DataAnalise no momento da análise (não da gravação): VincularPlanejamento
+                # ordena por ela para achar a sessão mais recente do CTC.
+                'DataAnalise':          datetime.now(),
+                'Filial':               str(filial or ''),
+                'Serie':                str(serie or ''),
+                'Ctc':                  str(ctc or ''),
+                'TipoCarga':            str(tipo_carga or ''),
+                'ServicoContratado':    str(servico_contratado or ''),
+                'ContextoDescricao':    f"{ctx.tipo_carga}/{ctx.servico_contratado}",
+                'PesoTempo':            float(pesos.peso_tempo),
+                'PesoCusto':            float(pesos.peso_custo),
+                'TotalCandidatos':      len(candidatos_validos),
+                'CategoriaPreenchidas': len(candidatos_validos),
+                'UsuarioAnalise':       str(usuario or ''),
+            }
 
-            db = ObterSessaoSqlServer()
+            linhas_candidatos = []
+            for categoria, candidato in candidatos_validos.items():
+                f = candidato['_ml_features']
+                m = candidato.get('metricas', {})
+                rota_voos = candidato.get('rota', [])
+
+                linhas_candidatos.append({
+                    'Categoria':        str(categoria),
+                    'AeroportoOrigem':  rota_voos[0].AeroportoOrigem if rota_voos else None,
+                    'AeroportoDestino': rota_voos[-1].AeroportoDestino if rota_voos else None,
+                    'Duracao':          float(f.get('duracao', 0)),
+                    'Custo':            float(f.get('custo', 0)),
+                    'Escalas':          int(f.get('escalas', 0)),
+                    'TrocasCia':        int(f.get('trocas_cia', 0)),
+                    'IndiceParceria':   float(f.get('indice_parceria', REGRAS_BUSCA_PADRAO.score_parceria_padrao)),
+                    'SemTarifa':        bool(f.get('sem_tarifa', 0)),
+                    'EhPerecivel':      bool(f.get('eh_perecivel_expresso', 0)),
+                    'ServicoAlinhado':  bool(f.get('servico_alinhado', 0)),
+                    'ScoreBase':        float(candidato.get('_score_base', m.get('score', 0))),
+                    'BonusML':          float(candidato.get('_bonus_ml', 0)),
+                    'ScoreFinal':       float(m.get('score', 0)),
+                    'FoiEscolhida':     False,
+                })
+
+            with cls._cond_pendentes:
+                cls._sessoes_pendentes += 1
+            cls._fila_sessoes.put({'sessao': linha_sessao, 'candidatos': linhas_candidatos})
+            cls._garantir_gravador()
+            return True
+        except Exception as e:
+            LogService.FalhaSilenciosa("RouteIntelligence", "ML: RegistrarSessaoAnalise", e)
+            return False
+
+    @classmethod
+    def AguardarSessoesPendentes(cls, timeout: float = 5.0) -> bool:
+        """
+        Bloqueia até a fila deste processo (sessões e vínculos) ser gravada (ou até o timeout).
+        Retorna True se não restou nada pendente. Usado no encerramento do processo.
+        """
+        with cls._cond_pendentes:
+            return cls._cond_pendentes.wait_for(lambda: cls._sessoes_pendentes == 0, timeout=timeout)
+
+    @classmethod
+    def _garantir_gravador(cls) -> None:
+        if cls._gravador is not None and cls._gravador.is_alive():
+            return
+        with cls._lock_gravador:
+            if cls._gravador is not None and cls._gravador.is_alive():
+                return
+            if cls._gravador is None:
+                # No encerramento do processo, dá uma chance à fila de ser gravada
+                atexit.register(cls.AguardarSessoesPendentes, 10.0)
+            cls._gravador = threading.Thread(
+                target=cls._loop_gravador,
+                daemon=True,
+                name='ml-gravador-sessoes',
+            )
+            cls._gravador.start()
+
+    @classmethod
+    def _loop_gravador(cls) -> None:
+        """Thread daemon: agrupa as sessões enfileiradas e grava em lote."""
+        while True:
+            lote = [cls._fila_sessoes.get()]
+            limite = time.monotonic() + cls.JANELA_LOTE_SEGUNDOS
+            while len(lote) < cls.LOTE_MAX_SESSOES:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(cls._fila_sessoes.get(timeout=restante))
+                except queue.Empty:
+                    break
+
+            sessoes = [item for item in lote if 'sessao' in item]
+            vinculos = [item['vinculo'] for item in lote if 'vinculo' in item]
             try:
-                sessao = ML_SessaoAnalise(
-                    Filial=str(filial or ''),
-                    Serie=str(serie or ''),
-                    Ctc=str(ctc or ''),
-                    TipoCarga=str(tipo_carga or ''),
-                    ServicoContratado=str(servico_contratado or ''),
-                    ContextoDescricao=f"{ctx.tipo_carga}/{ctx.servico_contratado}",
-                    PesoTempo=float(pesos.peso_tempo),
-                    PesoCusto=float(pesos.peso_custo),
-                    TotalCandidatos=len(candidatos_validos),
-                    CategoriaPreenchidas=len(candidatos_validos),
-                    UsuarioAnalise=str(usuario or ''),
-                )
-                db.add(sessao)
-                db.flush()
-
-                for categoria, candidato in candidatos_validos.items():
-                    f = candidato['_ml_features']
-                    m = candidato.get('metricas', {})
-                    rota_voos = candidato.get('rota', [])
-                    aero_orig = rota_voos[0].AeroportoOrigem.strip().upper() if rota_voos else None
-                    aero_dest = rota_voos[-1].AeroportoDestino.strip().upper() if rota_voos else None
-
-                    db.add(ML_CandidatoSessao(
-                        IdSessao=sessao.IdSessao,
-                        Categoria=str(categoria),
-                        AeroportoOrigem=aero_orig,
-                        AeroportoDestino=aero_dest,
-                        Duracao=float(f.get('duracao', 0)),
-                        Custo=float(f.get('custo', 0)),
-                        Escalas=int(f.get('escalas', 0)),
-                        TrocasCia=int(f.get('trocas_cia', 0)),
-                        IndiceParceria=float(f.get('indice_parceria', REGRAS_BUSCA_PADRAO.score_parceria_padrao)),
-                        SemTarifa=bool(f.get('sem_tarifa', 0)),
-                        EhPerecivel=bool(f.get('eh_perecivel_expresso', 0)),
-                        ServicoAlinhado=bool(f.get('servico_alinhado', 0)),
-                        ScoreBase=float(candidato.get('_score_base', m.get('score', 0))),
-                        BonusML=float(candidato.get('_bonus_ml', 0)),
-                        ScoreFinal=float(m.get('score', 0)),
-                        FoiEscolhida=False,
-                    ))
+                if sessoes:
+                    cls._gravar_lote_sessoes(sessoes)
+            except Exception as e:
+                LogService.FalhaSilenciosa("RouteIntelligence", f"ML: gravação de {len(sessoes)} sessões de análise", e)
+            # Depois das sessões do lote: o vínculo enxerga a sessão enfileirada antes dele
+            for vinculo in vinculos:
+                cls._processar_vinculo(vinculo)
+            with cls._cond_pendentes:
+                cls._sessoes_pendentes -= len(lote)
+                cls._cond_pendentes.notify_all()
 
-                db.commit()
-                LogService.Debug(
-                    "RouteIntelligence",
-                    f"ML: sessão {sessao.IdSessao} registrada "
-                    f"({len(candidatos_validos)} candidatos | {filial}-{serie}-{ctc})"
-                )
-                return sessao.IdSessao
-            except Exception:
-                db.rollback()
-                raise
-            finally:
-                db.close()
-        except Exception as e:
-            LogService.Warning("RouteIntelligence", f"ML: RegistrarSessaoAnalise falhou silenciosamente: {e}")
-            return None
+    @classmethod
+    def _gravar_lote_sessoes(cls, lote: list[dict]) -> None:
+        """
+        Grava N sessões com um INSERT multi-linha que devolve os IdSessao na ordem
+        dos parâmetros (OUTPUT INSERTED em lote) e, em seguida, todos os candidatos
+        num segundo INSERT multi-linha. Uma transação para o lote inteiro.
+        """
+        from sqlalchemy import insert
+        from Conexoes import ObterSessaoSqlServer
+        from Models.SQL_SERVER.MachineLearning import ML_SessaoAnalise, ML_CandidatoSessao
+
+        db = ObterSessaoSqlServer()
+        try:
+            ids = db.execute(
+                insert(ML_SessaoAnalise).returning(ML_SessaoAnalise.IdSessao, sort_by_parameter_order=True),
+                [item['sessao'] for item in lote],
+            ).scalars().all()
+
+            candidatos = []
+            for id_sessao, item in zip(ids, lote):
+                for linha in item['candidatos']:
+                    candidatos.append({**linha, 'IdSessao': id_sessao})
+            if candidatos:
+                db.execute(insert(ML_CandidatoSessao), candidatos)
+
+            db.commit()
+            LogService.Debug(
+                "RouteIntelligence",
+                f"ML: {len(ids)} sessões gravadas em lote ({len(candidatos)} candidatos | ids {ids[0]}–{ids[-1]})"
+            )
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
 
     # ─────────────────────────────────────────────────────────────────────────
     # VINCULAÇÃO AO PLANEJAMENTO (chamado em salvarPlanejamento)
@@ -373,64 +583,117 @@ class RouteMLEngine:
         categoria_escolhida: str,
     ) -> None:
         """
-        Localiza a sessão mais recente ainda não vinculada para o CTC informado,
-        vincula-a ao planejamento salvo e marca a categoria escolhida (FoiEscolhida = True).
-        As demais categorias da sessão ficam com FoiEscolhida = False (label de treino negativo).
+        Enfileira o vínculo do planejamento salvo à sessão de análise mais recente do CTC
+        e retorna na hora (não segura a gravação do planejamento). A thread gravadora
+        aplica o vínculo depois das sessões que já estavam na fila (_processar_vinculo).
         Nunca levanta exceção.
         """
         try:
-            from Conexoes import ObterSessaoSqlServer
-            from Models.SQL_SERVER.MachineLearning import ML_SessaoAnalise
-
-            db = ObterSessaoSqlServer()
-            try:
-                sessao = (
-                    db.query(ML_SessaoAnalise)
-                    .filter(
-                        ML_SessaoAnalise.Filial == str(filial),
-                        ML_SessaoAnalise.Serie  == str(serie),
-                        ML_SessaoAnalise.Ctc    == str(ctc),
-                        ML_SessaoAnalise.IdPlanejamento == None,
-                    )
-                    .order_by(ML_SessaoAnalise.DataAnalise.desc())
-                    .first()
-                )
-                if not sessao:
-                    LogService.Warning(
-                        "RouteIntelligence",
-                        f"ML: nenhuma sessão não vinculada para {filial}-{serie}-{ctc}"
-                    )
-                    return
-
-                sessao.IdPlanejamento    = int(id_planejamento)
-                sessao.CategoriaEscolhida = str(categoria_escolhida or '')
-                sessao.DataVinculo       = datetime.now()
+            vinculo = {
+                'filial': str(filial),
+                'serie': str(serie),
+                'ctc': str(ctc),
+                'id_planejamento': int(id_planejamento),
+                'categoria_escolhida': str(categoria_escolhida or ''),
+                'tentativa': 1,
+            }
+            cls._enfileirar_vinculo(vinculo)
+        except Exception as e:
+            LogService.FalhaSilenciosa("RouteIntelligence", "ML: VincularPlanejamento", e)
 
-                for candidato in sessao.Candidatos:
-                    candidato.FoiEscolhida = (candidato.Categoria == categoria_escolhida)
+    @classmethod
+    def _enfileirar_vinculo(cls, vinculo: dict) -> None:
+        with cls._cond_pendentes:
+            cls._sessoes_pendentes += 1
+        cls._fila_sessoes.put({'vinculo': vinculo})
+        cls._garantir_gravador()
 
-                db.commit()
-                LogService.Debug(
-                    "RouteIntelligence",
-                    f"ML: sessão {sessao.IdSessao} → planejamento {id_planejamento} "
-                    f"(escolha: '{categoria_escolhida}')"
-                )
-            except Exception:
-                db.rollback()
-                raise
-            finally:
-                db.close()
+    @classmethod
+    def _processar_vinculo(cls, vinculo: dict) -> None:
+        """
+        Thread gravadora: aplica o vínculo. Sem sessão no banco, a análise pode ter sido
+        gravada por outro processo do servidor que ainda não gravou o lote: reenfileira
+        depois de INTERVALO_VINCULO_SEGUNDOS * tentativa, até TENTATIVAS_VINCULO vezes.
+        """
+        try:
+            vinculado = cls._vincular_sessao(**{k: v for k, v in vinculo.items() if k != 'tentativa'})
+        except Exception as e:
+            LogService.FalhaSilenciosa("RouteIntelligence", "ML: VincularPlanejamento", e)
+            return
 
-            # Dispara auto-treino em background sem bloquear o fluxo principal
+        if vinculado:
+            # Dispara auto-treino em background sem bloquear a gravadora
             threading.Thread(
                 target=cls._verificar_e_treinar_automatico,
                 args=('sistema',),
                 daemon=True,
                 name='ml-auto-treino',
             ).start()
+            return
 
-        except Exception as e:
-            LogService.Warning("RouteIntelligence", f"ML: VincularPlanejamento falhou silenciosamente: {e}")
+        rotulo = f"{vinculo['filial']}-{vinculo['serie']}-{vinculo['ctc']}"
+        if vinculo['tentativa'] >= cls.TENTATIVAS_VINCULO:
+            LogService.Warning("RouteIntelligence", f"ML: nenhuma sessão não vinculada para {rotulo}")
+            return
+        atraso = cls.INTERVALO_VINCULO_SEGUNDOS * vinculo['tentativa']
+        LogService.Debug("RouteIntelligence", f"ML: sessão de {rotulo} ainda não gravada; nova tentativa em {atraso:.0f} s")
+        proximo = threading.Timer(atraso, cls._enfileirar_vinculo, args=({**vinculo, 'tentativa': vinculo['tentativa'] + 1},))
+        proximo.daemon = True
+        proximo.start()
+
+    @classmethod
+    def _vincular_sessao(
+        cls,
+        filial: str,
+        serie: str,
+        ctc: str,
+        id_planejamento: int,
+        categoria_escolhida: str,
+    ) -> bool:
+        """
+        Localiza a sessão mais recente ainda não vinculada para o CTC informado,
+        vincula-a ao planejamento salvo e marca a categoria escolhida (FoiEscolhida = True).
+        As demais categorias da sessão ficam com FoiEscolhida = False (label de treino negativo).
+        Retorna False se não há sessão a vincular.
+        """
+        from Conexoes import ObterSessaoSqlServer
+        from Models.SQL_SERVER.MachineLearning import ML_SessaoAnalise
+
+        db = ObterSessaoSqlServer()
+        try:
+            sessao = (
+                db.query(ML_SessaoAnalise)
+                .filter(
+                    ML_SessaoAnalise.Filial == filial,
+                    ML_SessaoAnalise.Serie  == serie,
+                    ML_SessaoAnalise.Ctc    == ctc,
+                    ML_SessaoAnalise.IdPlanejamento == None,
+                )
+                .order_by(ML_SessaoAnalise.DataAnalise.desc())
+                .first()
+            )
+            if not sessao:
+                return False
+
+            sessao.IdPlanejamento    = id_planejamento
+            sessao.CategoriaEscolhida = categoria_escolhida
+            sessao.DataVinculo       = datetime.now()
+
+            for candidato in sessao.Candidatos:
+                candidato.FoiEscolhida = (candidato.Categoria == categoria_escolhida)
+
+            db.commit()
+            LogService.Debug(
+                "RouteIntelligence",
+                f"ML: sessão {sessao.IdSessao} → planejamento {id_planejamento} "
+                f"(escolha: '{categoria_escolhida}')"
+            )
+            return True
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
 
     # ─────────────────────────────────────────────────────────────────────────
     # DESVINCULAÇÃO (chamado em cancelarPlanejamento)
@@ -480,14 +743,25 @@ class RouteMLEngine:
     # ─────────────────────────────────────────────────────────────────────────
 
     @classmethod
-    def Treinar(cls, usuario: str = 'sistema') -> dict:
+    def Treinar(cls, usuario: str = 'sistema', completo: bool = False) -> dict:
         """
         Treina um novo modelo com o histórico acumulado no banco de dados.
         Persiste metadados em Tb_PLN_ML_ModeloVersao e importâncias em
         Tb_PLN_ML_FeatureImportancia. O binário .joblib é salvo em Data/ML/.
 
+        O dataset vem do feature store local (_sincronizar_feature_store), que só
+        lê do banco as amostras novas. Se houver modelo ativo e poucas amostras
+        novas, faz warm-start (mais árvores sobre o modelo atual); completo=True
+        força o treino do zero, que avalia toda a GRADE_MODELOS em paralelo.
+
+        Promoção: os candidatos são treinados em ordem de AUC e o primeiro cuja
+        latência para pontuar 100 candidatos fica dentro de LATENCIA_MAX_MS_100
+        vira o modelo ativo. Os reprovados ficam registrados com IsAtivo = 0.
+
         Retorna dict de diagnóstico:
-          {'status': 'ok', 'amostras': 42, 'auc_cv': 0.87, 'importancias': {...}}
+          {'status': 'ok', 'amostras': 42, 'auc_cv': 0.87, 'modo': 'completo',
+           'algoritmo': '...', 'latencia_100_ms': 8.1, 'importancias': {...}}
+          {'status': 'latencia_acima_do_orcamento', 'orcamento_ms': 50.0, 'avaliados': [...]}
           {'status': 'amostras_insuficientes', 'amostras': 8, 'necessario': 20}
           {'status': 'sklearn_indisponivel'}
         """
@@ -495,88 +769,146 @@ class RouteMLEngine:
             return {'status': 'sklearn_indisponivel — instale scikit-learn e joblib'}
 
         try:
-            registros = cls._ler_historico_db()
+            dados = cls._sincronizar_feature_store()
         except Exception as e:
             return {'status': f'erro_leitura_db: {e}'}
 
-        n = len(registros)
+        n = len(dados['y'])
         if n < cls.MIN_AMOSTRAS:
             return {'status': 'amostras_insuficientes', 'amostras': n, 'necessario': cls.MIN_AMOSTRAS}
 
-        X = np.array([[r.get(f, 0) for f in cls.FEATURES] for r in registros])
-        y = np.array([r['escolhida'] for r in registros])
-
-        scaler = StandardScaler()
-        X_s    = scaler.fit_transform(X)
+        X = dados['X']
+        y = dados['y']
+
+        # Folds estratificados: cada fold de validação precisa ter as duas classes
+        minoritaria = int(min(y.sum(), n - y.sum()))
+        if minoritaria < 2:
+            return {'status': 'classes_insuficientes', 'amostras': n, 'escolhidas': int(y.sum())}
+        cv_k  = max(2, min(5, n // 4, minoritaria))
+        folds = list(StratifiedKFold(n_splits=cv_k, shuffle=True, random_state=42).split(X, y))
+
+        base_warm = None if completo else cls._modelo_para_warm_start(n)
+        if base_warm:
+            modelo_warm, scaler = base_warm
+            modo  = 'warm_start'
+            grade = [(type(modelo_warm).__name__, modelo_warm.get_params())]
+        else:
+            modelo_warm, scaler = None, StandardScaler().fit(X)
+            modo  = 'completo'
+            grade = cls.GRADE_MODELOS
+        X_s = scaler.transform(X)
+
+        # Folds × configurações em paralelo — cada job treina e pontua um fold. No warm-start
+        # a CV avalia o próprio modelo que será promovido, não a configuração treinada do zero
+        if modelo_warm is not None:
+            jobs = (joblib.delayed(_auc_fold_warm)(modelo_warm, X_s, y, treino, teste) for treino, teste in folds)
+        else:
+            jobs = (
+                joblib.delayed(_auc_fold)(algoritmo, params, X_s, y, treino, teste)
+                for algoritmo, params in grade
+                for treino, teste in folds
+            )
+        aucs = joblib.Parallel(n_jobs=cls.N_JOBS_TREINO)(jobs)
+        ranking = sorted(
+            (
+                (float(np.mean(aucs[i * cv_k:(i + 1) * cv_k])), algoritmo, params)
+                for i, (algoritmo, params) in enumerate(grade)
+            ),
+            key=lambda c: -c[0],
+        )
+        if modo == 'completo':
+            resumo_cv = '; '.join(
+                f"{cls._descrever_config(algoritmo, params)}={auc:.3f}" for auc, algoritmo, params in ranking
+            )
+        else:
+            # As árvores antigas já viram parte das amostras de validação: AUC otimista
+            resumo_cv = (
+                f"warm-start +{cls.INCREMENTO_ARVORES} árvores={ranking[0][0]:.3f} "
+                f"(árvores do modelo ativo treinadas com parte da validação)"
+            )
 
-        modelo = GradientBoostingClassifier(n_estimators=100, max_depth=3, random_state=42)
-        modelo.fit(X_s, y)
+        # Treina no dataset completo em ordem de AUC até achar um dentro do orçamento
+        avaliados, promovido = [], None
+        for auc, algoritmo, params in ranking:
+            modelo = modelo_warm if modelo_warm is not None else _instanciar_modelo(algoritmo, params)
+            inicio = time.perf_counter()
+            modelo.fit(X_s, y)
+            tempo_treino_ms = (time.perf_counter() - inicio) * 1000
+            latencia_ms     = cls._medir_latencia_100(modelo, scaler, X)
+
+            candidato = {
+                'modelo':          modelo,
+                'algoritmo':       algoritmo,
+                'params':          {k: v for k, v in params.items() if k != 'warm_start'},
+                'auc':             auc,
+                'tempo_treino_ms': tempo_treino_ms,
+                'latencia_ms':     latencia_ms,
+            }
+            avaliados.append(candidato)
+            if latencia_ms <= cls.LATENCIA_MAX_MS_100:
+                promovido = candidato
+                break
+            rotulo = cls._descrever_config(algoritmo, params) if modo == 'completo' else f"{algoritmo} (warm-start)"
+            LogService.Warning(
+                "RouteIntelligence",
+                f"ML: {rotulo} reprovado — "
+                f"{latencia_ms:.1f} ms/100 candidatos > orçamento {cls.LATENCIA_MAX_MS_100:.1f} ms",
+            )
 
-        cv_k = min(5, n // 4)
-        auc  = float(cross_val_score(modelo, X_s, y, cv=cv_k, scoring='roc_auc').mean())
+        if promovido is None:
+            cls._persistir_versoes(avaliados, None, n, modo, usuario, None, None, resumo_cv)
+            return {
+                'status':       'latencia_acima_do_orcamento',
+                'amostras':     n,
+                'modo':         modo,
+                'orcamento_ms': cls.LATENCIA_MAX_MS_100,
+                'avaliados': [
+                    {'algoritmo': c['algoritmo'], 'auc_cv': round(c['auc'], 3), 'latencia_100_ms': round(c['latencia_ms'], 2)}
+                    for c in avaliados
+                ],
+            }
 
-        # Coleta os aeroportos vistos no treinamento para validação futura de inferência
-        aeroportos_conhecidos = set()
-        for r in registros:
-            if r.get('aero_orig'):
-                aeroportos_conhecidos.add(r['aero_orig'])
-            if r.get('aero_dest'):
-                aeroportos_conhecidos.add(r['aero_dest'])
+        modelo = promovido['modelo']
 
-        cls.DIR_ML.mkdir(parents=True, exist_ok=True)
-        caminho = str(cls.CAMINHO_MODELO)
-        joblib.dump({'modelo': modelo, 'scaler': scaler, 'aeroportos_conhecidos': aeroportos_conhecidos}, caminho)
-        cls._modelo, cls._scaler, cls._aeroportos_conhecidos = modelo, scaler, aeroportos_conhecidos
+        # Aeroportos vistos no treinamento, para validação futura de inferência
+        aeroportos_conhecidos = (set(dados['aero_orig'].tolist()) | set(dados['aero_dest'].tolist())) - {''}
+        vetor_importancias    = cls._calcular_importancias(modelo, X_s, y)
 
-        importancias = dict(zip(cls.FEATURES, modelo.feature_importances_.tolist()))
+        dados_bundle = {
+            'modelo': modelo,
+            'scaler': scaler,
+            'aeroportos_conhecidos': aeroportos_conhecidos,
+            'total_amostras': n,
+            'importancias': vetor_importancias,
+        }
+        importancias = dict(zip(cls.FEATURES, vetor_importancias.tolist()))
 
         # Loga os fatores mais decisivos para facilitar diagnóstico
         top3     = sorted(importancias.items(), key=lambda x: -x[1])[:3]
         top3_fmt = ', '.join(f"{k}={v:.1%}" for k, v in top3)
         LogService.Info("RouteIntelligence", f"ML: principais fatores do novo modelo: {top3_fmt}")
 
-        try:
-            from Conexoes import ObterSessaoSqlServer
-            from Models.SQL_SERVER.MachineLearning import ML_ModeloVersao, ML_FeatureImportancia
+        # O arquivo é publicado antes do commit que ativa a versão; sem registro
+        # no banco o modelo não é promovido (os outros processos não o veriam)
+        id_modelo = cls._persistir_versoes(avaliados, promovido, n, modo, usuario, importancias, dados_bundle, resumo_cv)
+        if id_modelo is None:
+            return {'status': 'erro_persistencia', 'amostras': n, 'modo': modo}
 
-            db = ObterSessaoSqlServer()
-            try:
-                db.query(ML_ModeloVersao).filter_by(IsAtivo=True).update({'IsAtivo': False})
-                versao = ML_ModeloVersao(
-                    TotalAmostras=n,
-                    AucCrossVal=round(auc, 4),
-                    IsAtivo=True,
-                    CaminhoArquivo=caminho,
-                    Algoritmo='GradientBoostingClassifier',
-                    ParametrosJson=json.dumps({'n_estimators': 100, 'max_depth': 3, 'random_state': 42}),
-                    UsuarioTreino=str(usuario),
-                )
-                db.add(versao)
-                db.flush()
-                for nome, imp in importancias.items():
-                    db.add(ML_FeatureImportancia(
-                        IdModelo=versao.IdModelo,
-                        NomeFeature=nome,
-                        Importancia=float(imp),
-                    ))
-                db.commit()
-                LogService.Info(
-                    "RouteIntelligence",
-                    f"ML: modelo v{versao.IdModelo} treinado | {n} amostras | AUC={auc:.3f}"
-                )
-            except Exception:
-                db.rollback()
-                raise
-            finally:
-                db.close()
-        except Exception as e:
-            LogService.Warning("RouteIntelligence", f"ML: falha ao persistir versão do modelo: {e}")
+        with cls._lock_registro:
+            cls._bundle = cls._montar_bundle(id_modelo, dados_bundle)
+            cls._limpar_copias_locais(id_modelo)
 
         return {
-            'status': 'ok',
-            'amostras': n,
-            'auc_cv': round(auc, 3),
-            'importancias': importancias,
+            'status':          'ok',
+            'id_modelo':       id_modelo,
+            'amostras':        n,
+            'auc_cv':          round(promovido['auc'], 3),
+            'modo':            modo,
+            'algoritmo':       promovido['algoritmo'],
+            'arvores':         cls._num_arvores(modelo),
+            'tempo_treino_ms': round(promovido['tempo_treino_ms'], 1),
+            'latencia_100_ms': round(promovido['latencia_ms'], 2),
+            'importancias':    importancias,
         }
 
     @classmethod
@@ -600,9 +932,11 @@ class RouteMLEngine:
                     .count()
                 )
                 modelo_ativo = db.query(ML_ModeloVersao).filter_by(IsAtivo=True).first()
+                bundle = cls._bundle
                 return {
                     'sklearn_disponivel': _ML_DISPONIVEL,
-                    'modelo_treinado':    cls.CAMINHO_MODELO.exists(),
+                    'modelo_treinado':    modelo_ativo is not None,
+                    'modelo_carregado':   bundle.IdModelo if bundle else None,
                     'sessoes_vinculadas': total_sessoes,
                     'amostras':           total_candidatos,
                     'faltam_para_treino': max(0, cls.MIN_AMOSTRAS - total_candidatos),
@@ -611,6 +945,8 @@ class RouteMLEngine:
                         'data':     str(modelo_ativo.DataTreino),
                         'auc':      modelo_ativo.AucCrossVal,
                         'amostras': modelo_ativo.TotalAmostras,
+                        'algoritmo':       modelo_ativo.Algoritmo,
+                        'latencia_100_ms': modelo_ativo.LatenciaPredicao100Ms,
                     } if modelo_ativo else None,
                 }
             finally:
@@ -618,7 +954,7 @@ class RouteMLEngine:
         except Exception as e:
             return {
                 'sklearn_disponivel': _ML_DISPONIVEL,
-                'modelo_treinado':    cls.CAMINHO_MODELO.exists(),
+                'modelo_treinado':    cls._bundle is not None,
                 'erro': str(e),
             }
 
@@ -643,20 +979,18 @@ class RouteMLEngine:
         try:
             cls._treinando = True
             from Conexoes import ObterSessaoSqlServer
-            from Models.SQL_SERVER.MachineLearning import ML_CandidatoSessao, ML_ModeloVersao, ML_SessaoAnalise
+            from Models.SQL_SERVER.MachineLearning import ML_ModeloVersao
+
+            # Contagem incremental: o feature store só lê do banco o que mudou
+            total = len(cls._sincronizar_feature_store()['y'])
 
             db = ObterSessaoSqlServer()
             try:
-                total = (
-                    db.query(ML_CandidatoSessao)
-                    .join(ML_SessaoAnalise, ML_CandidatoSessao.IdSessao == ML_SessaoAnalise.IdSessao)
-                    .filter(ML_SessaoAnalise.IdPlanejamento != None)
-                    .count()
-                )
                 if total < cls.MIN_AMOSTRAS:
                     LogService.Debug(
                         "RouteIntelligence",
                         f"ML auto-treino: {total}/{cls.MIN_AMOSTRAS} amostras — aguardando mais dados",
+                        Chave='auto-treino-aguardando',
                     )
                     return
 
@@ -679,6 +1013,7 @@ class RouteMLEngine:
                     LogService.Debug(
                         "RouteIntelligence",
                         f"ML auto-treino: +{novas}/{delta_min} novas amostras — re-treino ainda não necessário",
+                        Chave='auto-treino-aguardando',
                     )
                     return
             finally:
@@ -697,54 +1032,463 @@ class RouteMLEngine:
     # ─────────────────────────────────────────────────────────────────────────
 
     @classmethod
-    def _ler_historico_db(cls) -> list[dict]:
+    def _sincronizar_feature_store(cls) -> dict:
+        """
+        Traz o feature store local em dia com o banco e devolve o dataset completo:
+          {'ids', 'sessoes', 'X', 'y', 'aero_orig', 'aero_dest', 'watermark'}
+
+        Do banco só vêm (1) a lista de IdSessao vinculados hoje, usada para descartar
+        do cache as sessões desvinculadas ou apagadas, e (2) os candidatos das sessões
+        vinculadas que ainda não estão no cache ou que foram vinculadas de novo depois
+        da marca d'água de DataVinculo. Linhas relidas substituem as antigas pelo
+        IdCandidato (upsert).
+        """
+        with cls._lock_features:
+            store = cls._ler_feature_store()
+            novos, sessoes_vinculadas = cls._ler_historico_db(
+                desde=store['watermark'],
+                sessoes_em_cache=store['sessoes'],
+            )
+
+            manter = (
+                np.isin(store['sessoes'], np.fromiter(sessoes_vinculadas, dtype=np.int64))
+                & ~np.isin(store['ids'], novos['ids'])
+            )
+            for chave in ('ids', 'sessoes', 'X', 'y', 'aero_orig', 'aero_dest'):
+                store[chave] = np.concatenate([store[chave][manter], novos[chave]])
+            marcas = [m for m in (store['watermark'], novos['watermark']) if m is not None]
+            store['watermark'] = max(marcas) if marcas else None
+
+            if len(novos['ids']) or not manter.all():
+                cls._gravar_feature_store(store)
+                LogService.Debug(
+                    "RouteIntelligence",
+                    f"ML: feature store sincronizado (+{len(novos['ids'])} lidas, "
+                    f"-{int((~manter).sum())} descartadas, total {len(store['ids'])})"
+                )
+            return store
+
+    @classmethod
+    def _ler_feature_store(cls) -> dict:
+        vazio = {
+            'ids':       np.empty(0, dtype=np.int64),
+            'sessoes':   np.empty(0, dtype=np.int64),
+            'X':         np.empty((0, len(cls.FEATURES)), dtype=float),
+            'y':         np.empty(0, dtype=np.int8),
+            'aero_orig': np.empty(0, dtype='<U5'),
+            'aero_dest': np.empty(0, dtype='<U5'),
+            'watermark': None,
+        }
+        if not cls.CAMINHO_FEATURES.exists():
+            return vazio
+        try:
+            with np.load(cls.CAMINHO_FEATURES) as arq:
+                # Vetor de features mudou → o cache não serve, relê tudo
+                if arq['features'].tolist() != cls.FEATURES:
+                    return vazio
+                store = {chave: arq[chave] for chave in ('ids', 'sessoes', 'X', 'y', 'aero_orig', 'aero_dest')}
+                watermark = arq['watermark']
+                store['watermark'] = watermark.item() if watermark.size else None
+                return store
+        except Exception as e:
+            LogService.Warning("RouteIntelligence", f"ML: feature store ilegível, será reconstruído: {e}")
+            return vazio
+
+    @classmethod
+    def _gravar_feature_store(cls, store: dict) -> None:
+        cls.DIR_CACHE_ML.mkdir(parents=True, exist_ok=True)
+        temporario = cls.CAMINHO_FEATURES.with_suffix('.tmp.npz')
+        watermark = store['watermark']
+        np.savez(
+            temporario,
+            features=np.array(cls.FEATURES),
+            ids=store['ids'],
+            sessoes=store['sessoes'],
+            X=store['X'],
+            y=store['y'],
+            aero_orig=store['aero_orig'],
+            aero_dest=store['aero_dest'],
+            watermark=np.array([watermark], dtype='datetime64[us]') if watermark is not None
+            else np.empty(0, dtype='datetime64[us]'),
+        )
+        temporario.replace(cls.CAMINHO_FEATURES)
+
+    @classmethod
+    def _ler_historico_db(cls, desde: Optional[datetime] = None, sessoes_em_cache=None) -> tuple[dict, set]:
         """
-        Retorna todos os candidatos de sessões vinculadas a um planejamento.
-        Cada item: {feature: valor, ..., 'escolhida': 0/1}
+        Lê (por colunas, sem objetos ORM) os candidatos de sessões vinculadas que não
+        estão em sessoes_em_cache ou com DataVinculo > desde (revinculadas depois da
+        última sincronização) — ou todos, se desde=None. As que já estão no cache com o
+        vínculo até a marca d'água não são relidas.
+        Retorna (arrays no formato do feature store, IdSessao vinculados).
         """
+        from sqlalchemy import or_
         from Conexoes import ObterSessaoSqlServer
         from Models.SQL_SERVER.MachineLearning import ML_CandidatoSessao, ML_SessaoAnalise
         from Services.Logic.RouteConfig import REGRAS_BUSCA_PADRAO
 
+        C, S = ML_CandidatoSessao, ML_SessaoAnalise
         db = ObterSessaoSqlServer()
         try:
-            candidatos = (
-                db.query(ML_CandidatoSessao)
-                .join(ML_SessaoAnalise, ML_CandidatoSessao.IdSessao == ML_SessaoAnalise.IdSessao)
-                .filter(ML_SessaoAnalise.IdPlanejamento != None)
-                .all()
+            sessoes_vinculadas = {
+                id_sessao for (id_sessao,) in db.query(S.IdSessao).filter(S.IdPlanejamento != None)
+            }
+            em_cache = set(sessoes_em_cache.tolist()) if sessoes_em_cache is not None else set()
+            faltantes = sessoes_vinculadas - em_cache
+
+            consulta = (
+                db.query(
+                    C.IdCandidato, C.IdSessao,
+                    C.Duracao, C.Custo, C.Escalas, C.TrocasCia, C.IndiceParceria,
+                    C.SemTarifa, C.EhPerecivel, C.ServicoAlinhado, C.FoiEscolhida,
+                    C.AeroportoOrigem, C.AeroportoDestino, S.DataVinculo,
+                )
+                .join(S, C.IdSessao == S.IdSessao)
+                .filter(S.IdPlanejamento != None)
             )
-            return [
-                {
-                    'duracao':               float(c.Duracao or 0),
-                    'custo':                 float(c.Custo or 0),
-                    'escalas':               int(c.Escalas or 0),
-                    'trocas_cia':            int(c.TrocasCia or 0),
-                    'indice_parceria':       float(c.IndiceParceria or REGRAS_BUSCA_PADRAO.score_parceria_padrao),
-                    'sem_tarifa':            int(c.SemTarifa or 0),
-                    'eh_perecivel_expresso': int(c.EhPerecivel or 0),
-                    'servico_alinhado':      int(c.ServicoAlinhado or 0),
-                    'escolhida':             int(c.FoiEscolhida or 0),
-                    'aero_orig':             str(c.AeroportoOrigem or '').strip().upper() or None,
-                    'aero_dest':             str(c.AeroportoDestino or '').strip().upper() or None,
-                }
-                for c in candidatos
-            ]
+            # Muitas sessões faltando (cache novo/antigo demais) → leitura completa
+            if desde is not None and len(faltantes) <= cls.MAX_SESSOES_FALTANTES:
+                # Toda sessão do cache tem DataVinculo <= desde; as empatadas com a marca
+                # que ainda faltam entram por 'faltantes'
+                filtro = S.DataVinculo > desde
+                if faltantes:
+                    filtro = or_(filtro, S.IdSessao.in_(sorted(faltantes)))
+                consulta = consulta.filter(filtro)
+            linhas = consulta.all()
         finally:
             db.close()
 
+        padrao_parceria = REGRAS_BUSCA_PADRAO.score_parceria_padrao
+        # Mesma ordem de cls.FEATURES
+        X = np.array([
+            (
+                float(c.Duracao or 0),
+                float(c.Custo or 0),
+                int(c.Escalas or 0),
+                int(c.TrocasCia or 0),
+                float(c.IndiceParceria or padrao_parceria),
+                int(c.SemTarifa or 0),
+                int(c.EhPerecivel or 0),
+                int(c.ServicoAlinhado or 0),
+            )
+            for c in linhas
+        ], dtype=float).reshape(-1, len(cls.FEATURES))
+
+        vinculos = [c.DataVinculo for c in linhas if c.DataVinculo is not None]
+        novos = {
+            'ids':       np.array([c.IdCandidato for c in linhas], dtype=np.int64),
+            'sessoes':   np.array([c.IdSessao for c in linhas], dtype=np.int64),
+            'X':         X,
+            'y':         np.array([int(c.FoiEscolhida or 0) for c in linhas], dtype=np.int8),
+            'aero_orig': np.array([str(c.AeroportoOrigem or '').strip().upper() for c in linhas], dtype='<U5'),
+            'aero_dest': np.array([str(c.AeroportoDestino or '').strip().upper() for c in linhas], dtype='<U5'),
+            'watermark': max(vinculos) if vinculos else None,
+        }
+        return novos, sessoes_vinculadas
+
     @classmethod
-    def _carregar_modelo(cls) -> bool:
-        """Lazy-load: carrega do disco apenas na primeira predição."""
-        if cls._modelo is not None:
-            return True
-        if not _ML_DISPONIVEL or not cls.CAMINHO_MODELO.exists():
-            return False
+    def _modelo_para_warm_start(cls, total_amostras: int) -> Optional[tuple]:
+        """
+        Devolve (cópia do modelo ativo com mais árvores, scaler ativo) quando o
+        warm-start é aplicável, ou None para treinar do zero. A cópia evita
+        alterar o modelo que as threads de predição estão usando.
+        """
+        bundle = cls._bundle_atual(aguardar=True)
+        if bundle is None:
+            return None
+        param_arvores = _PARAM_ARVORES.get(type(bundle.modelo).__name__)
+        if param_arvores is None:
+            return None
+
+        anteriores = bundle.total_amostras
+        if anteriores <= 0 or (total_amostras - anteriores) > anteriores * cls.FRACAO_MAX_WARM:
+            return None
+
+        arvores = cls._num_arvores(bundle.modelo) + cls.INCREMENTO_ARVORES
+        if arvores > cls.MAX_ARVORES_WARM:
+            return None
+
+        modelo = copy.deepcopy(bundle.modelo)
+        modelo.set_params(warm_start=True, **{param_arvores: arvores})
+        return modelo, bundle.scaler
+
+    @staticmethod
+    def _num_arvores(modelo) -> int:
+        """Árvores (GradientBoosting) ou iterações (HistGradientBoosting) configuradas no modelo."""
+        return int(modelo.get_params()[_PARAM_ARVORES[type(modelo).__name__]])
+
+    @staticmethod
+    def _descrever_config(algoritmo: str, params: dict) -> str:
+        return f"{algoritmo}({', '.join(f'{k}={v}' for k, v in params.items())})"
+
+    @classmethod
+    def _medir_latencia_100(cls, modelo, scaler, X: np.ndarray, repeticoes: int = 3) -> float:
+        """
+        Milissegundos para pontuar 100 candidatos do jeito que PredizirBonus faz
+        (scaler + predict_proba, um candidato por chamada). Melhor de `repeticoes`
+        medições, para não punir o modelo por ruído da máquina.
+        """
+        amostra = X[np.arange(100) % len(X)]
+        melhor  = float('inf')
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            for linha in amostra:
+                modelo.predict_proba(scaler.transform(linha.reshape(1, -1)))
+            melhor = min(melhor, time.perf_counter() - inicio)
+        return melhor * 1000
+
+    @classmethod
+    def _calcular_importancias(cls, modelo, X_s: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        Importância por feature, na ordem de FEATURES. GradientBoosting expõe
+        feature_importances_; o HistGradientBoosting não, então usa importância por
+        permutação sobre o AUC (negativos zerados, normalizada para somar 1).
+        """
+        if hasattr(modelo, 'feature_importances_'):
+            return np.asarray(modelo.feature_importances_, dtype=float)
+
+        resultado = permutation_importance(
+            modelo, X_s, y, scoring='roc_auc', n_repeats=5, random_state=42, n_jobs=cls.N_JOBS_TREINO,
+        )
+        valores = np.clip(resultado.importances_mean, 0.0, None)
+        total   = valores.sum()
+        return valores / total if total > 0 else valores
+
+    @classmethod
+    def _persistir_versoes(
+        cls,
+        avaliados: list[dict],
+        promovido: Optional[dict],
+        total_amostras: int,
+        modo: str,
+        usuario: str,
+        importancias: Optional[dict],
+        dados_bundle: Optional[dict],
+        resumo_cv: Optional[str],
+    ) -> Optional[int]:
+        """
+        Grava uma linha em Tb_PLN_ML_ModeloVersao por candidato treinado. Só o
+        promovido fica IsAtivo (e recebe arquivo e importâncias); os reprovados
+        pelo orçamento de latência ficam como histórico.
+
+        Retorna o IdModelo promovido, ou None se nada foi promovido/gravado.
+        """
         try:
-            bundle = joblib.load(cls.CAMINHO_MODELO)
-            cls._modelo  = bundle['modelo']
-            cls._scaler  = bundle['scaler']
-            cls._aeroportos_conhecidos = bundle.get('aeroportos_conhecidos', set())
-            return True
-        except Exception:
-            return False
+            from Conexoes import ObterSessaoSqlServer
+            from Models.SQL_SERVER.MachineLearning import ML_ModeloVersao, ML_FeatureImportancia
+
+            db = ObterSessaoSqlServer()
+            try:
+                if promovido is not None:
+                    db.query(ML_ModeloVersao).filter_by(IsAtivo=True).update({'IsAtivo': False})
+
+                versao_ativa = None
+                for candidato in avaliados:
+                    ativo = candidato is promovido
+                    if ativo:
+                        observacao = f"Grade CV: {resumo_cv}" if resumo_cv else None
+                    else:
+                        observacao = (
+                            f"Não promovido: {candidato['latencia_ms']:.1f} ms/100 candidatos "
+                            f"> orçamento {cls.LATENCIA_MAX_MS_100:.1f} ms"
+                        )
+                    versao = ML_ModeloVersao(
+                        TotalAmostras=total_amostras,
+                        AucCrossVal=round(candidato['auc'], 4),
+                        TempoTreinoMs=round(candidato['tempo_treino_ms'], 1),
+                        LatenciaPredicao100Ms=round(candidato['latencia_ms'], 3),
+                        IsAtivo=ativo,
+                        Algoritmo=candidato['algoritmo'] + (' (warm-start)' if modo == 'warm_start' else ''),
+                        ParametrosJson=json.dumps(candidato['params'], default=str),
+                        UsuarioTreino=str(usuario),
+                        Observacoes=observacao,
+                    )
+                    db.add(versao)
+                    if ativo:
+                        versao_ativa = versao
+
+                if versao_ativa is not None:
+                    db.flush()
+                    versao_ativa.CaminhoArquivo = cls._publicar_arquivo(versao_ativa.IdModelo, dados_bundle)
+                    for nome, imp in (importancias or {}).items():
+                        db.add(ML_FeatureImportancia(
+                            IdModelo=versao_ativa.IdModelo,
+                            NomeFeature=nome,
+                            Importancia=float(imp),
+                        ))
+                db.commit()
+
+                if versao_ativa is not None:
+                    LogService.Info(
+                        "RouteIntelligence",
+                        f"ML: modelo v{versao_ativa.IdModelo} treinado ({modo}) | {versao_ativa.Algoritmo} | "
+                        f"{total_amostras} amostras | AUC={promovido['auc']:.3f} | "
+                        f"{promovido['latencia_ms']:.1f} ms/100 candidatos"
+                    )
+                    return versao_ativa.IdModelo
+                return None
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+        except Exception as e:
+            LogService.Warning("RouteIntelligence", f"ML: falha ao persistir versão do modelo: {e}")
+            return None
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # REGISTRO DO MODELO ATIVO (hot-swap)
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def _bundle_atual(cls, aguardar: bool = False) -> Optional[BundleModelo]:
+        """
+        Bundle em uso. Vencido o intervalo, agenda a conferência da versão ativa
+        em background e devolve o bundle atual sem esperar; aguardar=True (treino)
+        faz a conferência na própria thread.
+        """
+        if not _ML_DISPONIVEL:
+            return None
+        if cls._verificacao.Vencida():
+            if aguardar:
+                cls._atualizar_registro()
+            else:
+                cls._verificacao.Agendar(cls._atualizar_registro, antes=cls._partida_a_frio)
+        return cls._bundle
+
+    @classmethod
+    def _partida_a_frio(cls) -> None:
+        # A última cópia local (disco local, sem rede) serve até a verificação
+        # confirmar ou trocar a versão
+        if cls._bundle is None:
+            cls._carregar_copia_local()
+
+    @classmethod
+    def _atualizar_registro(cls) -> None:
+        """
+        Confere a versão IsAtivo no banco e, se mudou, copia o arquivo do share
+        para o cache local, carrega e publica o bundle novo. Sem versão ativa
+        (dados ML limpos), descarrega o modelo. Nunca levanta exceção.
+        """
+        with cls._lock_registro:
+            try:
+                from Conexoes import ObterSessaoSqlServer
+                from Models.SQL_SERVER.MachineLearning import ML_ModeloVersao
+
+                db = ObterSessaoSqlServer()
+                try:
+                    ativo = (
+                        db.query(ML_ModeloVersao.IdModelo, ML_ModeloVersao.CaminhoArquivo)
+                        .filter(ML_ModeloVersao.IsAtivo == True)
+                        .order_by(ML_ModeloVersao.IdModelo.desc())
+                        .first()
+                    )
+                finally:
+                    db.close()
+
+                atual = cls._bundle
+                if ativo is None:
+                    if atual is not None:
+                        cls._bundle = None
+                        LogService.Info("RouteIntelligence", f"ML: nenhuma versão ativa — modelo v{atual.IdModelo} descarregado")
+                    return
+                if atual is not None and atual.IdModelo == ativo.IdModelo:
+                    return
+
+                local = cls._caminho_local(ativo.IdModelo)
+                if not local.exists():
+                    origem = Path(ativo.CaminhoArquivo) if ativo.CaminhoArquivo else cls._caminho_share(ativo.IdModelo)
+                    cls._copiar_atomico(origem, local)
+
+                cls._bundle = cls._montar_bundle(ativo.IdModelo, cls._carregar_arquivo(local))
+                cls._limpar_copias_locais(ativo.IdModelo)
+                LogService.Info(
+                    "RouteIntelligence",
+                    f"ML: modelo v{ativo.IdModelo} em uso"
+                    + (f" (substitui v{atual.IdModelo})" if atual is not None else ""),
+                )
+            except Exception as e:
+                LogService.FalhaSilenciosa("RouteIntelligence", "ML: verificação da versão do modelo", e)
+            finally:
+                cls._verificacao.Adiar()
+
+    @classmethod
+    def _carregar_copia_local(cls) -> None:
+        copias = sorted(cls.DIR_CACHE_ML.glob('modelo_rotas_v*.joblib'), key=cls._versao_do_arquivo)
+        if not copias:
+            return
+        try:
+            cls._bundle = cls._montar_bundle(cls._versao_do_arquivo(copias[-1]), cls._carregar_arquivo(copias[-1]))
+        except Exception as e:
+            LogService.Warning("RouteIntelligence", f"ML: cópia local do modelo ilegível ({copias[-1].name}): {e}")
+
+    @classmethod
+    def _carregar_arquivo(cls, caminho: Path) -> dict:
+        return joblib.load(caminho, mmap_mode='r' if cls.MMAP_MODELO else None)
+
+    @classmethod
+    def _montar_bundle(cls, id_modelo: int, dados: dict) -> BundleModelo:
+        modelo = dados['modelo']
+        # Bundles anteriores à grade não guardam importâncias (eram sempre GradientBoosting)
+        importancias = dados.get('importancias')
+        if importancias is None:
+            importancias = getattr(modelo, 'feature_importances_', np.zeros(len(cls.FEATURES)))
+        return BundleModelo(
+            IdModelo=int(id_modelo),
+            modelo=modelo,
+            scaler=dados['scaler'],
+            aeroportos_conhecidos=frozenset(dados.get('aeroportos_conhecidos') or ()),
+            importancias=np.asarray(importancias, dtype=float),
+            total_amostras=int(dados.get('total_amostras', 0)),
+        )
+
+    @classmethod
+    def _publicar_arquivo(cls, id_modelo: int, dados: dict) -> str:
+        """Grava a versão no cache local e copia para o share. Retorna o caminho no share."""
+        local = cls._caminho_local(id_modelo)
+        cls.DIR_CACHE_ML.mkdir(parents=True, exist_ok=True)
+        temporario = local.with_suffix('.tmp')
+        joblib.dump(dados, temporario)
+        temporario.replace(local)
+
+        destino = cls._caminho_share(id_modelo)
+        cls.DIR_ML.mkdir(parents=True, exist_ok=True)
+        cls._copiar_atomico(local, destino)
+        return str(destino)
+
+    @classmethod
+    def _limpar_copias_locais(cls, id_em_uso: int) -> None:
+        """Mantém só as COPIAS_LOCAIS_MANTIDAS versões mais recentes no cache local."""
+        copias = sorted(cls.DIR_CACHE_ML.glob('modelo_rotas_v*.joblib'), key=cls._versao_do_arquivo)
+        for antiga in copias[:-cls.COPIAS_LOCAIS_MANTIDAS]:
+            if cls._versao_do_arquivo(antiga) != id_em_uso:
+                try:
+                    antiga.unlink(missing_ok=True)
+                except OSError:
+                    pass  # Windows: ainda mapeada por outro processo; sai na próxima troca
+
+    @staticmethod
+    def _copiar_atomico(origem: Path, destino: Path) -> None:
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        # Temporário por processo: vários processos do servidor podem copiar a mesma versão
+        temporario = destino.with_suffix(f'.{os.getpid()}.tmp')
+        shutil.copyfile(origem, temporario)
+        try:
+            temporario.replace(destino)
+        except OSError:
+            # Windows: outro processo já copiou e mapeou a versão — a cópia dele serve
+            temporario.unlink(missing_ok=True)
+            if not destino.exists():
+                raise
+
+    @classmethod
+    def _caminho_share(cls, id_modelo: int) -> Path:
+        return cls.DIR_ML / f"modelo_rotas_v{id_modelo}.joblib"
+
+    @classmethod
+    def _caminho_local(cls, id_modelo: int) -> Path:
+        return cls.DIR_CACHE_ML / f"modelo_rotas_v{id_modelo}.joblib"
+
+    @staticmethod
+    def _versao_do_arquivo(caminho: Path) -> int:
+        return int(caminho.stem.rsplit('_v', 1)[1])
@@ -4,7 +4,8 @@ import pandas as pd
 from datetime import datetime, timedelta, date, time
 from sqlalchemy import desc
 from Conexoes import ObterSessaoSqlServer
-from Utils.Formatadores import PadronizarData
+from Utils.Formatadores import PadronizarData, PadronizarDatasSerie, PadronizarHorasSerie, DescreverFalhas
+from Utils.Texto import ChaveSufixoVoo
 from Models.SQL_SERVER.Aeroporto import Aeroporto
 from Models.SQL_SERVER.MalhaAerea import RemessaMalha, VooMalha
 from Services.TabelaFreteService import TabelaFreteService
@@ -12,6 +13,8 @@ from Services.CiaAereaService import CiaAereaService
 from Services.LogService import LogService
 from Services.Logic.RouteIntelligenceService import RouteIntelligenceService
 from Services.Logic.RouteMLEngine import RouteMLEngine
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
+from Services.Shared.IndiceVoosMalhaService import IndiceVoosMalhaService
 from Configuracoes import ConfiguracaoBase
 
 class MalhaService:
@@ -39,6 +42,8 @@ class MalhaService:
                 Sessao.delete(RemessaAlvo)
                 Sessao.commit()
                 LogService.Info("MalhaService", f"Remessa ID {id_remessa} excluída com sucesso.")
+                IndiceVoosMalhaService.Reconstruir()
+                CacheCompartilhadoService.Invalidar('malha')
                 return True, "Remessa excluída com sucesso."
             
             LogService.Warning("MalhaService", f"Tentativa de excluir remessa inexistente ID {id_remessa}.")
@@ -111,7 +116,9 @@ class MalhaService:
             Df.columns = [c.strip().upper() for c in Df.columns]
             ColunaData = next((col for col in ['DIA', 'DATA'] if col in Df.columns), None)
             
-            Df['DATA_PADRAO'] = Df[ColunaData].apply(PadronizarData)
+            Df['DATA_PADRAO'], FalhasData = PadronizarDatasSerie(Df[ColunaData])
+            if FalhasData:
+                LogService.Warning("MalhaService", f"Datas não reconhecidas (linhas descartadas): {DescreverFalhas(FalhasData)}")
             Df = Df.dropna(subset=['DATA_PADRAO'])
 
             # Desativa remessa anterior
@@ -129,38 +136,54 @@ class MalhaService:
             Sessao.add(NovaRemessa)
             Sessao.flush()
 
-            ListaVoos = []
-            for _, Linha in Df.iterrows():
-                try:
-                    # Tratamento de Horário
-                    raw_saida = str(Linha.get('HORÁRIO DE SAIDA', ''))
-                    raw_chegada = str(Linha.get('HORÁRIO DE CHEGADA', ''))
-                    
-                    if len(raw_saida) == 5: raw_saida += ":00"
-                    if len(raw_chegada) == 5: raw_chegada += ":00"
+            def Coluna(Nome):
+                return Df[Nome].astype(str) if Nome in Df.columns else pd.Series('', index=Df.index)
 
-                    H_Saida = pd.to_datetime(raw_saida, format='%H:%M:%S', errors='coerce').time() if raw_saida != 'nan' else time(0,0)
-                    H_Chegada = pd.to_datetime(raw_chegada, format='%H:%M:%S', errors='coerce').time() if raw_chegada != 'nan' else time(0,0)
-                except:
-                    H_Saida = time(0,0)
-                    H_Chegada = time(0,0)
+            # Horários: uma passada vetorizada por coluna; vazio/inválido vira 00:00 como antes
+            HorariosSaida, FalhasSaida = PadronizarHorasSerie(Coluna('HORÁRIO DE SAIDA'))
+            HorariosChegada, FalhasChegada = PadronizarHorasSerie(Coluna('HORÁRIO DE CHEGADA'))
+            if FalhasSaida or FalhasChegada:
+                LogService.Warning(
+                    "MalhaService",
+                    f"Horários inválidos assumidos como 00:00 — saída: {DescreverFalhas(FalhasSaida) or '0'} | "
+                    f"chegada: {DescreverFalhas(FalhasChegada) or '0'}"
+                )
+            HorariosSaida = HorariosSaida.where(HorariosSaida.notna(), time(0, 0))
+            HorariosChegada = HorariosChegada.where(HorariosChegada.notna(), time(0, 0))
 
-                Voo = VooMalha(
-                    IdRemessa=NovaRemessa.Id,
-                    CiaAerea=str(Linha.get('CIA', '')),
-                    NumeroVoo=str(Linha.get('Nº VOO', '')),
-                    DataPartida=Linha['DATA_PADRAO'],
-                    AeroportoOrigem=str(Linha.get('ORIGEM', '')).strip().upper(),
-                    HorarioSaida=H_Saida,
-                    HorarioChegada=H_Chegada,
-                    AeroportoDestino=str(Linha.get('DESTINO', '')).strip().upper()
+            NumerosVoo = Coluna('Nº VOO')
+            ListaVoos = [
+                {
+                    'IdRemessa': NovaRemessa.Id,
+                    'CiaAerea': Cia,
+                    'NumeroVoo': NumeroVoo,
+                    'NumeroVooReverso': ChaveSufixoVoo(NumeroVoo),
+                    'DataPartida': DataPartida,
+                    'AeroportoOrigem': Origem,
+                    'HorarioSaida': HSaida,
+                    'HorarioChegada': HChegada,
+                    'AeroportoDestino': Destino,
+                }
+                for Cia, NumeroVoo, DataPartida, Origem, HSaida, HChegada, Destino in zip(
+                    Coluna('CIA'),
+                    NumerosVoo,
+                    Df['DATA_PADRAO'].dt.date,
+                    Coluna('ORIGEM').str.strip().str.upper(),
+                    HorariosSaida,
+                    HorariosChegada,
+                    Coluna('DESTINO').str.strip().str.upper(),
                 )
-                ListaVoos.append(Voo)
+            ]
 
-            Sessao.bulk_save_objects(ListaVoos)
+            Sessao.bulk_insert_mappings(VooMalha, ListaVoos)
             Sessao.commit()
             
             LogService.Info("MalhaService", f"Malha processada com sucesso. {len(ListaVoos)} voos importados.")
+
+            # Índice número do voo -> trechos usado pela timeline/modal do Acompanhamento
+            IndiceVoosMalhaService.Reconstruir()
+            # Snapshot da busca de rotas e índices dos outros processos do servidor
+            CacheCompartilhadoService.Invalidar('malha')
             
             if os.path.exists(caminho_arquivo):
                 os.remove(caminho_arquivo)
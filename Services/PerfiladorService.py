@@ -0,0 +1,420 @@
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+
+from flask import g, request
+from flask_login import current_user
+
+from Configuracoes import ConfiguracaoAtual
+from Services.LogService import LogService
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
+
+# O limite de duração intercepta _sampler_saw_call_stack, método privado em que o pyinstrument
+# recebe cada amostra (conferido na 4.6). Outra versão principal ou sem o método: fica o
+# amostrador interno, com um aviso no Configurar
+PYINSTRUMENT_VERSAO_TESTADA = '4.'
+_PYINSTRUMENT_AVISO = None
+try:
+    import pyinstrument
+    _PYINSTRUMENT_DISPONIVEL = (
+        getattr(pyinstrument, '__version__', '').startswith(PYINSTRUMENT_VERSAO_TESTADA)
+        and hasattr(pyinstrument.Profiler, '_sampler_saw_call_stack')
+    )
+    if not _PYINSTRUMENT_DISPONIVEL:
+        _PYINSTRUMENT_AVISO = (
+            f"pyinstrument {getattr(pyinstrument, '__version__', '?')} não tem o gancho de amostragem "
+            f"conferido na {PYINSTRUMENT_VERSAO_TESTADA}x (_sampler_saw_call_stack): perfis usam o "
+            f"amostrador interno, que respeita PROFILER_MAX_SECONDS."
+        )
+except ImportError:
+    _PYINSTRUMENT_DISPONIVEL = False
+
+
+if _PYINSTRUMENT_DISPONIVEL:
+    class _PyinstrumentLimitado(pyinstrument.Profiler):
+        """
+        pyinstrument que descarta as amostras depois de 'duracao_maxima' segundos. O gancho dele
+        só pode ser removido pela própria thread medida (stop() no fim da requisição); até lá
+        cada amostra vencida custa uma comparação e não cresce a sessão.
+        """
+
+        def __init__(self, intervalo, duracao_maxima):
+            super().__init__(interval=intervalo)
+            self.limite = time.monotonic() + duracao_maxima
+            self.truncado = False
+
+        def _sampler_saw_call_stack(self, *args, **kwargs):
+            if time.monotonic() > self.limite:
+                self.truncado = True
+                return
+            super()._sampler_saw_call_stack(*args, **kwargs)
+
+
+class _AmostradorPilha(threading.Thread):
+    """
+    Perfilador estatístico de uma thread: a cada 'intervalo' segundos lê a pilha dela
+    (sys._current_frames) e conta quantas vezes cada pilha apareceu. O custo é proporcional
+    à frequência de amostragem, não à quantidade de chamadas do código medido.
+    """
+
+    PROFUNDIDADE_MAXIMA = 200
+
+    def __init__(self, id_thread, intervalo, duracao_maxima):
+        super().__init__(daemon=True, name='perfilador-amostras')
+        self.id_thread = id_thread
+        self.intervalo = intervalo
+        self.duracao_maxima = duracao_maxima
+        self.pilhas = {}        # {(frame raiz, ..., frame folha): amostras}
+        self.amostras = 0
+        self.duracao_amostrada = 0.0
+        self.truncado = False
+        self._parar = threading.Event()
+
+    def run(self):
+        inicio = time.monotonic()
+        limite = inicio + self.duracao_maxima
+        while not self._parar.wait(self.intervalo):
+            if time.monotonic() >= limite:
+                self.truncado = True
+                break
+            frame = sys._current_frames().get(self.id_thread)
+            if frame is None:
+                break
+            pilha = []
+            while frame is not None and len(pilha) < self.PROFUNDIDADE_MAXIMA:
+                codigo = frame.f_code
+                pilha.append((codigo.co_filename, codigo.co_firstlineno, codigo.co_name))
+                frame = frame.f_back
+            pilha = tuple(reversed(pilha))
+            self.pilhas[pilha] = self.pilhas.get(pilha, 0) + 1
+            self.amostras += 1
+        # Com a thread medida segurando o GIL, o intervalo real passa do pedido: o tempo de cada
+        # amostra no relatório sai da duração efetiva
+        self.duracao_amostrada = time.monotonic() - inicio
+
+    def Parar(self):
+        self._parar.set()
+        self.join()
+
+
+class PerfiladorService:
+    """
+    Perfil de requisições em produção, sob demanda (/Configuracoes/Perfis).
+    Um administrador arma o perfilador para as próximas N requisições de um endpoint e/ou usuário;
+    cada uma é amostrada (pyinstrument, se instalado, ou o amostrador de pilha interno) e o
+    relatório vai para DIR_PERFIS. Sem alvo armado, o custo por requisição é uma comparação.
+
+    No modo multiprocesso o alvo fica em DIR_ALVO (alvo.json + uma "vaga" por requisição a
+    perfilar): armar/cancelar avisa os outros processos (CacheCompartilhadoService, sinal
+    'perfilador') e cada requisição perfilada apaga uma vaga — quem conseguir apagar perfila,
+    então são N requisições no total, não N por processo.
+    """
+
+    DIR_PERFIS: str = ConfiguracaoAtual.DIR_PERFIS
+    INTERVALO_SEGUNDOS: float = ConfiguracaoAtual.PERFILADOR_INTERVALO_MS / 1000
+    DURACAO_MAXIMA_SEGUNDOS: int = ConfiguracaoAtual.PERFILADOR_DURACAO_MAX_SEGUNDOS
+    VALIDADE_ALVO_MINUTOS: int = ConfiguracaoAtual.PERFILADOR_VALIDADE_MINUTOS
+    MAX_ARQUIVOS: int = ConfiguracaoAtual.PERFILADOR_MAX_ARQUIVOS
+    MAX_REQUISICOES: int = ConfiguracaoAtual.PERFILADOR_MAX_REQUISICOES
+    LINHAS_RELATORIO = 40
+    MULTIPROCESSO: bool = ConfiguracaoAtual.SERVIDOR_PROCESSOS > 1
+    DIR_ALVO: str = os.path.join(ConfiguracaoAtual.DIR_CACHE_COMPARTILHADO, '_perfilador')
+    NOME_SINAL = 'perfilador'
+
+    _alvo: dict = None        # {'Id', 'Endpoint', 'Usuario', 'Restantes', 'ExpiraEm', 'ArmadoPor'}
+    _lock_alvo = threading.Lock()
+
+    @classmethod
+    def Configurar(cls, app):
+        if _PYINSTRUMENT_AVISO:
+            LogService.Warning("PerfiladorService", _PYINSTRUMENT_AVISO)
+        app.before_request(cls._IniciarPerfil)
+        app.teardown_request(cls._FinalizarPerfil)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # ALVO
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def Armar(cls, endpoint, usuario, quantidade, armado_por=None):
+        """
+        Perfila as próximas 'quantidade' requisições que casarem com endpoint e usuário (vazio = qualquer).
+        'quantidade' fora de 1..MAX_REQUISICOES levanta ValueError: no modo multiprocesso cada
+        requisição é uma vaga e um arquivo em disco.
+        """
+        endpoint = (endpoint or '').strip() or None
+        usuario = (usuario or '').strip().upper() or None
+        quantidade = int(quantidade)
+        if not 1 <= quantidade <= cls.MAX_REQUISICOES:
+            raise ValueError(f"Quantidade de requisições deve estar entre 1 e {cls.MAX_REQUISICOES}.")
+        alvo = {
+            'Id': f"{time.time_ns():x}",
+            'Endpoint': endpoint,
+            'Usuario': usuario,
+            'Restantes': quantidade,
+            'ExpiraEm': time.time() + cls.VALIDADE_ALVO_MINUTOS * 60,
+            'ArmadoPor': armado_por,
+        }
+        with cls._lock_alvo:
+            if cls.MULTIPROCESSO:
+                cls._GravarAlvo(alvo)
+            cls._alvo = alvo
+        if cls.MULTIPROCESSO:
+            CacheCompartilhadoService.Invalidar(cls.NOME_SINAL)
+        LogService.Info(
+            "PerfiladorService",
+            f"Perfilador armado por {armado_por}: {quantidade} requisição(ões), "
+            f"endpoint={endpoint or '*'}, usuário={usuario or '*'}."
+        )
+
+    @classmethod
+    def Cancelar(cls):
+        with cls._lock_alvo:
+            cls._alvo = None
+            if cls.MULTIPROCESSO:
+                cls._GravarAlvo(None)
+        if cls.MULTIPROCESSO:
+            CacheCompartilhadoService.Invalidar(cls.NOME_SINAL)
+
+    @classmethod
+    def ObterAlvo(cls):
+        """Alvo armado (cópia) ou None se não há ou já expirou."""
+        if cls.MULTIPROCESSO:
+            cls._RecarregarAlvo()
+        with cls._lock_alvo:
+            if cls._alvo and cls._alvo['ExpiraEm'] < time.time():
+                cls._alvo = None
+            return dict(cls._alvo) if cls._alvo else None
+
+    # ── Alvo compartilhado (modo multiprocesso) ──
+
+    @classmethod
+    def _GravarAlvo(cls, alvo):
+        """Troca o alvo em disco: alvo.json e as vagas em DIR_ALVO/<Id>/ (None = desarmar)."""
+        os.makedirs(cls.DIR_ALVO, exist_ok=True)
+        for entrada in os.scandir(cls.DIR_ALVO):
+            if entrada.is_dir():
+                shutil.rmtree(entrada.path, ignore_errors=True)
+        caminho = os.path.join(cls.DIR_ALVO, 'alvo.json')
+        if alvo is None:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+            return
+        pasta_vagas = os.path.join(cls.DIR_ALVO, alvo['Id'])
+        os.makedirs(pasta_vagas, exist_ok=True)
+        for indice in range(alvo['Restantes']):
+            open(os.path.join(pasta_vagas, f"vaga-{indice}"), 'w').close()
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(alvo, arquivo)
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def _RecarregarAlvo(cls):
+        """Lê o alvo armado por qualquer processo (callback do sinal 'perfilador')."""
+        try:
+            with open(os.path.join(cls.DIR_ALVO, 'alvo.json'), encoding='utf-8') as arquivo:
+                alvo = json.load(arquivo)
+            alvo['Restantes'] = len(os.listdir(os.path.join(cls.DIR_ALVO, alvo['Id'])))
+        except (OSError, ValueError, KeyError):
+            alvo = None
+        with cls._lock_alvo:
+            cls._alvo = alvo if alvo and alvo['Restantes'] > 0 else None
+
+    @classmethod
+    def _ConsumirVaga(cls, alvo):
+        """Apaga uma vaga do alvo; False se outro processo já levou todas."""
+        pasta_vagas = os.path.join(cls.DIR_ALVO, alvo['Id'])
+        try:
+            vagas = os.listdir(pasta_vagas)
+        except OSError:
+            vagas = []
+        for vaga in vagas:
+            try:
+                os.remove(os.path.join(pasta_vagas, vaga))
+                return True
+            except OSError:
+                continue
+        return False
+
+    @staticmethod
+    def _Casa(valor_alvo, endpoint, path):
+        # Nome do endpoint (Planejamento.montarPlanejamento) ou prefixo do caminho (/Planejamento/Montar)
+        if valor_alvo.startswith('/'):
+            return path.startswith(valor_alvo)
+        return endpoint == valor_alvo
+
+    @staticmethod
+    def _UsuarioAtual():
+        try:
+            if current_user and current_user.is_authenticated:
+                return (getattr(current_user, 'Login', None) or current_user.get_id() or '').upper()
+        except Exception:
+            pass
+        return 'ANONIMO'
+
+    @classmethod
+    def _Reivindicar(cls):
+        """True se esta requisição deve ser perfilada (consome uma das N vagas)."""
+        if cls._alvo is None or request.endpoint == 'static':
+            return False
+        with cls._lock_alvo:
+            alvo = cls._alvo
+            if alvo is None:
+                return False
+            if alvo['ExpiraEm'] < time.time():
+                cls._alvo = None
+                return False
+            if alvo['Endpoint'] and not cls._Casa(alvo['Endpoint'], request.endpoint or '', request.path):
+                return False
+            if alvo['Usuario'] and cls._UsuarioAtual() != alvo['Usuario']:
+                return False
+            if cls.MULTIPROCESSO and not cls._ConsumirVaga(alvo):
+                cls._alvo = None
+                return False
+            alvo['Restantes'] -= 1
+            if alvo['Restantes'] <= 0:
+                cls._alvo = None
+            return True
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # REQUISIÇÃO
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def _IniciarPerfil(cls):
+        if not cls._Reivindicar():
+            return
+        try:
+            # Os dois caminhos param de amostrar em DURACAO_MAXIMA_SEGUNDOS (respostas em streaming
+            # só chegam ao teardown quando o cliente termina de ler)
+            if _PYINSTRUMENT_DISPONIVEL:
+                perfilador = _PyinstrumentLimitado(cls.INTERVALO_SEGUNDOS, cls.DURACAO_MAXIMA_SEGUNDOS)
+            else:
+                perfilador = _AmostradorPilha(threading.get_ident(), cls.INTERVALO_SEGUNDOS, cls.DURACAO_MAXIMA_SEGUNDOS)
+            perfilador.start()
+            g.perfil = (perfilador, time.perf_counter())
+        except Exception as e:
+            LogService.FalhaSilenciosa("PerfiladorService", "Início do perfil", e)
+
+    @classmethod
+    def _FinalizarPerfil(cls, erro=None):
+        perfil = g.pop('perfil', None)
+        if perfil is None:
+            return
+        perfilador, inicio = perfil
+        try:
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            endpoint = request.endpoint or request.path
+            usuario = cls._UsuarioAtual()
+            if _PYINSTRUMENT_DISPONIVEL:
+                perfilador.stop()
+                conteudo, extensao = perfilador.output_html(), 'html'
+            else:
+                perfilador.Parar()
+                conteudo, extensao = cls._MontarRelatorio(perfilador, endpoint, usuario, duracao_ms, erro), 'txt'
+
+            nome = cls._GravarPerfil(endpoint, usuario, duracao_ms, conteudo, extensao)
+            corte = f", amostrado só nos primeiros {cls.DURACAO_MAXIMA_SEGUNDOS} s" if perfilador.truncado else ""
+            LogService.Info("PerfiladorService", f"Perfil de {endpoint} ({usuario}, {duracao_ms:.0f} ms{corte}) gravado em {nome}.")
+        except Exception as e:
+            LogService.FalhaSilenciosa("PerfiladorService", "Gravação do perfil", e)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # RELATÓRIO
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _NomeFuncao(frame):
+        arquivo, linha, nome = frame
+        base = ConfiguracaoAtual.DIR_BASE
+        if arquivo.startswith(base):
+            arquivo = os.path.relpath(arquivo, base)
+        else:
+            arquivo = os.path.basename(arquivo)
+        return f"{nome} ({arquivo}:{linha})"
+
+    @classmethod
+    def _MontarRelatorio(cls, amostrador, endpoint, usuario, duracao_ms, erro):
+        """
+        Texto com: funções por tempo próprio (folha da pilha), funções por tempo acumulado
+        (aparecem em qualquer ponto da pilha) e as pilhas no formato 'collapsed'
+        (uma por linha, 'a;b;c amostras'), que flamegraph.pl e speedscope leem.
+        """
+        total = amostrador.amostras or 1
+        ms_por_amostra = amostrador.duracao_amostrada * 1000 / total if amostrador.amostras else 0.0
+        proprio, acumulado = {}, {}
+        for pilha, n in amostrador.pilhas.items():
+            proprio[pilha[-1]] = proprio.get(pilha[-1], 0) + n
+            for frame in set(pilha):
+                acumulado[frame] = acumulado.get(frame, 0) + n
+
+        def Tabela(contagem):
+            linhas = []
+            for frame, n in sorted(contagem.items(), key=lambda x: x[1], reverse=True)[:cls.LINHAS_RELATORIO]:
+                linhas.append(f"  {n / total * 100:6.1f}%  {n * ms_por_amostra:9.0f} ms  {cls._NomeFuncao(frame)}")
+            return linhas
+
+        linhas = [
+            f"Endpoint: {endpoint}",
+            f"Caminho:  {request.method} {request.full_path}",
+            f"Usuário:  {usuario}",
+            f"Data:     {datetime.now():%Y-%m-%d %H:%M:%S}",
+            f"Duração:  {duracao_ms:.0f} ms | {amostrador.amostras} amostras "
+            f"(a cada {ms_por_amostra:.1f} ms; pedido {cls.INTERVALO_SEGUNDOS * 1000:g} ms)",
+        ]
+        if amostrador.truncado:
+            linhas.append(f"Corte:    amostragem parou em {cls.DURACAO_MAXIMA_SEGUNDOS} s (PERFILADOR_DURACAO_MAX_SEGUNDOS)")
+        if erro is not None:
+            linhas.append(f"Erro:     {erro!r}")
+        linhas += ["", "== Tempo próprio ==", *Tabela(proprio), "", "== Tempo acumulado ==", *Tabela(acumulado),
+                   "", "== Pilhas (collapsed) =="]
+        for pilha, n in sorted(amostrador.pilhas.items(), key=lambda x: x[1], reverse=True):
+            linhas.append(f"{';'.join(cls._NomeFuncao(f) for f in pilha)} {n}")
+        return '\n'.join(linhas) + '\n'
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # ARQUIVOS
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def _GravarPerfil(cls, endpoint, usuario, duracao_ms, conteudo, extensao):
+        os.makedirs(cls.DIR_PERFIS, exist_ok=True)
+        seguro = lambda texto: re.sub(r'[^A-Za-z0-9_.-]+', '-', texto).strip('-')[:60]
+        nome = f"{datetime.now():%Y%m%d_%H%M%S_%f}_{seguro(endpoint)}_{seguro(usuario)}_{duracao_ms:.0f}ms.{extensao}"
+        with open(os.path.join(cls.DIR_PERFIS, nome), 'w', encoding='utf-8') as arquivo:
+            arquivo.write(conteudo)
+
+        # Retenção: só os MAX_ARQUIVOS mais recentes
+        for antigo in cls.ListarPerfis()[cls.MAX_ARQUIVOS:]:
+            try:
+                os.remove(os.path.join(cls.DIR_PERFIS, antigo['Nome']))
+            except OSError:
+                pass
+        return nome
+
+    @classmethod
+    def ListarPerfis(cls):
+        """[{'Nome', 'Tamanho', 'Data'}] dos perfis gravados, mais recentes primeiro."""
+        if not os.path.isdir(cls.DIR_PERFIS):
+            return []
+        perfis = []
+        for entrada in os.scandir(cls.DIR_PERFIS):
+            if entrada.is_file() and entrada.name.endswith(('.txt', '.html')):
+                info = entrada.stat()
+                perfis.append({
+                    'Nome': entrada.name,
+                    'Tamanho': info.st_size,
+                    'Data': datetime.fromtimestamp(info.st_mtime),
+                })
+        return sorted(perfis, key=lambda x: x['Nome'], reverse=True)
+
+
+CacheCompartilhadoService.AoInvalidar(PerfiladorService.NOME_SINAL, PerfiladorService._RecarregarAlvo)
@@ -1,15 +1,21 @@
+import hashlib
 import os
+import threading
 import unicodedata
 from functools import wraps
-from flask import request, jsonify
+from flask import has_request_context, request, jsonify, session
 import json
 from flask_login import current_user
+from sqlalchemy import BigInteger, case, cast, func
 
 # Importações específicas do Luft-ConnectAir
 from Conexoes import ObterSessaoSqlServer
+from Configuracoes import ConfiguracaoAtual
 from Models.SQL_SERVER.Permissoes import Tb_Permissao, Tb_PermissaoGrupo, Tb_PermissaoUsuario, Tb_LogAcesso
-from Models.SQL_SERVER.Usuario import Usuario as ModeloUsuario
+from Models.SQL_SERVER.Usuario import Usuario as ModeloUsuario, UsuarioGrupo
 from Services.LogService import LogService
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
+from Services.Shared.TarefaSegundoPlano import TarefaSegundoPlano
 
 # Framework Luftcore
 from luftcore.extensions.flask_extension import api_error, render_no_permission, render_403
@@ -18,13 +24,37 @@ SISTEMA_ID = int(os.getenv("SISTEMA_ID", 1)) # Garantindo que leia o ID ou caia
 DEBUG_PERMISSIONS = os.getenv("DEBUG_PERMISSIONS", "False").lower() == "true"
 
 class PermissaoService:
-    
+    """
+    Autorização por chave (MODULO.ACAO). O usuário logado carrega na sessão (cookie assinado
+    pelo Flask) o conjunto de Id_Permissao efetivos (grupo + exceções do usuário) e a versão
+    das permissões em que ele foi calculado. A checagem compara a versão com a atual e resolve
+    a chave pelo catálogo em memória: sem SQL enquanto nada mudar.
+
+    A versão é uma assinatura de Tb_Permissao, Tb_PermissaoGrupo, Tb_PermissaoUsuario e do grupo
+    de cada usuário; muda na hora quando a tela de segurança grava (Reconstruir) e, para mudanças
+    feitas por outro processo ou direto no ERP, é conferida em segundo plano a cada
+    INTERVALO_VERSAO_SEGUNDOS. Versão diferente = o conjunto do usuário é recalculado uma vez.
+    """
+
+    INTERVALO_VERSAO_SEGUNDOS: int = ConfiguracaoAtual.PERMISSOES_VERSAO_INTERVALO
+
+    _catalogo: dict = None        # {chave normalizada: Id_Permissao} do SISTEMA_ID
+    _assinatura: tuple = None
+    _versao: str = None
+    _agenda = TarefaSegundoPlano('versao-permissoes', INTERVALO_VERSAO_SEGUNDOS)
+    _lock_carga = threading.Lock()
+
     @staticmethod
     def _Normalizar(texto):
         if not texto: return ""
         return "".join(c for c in unicodedata.normalize('NFD', texto.upper().strip())
                        if unicodedata.category(c) != 'Mn')
 
+    @staticmethod
+    def _IdUsuario(Usuario):
+        # Pega o ID com fallback para garantir compatibilidade
+        return getattr(Usuario, 'Codigo_Usuario', getattr(Usuario, 'IdBanco', Usuario.get_id()))
+
     @staticmethod
     def VerificarPermissao(Usuario, ChavePermissao):
         if DEBUG_PERMISSIONS:
@@ -32,46 +62,159 @@ class PermissaoService:
             return True
 
         if not Usuario.is_authenticated: return False
-        
-        # Verifica se o usuário tem a role global de ADM (Adapte conforme a propriedade do usuário no ConnectAir)
-        if getattr(Usuario, 'Grupo', '') == 'ADM_SISTEMA': return True
 
-        Sessao = ObterSessaoSqlServer()
         try:
-            # Pega o ID com fallback para garantir compatibilidade
-            id_usuario_logado = getattr(Usuario, 'Codigo_Usuario', getattr(Usuario, 'IdBanco', Usuario.get_id()))
-            user_db = Sessao.query(ModeloUsuario).filter_by(Codigo_Usuario=id_usuario_logado).first()
-            
-            if not user_db: return False
+            # Atualiza grupo/conjunto antes da checagem de ADM: troca de grupo também muda a versão
+            catalogo = PermissaoService._ObterCatalogo()
+            permissoes = PermissaoService._PermissoesVigentes(Usuario) if catalogo is not None else None
 
-            id_grupo = user_db.codigo_usuariogrupo
-            chave_procurada = PermissaoService._Normalizar(ChavePermissao)
+            # Verifica se o usuário tem a role global de ADM (Adapte conforme a propriedade do usuário no ConnectAir)
+            if getattr(Usuario, 'Grupo', '') == 'ADM_SISTEMA': return True
 
-            todas_perms = Sessao.query(Tb_Permissao).filter_by(Id_Sistema=SISTEMA_ID).all()
-            permissao_encontrada = next((p for p in todas_perms if PermissaoService._Normalizar(p.Chave_Permissao) == chave_procurada), None)
-            
-            if not permissao_encontrada: return False
+            if catalogo is None or permissoes is None: return False
+            id_permissao = catalogo.get(PermissaoService._Normalizar(ChavePermissao))
+            return id_permissao is not None and id_permissao in permissoes
+
+        except Exception as e:
+            print(f"[ERRO] {str(e)}")
+            return False
 
-            tem_acesso = False
+    # ─────────────────────────────────────────────────────────────────────────
+    # PERMISSÕES DO USUÁRIO
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _PermissoesVigentes(Usuario):
+        """Conjunto de Id_Permissao do usuário; recalcula (e regrava na sessão) se a versão mudou."""
+        versao = PermissaoService._versao
+        permissoes = getattr(Usuario, 'Permissoes', None)
+        if permissoes is not None and (versao is None or getattr(Usuario, 'VersaoPermissoes', None) == versao):
+            return permissoes
+
+        if not PermissaoService.CarregarPermissoes(Usuario):
+            return None
+
+        if has_request_context():
+            dados_sessao = session.get('usuario_autenticado') or {}
+            if dados_sessao.get('Login') == getattr(Usuario, 'Login', None):
+                session['usuario_autenticado'] = Usuario.ParaSessao()
+        return Usuario.Permissoes
+
+    @staticmethod
+    def CarregarPermissoes(Usuario):
+        """
+        Calcula no banco o grupo atual e o conjunto de permissões efetivas do usuário
+        (grupo, com exceções Conceder/negar do usuário por cima) e grava em Usuario.
+        Retorna False se o usuário não existe ou a consulta falhou.
+        """
+        # Versão lida antes das consultas: se mudar no meio, a próxima checagem recalcula
+        PermissaoService._ObterCatalogo()
+        versao = PermissaoService._versao
+
+        Sessao = ObterSessaoSqlServer()
+        try:
+            id_usuario = PermissaoService._IdUsuario(Usuario)
+            linha = Sessao.query(ModeloUsuario.codigo_usuariogrupo, UsuarioGrupo.Sigla_UsuarioGrupo)\
+                .outerjoin(UsuarioGrupo, ModeloUsuario.codigo_usuariogrupo == UsuarioGrupo.codigo_usuariogrupo)\
+                .filter(ModeloUsuario.Codigo_Usuario == id_usuario)\
+                .first()
+            if not linha: return False
+
+            id_grupo, sigla_grupo = linha
+            permissoes = set()
             if id_grupo:
-                tem_acesso = Sessao.query(Tb_PermissaoGrupo).filter_by(
-                    Id_Permissao=permissao_encontrada.Id_Permissao,
-                    Codigo_UsuarioGrupo=id_grupo
-                ).count() > 0
+                permissoes.update(i for (i,) in Sessao.query(Tb_PermissaoGrupo.Id_Permissao)
+                                  .filter(Tb_PermissaoGrupo.Codigo_UsuarioGrupo == id_grupo))
 
-            override = Sessao.query(Tb_PermissaoUsuario).filter_by(
-                Id_Permissao=permissao_encontrada.Id_Permissao,
-                Codigo_Usuario=id_usuario_logado
-            ).first()
+            for id_permissao, conceder in Sessao.query(Tb_PermissaoUsuario.Id_Permissao, Tb_PermissaoUsuario.Conceder)\
+                    .filter(Tb_PermissaoUsuario.Codigo_Usuario == id_usuario):
+                if conceder:
+                    permissoes.add(id_permissao)
+                else:
+                    permissoes.discard(id_permissao)
 
-            return override.Conceder if override else tem_acesso
+            Usuario.Id_Grupo_Banco = id_grupo
+            if sigla_grupo: Usuario.Grupo = sigla_grupo
+            Usuario.Permissoes = frozenset(permissoes)
+            Usuario.VersaoPermissoes = versao
+            return True
 
         except Exception as e:
-            print(f"[ERRO] {str(e)}")
+            LogService.FalhaSilenciosa("PermissaoService", "Carga das permissões do usuário", e)
             return False
         finally:
             Sessao.close()
 
+    # ─────────────────────────────────────────────────────────────────────────
+    # CATÁLOGO E VERSÃO
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _ObterCatalogo():
+        if PermissaoService._catalogo is None:
+            with PermissaoService._lock_carga:
+                # Primeira carga é síncrona; depois de uma falha, só tenta de novo após o intervalo
+                if PermissaoService._catalogo is None and PermissaoService._agenda.Vencida():
+                    PermissaoService.Reconstruir()
+        else:
+            # Confere a versão em segundo plano, no máximo a cada INTERVALO_VERSAO_SEGUNDOS
+            PermissaoService._agenda.Agendar(PermissaoService._VerificarAssinatura)
+        return PermissaoService._catalogo
+
+    @staticmethod
+    def _Assinatura(Sessao):
+        """Muda quando permissões, vínculos de grupo/usuário ou o grupo de algum usuário mudam."""
+        permissoes = Sessao.query(func.count(Tb_Permissao.Id_Permissao), func.max(Tb_Permissao.Id_Permissao))\
+            .filter(Tb_Permissao.Id_Sistema == SISTEMA_ID).one()
+        grupos = Sessao.query(func.count(Tb_PermissaoGrupo.Id_Vinculo), func.max(Tb_PermissaoGrupo.Id_Vinculo)).one()
+        usuarios = Sessao.query(
+            func.count(Tb_PermissaoUsuario.Id_Vinculo), func.max(Tb_PermissaoUsuario.Id_Vinculo),
+            func.sum(case((Tb_PermissaoUsuario.Conceder == True, Tb_PermissaoUsuario.Id_Vinculo), else_=0))
+        ).one()
+        membros = Sessao.query(
+            func.sum(cast(ModeloUsuario.Codigo_Usuario, BigInteger) * func.coalesce(ModeloUsuario.codigo_usuariogrupo, 0))
+        ).scalar()
+        return tuple(permissoes) + tuple(grupos) + tuple(usuarios) + (membros,)
+
+    @staticmethod
+    def Reconstruir():
+        """
+        Recarrega o catálogo de chaves e a versão das permissões. Chamar depois de gravar
+        permissões/vínculos. Retorna False se falhou (catálogo e versão anteriores são mantidos).
+        """
+        Sessao = ObterSessaoSqlServer()
+        try:
+            assinatura = PermissaoService._Assinatura(Sessao)
+            catalogo = {}
+            for id_permissao, chave in Sessao.query(Tb_Permissao.Id_Permissao, Tb_Permissao.Chave_Permissao)\
+                    .filter(Tb_Permissao.Id_Sistema == SISTEMA_ID).order_by(Tb_Permissao.Id_Permissao):
+                catalogo.setdefault(PermissaoService._Normalizar(chave), id_permissao)
+
+            PermissaoService._catalogo = catalogo
+            PermissaoService._assinatura = assinatura
+            PermissaoService._versao = hashlib.blake2b(repr(assinatura).encode(), digest_size=8).hexdigest()
+            PermissaoService._agenda.Adiar()
+            return True
+        except Exception as e:
+            PermissaoService._agenda.Adiar()
+            LogService.FalhaSilenciosa("PermissaoService", "Recarga do catálogo de permissões", e)
+            return False
+        finally:
+            Sessao.close()
+
+    @staticmethod
+    def _VerificarAssinatura():
+        Sessao = ObterSessaoSqlServer()
+        try:
+            mudou = PermissaoService._Assinatura(Sessao) != PermissaoService._assinatura
+        except Exception as e:
+            LogService.FalhaSilenciosa("PermissaoService", "Verificação da versão das permissões", e)
+            return
+        finally:
+            Sessao.close()
+        if mudou:
+            PermissaoService.Reconstruir()
+
     @staticmethod
     def RegistrarLogAcesso(Usuario, Rota, Metodo, Ip, Chave, Permitido, Parametros=None, Retorno=None):
         Sessao = ObterSessaoSqlServer()
@@ -158,4 +301,8 @@ def RequerPermissao(Chave):
             return resposta
             
         return Wrapper
-    return Decorator
\ No newline at end of file
+    return Decorator
+
+
+# Permissões/vínculos gravados em outro processo do servidor (ConfiguracaoSeguranca)
+CacheCompartilhadoService.AoInvalidar('permissoes', PermissaoService.Reconstruir)
@@ -17,6 +17,9 @@ from Models.SQL_SERVER.ServicoCliente import ServicoCliente
 from Models.SQL_SERVER.Filial import Filial
 import re
 from Services.LogService import LogService 
+from Utils.Texto import NormalizarTexto
+from Services.Shared.AwbStatusAtualService import AwbStatusAtualService
+from Services.Shared.IndiceServicoClienteService import IndiceServicoClienteService
 
 class PlanejamentoService:
     """
@@ -405,10 +408,14 @@ class PlanejamentoService:
             if not SessaoPln:
                 return {'planejamentos_atualizados': 0, 'modo': 'indisponivel'}
 
+            # Lê o último status já materializado; a atualização incremental roda em segundo plano
+            # (carga inicial: Scripts/AtualizarStatusAwb.py --completo, ver V006)
+            AwbStatusAtualService.AgendarAtualizacao()
+
             collation_awbnota_ctc = PlanejamentoService._ObterCollationColuna(SessaoPln, 'intec', 'dbo', 'tb_airAWBnota', 'filialctc')
             collation_awbnota_serie = PlanejamentoService._ObterCollationColuna(SessaoPln, 'intec', 'dbo', 'tb_airAWBnota', 'serie')
             collation_awb_codawb = PlanejamentoService._ObterCollationColuna(SessaoPln, 'intec', 'dbo', 'tb_airAWB', 'codawb')
-            collation_status_codawb = PlanejamentoService._ObterCollationColuna(SessaoPln, 'intec', 'dbo', 'TB_AWB_STATUS', 'CODAWB')
+            collation_status_codawb = PlanejamentoService._ObterCollationColuna(SessaoPln, 'intec', 'dbo', 'Tb_PLN_AwbStatusAtual', 'CODAWB')
 
             expr_ctc_planejamento = "RIGHT(REPLICATE('0', 10) + LTRIM(RTRIM(ISNULL(pi.Ctc, ''))), 10)"
             expr_serie_planejamento = "LTRIM(RTRIM(ISNULL(pi.Serie, '')))"
@@ -448,14 +455,8 @@ class PlanejamentoService:
                     INNER JOIN intec.dbo.tb_airAWB a WITH (NOLOCK)
                         ON a.codawb = {expr_codawb_awbnota}
                        AND ISNULL(a.cancelado, '') <> 'S'
-                    OUTER APPLY (
-                        SELECT TOP 1
-                            s.STATUS_AWB,
-                            s.DATAHORA_STATUS
-                        FROM intec.dbo.TB_AWB_STATUS s WITH (NOLOCK)
-                        WHERE s.CODAWB = {expr_codawb_awb}
-                        ORDER BY s.DATAHORA_STATUS DESC, s.DATA_INSERT DESC
-                    ) ult
+                    LEFT JOIN intec.dbo.Tb_PLN_AwbStatusAtual ult WITH (NOLOCK)
+                        ON ult.CODAWB = {expr_codawb_awb}
                     WHERE pc.Status = 'Em Planejamento'
                 )
                 SELECT IdPlanejamento, NovoStatus
@@ -504,84 +505,170 @@ class PlanejamentoService:
             if SessaoPln:
                 SessaoPln.close()
 
+    # Blocos do painel: filtro SQL (sobre _QueryBase) e ordenação
+    FILTROS_BLOCOS = {
+        'DIARIO': ("""
+                AND c.motivodoc IN ('REE', 'ENT', 'NOR') 
+                AND c.data = :data_alvo
+            """, " ORDER BY c.data DESC, c.hora DESC"),
+        'REVERSA': ("""
+                AND c.motivodoc = 'DEV' 
+                AND rev.LiberadoPlanejamento = 1
+            """, " ORDER BY c.data DESC"),
+        'BACKLOG': ("""
+                AND c.motivodoc IN ('REE', 'ENT')
+                AND c.data < :data_hoje 
+                AND c.data >= :data_corte
+            """, " ORDER BY c.data ASC"),
+    }
+    DIAS_BACKLOG = 120
+
+    # Quadro colunar: coluna -> dicionário que a codifica (strings repetidas viram índice)
+    COLUNAS_DICIONARIO = {
+        'origem_dados': 'bloco', 'filial': 'filial', 'nomefilial': 'nome_filial', 'serie': 'serie',
+        'prioridade': 'prioridade', 'motivodoc': 'motivo', 'status_ctc': 'status_ctc',
+        'cidade_origem': 'cidade', 'uf_origem': 'uf', 'cidade_destino': 'cidade', 'uf_destino': 'uf',
+        'unid_lastmile': 'unidade', 'cliente_nome': 'cliente', 'remetente': 'cliente',
+        'destinatario': 'cliente', 'tipo_carga': 'tipo_carga', 'status_planejamento': 'status_planejamento',
+    }
+    # Colunas com o valor cru (data AAAAMMDD, hora HHMM, números sem formatação)
+    COLUNAS_VALOR = (
+        'ctc', 'data_emissao', 'hora_emissao', 'volumes', 'peso_fisico', 'peso_taxado',
+        'valor_mercadoria', 'frete_total', 'qtd_notas', 'id_planejamento', 'custo_planejado', 'tarifa_estimada',
+    )
+
     @staticmethod
-    def _SerializarResultados(ResultadoSQL, NomeBloco, MapaCache, CacheTarifas=None):
-        if CacheTarifas is None: CacheTarifas = {}
-        Lista = []
+    def _BuscarLinhasBloco(Sessao, NomeBloco):
+        Filtro, Ordem = PlanejamentoService.FILTROS_BLOCOS[NomeBloco]
+        Hoje = date.today()
+        Parametros = {
+            'data_alvo': Hoje,
+            'data_hoje': Hoje,
+            'data_corte': Hoje - timedelta(days=PlanejamentoService.DIAS_BACKLOG),
+        }
+        Query = text(PlanejamentoService._QueryBase + Filtro + Ordem)
+        return Sessao.execute(Query, {k: v for k, v in Parametros.items() if f":{k}" in Filtro}).fetchall()
+
+    @staticmethod
+    def _HoraEmissaoHHMM(HoraEmissao):
+        """'1430', '14:30', '9' ou time -> 1430. None se vazia ou ilegível."""
+        if HoraEmissao is None or HoraEmissao == '':
+            return None
+        if isinstance(HoraEmissao, time):
+            return HoraEmissao.hour * 100 + HoraEmissao.minute
+        h = str(HoraEmissao).strip()
+        try:
+            if ':' in h:
+                Partes = h.split(':')
+                return int(Partes[0]) * 100 + int(Partes[1] or 0)
+            if len(h) <= 2:
+                return int(h) * 100
+            return int(h[:-2]) * 100 + int(h[-2:])
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _CamposCtc(row, MapaCache, CacheTarifas):
+        """Valores crus de uma linha de _QueryBase (sem formatação), comuns às duas serializações."""
         def to_float(val): return float(val) if val else 0.0
         def to_int(val): return int(val) if val else 0
         def to_str(val): return str(val).strip() if val else ''
-        def fmt_moeda(val): return f"{to_float(val):,.2f}"
 
-        for row in ResultadoSQL:
-            data_emissao = row.DataEmissao.strftime('%d/%m/%Y') if row.DataEmissao else ''
-            
-            hora_fmt = '--:--'
-            if row.HoraEmissao:
-                h = str(row.HoraEmissao).strip()
-                if ':' not in h:
-                    if len(h) == 4: h = f"{h[:2]}:{h[2:]}"
-                    elif len(h) <= 2: h = f"{h.zfill(2)}:00"
-                hora_fmt = h
-
-            qtd_notas = to_int(row.QtdNotas)
-            if qtd_notas == 0 and to_int(row.Volumes) > 0:
-                qtd_notas = 1
-
-            chave = f"{to_str(row.Filial)}-{to_str(row.Serie)}-{to_str(row.CTC)}"
-            info = MapaCache.get(chave)
-            
-            is_dev = to_str(row.MotivoCTC) == 'DEV'
-            remetente_final = to_str(row.Destinatario) if is_dev else to_str(row.Remetente)
-            destinatario_final = to_str(row.Remetente) if is_dev else to_str(row.Destinatario)
-            cliente_nome = to_str(getattr(row, 'ClienteNome', '')) or remetente_final or destinatario_final
-            
+        qtd_notas = to_int(row.QtdNotas)
+        if qtd_notas == 0 and to_int(row.Volumes) > 0:
+            qtd_notas = 1
+
+        chave = f"{to_str(row.Filial)}-{to_str(row.Serie)}-{to_str(row.CTC)}"
+        info = MapaCache.get(chave)
+
+        is_dev = to_str(row.MotivoCTC) == 'DEV'
+        remetente_final = to_str(row.Destinatario) if is_dev else to_str(row.Remetente)
+        destinatario_final = to_str(row.Remetente) if is_dev else to_str(row.Destinatario)
+        cliente_nome = to_str(getattr(row, 'ClienteNome', '')) or remetente_final or destinatario_final
+
+        # --- NOVA LÓGICA DE PLANEJAMENTO VIRTUAL RÁPIDO ---
+        uf_orig = to_str(row.UFOrigem)
+        uf_dest = to_str(row.UFDestino)
+
+        # Pega o Aeroporto principal da UF (Se não achar, chuta GRU -> MAO como fallback)
+        iata_orig = PlanejamentoService.MAPA_UF_IATA.get(uf_orig, 'GRU')
+        iata_dest = PlanejamentoService.MAPA_UF_IATA.get(uf_dest, 'MAO')
+
+        # Pega o valor real do banco em memória. Se a rota não existir na tabela, usa R$ 5.50
+        tarifa_virtual = CacheTarifas.get(f"{iata_orig}-{iata_dest}", 5.50)
+        # --------------------------------------------------
+
+        return {
+            'filial': to_str(row.Filial),
+            'nomefilial': to_str(getattr(row, 'Filial_Nome', '')),
+            'ctc': to_str(row.CTC),
+            'serie': to_str(row.Serie),
+            'prioridade': to_str(row.Prioridade),
+            'motivodoc': to_str(row.MotivoCTC),
+            'status_ctc': to_str(row.StatusCTC),
+            'cidade_origem': to_str(row.CidadeOrigem),
+            'uf_origem': uf_orig,
+            'cidade_destino': to_str(row.CidadeDestino),
+            'uf_destino': uf_dest,
+            'unid_lastmile': to_str(row.UnidadeDestino),
+            'cliente_nome': cliente_nome,
+            'remetente': remetente_final,
+            'destinatario': destinatario_final,
+            'volumes': to_int(row.Volumes),
+            'peso_fisico': to_float(row.PesoFisico),
+            'peso_taxado': to_float(row.PesoTaxado),
+            'valor_mercadoria': to_float(row.Valor),
+            'frete_total': to_float(row.FreteTotal),
+            'qtd_notas': qtd_notas,
+            'tipo_carga': to_str(row.Tipo_carga),
+            'tem_planejamento': bool(info),
+            'status_planejamento': info['status'] if info else None,
+            'id_planejamento': info['id_plan'] if info else None,
+            'custo_planejado': info['custo_planejado'] if info else 0.0,
+            'tarifa_estimada': info['tarifa_rota'] if info and info.get('tarifa_rota', 0) > 0 else tarifa_virtual,
+        }
 
-            # --- NOVA LÓGICA DE PLANEJAMENTO VIRTUAL RÁPIDO ---
-            uf_orig = to_str(row.UFOrigem)
-            uf_dest = to_str(row.UFDestino)
-            
-            # Pega o Aeroporto principal da UF (Se não achar, chuta GRU -> MAO como fallback)
-            iata_orig = PlanejamentoService.MAPA_UF_IATA.get(uf_orig, 'GRU')
-            iata_dest = PlanejamentoService.MAPA_UF_IATA.get(uf_dest, 'MAO')
-            
-            chave_tarifa = f"{iata_orig}-{iata_dest}"
-            
-            # Pega o valor real do banco em memória. Se a rota não existir na tabela, usa R$ 5.50
-            tarifa_virtual = CacheTarifas.get(chave_tarifa, 5.50)
-            # --------------------------------------------------
+    @staticmethod
+    def _SerializarResultados(ResultadoSQL, NomeBloco, MapaCache, CacheTarifas=None):
+        """Uma linha por CTC como dict, já formatada (scripts de _DEV e integrações)."""
+        if CacheTarifas is None: CacheTarifas = {}
+        Lista = []
+
+        for row in ResultadoSQL:
+            c = PlanejamentoService._CamposCtc(row, MapaCache, CacheTarifas)
+            hhmm = PlanejamentoService._HoraEmissaoHHMM(row.HoraEmissao)
 
             Lista.append({
-                'id_unico': f"{to_str(row.Filial)}-{to_str(row.CTC)}",
+                'id_unico': f"{c['filial']}-{c['ctc']}",
                 'origem_dados': NomeBloco,
-                'filial': to_str(row.Filial),
-                'nomefilial': to_str(getattr(row, 'Filial_Nome', '')),
-                'ctc': to_str(row.CTC),
-                'serie': to_str(row.Serie),
-                'data_emissao': data_emissao,
-                'hora_emissao': hora_fmt,
-                'prioridade': to_str(row.Prioridade),
-                'motivodoc': to_str(row.MotivoCTC),
-                'status_ctc': to_str(row.StatusCTC),
-                'origem': f"{to_str(row.CidadeOrigem)}/{to_str(row.UFOrigem)}",
-                'destino': f"{to_str(row.CidadeDestino)}/{to_str(row.UFDestino)}",
-                'unid_lastmile': to_str(row.UnidadeDestino),
-                'cliente_nome': cliente_nome,
-                'remetente': remetente_final,
-                'destinatario': destinatario_final,
-                'volumes': to_int(row.Volumes),
-                'peso_fisico': to_float(row.PesoFisico),
-                'peso_taxado': to_float(row.PesoTaxado),
-                'val_mercadoria': fmt_moeda(row.Valor),
-                'raw_val_mercadoria': to_float(row.Valor),
-                'raw_frete_total': to_float(row.FreteTotal),
-                'qtd_notas': qtd_notas,
-                'tipo_carga': to_str(row.Tipo_carga),
-                'tem_planejamento': bool(info),
-                'status_planejamento': info['status'] if info else None,
-                'id_planejamento': info['id_plan'] if info else None,
-                'custo_planejado': info['custo_planejado'] if info else 0.0,
-                'tarifa_estimada': info['tarifa_rota'] if info and info.get('tarifa_rota', 0) > 0 else tarifa_virtual,
+                'filial': c['filial'],
+                'nomefilial': c['nomefilial'],
+                'ctc': c['ctc'],
+                'serie': c['serie'],
+                'data_emissao': row.DataEmissao.strftime('%d/%m/%Y') if row.DataEmissao else '',
+                'hora_emissao': f"{hhmm // 100:02d}:{hhmm % 100:02d}" if hhmm is not None else '--:--',
+                'prioridade': c['prioridade'],
+                'motivodoc': c['motivodoc'],
+                'status_ctc': c['status_ctc'],
+                'origem': f"{c['cidade_origem']}/{c['uf_origem']}",
+                'destino': f"{c['cidade_destino']}/{c['uf_destino']}",
+                'unid_lastmile': c['unid_lastmile'],
+                'cliente_nome': c['cliente_nome'],
+                'remetente': c['remetente'],
+                'destinatario': c['destinatario'],
+                'volumes': c['volumes'],
+                'peso_fisico': c['peso_fisico'],
+                'peso_taxado': c['peso_taxado'],
+                'val_mercadoria': f"{c['valor_mercadoria']:,.2f}",
+                'raw_val_mercadoria': c['valor_mercadoria'],
+                'raw_frete_total': c['frete_total'],
+                'qtd_notas': c['qtd_notas'],
+                'tipo_carga': c['tipo_carga'],
+                'tem_planejamento': c['tem_planejamento'],
+                'status_planejamento': c['status_planejamento'],
+                'id_planejamento': c['id_planejamento'],
+                'custo_planejado': c['custo_planejado'],
+                'tarifa_estimada': c['tarifa_estimada'],
                 'full_data': { 
                      'filial': row.Filial, 'filialctc': row.CTC, 'seriectc': row.Serie,
                      'data': str(row.DataEmissao), 'hora': str(row.HoraEmissao),
@@ -592,84 +679,144 @@ class PlanejamentoService:
         return Lista
 
     @staticmethod
-    def BuscarCtcsDiario(mapa_cache=None, cache_tarifas=None): # ADICIONADO AQUI
+    def _BuscarCtcsBloco(NomeBloco, mapa_cache=None, cache_tarifas=None):
         Sessao = ObterSessaoSqlServer()
         try:
             if not mapa_cache: mapa_cache = PlanejamentoService._ObterMapaCache()
-            Hoje = date.today() 
-            FiltroSQL = """
-                AND c.motivodoc IN ('REE', 'ENT', 'NOR') 
-                AND c.data = :data_alvo
-            """
-            Query = text(PlanejamentoService._QueryBase + FiltroSQL + " ORDER BY c.data DESC, c.hora DESC")
-            Rows = Sessao.execute(Query, {'data_alvo': Hoje}).fetchall()
-            
-            # ADICIONADO O cache_tarifas AQUI NO RETORNO:
-            return PlanejamentoService._SerializarResultados(Rows, "DIARIO", mapa_cache, cache_tarifas)
+            Rows = PlanejamentoService._BuscarLinhasBloco(Sessao, NomeBloco)
+            return PlanejamentoService._SerializarResultados(Rows, NomeBloco, mapa_cache, cache_tarifas)
         except Exception as e:
-            LogService.Error("PlanejamentoService", "Erro Buscar Diario", e)
+            LogService.Error("PlanejamentoService", f"Erro Buscar {NomeBloco.capitalize()}", e)
             return []
         finally: Sessao.close()
 
     @staticmethod
-    def BuscarCtcsReversa(mapa_cache=None, cache_tarifas=None): # ADICIONADO AQUI
-        Sessao = ObterSessaoSqlServer()
-        try:
-            if not mapa_cache: mapa_cache = PlanejamentoService._ObterMapaCache()
-            FiltroSQL = """
-                AND c.motivodoc = 'DEV' 
-                AND rev.LiberadoPlanejamento = 1
-            """
-            Query = text(PlanejamentoService._QueryBase + FiltroSQL + " ORDER BY c.data DESC")
-            Rows = Sessao.execute(Query).fetchall()
-            
-            return PlanejamentoService._SerializarResultados(Rows, "REVERSA", mapa_cache, cache_tarifas)
-        except Exception as e:
-            LogService.Error("PlanejamentoService", "Erro Buscar Reversa", e)
-            return []
-        finally: Sessao.close()
+    def BuscarCtcsDiario(mapa_cache=None, cache_tarifas=None):
+        return PlanejamentoService._BuscarCtcsBloco('DIARIO', mapa_cache, cache_tarifas)
 
     @staticmethod
-    def BuscarCtcsBacklog(mapa_cache=None, cache_tarifas=None): # ADICIONADO AQUI
-        Sessao = ObterSessaoSqlServer()
-        try:
-            if not mapa_cache: mapa_cache = PlanejamentoService._ObterMapaCache()
-            Hoje = date.today()
-            Corte = Hoje - timedelta(days=120)
-            FiltroSQL = """
-                AND c.motivodoc IN ('REE', 'ENT')
-                AND c.data < :data_hoje 
-                AND c.data >= :data_corte
-            """
-            Query = text(PlanejamentoService._QueryBase + FiltroSQL + " ORDER BY c.data ASC")
-            Rows = Sessao.execute(Query, {'data_hoje': Hoje, 'data_corte': Corte}).fetchall()
-            
-            # ADICIONADO O cache_tarifas AQUI NO RETORNO:
-            return PlanejamentoService._SerializarResultados(Rows, "BACKLOG", mapa_cache, cache_tarifas)
-        except Exception as e:
-            LogService.Error("PlanejamentoService", "Erro Buscar Backlog", e)
-            return []
-        finally: Sessao.close()
+    def BuscarCtcsReversa(mapa_cache=None, cache_tarifas=None):
+        return PlanejamentoService._BuscarCtcsBloco('REVERSA', mapa_cache, cache_tarifas)
+
+    @staticmethod
+    def BuscarCtcsBacklog(mapa_cache=None, cache_tarifas=None):
+        return PlanejamentoService._BuscarCtcsBloco('BACKLOG', mapa_cache, cache_tarifas)
+
+    @staticmethod
+    def _MontarQuadro(Blocos, MapaCache, CacheTarifas, IncluirUfs=False):
+        """
+        Quadro colunar do painel: {'total', 'colunas': {nome: [valores]}, 'dicionarios': {nome: [strings]},
+        'codificacao': {coluna: dicionário}}. Colunas de COLUNAS_DICIONARIO trazem o índice da string
+        no dicionário (null = sem valor); as demais trazem o valor cru. A formatação fica no navegador
+        (Static/JS/Planejamento/Quadro.js).
+        IncluirUfs: agrega na mesma passada, por UF de origem e bloco, o que o Mapa Global exibe
+        ('ufs': [{'uf', 'resumo': {bloco|'TODOS': {qtd_docs, qtd_vols, valor_total, tem_urgencia}}, 'linhas'}]).
+        """
+        Colunas = {Nome: [] for Nome in (*PlanejamentoService.COLUNAS_DICIONARIO, *PlanejamentoService.COLUNAS_VALOR)}
+        Dicionarios = {Nome: ([], {}) for Nome in set(PlanejamentoService.COLUNAS_DICIONARIO.values())}
+        Codificadores = []
+        for Coluna, NomeDicionario in PlanejamentoService.COLUNAS_DICIONARIO.items():
+            Valores, Posicoes = Dicionarios[NomeDicionario]
+            Codificadores.append((Colunas[Coluna].append, Coluna, Valores, Posicoes))
+        Ufs = {}
+        Total = 0
+
+        for NomeBloco, Rows in Blocos:
+            for row in Rows:
+                c = PlanejamentoService._CamposCtc(row, MapaCache, CacheTarifas)
+                c['origem_dados'] = NomeBloco
+                c['data_emissao'] = int(row.DataEmissao.strftime('%Y%m%d')) if row.DataEmissao else None
+                c['hora_emissao'] = PlanejamentoService._HoraEmissaoHHMM(row.HoraEmissao)
+
+                for Adicionar, Coluna, Valores, Posicoes in Codificadores:
+                    Valor = c[Coluna]
+                    if Valor is None:
+                        Adicionar(None)
+                        continue
+                    Indice = Posicoes.get(Valor)
+                    if Indice is None:
+                        Indice = Posicoes[Valor] = len(Valores)
+                        Valores.append(Valor)
+                    Adicionar(Indice)
+                for Coluna in PlanejamentoService.COLUNAS_VALOR:
+                    Colunas[Coluna].append(c[Coluna])
+
+                if IncluirUfs:
+                    Uf = c['uf_origem'].upper()
+                    Grupo = Ufs.get(Uf)
+                    if Grupo is None:
+                        Grupo = Ufs[Uf] = {'uf': Uf, 'resumo': {}, 'linhas': []}
+                    Grupo['linhas'].append(Total)
+                    Urgente = 'URGENTE' in c['prioridade'].upper()
+                    for Chave in ('TODOS', NomeBloco):
+                        Resumo = Grupo['resumo'].setdefault(
+                            Chave, {'qtd_docs': 0, 'qtd_vols': 0, 'valor_total': 0.0, 'tem_urgencia': False}
+                        )
+                        Resumo['qtd_docs'] += 1
+                        Resumo['qtd_vols'] += c['volumes']
+                        Resumo['valor_total'] += c['valor_mercadoria']
+                        Resumo['tem_urgencia'] = Resumo['tem_urgencia'] or Urgente
+                Total += 1
+
+        Quadro = {
+            'total': Total,
+            'colunas': Colunas,
+            'dicionarios': {Nome: Valores for Nome, (Valores, _) in Dicionarios.items()},
+            'codificacao': dict(PlanejamentoService.COLUNAS_DICIONARIO),
+        }
+        if IncluirUfs:
+            Quadro['ufs'] = list(Ufs.values())
+        return Quadro
 
     @staticmethod
-    def BuscarCtcsPlanejamento():
+    def BuscarQuadroPlanejamento(IncluirUfs=False):
+        """Os 3 blocos do painel (Diário, Reversa, Backlog) num único quadro colunar (ver _MontarQuadro)."""
         LogService.Debug("PlanejamentoService", "Iniciando busca GLOBAL (3 Blocos)...")
         Cache = PlanejamentoService._ObterMapaCache()
         
-        # NOVO: Carrega as tarifas virtuais 1 única vez para toda a tela
+        # Tarifas virtuais carregadas 1 única vez para toda a tela
         CacheTarifas = PlanejamentoService._CarregarCacheTarifas() 
-        
-        # Passamos o CacheTarifas para dentro das buscas
-        ListaDiario = PlanejamentoService.BuscarCtcsDiario(Cache, CacheTarifas)
-        ListaReversa = PlanejamentoService.BuscarCtcsReversa(Cache, CacheTarifas)
-        ListaBacklog = PlanejamentoService.BuscarCtcsBacklog(Cache, CacheTarifas)
-        
-        Total = len(ListaDiario) + len(ListaReversa) + len(ListaBacklog)
-        LogService.Info("PlanejamentoService", f"Busca Concluída. Total: {Total} (D:{len(ListaDiario)}, R:{len(ListaReversa)}, B:{len(ListaBacklog)})")
-        return ListaDiario + ListaReversa + ListaBacklog
+
+        Blocos = []
+        Sessao = ObterSessaoSqlServer()
+        try:
+            for NomeBloco in PlanejamentoService.FILTROS_BLOCOS:
+                try:
+                    Blocos.append((NomeBloco, PlanejamentoService._BuscarLinhasBloco(Sessao, NomeBloco)))
+                except Exception as e:
+                    Sessao.rollback()
+                    LogService.Error("PlanejamentoService", f"Erro Buscar {NomeBloco.capitalize()}", e)
+                    Blocos.append((NomeBloco, []))
+        finally:
+            Sessao.close()
+
+        Quadro = PlanejamentoService._MontarQuadro(Blocos, Cache, CacheTarifas, IncluirUfs)
+        Contagem = ', '.join(f"{Nome[0]}:{len(Rows)}" for Nome, Rows in Blocos)
+        LogService.Info("PlanejamentoService", f"Busca Concluída. Total: {Quadro['total']} ({Contagem})")
+        return Quadro
 
     @staticmethod
     def BuscarServicoContratadoCliente(*cnpjs):
+        """Serviço contratado (normalizado) do cliente, pelas raízes de CNPJ. Sem cadastro = STANDARD."""
+        servico = IndiceServicoClienteService.Resolver(*cnpjs)
+        if servico is None:
+            return PlanejamentoService._BuscarServicoContratadoSql(*cnpjs)
+        return PlanejamentoService._NormalizarServicoContratado(servico or "STANDARD")
+
+    @staticmethod
+    def BuscarServicosContratadosLote(grupos_cnpjs):
+        """
+        BuscarServicoContratadoCliente para vários documentos: grupos_cnpjs é uma lista de tuplas
+        de CNPJs; devolve os serviços na mesma ordem, resolvidos no índice em memória, sem consulta.
+        """
+        servicos = IndiceServicoClienteService.ResolverLote(grupos_cnpjs)
+        if servicos is None:
+            return [PlanejamentoService._BuscarServicoContratadoSql(*cnpjs) for cnpjs in grupos_cnpjs]
+        return [PlanejamentoService._NormalizarServicoContratado(s or "STANDARD") for s in servicos]
+
+    @staticmethod
+    def _BuscarServicoContratadoSql(*cnpjs):
+        """Consulta direta ao banco; usada só quando o índice em memória não está disponível."""
         Sessao = ObterSessaoSqlServer()
         try:
             from sqlalchemy import or_ 
@@ -698,7 +845,7 @@ class PlanejamentoService:
             
             return PlanejamentoService._NormalizarServicoContratado(Servico.ServicoContratado if Servico else "STANDARD")
         except Exception as e:
-            LogService.Error("PlanejamentoService", "Erro em BuscarServicoContratadoCliente", e)
+            LogService.Error("PlanejamentoService", "Erro em _BuscarServicoContratadoSql", e)
             return "STANDARD"
         finally:
             Sessao.close()
@@ -870,10 +1017,10 @@ class PlanejamentoService:
             Sessao.close()
 
     @staticmethod
-    def BuscarCtcsConsolidaveis(cidade_origem, uf_origem, cidade_destino, uf_destino, data_base, filial_excluir=None, ctc_excluir=None, tipo_carga=None, servico_alvo=None):
+    def BuscarCtcsConsolidaveis(cidade_origem, uf_origem, cidade_destino, uf_destino, data_base, filial_excluir=None, ctc_excluir=None, tipo_carga=None, servico_alvo=None, mapa_cache=None):
         Sessao = ObterSessaoSqlServer()
         try:
-            mapa_cache = PlanejamentoService._ObterMapaCache()
+            if mapa_cache is None: mapa_cache = PlanejamentoService._ObterMapaCache()
 
             cidade_origem = str(cidade_origem).strip().upper()
             uf_origem = str(uf_origem).strip().upper()
@@ -893,17 +1040,27 @@ class PlanejamentoService:
             Query = text(PlanejamentoService._QueryBase + FiltroSQL + " ORDER BY c.data DESC, c.hora DESC")
             Resultados = Sessao.execute(Query).fetchall()
             
-            ListaConsolidados = []
-            for row in Resultados:
-                def to_float(val): return float(val) if val else 0.0
-                def to_int(val): return int(val) if val else 0
-                def to_str(val): return str(val).strip() if val else ''
+            def to_float(val): return float(val) if val else 0.0
+            def to_int(val): return int(val) if val else 0
+            def to_str(val): return str(val).strip() if val else ''
 
+            Candidatos = []
+            for row in Resultados:
                 chave = f"{to_str(row.Filial)}-{to_str(row.Serie)}-{to_str(row.CTC)}"
                 info_plan = mapa_cache.get(chave)
                 if info_plan and str(info_plan.get('status', '')).upper() != 'CANCELADO':
                     continue 
+                Candidatos.append(row)
+
+            # Serviço contratado de todos os candidatos de uma vez (índice em memória)
+            ServicosCandidatos = PlanejamentoService.BuscarServicosContratadosLote([
+                (getattr(row, 'ResponsCGC', None), getattr(row, 'RemetCGC', None), getattr(row, 'DestCGC', None))
+                for row in Candidatos
+            ])
+            servico_alvo_norm = PlanejamentoService._NormalizarServicoContratado(servico_alvo) if servico_alvo else None
 
+            ListaConsolidados = []
+            for row, servico_cand in zip(Candidatos, ServicosCandidatos):
                 str_hora = "00:00"
                 if row.HoraEmissao:
                     h_raw = str(row.HoraEmissao).strip().replace(':', '').zfill(4)
@@ -921,18 +1078,11 @@ class PlanejamentoService:
 
                 cliente_nome = to_str(getattr(row, 'ClienteNome', '')) or remetente_nome or destinatario_nome
 
-                servico_cand = PlanejamentoService.BuscarServicoContratadoCliente(
-                    getattr(row, 'ResponsCGC', None), 
-                    getattr(row, 'RemetCGC', None), 
-                    getattr(row, 'DestCGC', None)
-                )
-                if servico_alvo:
-                    servico_alvo_norm = PlanejamentoService._NormalizarServicoContratado(servico_alvo)
-                    servico_cand_norm = PlanejamentoService._NormalizarServicoContratado(servico_cand)
+                if servico_alvo_norm:
                     if not (
                         PlanejamentoService._ServicoEhDependenteDestino(servico_alvo_norm) or
-                        PlanejamentoService._ServicoEhDependenteDestino(servico_cand_norm)
-                    ) and servico_cand_norm != servico_alvo_norm:
+                        PlanejamentoService._ServicoEhDependenteDestino(servico_cand)
+                    ) and servico_cand != servico_alvo_norm:
                         continue 
 
                 ListaConsolidados.append({
@@ -1071,8 +1221,8 @@ class PlanejamentoService:
                 try:
                     res = SessaoPG.query(Cidade.Id).join(RemessaCidade, Cidade.IdRemessa == RemessaCidade.Id).filter(
                         RemessaCidade.Ativo == True,
-                        func.upper(Cidade.Uf) == uf_busca.upper(),
-                        func.upper(Cidade.NomeCidade).collate('SQL_Latin1_General_CP1_CI_AI').like(f"%{nome_busca.upper()}%")
+                        Cidade.Uf == uf_busca.upper(),
+                        Cidade.NomeNormalizado.like(f"%{NormalizarTexto(nome_busca)}%")
                     ).first()
                     return res.Id if res else None
                 except: return None
@@ -0,0 +1,263 @@
+import gzip
+import hashlib
+import threading
+import time
+from functools import wraps
+from flask import g, has_request_context, make_response, request
+from flask.json.provider import DefaultJSONProvider
+
+from Configuracoes import ConfiguracaoAtual
+from Services.LogService import LogService
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
+
+try:
+    import orjson
+    _ORJSON_DISPONIVEL = True
+except ImportError:
+    _ORJSON_DISPONIVEL = False
+
+try:
+    import brotli
+    _BROTLI_DISPONIVEL = True
+except ImportError:
+    _BROTLI_DISPONIVEL = False
+
+
+class ProvedorJsonRapido(DefaultJSONProvider):
+    """
+    JSON do Flask (jsonify / app.json) via orjson, quando instalado.
+    Mantém a saída do provedor padrão: chaves ordenadas e datas/Decimal pelo mesmo
+    conversor (_default do Flask). O que o orjson não serializar cai no json da stdlib.
+    """
+
+    _OPCOES = 0
+    if _ORJSON_DISPONIVEL:
+        _OPCOES = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+                   | orjson.OPT_PASSTHROUGH_DATETIME)
+
+    def _DumpsBytes(self, obj):
+        if _ORJSON_DISPONIVEL:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._OPCOES)
+            except TypeError:
+                pass
+        return super().dumps(obj).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs or not _ORJSON_DISPONIVEL:
+            return super().dumps(obj, **kwargs)
+        return self._DumpsBytes(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        inicio = time.perf_counter()
+        corpo = self._DumpsBytes(obj)
+        if has_request_context():
+            g.resposta_serializacao_ms = (time.perf_counter() - inicio) * 1000
+        return self._app.response_class(corpo, mimetype=self.mimetype)
+
+
+class RespostaHttpService:
+    """
+    Camada transversal de resposta HTTP, ligada em App.py por Configurar(app):
+    - JSON via ProvedorJsonRapido (orjson);
+    - compressão brotli/gzip acima de COMPRESSAO_MIN_BYTES, conforme o Accept-Encoding;
+    - métricas por endpoint (bytes do payload, bytes enviados, tempo de serialização/compressão),
+      também devolvidas no cabeçalho Server-Timing.
+    Dados de referência usam o decorator RespostaCacheavel (ETag forte + Cache-Control).
+    """
+
+    COMPRESSAO_MIN_BYTES: int = ConfiguracaoAtual.RESPOSTA_COMPRESSAO_MIN_BYTES
+    NIVEL_GZIP = 6
+    QUALIDADE_BROTLI = 4   # conteúdo dinâmico: qualidade baixa comprime bem e é rápida
+    TIPOS_COMPRIMIVEIS = (
+        'application/json', 'application/javascript', 'text/html', 'text/css',
+        'text/plain', 'text/csv', 'text/javascript', 'image/svg+xml'
+    )
+
+    _metricas: dict = {}
+    _lock_metricas = threading.Lock()
+
+    @staticmethod
+    def Configurar(app):
+        """
+        Registra provedor JSON e o after_request de compressão/métricas.
+        Chamar logo após criar o app: o hook registrado primeiro roda por último,
+        depois de qualquer after_request que ainda mexa no corpo.
+        """
+        app.json = ProvedorJsonRapido(app)
+        app.after_request(RespostaHttpService._FinalizarResposta)
+        LogService.Info(
+            "RespostaHttpService",
+            f"Respostas: JSON {'orjson' if _ORJSON_DISPONIVEL else 'padrão'}, "
+            f"compressão {'br/gzip' if _BROTLI_DISPONIVEL else 'gzip'} a partir de {RespostaHttpService.COMPRESSAO_MIN_BYTES} bytes."
+        )
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # COMPRESSÃO
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _EscolherCodificacao():
+        aceitas = request.accept_encodings
+        if _BROTLI_DISPONIVEL and aceitas['br']:
+            return 'br'
+        if aceitas['gzip']:
+            return 'gzip'
+        return None
+
+    @staticmethod
+    def _Comprimivel(resposta):
+        return (
+            200 <= resposta.status_code < 300
+            and resposta.status_code != 204
+            and not resposta.direct_passthrough
+            and not resposta.is_streamed
+            and 'Content-Encoding' not in resposta.headers
+            and 'Content-Range' not in resposta.headers
+            and resposta.mimetype in RespostaHttpService.TIPOS_COMPRIMIVEIS
+        )
+
+    @staticmethod
+    def _FinalizarResposta(resposta):
+        try:
+            if not RespostaHttpService._Comprimivel(resposta):
+                return resposta
+
+            corpo = resposta.get_data()
+            tamanho = len(corpo)
+            codificacao, compressao_ms = None, 0.0
+
+            resposta.vary.add('Accept-Encoding')
+            if tamanho >= RespostaHttpService.COMPRESSAO_MIN_BYTES:
+                codificacao = RespostaHttpService._EscolherCodificacao()
+
+            if codificacao:
+                inicio = time.perf_counter()
+                if codificacao == 'br':
+                    comprimido = brotli.compress(corpo, quality=RespostaHttpService.QUALIDADE_BROTLI)
+                else:
+                    comprimido = gzip.compress(corpo, compresslevel=RespostaHttpService.NIVEL_GZIP)
+                compressao_ms = (time.perf_counter() - inicio) * 1000
+
+                resposta.set_data(comprimido)
+                resposta.headers['Content-Encoding'] = codificacao
+                # A representação comprimida tem ETag própria (RespostaCacheavel reconhece o sufixo)
+                etag, fraca = resposta.get_etag()
+                if etag:
+                    resposta.set_etag(f"{etag}-{codificacao}", weak=fraca)
+
+            serializacao_ms = g.pop('resposta_serializacao_ms', None)
+            RespostaHttpService._RegistrarMetrica(
+                request.endpoint or request.path, tamanho, resposta.content_length or tamanho,
+                serializacao_ms, compressao_ms
+            )
+
+            tempos = []
+            if serializacao_ms is not None: tempos.append(f"json;dur={serializacao_ms:.1f}")
+            if codificacao: tempos.append(f"{codificacao};dur={compressao_ms:.1f}")
+            if tempos:
+                resposta.headers.add('Server-Timing', ', '.join(tempos))
+
+        except Exception as e:
+            LogService.FalhaSilenciosa("RespostaHttpService", "Compressão da resposta", e)
+        return resposta
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # MÉTRICAS
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def _RegistrarMetrica(cls, endpoint, bytes_payload, bytes_enviados, serializacao_ms, compressao_ms):
+        with cls._lock_metricas:
+            m = cls._metricas.get(endpoint)
+            if m is None:
+                m = cls._metricas[endpoint] = {
+                    'Requisicoes': 0, 'BytesPayload': 0, 'BytesEnviados': 0, 'MaiorPayload': 0,
+                    'SerializacaoMs': 0.0, 'CompressaoMs': 0.0
+                }
+            m['Requisicoes'] += 1
+            m['BytesPayload'] += bytes_payload
+            m['BytesEnviados'] += bytes_enviados
+            m['MaiorPayload'] = max(m['MaiorPayload'], bytes_payload)
+            m['SerializacaoMs'] += serializacao_ms or 0.0
+            m['CompressaoMs'] += compressao_ms
+
+        if bytes_payload >= cls.COMPRESSAO_MIN_BYTES:
+            LogService.Debug(
+                "RespostaHttpService",
+                f"{endpoint}: {bytes_payload} B -> {bytes_enviados} B | "
+                f"json {serializacao_ms or 0:.1f} ms | compressão {compressao_ms:.1f} ms",
+                Chave=endpoint
+            )
+
+    @classmethod
+    def _Exportar(cls):
+        with cls._lock_metricas:
+            return {k: dict(v) for k, v in cls._metricas.items()}
+
+    @classmethod
+    def ObterMetricas(cls):
+        """
+        Métricas acumuladas por endpoint (médias por requisição), maiores payloads primeiro.
+        No modo multiprocesso, somadas sobre todos os processos vivos.
+        """
+        copia = {}
+        for estado in [cls._Exportar(), *CacheCompartilhadoService.LerEstadosProcessos('respostas')]:
+            for endpoint, m in estado.items():
+                soma = copia.get(endpoint)
+                if soma is None:
+                    copia[endpoint] = dict(m)
+                    continue
+                for campo, valor in m.items():
+                    soma[campo] = max(soma[campo], valor) if campo == 'MaiorPayload' else soma[campo] + valor
+
+        resultado = []
+        for endpoint, m in copia.items():
+            n = m['Requisicoes'] or 1
+            resultado.append({
+                'Endpoint': endpoint,
+                'Requisicoes': m['Requisicoes'],
+                'BytesPayloadMedio': round(m['BytesPayload'] / n),
+                'BytesEnviadosMedio': round(m['BytesEnviados'] / n),
+                'MaiorPayload': m['MaiorPayload'],
+                'TaxaCompressao': round(m['BytesEnviados'] / m['BytesPayload'], 3) if m['BytesPayload'] else 1.0,
+                'SerializacaoMsMedio': round(m['SerializacaoMs'] / n, 2),
+                'CompressaoMsMedio': round(m['CompressaoMs'] / n, 2),
+            })
+        return sorted(resultado, key=lambda x: x['BytesPayloadMedio'] * x['Requisicoes'], reverse=True)
+
+
+CacheCompartilhadoService.RegistrarEstadoProcesso('respostas', RespostaHttpService._Exportar)
+
+
+def RespostaCacheavel(MaxAgeSegundos=None):
+    """
+    Para endpoints de dados de referência (aeroportos, cias, cortes): ETag forte (hash do corpo)
+    e Cache-Control privado. Se o navegador já tem a mesma versão, responde 304 sem corpo.
+    MaxAgeSegundos=0 para dados editados na própria tela: sempre revalida, mas sem reenviar o corpo.
+    Usar abaixo de login_required/RequerPermissao, para a checagem de acesso acontecer antes.
+    """
+    def Decorator(F):
+        @wraps(F)
+        def Wrapper(*args, **kwargs):
+            resposta = make_response(F(*args, **kwargs))
+            if resposta.status_code != 200 or resposta.is_streamed:
+                return resposta
+
+            etag = hashlib.blake2b(resposta.get_data(), digest_size=16).hexdigest()
+            max_age = ConfiguracaoAtual.RESPOSTA_CACHE_REFERENCIA_SEGUNDOS if MaxAgeSegundos is None else MaxAgeSegundos
+            resposta.set_etag(etag)
+            resposta.headers['Cache-Control'] = f"private, max-age={max_age}, must-revalidate"
+
+            # ETag da versão comprimida = etag + '-br'/'-gzip' (ver _FinalizarResposta)
+            cliente = request.if_none_match
+            if cliente.star_tag or any(
+                t.removesuffix('-br').removesuffix('-gzip') == etag for t in cliente.as_set(include_weak=True)
+            ):
+                resposta.status_code = 304
+                resposta.set_data(b'')
+                resposta.headers.pop('Content-Length', None)
+            return resposta
+        return Wrapper
+    return Decorator
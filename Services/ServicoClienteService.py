@@ -3,6 +3,8 @@ from sqlalchemy import and_
 from Conexoes import ObterSessaoSqlServer 
 from Models.SQL_SERVER.Cadastros import Cliente, ClienteGrupo, ClienteServicoContratado
 from Models.SQL_SERVER.ServicoCliente import ServicoCliente
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
+from Services.Shared.IndiceServicoClienteService import IndiceServicoClienteService
 
 class ServicoClienteService:
 
@@ -140,6 +142,8 @@ class ServicoClienteService:
             
             Db.add(NovoServico)
             Db.commit()
+            IndiceServicoClienteService.Reconstruir()  # consolidação/planejamento enxergam na hora
+            CacheCompartilhadoService.Invalidar('servico_cliente')
             return {"Sucesso": True, "Mensagem": "Parâmetros de serviço cadastrados com sucesso!"}
         except Exception as Ex:
             Db.rollback()
@@ -164,6 +168,8 @@ class ServicoClienteService:
             ServicoExistente.UsuarioResponsavel = UsuarioLogado  # Atualiza o usuário responsável pela última alteração
 
             Db.commit()
+            IndiceServicoClienteService.Reconstruir()  # consolidação/planejamento enxergam na hora
+            CacheCompartilhadoService.Invalidar('servico_cliente')
             return {"Sucesso": True, "Mensagem": "Parâmetros de serviço atualizados com sucesso!"}
         except Exception as Ex:
             Db.rollback()
@@ -182,6 +188,8 @@ class ServicoClienteService:
 
             Db.delete(ServicoExistente)
             Db.commit()
+            IndiceServicoClienteService.Reconstruir()  # consolidação/planejamento enxergam na hora
+            CacheCompartilhadoService.Invalidar('servico_cliente')
             return {"Sucesso": True, "Mensagem": "Parâmetros de serviço excluídos com sucesso!"}
         except Exception as Ex:
             Db.rollback()
@@ -7,6 +7,7 @@ from Conexoes import ObterEngineSqlServer
 from Services.AcompanhamentoService import AcompanhamentoService
 from Services import AcompanhamentoService
 from Services.LogService import LogService
+from Services.Shared.AwbStatusAtualService import AwbStatusAtualService
 
 # --- MODELS SQL SERVER (LEGADO) ---
 from Models.SQL_SERVER.Awb import Awb, AwbStatus, AwbNota
@@ -74,6 +75,9 @@ class AwbService:
                     'volumes': fmt(s.VOLUMES, 'num')
                 })
 
+            # Status atual: leitura direta da tabela materializada (não depende do histórico)
+            atual = AwbStatusAtualService.BuscarPorAwbs(session, [awb.codawb]).get(awb.codawb)
+
             # 4. Monta Objeto Completo
             return {
                 "codawb": awb.codawb,
@@ -114,6 +118,12 @@ class AwbService:
                 },
                 "notas": lista_notas,
                 "historico": lista_status,
+                "status_atual": {
+                    "status": fmt(atual['Status']),
+                    "data": fmt(atual['Data'], 'datetime'),
+                    "local": fmt(atual['Local']),
+                    "voo": fmt(atual['Voo'])
+                } if atual else None,
                 "entregue": awb.ENTREGUE == 'S',
                 "cancelado": awb.cancelado == 'S',
                 "motivo_canc": fmt(awb.canc_motivo),
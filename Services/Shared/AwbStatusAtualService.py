@@ -0,0 +1,175 @@
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from Conexoes import ObterEngineSqlServer
+from Configuracoes import ConfiguracaoAtual
+from Services.LogService import LogService
+from Services.Shared.TarefaSegundoPlano import TarefaSegundoPlano
+
+# --- MODELS SQL SERVER ---
+from Models.SQL_SERVER.Awb import AwbStatusAtual
+
+
+class AwbStatusAtualService:
+    """
+    Mantém Tb_PLN_AwbStatusAtual: o último TB_AWB_STATUS de cada AWB, uma linha por CODAWB.
+
+    A atualização é incremental: só as AWBs com status inseridos depois da marca d'água
+    (maior DATA_INSERT já processado, em Tb_PLN_ControleSincronizacao) são recalculadas,
+    num único MERGE. Quem lê chama AgendarAtualizacao(), que dispara no máximo uma
+    atualização a cada INTERVALO_SEGUNDOS numa thread própria — a leitura nunca espera.
+    Entre processos, sp_getapplock garante um único atualizador por vez.
+    """
+
+    CHAVE_CONTROLE = 'AWB_STATUS_ATUAL'
+    INTERVALO_SEGUNDOS: int = ConfiguracaoAtual.AWB_STATUS_INTERVALO_ATUALIZACAO
+    # Status gravados com DATA_INSERT um pouco anterior à marca, mas commitados
+    # depois da última execução, ainda são apanhados (o MERGE é idempotente)
+    SOBREPOSICAO_SEGUNDOS: int = 300
+
+    _agenda = TarefaSegundoPlano('awb-status-atual', INTERVALO_SEGUNDOS)
+
+    @staticmethod
+    def _ObterSessaoSql():
+        Engine = ObterEngineSqlServer()
+        return sessionmaker(bind=Engine)()
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # LEITURA
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def BuscarPorAwbs(session, lista_codigos):
+        """
+        {CODAWB: {'Status', 'Data', 'Voo', 'Local', 'DataInsert'}} para os códigos pedidos.
+        Usa a sessão de quem chama (mesma transação/conexão da tela).
+        """
+        if not lista_codigos: return {}
+        AwbStatusAtualService.AgendarAtualizacao()
+
+        return {
+            st.CODAWB: {
+                'Status': st.STATUS_AWB,
+                'Data': st.DATAHORA_STATUS,
+                'Voo': st.VOO,
+                'Local': st.LOCAL_STATUS,
+                'DataInsert': st.DATA_INSERT
+            }
+            for st in session.query(
+                AwbStatusAtual.CODAWB,
+                AwbStatusAtual.STATUS_AWB,
+                AwbStatusAtual.DATAHORA_STATUS,
+                AwbStatusAtual.VOO,
+                AwbStatusAtual.LOCAL_STATUS,
+                AwbStatusAtual.DATA_INSERT
+            ).filter(AwbStatusAtual.CODAWB.in_(lista_codigos)).all()
+        }
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # ATUALIZAÇÃO
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def AgendarAtualizacao(cls):
+        """Dispara a atualização incremental em segundo plano, se o intervalo já passou."""
+        cls._agenda.Agendar(cls.Atualizar)
+
+    @classmethod
+    def Atualizar(cls, completo=False):
+        """
+        Recalcula o último status das AWBs com movimento desde a marca d'água.
+        completo=True ignora a marca e recalcula todas as AWBs do histórico.
+        Retorna {'modo', 'awbs_atualizadas', 'marca_dagua'}. Nunca levanta exceção.
+        """
+        session = cls._ObterSessaoSql()
+        try:
+            # Trava de aplicação (liberada no commit/rollback): outro processo já atualizando = pula
+            trava = session.execute(text("""
+                SET NOCOUNT ON;
+                DECLARE @Resultado INT;
+                EXEC @Resultado = sp_getapplock
+                    @Resource = 'Tb_PLN_AwbStatusAtual', @LockMode = 'Exclusive',
+                    @LockOwner = 'Transaction', @LockTimeout = 0;
+                SELECT @Resultado;
+            """)).scalar()
+            if trava is None or trava < 0:
+                session.rollback()
+                return {'modo': 'em_andamento', 'awbs_atualizadas': 0, 'marca_dagua': None}
+
+            marca = None
+            if not completo:
+                marca = session.execute(
+                    text("SELECT MarcaDagua FROM intec.dbo.Tb_PLN_ControleSincronizacao WHERE Chave = :chave"),
+                    {'chave': cls.CHAVE_CONTROLE}
+                ).scalar()
+
+            filtro_desde = ""
+            parametros = {'sobreposicao': cls.SOBREPOSICAO_SEGUNDOS, 'marca': marca}
+            if marca is not None:
+                filtro_desde = "AND DATA_INSERT > DATEADD(SECOND, -:sobreposicao, :marca)"
+
+            # Teto fixo da execução: o que entrar durante o MERGE fica para a próxima
+            nova_marca = session.execute(text(f"""
+                SELECT MAX(DATA_INSERT) FROM intec.dbo.TB_AWB_STATUS WITH (NOLOCK)
+                WHERE 1 = 1 {filtro_desde}
+            """), parametros).scalar()
+
+            if nova_marca is None:
+                session.commit()
+                return {'modo': 'sem_novidades', 'awbs_atualizadas': 0, 'marca_dagua': marca}
+
+            parametros['ate'] = nova_marca
+            resultado = session.execute(text(f"""
+                ;WITH Alterados AS (
+                    SELECT DISTINCT CODAWB
+                    FROM intec.dbo.TB_AWB_STATUS WITH (NOLOCK)
+                    WHERE DATA_INSERT <= :ate {filtro_desde}
+                ),
+                Ultimos AS (
+                    SELECT
+                        s.CODAWB, s.STATUS_AWB, s.DATAHORA_STATUS, s.DATA_INSERT, s.VOO, s.LOCAL_STATUS,
+                        ROW_NUMBER() OVER (
+                            PARTITION BY s.CODAWB
+                            ORDER BY s.DATAHORA_STATUS DESC, s.DATA_INSERT DESC
+                        ) AS Ordem
+                    FROM intec.dbo.TB_AWB_STATUS s WITH (NOLOCK)
+                    INNER JOIN Alterados a ON a.CODAWB = s.CODAWB
+                )
+                MERGE intec.dbo.Tb_PLN_AwbStatusAtual WITH (HOLDLOCK) AS alvo
+                USING (SELECT * FROM Ultimos WHERE Ordem = 1) AS origem
+                   ON alvo.CODAWB = origem.CODAWB COLLATE DATABASE_DEFAULT
+                WHEN MATCHED THEN UPDATE SET
+                    STATUS_AWB      = origem.STATUS_AWB,
+                    DATAHORA_STATUS = origem.DATAHORA_STATUS,
+                    DATA_INSERT     = origem.DATA_INSERT,
+                    VOO             = origem.VOO,
+                    LOCAL_STATUS    = origem.LOCAL_STATUS,
+                    DataAtualizacao = GETDATE()
+                WHEN NOT MATCHED BY TARGET THEN
+                    INSERT (CODAWB, STATUS_AWB, DATAHORA_STATUS, DATA_INSERT, VOO, LOCAL_STATUS, DataAtualizacao)
+                    VALUES (origem.CODAWB, origem.STATUS_AWB, origem.DATAHORA_STATUS, origem.DATA_INSERT,
+                            origem.VOO, origem.LOCAL_STATUS, GETDATE());
+            """), parametros)
+            linhas = resultado.rowcount if resultado.rowcount is not None else 0
+
+            session.execute(text("""
+                MERGE intec.dbo.Tb_PLN_ControleSincronizacao AS alvo
+                USING (SELECT :chave AS Chave) AS origem ON alvo.Chave = origem.Chave
+                WHEN MATCHED THEN UPDATE SET
+                    MarcaDagua = :marca, DataExecucao = GETDATE(), LinhasUltimaExecucao = :linhas
+                WHEN NOT MATCHED THEN
+                    INSERT (Chave, MarcaDagua, DataExecucao, LinhasUltimaExecucao)
+                    VALUES (:chave, :marca, GETDATE(), :linhas);
+            """), {'chave': cls.CHAVE_CONTROLE, 'marca': nova_marca, 'linhas': linhas})
+            session.commit()
+
+            modo = 'completo' if completo or marca is None else 'incremental'
+            LogService.Debug("AwbStatusAtualService", f"Status atual materializado ({modo}): {linhas} AWB(s), marca {nova_marca}.")
+            return {'modo': modo, 'awbs_atualizadas': linhas, 'marca_dagua': nova_marca}
+
+        except Exception as e:
+            session.rollback()
+            LogService.FalhaSilenciosa("AwbStatusAtualService", "Atualização do status atual de AWB", e)
+            return {'modo': 'erro', 'awbs_atualizadas': 0, 'marca_dagua': None, 'erro': str(e)}
+        finally:
+            session.close()
@@ -0,0 +1,486 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+
+from Conexoes import ObterSessaoSqlServer
+from Configuracoes import ConfiguracaoAtual
+from Services.LogService import LogService
+from Services.Shared.TarefaSegundoPlano import TarefaSegundoPlano
+
+
+class SnapshotCompartilhado(NamedTuple):
+    """Uma versão publicada: colunas NumPy abertas com mmap (somente leitura) + metadados."""
+    Nome: str
+    Versao: str
+    Colunas: dict
+    Meta: dict
+
+
+class CacheCompartilhadoService:
+    """
+    Caches imutáveis compartilhados entre os processos do servidor (modo multiprocesso, WSGI.py).
+
+    Snapshots: cada cache registrado (Registrar) é construído por UM processo, gravado em
+    DIR_CACHE_COMPARTILHADO/<nome>/<versao>/ como colunas .npy e publicado trocando o arquivo
+    ATUAL. Os demais processos só abrem as colunas com mmap: as páginas ficam no cache do
+    sistema operacional uma vez só, sem reconstrução nem cópia por processo. O ponteiro ATUAL é
+    relido no máximo a cada INTERVALO_SEGUNDOS; a assinatura no banco é conferida em segundo
+    plano a cada INTERVALO_ASSINATURA_SEGUNDOS e, se mudou, uma nova versão é publicada.
+
+    Construção sempre em segundo plano (_AgendarPublicacao): nem a primeira leitura nem uma
+    invalidação seguram a requisição; enquanto não há versão válida, Obter devolve None e quem
+    chama consulta o banco direto. Se outro processo está construindo (trava), espera a trava
+    sair e constrói de novo — a construção em andamento pode ser de antes da mudança.
+
+    Invalidação: Invalidar(nome) agenda a republicação do snapshot (se for um) e grava um sinal
+    em DIR_CACHE_COMPARTILHADO/_sinais. O observador (Iniciar) de cada processo chama os callbacks
+    registrados em AoInvalidar quando o sinal muda — é assim que índices em memória
+    (voos da malha, serviço do cliente, permissões) são refeitos nos outros processos. A versão
+    publicada quando chegou a invalidação deixa de ser usada até sair a próxima.
+
+    Estado por processo: com mais de um processo no servidor, o mesmo observador grava a cada
+    INTERVALO_ESTADO_SEGUNDOS o que cada RegistrarEstadoProcesso(nome, Exportar) devolve em
+    DIR_CACHE_COMPARTILHADO/_processos/<nome>/<pid>.json; LerEstadosProcessos(nome) junta o dos
+    outros processos vivos (métricas de desempenho, por exemplo, somadas na tela de métricas).
+    """
+
+    DIR: str = ConfiguracaoAtual.DIR_CACHE_COMPARTILHADO
+    ATIVO: bool = ConfiguracaoAtual.CACHE_COMPARTILHADO_ATIVO
+    INTERVALO_SEGUNDOS: float = ConfiguracaoAtual.CACHE_COMPARTILHADO_INTERVALO
+    INTERVALO_ASSINATURA_SEGUNDOS: int = ConfiguracaoAtual.CACHE_COMPARTILHADO_VERIFICACAO
+    VERSOES_MANTIDAS = 3
+    VALIDADE_TRAVA_SEGUNDOS = 600
+    MULTIPROCESSO: bool = ConfiguracaoAtual.SERVIDOR_PROCESSOS > 1
+    INTERVALO_ESTADO_SEGUNDOS = 15
+    VALIDADE_ESTADO_SEGUNDOS = 120   # estado mais antigo que isso é de processo que já saiu
+
+    _definicoes: dict = {}          # {nome: (Construir(Sessao) -> (colunas, meta), Assinatura(Sessao))}
+    _abertos: dict = {}             # {nome: SnapshotCompartilhado}
+    _proxima_leitura: dict = {}     # {nome: monotonic} próxima releitura do ponteiro ATUAL
+    _verificacoes: dict = {}        # {nome: TarefaSegundoPlano} conferência da assinatura no banco
+    _publicadores: dict = {}        # {nome: Thread} republicação em segundo plano
+    _republicar: set = set()        # nomes com nova publicação pedida enquanto o publicador roda
+    _invalidados: dict = {}         # {nome: (versão publicada na invalidação, prazo monotonic)}
+    _locks: dict = {}
+    _lock = threading.Lock()
+    _lock_agenda = threading.Lock()
+
+    _assinantes: dict = {}          # {nome: [callback]}
+    _sinais_vistos: dict = {}       # {nome: conteúdo do arquivo de sinal}
+    _observador = None
+    _exportadores: dict = {}        # {nome: Exportar() -> dict json-serializável}
+    _proxima_exportacao: float = 0.0
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # SNAPSHOTS
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def Registrar(cls, nome, Construir, Assinatura):
+        """
+        Construir(Sessao) -> ({coluna: np.ndarray sem dtype object}, meta json-serializável).
+        Assinatura(Sessao) -> tupla que muda quando os dados de origem mudam.
+        """
+        cls._definicoes[nome] = (Construir, Assinatura)
+
+    @classmethod
+    def _LockDe(cls, nome):
+        with cls._lock:
+            return cls._locks.setdefault(nome, threading.Lock())
+
+    @classmethod
+    def Obter(cls, nome):
+        """
+        Snapshot atual (SnapshotCompartilhado) ou None se desligado, não registrado ou
+        indisponível — quem chama cai na consulta direta ao banco.
+        """
+        if not cls.ATIVO or nome not in cls._definicoes:
+            return None
+
+        invalidado = cls._invalidados.get(nome)
+        snapshot = cls._abertos.get(nome)
+        if snapshot is None or invalidado is not None or time.monotonic() >= cls._proxima_leitura.get(nome, 0.0):
+            with cls._LockDe(nome):
+                snapshot = cls._abertos.get(nome)
+                if snapshot is None or invalidado is not None or time.monotonic() >= cls._proxima_leitura.get(nome, 0.0):
+                    snapshot = cls._Recarregar(nome, snapshot)
+
+        if invalidado is not None:
+            versao_invalidada, prazo = invalidado
+            if snapshot is not None and snapshot.Versao == versao_invalidada and time.monotonic() < prazo:
+                return None   # dados mudaram e a nova versão ainda não saiu: banco direto
+            cls._invalidados.pop(nome, None)
+
+        if snapshot is not None:
+            # Confere a assinatura no banco em segundo plano, no máximo a cada INTERVALO_ASSINATURA_SEGUNDOS
+            cls._VerificacaoDe(nome).Agendar(lambda: cls._VerificarAssinatura(nome))
+        return snapshot
+
+    @classmethod
+    def ObterVersao(cls, nome, versao):
+        """
+        Uma versão específica do snapshot (ex.: a que a requisição usou, num processo de cálculo),
+        sem conferir ponteiro nem assinatura. None se desligado ou se a versão já saiu do disco.
+        """
+        if not cls.ATIVO:
+            return None
+        snapshot = cls._abertos.get(nome)
+        if snapshot is not None and snapshot.Versao == versao:
+            return snapshot
+        with cls._LockDe(nome):
+            snapshot = cls._abertos.get(nome)
+            if snapshot is not None and snapshot.Versao == versao:
+                return snapshot
+            aberto = cls._Abrir(nome, versao)
+            if aberto is not None and (snapshot is None or int(versao, 16) > int(snapshot.Versao, 16)):
+                cls._abertos[nome] = aberto
+            return aberto
+
+    @classmethod
+    def _Recarregar(cls, nome, atual):
+        cls._proxima_leitura[nome] = time.monotonic() + cls.INTERVALO_SEGUNDOS
+        versao = cls._LerArquivo(os.path.join(cls.DIR, nome, 'ATUAL'))
+        if versao is None and atual is None:
+            # Ninguém publicou ainda: este processo constrói em segundo plano (os outros esperam
+            # o ponteiro). Depois de uma tentativa, só agenda de novo no intervalo da assinatura.
+            verificacao = cls._VerificacaoDe(nome)
+            if verificacao.Vencida():
+                verificacao.Adiar()
+                cls._AgendarPublicacao(nome)
+            return None
+
+        if versao and (atual is None or atual.Versao != versao):
+            novo = cls._Abrir(nome, versao)
+            if novo is not None:
+                cls._abertos[nome] = novo
+                return novo
+        return atual
+
+    @classmethod
+    def _Abrir(cls, nome, versao):
+        pasta = os.path.join(cls.DIR, nome, versao)
+        try:
+            with open(os.path.join(pasta, 'meta.json'), encoding='utf-8') as arquivo:
+                meta = json.load(arquivo)
+            colunas = {
+                coluna: np.load(os.path.join(pasta, f"{coluna}.npy"), mmap_mode='r', allow_pickle=False)
+                for coluna in meta['colunas']
+            }
+            return SnapshotCompartilhado(nome, versao, colunas, meta)
+        except Exception as e:
+            LogService.FalhaSilenciosa("CacheCompartilhadoService", f"Abertura do snapshot {nome}/{versao}", e)
+            return None
+
+    @classmethod
+    def _AgendarPublicacao(cls, nome):
+        """Publica 'nome' numa thread; pedido feito durante uma publicação em andamento gera mais uma."""
+        with cls._lock_agenda:
+            cls._republicar.add(nome)
+            publicador = cls._publicadores.get(nome)
+            if publicador is not None and publicador.is_alive():
+                return
+            cls._publicadores[nome] = threading.Thread(
+                target=cls._LoopPublicacao,
+                args=(nome,),
+                daemon=True,
+                name=f'cache-compartilhado-publicar-{nome}',
+            )
+            cls._publicadores[nome].start()
+
+    @classmethod
+    def _LoopPublicacao(cls, nome):
+        while True:
+            with cls._lock_agenda:
+                if nome not in cls._republicar:
+                    cls._publicadores.pop(nome, None)
+                    return
+                cls._republicar.discard(nome)
+            cls.Publicar(nome, aguardar=True)
+
+    @classmethod
+    def Publicar(cls, nome, aguardar=False):
+        """
+        Constrói e publica uma nova versão do snapshot. Só um processo constrói por vez
+        (trava em arquivo); retorna a versão publicada ou None (falhou ou outro processo está
+        construindo). aguardar=True espera a trava sair (até VALIDADE_TRAVA_SEGUNDOS) em vez
+        de desistir — usar só fora da requisição.
+        """
+        definicao = cls._definicoes.get(nome)
+        if definicao is None:
+            return None
+        prazo = time.monotonic() + cls.VALIDADE_TRAVA_SEGUNDOS
+        while not cls._Travar(nome):
+            if not aguardar or time.monotonic() >= prazo:
+                return None
+            time.sleep(cls.INTERVALO_SEGUNDOS)
+        Construir, Assinatura = definicao
+        try:
+            inicio = time.perf_counter()
+            Sessao = ObterSessaoSqlServer()
+            try:
+                # Assinatura antes dos dados: se mudar no meio, a próxima conferência republica
+                assinatura = cls._Normalizar(Assinatura(Sessao))
+                colunas, meta = Construir(Sessao)
+            finally:
+                Sessao.close()
+
+            versao = f"{time.time_ns():x}"
+            pasta = os.path.join(cls.DIR, nome, versao)
+            temporaria = pasta + '.tmp'
+            os.makedirs(temporaria, exist_ok=True)
+            for coluna, valores in colunas.items():
+                np.save(os.path.join(temporaria, f"{coluna}.npy"), np.ascontiguousarray(valores), allow_pickle=False)
+
+            linhas = len(next(iter(colunas.values()))) if colunas else 0
+            meta = {
+                **(meta or {}),
+                'assinatura': assinatura,
+                'colunas': list(colunas),
+                'linhas': linhas,
+                'criado_em': datetime.now().isoformat(timespec='seconds'),
+                'pid': os.getpid(),
+            }
+            with open(os.path.join(temporaria, 'meta.json'), 'w', encoding='utf-8') as arquivo:
+                json.dump(meta, arquivo)
+            os.replace(temporaria, pasta)
+            cls._GravarArquivo(os.path.join(cls.DIR, nome, 'ATUAL'), versao)
+            cls._proxima_leitura[nome] = 0.0
+
+            LogService.Info(
+                "CacheCompartilhadoService",
+                f"Snapshot {nome} v{versao} publicado: {linhas} linhas em {(time.perf_counter() - inicio) * 1000:.0f} ms."
+            )
+            cls._LimparVersoes(nome, versao)
+            return versao
+        except Exception as e:
+            LogService.FalhaSilenciosa("CacheCompartilhadoService", f"Publicação do snapshot {nome}", e)
+            return None
+        finally:
+            cls._Destravar(nome)
+
+    @classmethod
+    def _MarcarInvalidado(cls, nome):
+        """A versão publicada agora deixa de valer até sair outra (ou até VALIDADE_TRAVA_SEGUNDOS)."""
+        publicada = cls._LerArquivo(os.path.join(cls.DIR, nome, 'ATUAL'))
+        cls._invalidados[nome] = (publicada, time.monotonic() + cls.VALIDADE_TRAVA_SEGUNDOS)
+
+    @staticmethod
+    def _Normalizar(valor):
+        """Assinatura no formato em que volta do meta.json (tuplas viram listas, datas viram texto)."""
+        return json.loads(json.dumps(valor, default=str))
+
+    @classmethod
+    def _VerificacaoDe(cls, nome):
+        verificacao = cls._verificacoes.get(nome)
+        if verificacao is not None:
+            return verificacao
+        with cls._lock:
+            if nome not in cls._verificacoes:
+                cls._verificacoes[nome] = TarefaSegundoPlano(f'cache-compartilhado-{nome}', cls.INTERVALO_ASSINATURA_SEGUNDOS)
+            return cls._verificacoes[nome]
+
+    @classmethod
+    def _VerificarAssinatura(cls, nome):
+        snapshot = cls._abertos.get(nome)
+        Sessao = ObterSessaoSqlServer()
+        try:
+            assinatura = cls._Normalizar(cls._definicoes[nome][1](Sessao))
+        except Exception as e:
+            LogService.FalhaSilenciosa("CacheCompartilhadoService", f"Verificação do snapshot {nome}", e)
+            return
+        finally:
+            Sessao.close()
+        if snapshot is None or assinatura != snapshot.Meta.get('assinatura'):
+            # Outro processo pode ter publicado enquanto isso: relê o ponteiro antes de construir
+            atual = cls._LerArquivo(os.path.join(cls.DIR, nome, 'ATUAL'))
+            if snapshot is not None and atual and atual != snapshot.Versao:
+                cls._proxima_leitura[nome] = 0.0
+                return
+            cls.Publicar(nome)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # INVALIDAÇÃO (broadcast entre processos)
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def AoInvalidar(cls, nome, callback):
+        """Registra callback() para quando OUTRO processo invalidar 'nome' (ver Invalidar)."""
+        cls._assinantes.setdefault(nome, []).append(callback)
+
+    @classmethod
+    def Invalidar(cls, nome):
+        """
+        Chamar depois de gravar os dados de origem (importação/exclusão de remessa, cadastro...).
+        Agenda a republicação do snapshot 'nome' (se for um) e avisa os outros processos, sem
+        esperar a construção. Quem chama já refez o próprio índice em memória; os callbacks
+        rodam só nos demais.
+        """
+        if not cls.ATIVO:
+            return
+        if nome in cls._definicoes:
+            cls._MarcarInvalidado(nome)
+            cls._AgendarPublicacao(nome)
+        try:
+            conteudo = f"{os.getpid()}:{time.time_ns()}"
+            cls._GravarArquivo(os.path.join(cls.DIR, '_sinais', nome), conteudo)
+            cls._sinais_vistos[nome] = conteudo
+        except Exception as e:
+            LogService.FalhaSilenciosa("CacheCompartilhadoService", f"Sinal de invalidação de {nome}", e)
+
+    @classmethod
+    def Iniciar(cls):
+        """Liga o observador de sinais deste processo (chamado uma vez, em App.py)."""
+        if not cls.ATIVO:
+            return
+        with cls._lock:
+            if cls._observador is not None and cls._observador.is_alive():
+                return
+            for nome in [*cls._assinantes, *cls._definicoes]:
+                cls._sinais_vistos.setdefault(nome, cls._LerArquivo(os.path.join(cls.DIR, '_sinais', nome)))
+            cls._observador = threading.Thread(target=cls._Observar, daemon=True, name='cache-compartilhado-sinais')
+            cls._observador.start()
+
+    @classmethod
+    def _Observar(cls):
+        while True:
+            time.sleep(cls.INTERVALO_SEGUNDOS)
+            cls._DespacharSinais()
+            if cls.MULTIPROCESSO and time.monotonic() >= cls._proxima_exportacao:
+                cls._proxima_exportacao = time.monotonic() + cls.INTERVALO_ESTADO_SEGUNDOS
+                cls._ExportarEstados()
+
+    @classmethod
+    def _DespacharSinais(cls):
+        """Uma passada do observador: roda os callbacks dos sinais que mudaram desde a última."""
+        for nome in list(cls._assinantes) + [n for n in cls._definicoes if n not in cls._assinantes]:
+            callbacks = cls._assinantes.get(nome, [])
+            conteudo = cls._LerArquivo(os.path.join(cls.DIR, '_sinais', nome))
+            if conteudo is None or conteudo == cls._sinais_vistos.get(nome):
+                continue
+            cls._sinais_vistos[nome] = conteudo
+            LogService.Debug("CacheCompartilhadoService", f"Invalidação de {nome} recebida ({conteudo}).")
+            if nome in cls._definicoes:
+                cls._MarcarInvalidado(nome)
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    LogService.FalhaSilenciosa("CacheCompartilhadoService", f"Recarga de {nome} após invalidação", e)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # ESTADO POR PROCESSO (modo multiprocesso)
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def RegistrarEstadoProcesso(cls, nome, Exportar):
+        """Exportar() -> dict json-serializável com o estado deste processo (gravado pelo observador)."""
+        cls._exportadores[nome] = Exportar
+
+    @classmethod
+    def _ExportarEstados(cls):
+        for nome, Exportar in list(cls._exportadores.items()):
+            try:
+                cls._GravarArquivo(
+                    os.path.join(cls.DIR, '_processos', nome, f"{os.getpid()}.json"),
+                    json.dumps(Exportar(), default=str)
+                )
+            except Exception as e:
+                LogService.FalhaSilenciosa("CacheCompartilhadoService", f"Exportação do estado {nome}", e)
+
+    @classmethod
+    def LerEstadosProcessos(cls, nome):
+        """
+        [dict] exportados pelos OUTROS processos vivos para 'nome' (vazio em processo único).
+        Arquivos de processos que já saíram são removidos.
+        """
+        if not cls.ATIVO or not cls.MULTIPROCESSO:
+            return []
+        pasta = os.path.join(cls.DIR, '_processos', nome)
+        estados = []
+        try:
+            entradas = list(os.scandir(pasta))
+        except OSError:
+            return []
+        for entrada in entradas:
+            if not entrada.name.endswith('.json') or entrada.name == f"{os.getpid()}.json":
+                continue
+            try:
+                if time.time() - entrada.stat().st_mtime > cls.VALIDADE_ESTADO_SEGUNDOS:
+                    os.remove(entrada.path)
+                    continue
+                with open(entrada.path, encoding='utf-8') as arquivo:
+                    estados.append(json.load(arquivo))
+            except (OSError, ValueError):
+                continue
+        return estados
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # ARQUIVOS
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def ObterEstado(cls):
+        """{nome: {'Versao', 'Linhas', 'CriadoEm'}} dos snapshots abertos neste processo."""
+        return {
+            nome: {'Versao': s.Versao, 'Linhas': s.Meta.get('linhas'), 'CriadoEm': s.Meta.get('criado_em')}
+            for nome, s in cls._abertos.items()
+        }
+
+    @staticmethod
+    def _LerArquivo(caminho):
+        try:
+            with open(caminho, encoding='utf-8') as arquivo:
+                return arquivo.read().strip() or None
+        except OSError:
+            return None
+
+    @staticmethod
+    def _GravarArquivo(caminho, conteudo):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def _Travar(cls, nome):
+        caminho = os.path.join(cls.DIR, nome, '.trava')
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        for _ in range(2):
+            try:
+                os.close(os.open(caminho, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                # Trava abandonada (processo morreu construindo): vence depois da validade
+                try:
+                    if time.time() - os.path.getmtime(caminho) < cls.VALIDADE_TRAVA_SEGUNDOS:
+                        return False
+                    os.remove(caminho)
+                except OSError:
+                    return False
+        return False
+
+    @classmethod
+    def _Destravar(cls, nome):
+        try:
+            os.remove(os.path.join(cls.DIR, nome, '.trava'))
+        except OSError:
+            pass
+
+    @classmethod
+    def _LimparVersoes(cls, nome, versao_atual):
+        """Mantém as VERSOES_MANTIDAS mais recentes. No Windows, versão ainda mapeada por outro processo fica para a próxima."""
+        pasta = os.path.join(cls.DIR, nome)
+        versoes = sorted(
+            (e.name for e in os.scandir(pasta) if e.is_dir() and not e.name.endswith('.tmp')),
+            key=lambda v: int(v, 16)
+        )
+        for antiga in versoes[:-cls.VERSOES_MANTIDAS]:
+            if antiga != versao_atual:
+                shutil.rmtree(os.path.join(pasta, antiga), ignore_errors=True)
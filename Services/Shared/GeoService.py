@@ -1,4 +1,5 @@
-from sqlalchemy import distinct, desc
+import numpy as np
+from sqlalchemy import distinct, desc, func
 from Conexoes import ObterSessaoSqlServer
 from Models.SQL_SERVER.Cidade import Cidade, RemessaCidade
 from Models.SQL_SERVER.Aeroporto import Aeroporto, RemessaAeroportos
@@ -8,6 +9,7 @@ from Models.SQL_SERVER.Planejamento import RankingAeroportos
 from Utils.Geometria import Haversine
 from Utils.Texto import NormalizarTexto
 from Services.LogService import LogService
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
 
 # Configuração de Inteligência
 # Quanto maior este número, mais o sistema ignora a distância para priorizar o Ranking.
@@ -15,27 +17,34 @@ from Services.LogService import LogService
 FATOR_RANKING_KM = 3.5 
 
 def BuscarCoordenadasCidade(NomeCidade, Uf):
+    if not NomeCidade or not Uf: return None
+
+    NomeBusca = NormalizarTexto(NomeCidade)
+    UfBusca = NormalizarTexto(Uf)
+
+    Snapshot = CacheCompartilhadoService.Obter('cidades')
+    if Snapshot is not None:
+        return _CidadeDoSnapshot(Snapshot, NomeBusca, UfBusca)
+
     Sessao = ObterSessaoSqlServer()
     try:
-        if not NomeCidade or not Uf: return None
-        
-        NomeBusca = NormalizarTexto(NomeCidade)
-        UfBusca = NormalizarTexto(Uf)
-        
-        CidadesDoEstado = Sessao.query(Cidade)\
+        # NomeNormalizado é gravado na importação: a comparação acontece no banco (índice V005).
+        # Nome exato primeiro; senão, o primeiro nome que contém o texto buscado (regra antiga).
+        Consulta = Sessao.query(Cidade.NomeCidade, Cidade.Uf, Cidade.Latitude, Cidade.Longitude)\
             .join(RemessaCidade)\
             .filter(RemessaCidade.Ativo == True) \
-            .filter(Cidade.Uf == UfBusca).all()
-        
-        for c in CidadesDoEstado:
-            NomeBanco = NormalizarTexto(c.NomeCidade)
-            if NomeBanco == NomeBusca or NomeBusca in NomeBanco:
-                return {
-                    'lat': float(c.Latitude) if c.Latitude else 0.0, 
-                    'lon': float(c.Longitude) if c.Longitude else 0.0, 
-                    'nome': c.NomeCidade,
-                    'uf': c.Uf
-                }
+            .filter(Cidade.Uf == UfBusca)
+
+        c = Consulta.filter(Cidade.NomeNormalizado == NomeBusca).first() \
+            or Consulta.filter(Cidade.NomeNormalizado.like(f"%{NomeBusca}%")).order_by(Cidade.Id).first()
+
+        if c:
+            return {
+                'lat': float(c.Latitude) if c.Latitude else 0.0, 
+                'lon': float(c.Longitude) if c.Longitude else 0.0, 
+                'nome': c.NomeCidade,
+                'uf': c.Uf
+            }
         return None
     except Exception as e:
         LogService.Error("GeoService", f"Erro ao buscar cidade {NomeCidade}-{Uf}", e)
@@ -43,6 +52,57 @@ def BuscarCoordenadasCidade(NomeCidade, Uf):
     finally:
         Sessao.close()
 
+def _CidadeDoSnapshot(Snapshot, NomeBusca, UfBusca):
+    """Mesma regra da consulta de BuscarCoordenadasCidade sobre o snapshot 'cidades' (ordenado por Uf, Id)."""
+    c = Snapshot.Colunas
+    Inicio = int(np.searchsorted(c['Uf'], UfBusca, side='left'))
+    Fim = int(np.searchsorted(c['Uf'], UfBusca, side='right'))
+    if Fim <= Inicio: return None
+
+    Nomes = c['NomeNormalizado'][Inicio:Fim]
+    Achados = np.flatnonzero(Nomes == NomeBusca)
+    if len(Achados) == 0:
+        Achados = np.flatnonzero(np.char.find(Nomes, NomeBusca) >= 0)
+    if len(Achados) == 0: return None
+
+    i = Inicio + int(Achados[0])
+    Lat, Lon = float(c['Latitude'][i]), float(c['Longitude'][i])
+    return {
+        'lat': Lat if Lat == Lat and Lat else 0.0,  # NaN = sem coordenada
+        'lon': Lon if Lon == Lon and Lon else 0.0,
+        'nome': str(c['NomeCidade'][i]),
+        'uf': str(c['Uf'][i])
+    }
+
+# Formato das colunas do snapshot 'cidades': entra na assinatura, então mudar aqui republica o snapshot
+FORMATO_SNAPSHOT_CIDADES = 2
+
+def _AssinaturaCidades(Sessao):
+    return (FORMATO_SNAPSHOT_CIDADES, *Sessao.query(func.count(RemessaCidade.Id), func.max(RemessaCidade.Id))
+            .filter(RemessaCidade.Ativo == True).one())
+
+def _ConstruirSnapshotCidades(Sessao):
+    """Cidades da remessa ativa em colunas, ordenadas por Uf e Id (CacheCompartilhadoService, 'cidades')."""
+    Linhas = Sessao.query(
+        Cidade.Id, Cidade.Uf, Cidade.NomeNormalizado, Cidade.NomeCidade, Cidade.Latitude, Cidade.Longitude
+    ).join(RemessaCidade)\
+     .filter(RemessaCidade.Ativo == True)\
+     .all()
+    # Uf e nome normalizados como a busca: o '=' do banco ignora caixa e espaços à direita,
+    # a comparação do NumPy não
+    Ufs = [NormalizarTexto(l.Uf) for l in Linhas]
+    Ordem = sorted(range(len(Linhas)), key=lambda i: (Ufs[i], Linhas[i].Id))  # ordem binária do NumPy (searchsorted)
+    Linhas = [Linhas[i] for i in Ordem]
+    Ufs = [Ufs[i] for i in Ordem]
+    return {
+        'Id': np.array([l.Id for l in Linhas], dtype=np.int64),
+        'Uf': np.array(Ufs, dtype=str),
+        'NomeNormalizado': np.array([NormalizarTexto(l.NomeNormalizado) for l in Linhas], dtype=str),
+        'NomeCidade': np.array([l.NomeCidade or '' for l in Linhas], dtype=str),
+        'Latitude': np.array([float(l.Latitude) if l.Latitude is not None else np.nan for l in Linhas], dtype=np.float64),
+        'Longitude': np.array([float(l.Longitude) if l.Longitude is not None else np.nan for l in Linhas], dtype=np.float64),
+    }, {}
+
 def BuscarAeroportoEstrategico(Latitude, Longitude, UfAlvo):
     """
     Busca o melhor aeroporto baseando-se na Estratégia da Empresa (Ranking) 
@@ -138,33 +198,83 @@ def BuscarAeroportoEstrategico(Latitude, Longitude, UfAlvo):
 
 # Manter métodos auxiliares legados caso outras partes do sistema ainda usem, 
 # mas o Planejamento deve chamar o BuscarAeroportoEstrategico acima.
-def BuscarTopAeroportos(lat_cidade, lon_cidade, limite=2):
+def ListarAeroportosAtivos():
+    """Aeroportos da remessa ativa com coordenada: [{'iata', 'nome', 'lat', 'lon'}]."""
+    Snapshot = CacheCompartilhadoService.Obter('aeroportos')
+    if Snapshot is not None:
+        c = Snapshot.Colunas
+        return [
+            {'iata': iata, 'nome': nome, 'lat': lat, 'lon': lon}
+            for iata, nome, lat, lon in zip(
+                c['CodigoIata'].tolist(), c['NomeAeroporto'].tolist(), c['Latitude'].tolist(), c['Longitude'].tolist()
+            )
+        ]
+
     Sessao = ObterSessaoSqlServer()
     try:
-        aeroportos = Sessao.query(Aeroporto)\
-            .join(RemessaAeroportos, Aeroporto.IdRemessa == RemessaAeroportos.Id)\
+        aeroportos = Sessao.query(
+            Aeroporto.CodigoIata, Aeroporto.NomeAeroporto, Aeroporto.Latitude, Aeroporto.Longitude
+        ).join(RemessaAeroportos, Aeroporto.IdRemessa == RemessaAeroportos.Id)\
             .filter(
                 RemessaAeroportos.Ativo == True,
                 Aeroporto.Latitude != None,
                 Aeroporto.Longitude != None
             ).all()
-        
-        lista_distancias = []
-        for aero in aeroportos:
-            dist = Haversine(lat_cidade, lon_cidade, float(aero.Latitude), float(aero.Longitude))
-            lista_distancias.append({
-                'iata': aero.CodigoIata,
-                'nome': aero.NomeAeroporto,
-                'lat': float(aero.Latitude),
-                'lon': float(aero.Longitude),
-                'distancia': dist
-            })
-
-        lista_distancias.sort(key=lambda x: x['distancia'])
-        return lista_distancias[:limite]
 
+        return [
+            {'iata': aero.CodigoIata, 'nome': aero.NomeAeroporto, 'lat': float(aero.Latitude), 'lon': float(aero.Longitude)}
+            for aero in aeroportos
+        ]
     except Exception as e:
-        LogService.Error("GeoService", "Erro ao buscar Top Aeroportos", e)
+        LogService.Error("GeoService", "Erro ao listar aeroportos ativos", e)
         return []
     finally:
-        Sessao.close()
\ No newline at end of file
+        Sessao.close()
+
+def CoordenadasAeroportosAtivos():
+    """{IATA: (lat, lon)} do snapshot 'aeroportos', ou None se indisponível (quem chama consulta o banco)."""
+    Snapshot = CacheCompartilhadoService.Obter('aeroportos')
+    if Snapshot is None: return None
+    c = Snapshot.Colunas
+    return {
+        iata.upper(): (lat, lon)
+        for iata, lat, lon in zip(c['CodigoIata'].tolist(), c['Latitude'].tolist(), c['Longitude'].tolist())
+        if iata
+    }
+
+def _AssinaturaAeroportos(Sessao):
+    return tuple(Sessao.query(func.count(RemessaAeroportos.Id), func.max(RemessaAeroportos.Id))
+                 .filter(RemessaAeroportos.Ativo == True).one())
+
+def _ConstruirSnapshotAeroportos(Sessao):
+    """Aeroportos da remessa ativa com coordenada, em colunas (CacheCompartilhadoService, 'aeroportos')."""
+    Linhas = Sessao.query(
+        Aeroporto.CodigoIata, Aeroporto.NomeAeroporto, Aeroporto.Latitude, Aeroporto.Longitude
+    ).join(RemessaAeroportos, Aeroporto.IdRemessa == RemessaAeroportos.Id)\
+     .filter(
+        RemessaAeroportos.Ativo == True,
+        Aeroporto.Latitude != None,
+        Aeroporto.Longitude != None
+     ).order_by(Aeroporto.Id)\
+     .all()
+    return {
+        'CodigoIata': np.array([l.CodigoIata or '' for l in Linhas], dtype=str),
+        'NomeAeroporto': np.array([l.NomeAeroporto or '' for l in Linhas], dtype=str),
+        'Latitude': np.array([float(l.Latitude) for l in Linhas], dtype=np.float64),
+        'Longitude': np.array([float(l.Longitude) for l in Linhas], dtype=np.float64),
+    }, {}
+
+def OrdenarAeroportosPorDistancia(aeroportos, lat_cidade, lon_cidade, limite=2):
+    """Os 'limite' aeroportos mais próximos de uma lista já carregada (ListarAeroportosAtivos)."""
+    lista_distancias = [
+        {**aero, 'distancia': Haversine(lat_cidade, lon_cidade, aero['lat'], aero['lon'])}
+        for aero in aeroportos
+    ]
+    lista_distancias.sort(key=lambda x: x['distancia'])
+    return lista_distancias[:limite]
+
+def BuscarTopAeroportos(lat_cidade, lon_cidade, limite=2):
+    return OrdenarAeroportosPorDistancia(ListarAeroportosAtivos(), lat_cidade, lon_cidade, limite)
+
+CacheCompartilhadoService.Registrar('cidades', _ConstruirSnapshotCidades, _AssinaturaCidades)
+CacheCompartilhadoService.Registrar('aeroportos', _ConstruirSnapshotAeroportos, _AssinaturaAeroportos)
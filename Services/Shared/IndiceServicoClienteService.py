@@ -0,0 +1,133 @@
+import re
+import threading
+import time
+
+from Conexoes import ObterSessaoSqlServer
+from Configuracoes import ConfiguracaoAtual
+from Services.LogService import LogService
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
+from Services.Shared.TarefaSegundoPlano import TarefaSegundoPlano
+
+# --- MODELS SQL SERVER ---
+from Models.SQL_SERVER.Cadastros import Cliente
+from Models.SQL_SERVER.ServicoCliente import ServicoCliente
+
+
+class IndiceServicoClienteService:
+    """
+    Índice em memória raiz do CNPJ (8 dígitos) -> serviço contratado (texto como cadastrado
+    em Tb_PLN_ServicoCliente; quem usa normaliza). Só entram serviços diferentes de STANDARD:
+    raiz fora do índice = STANDARD.
+
+    Montado com uma única consulta (ServicoCliente + Cliente). É reconstruído a cada
+    cadastro/edição/exclusão em ServicoClienteService e, para pegar alterações feitas por
+    outro processo, recarregado em segundo plano no máximo a cada INTERVALO_SEGUNDOS.
+    """
+
+    INTERVALO_SEGUNDOS: int = ConfiguracaoAtual.SERVICO_CLIENTE_INDICE_INTERVALO
+
+    _indice: dict = None          # {raiz_cnpj: servico_contratado}
+    _agenda = TarefaSegundoPlano('indice-servico-cliente', INTERVALO_SEGUNDOS)
+    _lock_carga = threading.Lock()
+
+    @staticmethod
+    def RaizCnpj(cnpj):
+        """'12.345.678/0001-90' -> '12345678'. None se não tiver ao menos 8 dígitos."""
+        digitos = re.sub(r'[^0-9]', '', str(cnpj or ''))
+        return digitos[:8] if len(digitos) >= 8 else None
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # CONSULTA
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def Resolver(cls, *cnpjs):
+        """
+        Serviço contratado do primeiro CNPJ (na ordem recebida) cuja raiz tem serviço cadastrado.
+        '' se nenhum tem; None se o índice não está disponível (banco fora), para quem chama cair no SQL.
+        """
+        indice = cls._ObterIndice()
+        if indice is None:
+            return None
+        return cls._ResolverNoIndice(indice, cnpjs)
+
+    @classmethod
+    def ResolverLote(cls, grupos_cnpjs):
+        """
+        Resolver() para vários documentos de uma vez: grupos_cnpjs é uma lista de tuplas de CNPJs
+        (ex.: responsável, remetente, destinatário) e o retorno, a lista de serviços na mesma ordem.
+        Um único acesso ao índice para o lote inteiro. None se o índice não está disponível.
+        """
+        indice = cls._ObterIndice()
+        if indice is None:
+            return None
+        return [cls._ResolverNoIndice(indice, cnpjs) for cnpjs in grupos_cnpjs]
+
+    @classmethod
+    def _ResolverNoIndice(cls, indice, cnpjs):
+        for cnpj in cnpjs:
+            servico = indice.get(cls.RaizCnpj(cnpj))
+            if servico is not None:
+                return servico
+        return ''
+
+    @classmethod
+    def _ObterIndice(cls):
+        if cls._indice is None:
+            with cls._lock_carga:
+                # Primeira carga é síncrona; depois de uma falha, só tenta de novo após o intervalo
+                if cls._indice is None and cls._agenda.Vencida():
+                    cls.Reconstruir()
+        else:
+            # Recarga em segundo plano, no máximo a cada INTERVALO_SEGUNDOS
+            cls._agenda.Agendar(cls.Reconstruir)
+        return cls._indice
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # CONSTRUÇÃO
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def Reconstruir(cls):
+        """
+        Recarrega o índice e troca a referência de uma vez. Retorna o total de raízes,
+        ou None se falhou — nesse caso o índice anterior é mantido.
+        """
+        Sessao = ObterSessaoSqlServer()
+        try:
+            inicio = time.perf_counter()
+            linhas = Sessao.query(
+                Cliente.CNPJ_Cliente,
+                ServicoCliente.ServicoContratado
+            ).join(
+                Cliente, ServicoCliente.CodigoCliente == Cliente.Codigo_Cliente
+            ).filter(
+                ServicoCliente.ServicoContratado != 'STANDARD',
+                Cliente.CNPJ_Cliente.isnot(None)
+            ).order_by(ServicoCliente.Id).all()
+
+            indice = {}
+            for linha in linhas:
+                raiz = cls.RaizCnpj(linha.CNPJ_Cliente)
+                # Mais de um cadastro para a mesma raiz: vale o mais antigo
+                if raiz and raiz not in indice:
+                    indice[raiz] = linha.ServicoContratado
+
+            cls._indice = indice
+            cls._agenda.Adiar()
+            LogService.Debug(
+                "IndiceServicoClienteService",
+                f"Índice de serviço contratado reconstruído: {len(indice)} raízes de CNPJ "
+                f"({(time.perf_counter() - inicio) * 1000:.0f} ms)."
+            )
+            return len(indice)
+        except Exception as e:
+            cls._agenda.Adiar()
+            LogService.FalhaSilenciosa("IndiceServicoClienteService", "Reconstrução do índice de serviço contratado", e)
+            return None
+        finally:
+            Sessao.close()
+
+
+# Cadastro alterado em outro processo do servidor (ServicoClienteService)
+CacheCompartilhadoService.AoInvalidar('servico_cliente', IndiceServicoClienteService.Reconstruir)
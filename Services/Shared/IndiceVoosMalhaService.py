@@ -0,0 +1,177 @@
+import threading
+import time
+from datetime import date
+from typing import NamedTuple
+from sqlalchemy import func
+
+from Conexoes import ObterSessaoSqlServer
+from Configuracoes import ConfiguracaoAtual
+from Services.LogService import LogService
+from Services.Shared.TarefaSegundoPlano import TarefaSegundoPlano
+from Utils.Texto import ChaveNumeroVoo, SepararNumeroVoo
+
+# --- MODELS SQL SERVER ---
+from Models.SQL_SERVER.MalhaAerea import RemessaMalha, VooMalha
+
+
+class TrechoMalha(NamedTuple):
+    """Um voo (perna) da malha ativa, como fica guardado no índice."""
+    Cia: str
+    NumeroVoo: str
+    DataPartida: date
+    Origem: str
+    Destino: str
+    HorarioSaida: object
+    HorarioChegada: object
+
+
+class IndiceVoosMalhaService:
+    """
+    Índice em memória da malha ativa: número do voo normalizado (Utils.Texto.ChaveNumeroVoo)
+    -> data de partida -> trechos. Timeline e modal de voo do Acompanhamento resolvem os
+    trechos daqui, sem varrer a malha a cada requisição.
+
+    É reconstruído quando uma remessa de malha é processada ou excluída (MalhaService) e,
+    para pegar trocas feitas por outro processo, a assinatura das remessas ativas é
+    conferida em segundo plano no máximo a cada INTERVALO_SEGUNDOS.
+    """
+
+    INTERVALO_SEGUNDOS: int = ConfiguracaoAtual.MALHA_INDICE_INTERVALO_VERIFICACAO
+
+    # Código da cia (designador IATA do voo ou código ICAO do cadastro/AWB) -> CiaAerea da malha.
+    # A chave do índice é só o número: cias diferentes com o mesmo número caem na mesma chave.
+    CIA_POR_CODIGO = {
+        'LA': 'LATAM', 'JJ': 'LATAM', 'TAM': 'LATAM', 'LAN': 'LATAM',
+        'G3': 'GOL', 'GLO': 'GOL',
+        'AD': 'AZUL', 'AZU': 'AZUL',
+    }
+
+    _indice: dict = None          # {chave: {DataPartida: [TrechoMalha, ...]}}
+    _assinatura: tuple = None
+    _agenda = TarefaSegundoPlano('indice-voos-malha', INTERVALO_SEGUNDOS)
+    _lock_carga = threading.Lock()
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # CONSULTA
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def CiaDaMalha(cls, cia):
+        """Código ou nome da cia ('G3', 'GLO', 'Gol Linhas Aéreas') como aparece em VooMalha.CiaAerea ('GOL')."""
+        valor = str(cia or '').strip().upper()
+        if not valor:
+            return ''
+        if valor in cls.CIA_POR_CODIGO:
+            return cls.CIA_POR_CODIGO[valor]
+        palavras = valor.replace('-', ' ').split()
+        for nome in ('LATAM', 'GOL', 'AZUL'):
+            if nome in palavras:
+                return nome
+        return 'LATAM' if 'TAM' in palavras else valor
+
+    @classmethod
+    def BuscarTrechos(cls, numero_voo, datas, cia=None):
+        """
+        Trechos da malha ativa para o número do voo, só da cia informada (a da AWB) ou,
+        sem ela, da cia do designador do número ('G3-1234'). Sem nenhuma das duas, o número
+        sozinho pode juntar cias diferentes: quem chama deve mandar a cia sempre que tiver.
+        datas: lista em ordem de preferência; vale a primeira data que tiver trechos da cia.
+        Retorna None se o índice não está disponível (banco fora), para quem chama cair no SQL.
+        """
+        indice = cls._ObterIndice()
+        if indice is None:
+            return None
+
+        cia = cls.CiaDaMalha(cia) or cls.CIA_POR_CODIGO.get(SepararNumeroVoo(numero_voo)[0], '')
+        por_data = indice.get(ChaveNumeroVoo(numero_voo, cia))
+        if not por_data:
+            return []
+
+        for data in datas or []:
+            trechos = por_data.get(data, [])
+            if cia:
+                trechos = [t for t in trechos if (t.Cia or '').strip().upper() == cia]
+            if trechos:
+                return trechos
+        return []
+
+    @classmethod
+    def _ObterIndice(cls):
+        if cls._indice is None:
+            with cls._lock_carga:
+                # Primeira carga é síncrona; depois de uma falha, só tenta de novo após o intervalo
+                if cls._indice is None and cls._agenda.Vencida():
+                    cls.Reconstruir()
+        else:
+            # Confere a assinatura das remessas em segundo plano, no máximo a cada INTERVALO_SEGUNDOS
+            cls._agenda.Agendar(cls._VerificarAssinatura)
+        return cls._indice
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # CONSTRUÇÃO
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _Assinatura(Sessao):
+        """(quantidade, maior Id) das remessas ativas: muda a cada importação/exclusão de malha."""
+        return tuple(Sessao.query(func.count(RemessaMalha.Id), func.max(RemessaMalha.Id))
+                     .filter(RemessaMalha.Ativo == True).one())
+
+    @classmethod
+    def Reconstruir(cls):
+        """
+        Recarrega o índice a partir das remessas ativas e troca a referência de uma vez
+        (leitores em andamento continuam com o índice anterior). Retorna o total de trechos,
+        ou None se falhou — nesse caso o índice anterior é mantido.
+        """
+        Sessao = ObterSessaoSqlServer()
+        try:
+            inicio = time.perf_counter()
+            assinatura = cls._Assinatura(Sessao)
+            linhas = Sessao.query(
+                VooMalha.CiaAerea,
+                VooMalha.NumeroVoo,
+                VooMalha.DataPartida,
+                VooMalha.AeroportoOrigem,
+                VooMalha.AeroportoDestino,
+                VooMalha.HorarioSaida,
+                VooMalha.HorarioChegada
+            ).join(RemessaMalha)\
+             .filter(RemessaMalha.Ativo == True)\
+             .order_by(VooMalha.DataPartida, VooMalha.HorarioSaida)\
+             .all()
+
+            indice = {}
+            for linha in linhas:
+                chave = ChaveNumeroVoo(linha.NumeroVoo, linha.CiaAerea)
+                if not chave:
+                    continue
+                indice.setdefault(chave, {}).setdefault(linha.DataPartida, []).append(TrechoMalha(*linha))
+
+            cls._indice, cls._assinatura = indice, assinatura
+            cls._agenda.Adiar()
+            LogService.Debug(
+                "IndiceVoosMalhaService",
+                f"Índice de voos da malha reconstruído: {len(linhas)} trechos, {len(indice)} números "
+                f"({(time.perf_counter() - inicio) * 1000:.0f} ms)."
+            )
+            return len(linhas)
+        except Exception as e:
+            cls._agenda.Adiar()
+            LogService.FalhaSilenciosa("IndiceVoosMalhaService", "Reconstrução do índice de voos", e)
+            return None
+        finally:
+            Sessao.close()
+
+    @classmethod
+    def _VerificarAssinatura(cls):
+        Sessao = ObterSessaoSqlServer()
+        try:
+            mudou = cls._Assinatura(Sessao) != cls._assinatura
+        except Exception as e:
+            LogService.FalhaSilenciosa("IndiceVoosMalhaService", "Verificação do índice de voos", e)
+            return
+        finally:
+            Sessao.close()
+        if mudou:
+            cls.Reconstruir()
@@ -0,0 +1,118 @@
+from datetime import date, time as dtime
+from typing import NamedTuple
+
+import numpy as np
+
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
+from Services.Shared.IndiceVoosMalhaService import IndiceVoosMalhaService
+
+# --- MODELS SQL SERVER ---
+from Models.SQL_SERVER.MalhaAerea import RemessaMalha, VooMalha
+
+
+class LinhaMalha(NamedTuple):
+    """Mesmo formato das linhas da consulta de malha da busca de rotas (Services.Logic.RouteFlight.montar_voos_rota)."""
+    Id: int
+    CiaAerea: str
+    NumeroVoo: str
+    DataPartida: date
+    AeroportoOrigem: str
+    HorarioSaida: dtime
+    HorarioChegada: dtime
+    AeroportoDestino: str
+
+
+class SnapshotMalhaService:
+    """
+    Malha ativa em colunas (CacheCompartilhadoService, nome 'malha'), ordenada por data de
+    partida: a janela de datas de uma busca de rotas sai por busca binária, sem ir ao banco
+    e sem cada processo do servidor guardar a própria cópia.
+    """
+
+    NOME = 'malha'
+
+    @staticmethod
+    def _Construir(Sessao):
+        linhas = Sessao.query(
+            VooMalha.Id,
+            VooMalha.CiaAerea,
+            VooMalha.NumeroVoo,
+            VooMalha.DataPartida,
+            VooMalha.AeroportoOrigem,
+            VooMalha.HorarioSaida,
+            VooMalha.HorarioChegada,
+            VooMalha.AeroportoDestino
+        ).join(RemessaMalha)\
+         .filter(RemessaMalha.Ativo == True)\
+         .order_by(VooMalha.DataPartida, VooMalha.HorarioSaida, VooMalha.Id)\
+         .all()
+
+        def segundos(h):
+            return h.hour * 3600 + h.minute * 60 + h.second
+
+        colunas = {
+            'Id': np.array([l.Id for l in linhas], dtype=np.int64),
+            'CiaAerea': np.array([l.CiaAerea or '' for l in linhas], dtype=str),
+            'NumeroVoo': np.array([l.NumeroVoo or '' for l in linhas], dtype=str),
+            'DataPartida': np.array([l.DataPartida for l in linhas], dtype='datetime64[D]'),
+            'AeroportoOrigem': np.array([l.AeroportoOrigem or '' for l in linhas], dtype=str),
+            'AeroportoDestino': np.array([l.AeroportoDestino or '' for l in linhas], dtype=str),
+            'Saida': np.array([segundos(l.HorarioSaida) for l in linhas], dtype=np.int32),
+            'Chegada': np.array([segundos(l.HorarioChegada) for l in linhas], dtype=np.int32),
+        }
+        return colunas, {}
+
+    @classmethod
+    def Obter(cls):
+        return CacheCompartilhadoService.Obter(cls.NOME)
+
+    @classmethod
+    def Versao(cls):
+        snapshot = cls.Obter()
+        return snapshot.Versao if snapshot is not None else None
+
+    @classmethod
+    def LinhasEntre(cls, data_inicio, data_fim, snapshot=None):
+        """
+        Voos da malha ativa com DataPartida em [data_inicio, data_fim], como LinhaMalha.
+        Retorna None se o snapshot não está disponível, para quem chama cair no SQL.
+        """
+        snapshot = snapshot or cls.Obter()
+        if snapshot is None:
+            return None
+
+        c = snapshot.Colunas
+        datas = c['DataPartida']
+        ini = int(np.searchsorted(datas, np.datetime64(data_inicio, 'D'), side='left'))
+        fim = int(np.searchsorted(datas, np.datetime64(data_fim, 'D'), side='right'))
+        if fim <= ini:
+            return []
+
+        horarios = {}
+
+        def horario(segundos):
+            h = horarios.get(segundos)
+            if h is None:
+                h = horarios[segundos] = dtime(segundos // 3600, segundos // 60 % 60, segundos % 60)
+            return h
+
+        return [
+            LinhaMalha(i, cia, numero, data, origem, horario(saida), horario(chegada), destino)
+            for i, cia, numero, data, origem, saida, chegada, destino in zip(
+                c['Id'][ini:fim].tolist(),
+                c['CiaAerea'][ini:fim].tolist(),
+                c['NumeroVoo'][ini:fim].tolist(),
+                datas[ini:fim].tolist(),
+                c['AeroportoOrigem'][ini:fim].tolist(),
+                c['Saida'][ini:fim].tolist(),
+                c['Chegada'][ini:fim].tolist(),
+                c['AeroportoDestino'][ini:fim].tolist(),
+            )
+        ]
+
+
+# Mesma assinatura do índice por número de voo: muda a cada importação/exclusão de malha
+CacheCompartilhadoService.Registrar(
+    SnapshotMalhaService.NOME, SnapshotMalhaService._Construir, IndiceVoosMalhaService._Assinatura
+)
+CacheCompartilhadoService.AoInvalidar(SnapshotMalhaService.NOME, IndiceVoosMalhaService.Reconstruir)
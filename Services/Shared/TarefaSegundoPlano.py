@@ -0,0 +1,51 @@
+import threading
+import time
+
+
+class TarefaSegundoPlano:
+    """
+    Agenda de uma tarefa de fundo com intervalo mínimo: índices e tabelas que se conferem
+    sozinhos a cada N segundos (IndiceVoosMalhaService, PermissaoService, AwbStatusAtualService...).
+
+    Agendar() nunca espera: se outra thread está agendando, se a execução anterior ainda
+    roda ou se o intervalo não passou, só retorna False. Quem executa a tarefa por conta
+    própria (carga síncrona, falha) chama Adiar() para reiniciar o intervalo.
+    """
+
+    def __init__(self, nome, intervalo):
+        self.nome = nome
+        self.intervalo = intervalo
+        self.proxima = 0.0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def Vencida(self):
+        return time.monotonic() >= self.proxima
+
+    def Adiar(self):
+        self.proxima = time.monotonic() + self.intervalo
+
+    def Agendar(self, alvo, antes=None):
+        """
+        Roda alvo() numa thread daemon se o intervalo já passou; True se disparou.
+        antes(), se informado, roda na thread de quem agenda logo antes do disparo, ainda
+        dentro da trava (ex.: carga local que precisa terminar antes de a tarefa começar).
+        """
+        if not self.Vencida():
+            return False
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            if not self.Vencida():
+                return False
+            self.Adiar()
+            if antes is not None:
+                antes()
+
+            self._thread = threading.Thread(target=alvo, daemon=True, name=self.nome)
+            self._thread.start()
+            return True
+        finally:
+            self._lock.release()
@@ -1,4 +1,5 @@
 import os
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from sqlalchemy import desc, func, text
@@ -6,6 +7,7 @@ from Conexoes import ObterSessaoSqlServer
 from Models.SQL_SERVER.TabelaFrete import RemessaFrete, TabelaFrete
 from Configuracoes import ConfiguracaoBase
 from Services.LogService import LogService
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
 
 class TabelaFreteService:
     DIR_TEMP = ConfiguracaoBase.DIR_TEMP
@@ -70,6 +72,13 @@ class TabelaFreteService:
         if not origens or not destinos:
             return {}
 
+        snapshot = CacheCompartilhadoService.Obter('tarifas')
+        if snapshot is not None:
+            cache = TabelaFreteService._CacheDoSnapshot(snapshot, origens, destinos, cias_norm)
+            LogService.Info("TabelaFreteService",
+                f"Cache batch: {len(cache)} tarifas carregadas para {len(lista_voos)} voos (snapshot v{snapshot.Versao}).")
+            return cache
+
         from sqlalchemy import or_
         Sessao = ObterSessaoSqlServer()
         try:
@@ -123,6 +132,73 @@ class TabelaFreteService:
         finally:
             Sessao.close()
 
+    @staticmethod
+    def _CacheDoSnapshot(snapshot, origens, destinos, cias_norm) -> dict:
+        """Mesmo resultado da consulta de CarregarCacheParaVoos, filtrando as colunas do snapshot 'tarifas'."""
+        c = snapshot.Colunas
+        indices = np.flatnonzero(np.isin(c['Origem'], list(origens)) & np.isin(c['Destino'], list(destinos)))
+        if len(indices) == 0:
+            return {}
+
+        # CiaAerea LIKE '%cia%' (collation sem distinção de maiúsculas)
+        cias_busca = c['CiaBusca'][indices]
+        filtro_cia = np.zeros(len(indices), dtype=bool)
+        for cia in cias_norm:
+            filtro_cia |= np.char.find(cias_busca, cia) >= 0
+        indices = indices[filtro_cia]
+
+        cache = {}
+        for i, orig_key, dest_key, cia_k, cia, servico, tarifa in zip(
+            c['Id'][indices].tolist(), c['Origem'][indices].tolist(), c['Destino'][indices].tolist(),
+            c['CiaNorm'][indices].tolist(), c['CiaAerea'][indices].tolist(),
+            c['Servico'][indices].tolist(), c['Tarifa'][indices].tolist(),
+        ):
+            chave = (cia_k, orig_key, dest_key)
+            if chave not in cache:  # snapshot ordenado por Tarifa → primeiro = menor tarifa
+                cache[chave] = {
+                    'id_frete':      i,
+                    'tarifa_base':   tarifa,
+                    'servico':       servico,
+                    'cia_tarifaria': cia,
+                    'tarifa_missing': False,
+                }
+        return cache
+
+    @staticmethod
+    def _AssinaturaTarifas(Sessao):
+        """(quantidade, maior Id) das remessas de frete ativas: muda a cada importação/exclusão."""
+        return tuple(Sessao.query(func.count(RemessaFrete.Id), func.max(RemessaFrete.Id))
+                     .filter(RemessaFrete.Ativo == True).one())
+
+    @staticmethod
+    def _ConstruirSnapshotTarifas(Sessao):
+        """Tarifas das remessas ativas em colunas, da menor para a maior (CacheCompartilhadoService, 'tarifas')."""
+        registros = (
+            Sessao.query(
+                TabelaFrete.Id,
+                TabelaFrete.Origem,
+                TabelaFrete.Destino,
+                TabelaFrete.CiaAerea,
+                TabelaFrete.Tarifa,
+                TabelaFrete.Servico,
+            )
+            .join(RemessaFrete, TabelaFrete.IdRemessa == RemessaFrete.Id)
+            .filter(RemessaFrete.Ativo == True, TabelaFrete.Tarifa.isnot(None), TabelaFrete.Tarifa != 0)
+            .order_by(TabelaFrete.Tarifa.asc(), TabelaFrete.Id.asc())
+            .all()
+        )
+        colunas = {
+            'Id': np.array([r.Id for r in registros], dtype=np.int64),
+            'Origem': np.array([str(r.Origem or '').strip().upper() for r in registros], dtype=str),
+            'Destino': np.array([str(r.Destino or '').strip().upper() for r in registros], dtype=str),
+            'CiaAerea': np.array([str(r.CiaAerea or '') for r in registros], dtype=str),
+            'CiaBusca': np.array([str(r.CiaAerea or '').upper() for r in registros], dtype=str),
+            'CiaNorm': np.array([TabelaFreteService._NormalizarNomeCia(r.CiaAerea) for r in registros], dtype=str),
+            'Servico': np.array([str(r.Servico or 'STD') for r in registros], dtype=str),
+            'Tarifa': np.array([float(r.Tarifa) for r in registros], dtype=np.float64),
+        }
+        return colunas, {}
+
     @staticmethod
     def ListarRemessas():
         Sessao = ObterSessaoSqlServer()
@@ -139,6 +215,7 @@ class TabelaFreteService:
             if Remessa:
                 Sessao.delete(Remessa)
                 Sessao.commit()
+                CacheCompartilhadoService.Invalidar('tarifas')
                 return True, "Tabela excluída com sucesso."
             return False, "Registro não encontrado."
         except Exception as e:
@@ -220,6 +297,7 @@ class TabelaFreteService:
 
             Sessao.bulk_save_objects(ListaInsert)
             Sessao.commit()
+            CacheCompartilhadoService.Invalidar('tarifas')
             return True, f"Sucesso! {len(ListaInsert)} tarifas importadas."
 
         except Exception as e:
@@ -315,4 +393,9 @@ class TabelaFreteService:
             LogService.Error("TabelaFreteService", f"Erro crítico calc {origem}->{destino}", e)
             return 0.0, {'tarifa_missing': True}
         finally:
-            Sessao.close()
\ No newline at end of file
+            Sessao.close()
+
+
+CacheCompartilhadoService.Registrar(
+    'tarifas', TabelaFreteService._ConstruirSnapshotTarifas, TabelaFreteService._AssinaturaTarifas
+)
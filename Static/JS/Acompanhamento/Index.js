@@ -12,6 +12,13 @@ class GerenciadorAcompanhamento {
         
         // Otimização: Renderizador Canvas para melhor performance em rotas complexas
         this.renderizadorCanvas = L.canvas({ padding: 0.5 });
+
+        // Streaming da listagem em andamento (cancelado ao filtrar de novo)
+        this.controladorBusca = null;
+
+        // Linha resumo (origem -> destino) de cada AWB, trocada pelo trajeto real quando ele chega
+        this.linhasResumo = new Map();
+        this.tamanhoLoteTrajetos = 200;
     }
 
     inicializar() {
@@ -86,94 +93,143 @@ class GerenciadorAcompanhamento {
         const filialCtcBusca = document.getElementById('buscaFilialCtc').value;
 
         const corpoTabela = document.querySelector('#tabela-awbs tbody');
+        const rotuloTotal = document.getElementById('lbl-total');
 
         corpoTabela.innerHTML = `<tr><td colspan="8" style="text-align:center; padding:60px; color:var(--luft-text-muted);"><i class="ph-bold ph-spinner animate-spin text-primary" style="font-size:28px;"></i><br><span style="margin-top:10px; display:block">Buscando cargas...</span></td></tr>`;
+        rotuloTotal.innerText = '0';
         
+        // Nova busca cancela o streaming anterior, se ainda estiver chegando
+        if (this.controladorBusca) this.controladorBusca.abort();
+        const controlador = new AbortController();
+        this.controladorBusca = controlador;
+
+        this.camadaGeral.clearLayers();
+        this.linhasResumo.clear();
         this.resetarMapaVisual(); 
 
-        let urlBusca = `${rotasAcompanhamento.listarAwbs}?dataInicio=${inicio}&dataFim=${fim}`;
+        let urlBusca = `${rotasAcompanhamento.listarAwbsStream}?dataInicio=${inicio}&dataFim=${fim}`;
         if (awbBusca) urlBusca += `&numeroAwb=${encodeURIComponent(awbBusca)}`;
         if (filialCtcBusca) urlBusca += `&filialCtc=${encodeURIComponent(filialCtcBusca)}`;
 
         try {
-            const resposta = await fetch(urlBusca);
-            const dados = await resposta.json();
-            
-            corpoTabela.innerHTML = '';
-            document.getElementById('lbl-total').innerText = dados.length;
-
-            if (dados.length === 0) {
-                corpoTabela.innerHTML = `<tr><td colspan="8" style="text-align:center; padding:40px; color:var(--luft-text-muted);">Nenhum registro encontrado.</td></tr>`;
-                return;
+            const resposta = await fetch(urlBusca, { signal: controlador.signal });
+            if (!resposta.ok || !resposta.body) throw new Error(`HTTP ${resposta.status}`);
+
+            // NDJSON: uma AWB por linha; cada pedaço recebido já vira linhas na tabela
+            const leitor = resposta.body.pipeThrough(new TextDecoderStream()).getReader();
+            let resto = '';
+            let total = 0;
+            let erroServidor = null;
+            const numerosCarregados = [];
+
+            const renderizarLinhas = (linhas) => {
+                const fragmento = document.createDocumentFragment();
+                linhas.forEach(linha => {
+                    if (!linha.trim()) return;
+                    const awb = JSON.parse(linha);
+                    // Linha final {"erro": ...}: o servidor falhou no meio da listagem
+                    if (awb.erro) { erroServidor = awb.erro; return; }
+                    this.plotarRotaResumo(awb);
+                    numerosCarregados.push(awb.Numero);
+                    this.montarLinhasAwb(awb).forEach(tr => fragmento.appendChild(tr));
+                    total++;
+                });
+                if (!fragmento.childNodes.length) return;
+                if (total && corpoTabela.querySelector('.animate-spin')) corpoTabela.innerHTML = '';
+                corpoTabela.appendChild(fragmento);
+                rotuloTotal.innerText = total;
+            };
+
+            while (true) {
+                const { value, done } = await leitor.read();
+                if (done) break;
+                const linhas = (resto + value).split('\n');
+                resto = linhas.pop();
+                renderizarLinhas(linhas);
             }
+            renderizarLinhas([resto]);
 
-            dados.forEach(awb => {
-                this.plotarRotaResumo(awb);
-                const idLinha = `row-${awb.CodigoId}`;
-                const corCia = this.obterCorPorCia(awb.CiaAerea);
-
-                let classeCracha = 'luft-badge luft-badge-secondary';
-                const status = awb.Status ? awb.Status.toUpperCase() : '';
-
-                const statusSucesso = ['ENTREGUE', 'CARGA ENTREGUE'];
-                const statusPerigo = ['RETIDA', 'ATRASADO', 'DELAY', 'CANCELADO'];
-                const statusAviso = ['RECEPCAO DOCUMENTAL', 'LIBERADO PELA FISCALIZAÇÃO', 'EM PROCESSO DE LIBERAÇÃO FISCAL'];
-                const statusInfo = ['CARGA ALOCADA', 'EMBARQUE CONFIRMADO', 'AGUARDANDO DESEMBARQUE', 'AGUARDANDO', 'CARGA DESEMBARCADA', 'EMBARQUE SURFACE', 'DESEMBARQUE VÔO', 'EMBARQUE VÔO'];
-
-                if (statusSucesso.some(s => status.includes(s))) classeCracha = 'luft-badge luft-badge-success';
-                else if (statusPerigo.some(s => status.includes(s))) classeCracha = 'luft-badge luft-badge-danger';
-                else if (statusAviso.some(s => status.includes(s))) classeCracha = 'luft-badge luft-badge-warning';
-                else if (statusInfo.some(s => status.includes(s))) classeCracha = 'luft-badge luft-badge-info';
-
-                let htmlVoo = '<span style="color:var(--luft-text-muted);">-</span>';
-                if (awb.Voo && awb.Voo.length > 2) {
-                    htmlVoo = `<span class="voo-interativo" title="Duplo clique para detalhes do voo" 
-                               ondblclick="abrirModalVoo('${awb.Voo}', '${awb.DataStatus}', event)">
-                               <i class="ph-bold ph-airplane-tilt"></i> ${awb.Voo}</span>`;
-                }
+            if (erroServidor && total === 0) throw new Error(erroServidor);
+            if (erroServidor) {
+                // Mantém o que já chegou, mas avisa que a lista está incompleta
+                corpoTabela.insertAdjacentHTML('beforeend', `<tr><td colspan="8" style="text-align:center; padding:16px; color:var(--luft-danger);">Listagem interrompida após ${total} registros. Tente novamente.</td></tr>`);
+            }
 
-                const linhaPrincipal = document.createElement('tr');
-                linhaPrincipal.className = 'row-main';
-                linhaPrincipal.id = idLinha;
-                linhaPrincipal.onclick = (evento) => { 
-                    if (!evento.target.closest('.voo-interativo') && !evento.target.closest('td[ondblclick]')) {
-                        this.alternarArvore(awb.Numero, idLinha); 
-                    }
-                };
-                
-                // Nota: O método AbrirModalAwbDetalhes é presumivelmente uma função global do _ModalAwb.html
-                linhaPrincipal.innerHTML = `
-                    <td style="text-align:center;">
-                        <i class="ph-bold ph-caret-right transition-transform" id="icon-${idLinha}" style="color:var(--luft-text-muted);"></i>
-                    </td>
-                    <td style="font-weight:700; color:var(--luft-primary-600); font-family:monospace; cursor:pointer;"
-                        title="Duplo clique para ver detalhes completos da Carga"
-                        ondblclick="if(typeof AbrirModalAwbDetalhes !== 'undefined') AbrirModalAwbDetalhes('${awb.CodigoId}', event)">
-                        ${awb.Numero}
-                    </td>
-                    <td><span style="font-weight:600; color:${corCia};">${awb.CiaAerea || 'INDEF'}</span></td>
-                    <td><span style="font-weight:700;">${awb.Origem}</span> <i class="ph-bold ph-arrow-right" style="font-size:0.8rem; color:var(--luft-text-muted);"></i> <span style="font-weight:700;">${awb.Destino}</span></td>
-                    <td>${htmlVoo}</td>
-                    <td>${awb.Peso.toFixed(1)} kg</td>
-                    <td><span class="${classeCracha}">${awb.Status}</span></td>
-                    <td style="color:var(--luft-text-muted); font-size:0.8rem;">${awb.DataStatus}</td>
-                `;
-
-                const linhaDetalhe = document.createElement('tr');
-                linhaDetalhe.id = `detail-${idLinha}`;
-                linhaDetalhe.style.display = 'none';
-                linhaDetalhe.innerHTML = `<td colspan="8" class="detail-cell"><div id="container-${idLinha}" style="min-height:100px; padding:20px;">Carregando...</div></td>`;
-                
-                corpoTabela.appendChild(linhaPrincipal);
-                corpoTabela.appendChild(linhaDetalhe);
-            });
+            if (total === 0) {
+                corpoTabela.innerHTML = `<tr><td colspan="8" style="text-align:center; padding:40px; color:var(--luft-text-muted);">Nenhum registro encontrado.</td></tr>`;
+            } else {
+                // Trajetos reais em lotes (uma requisição a cada 200 AWBs), sem travar a tabela
+                this.carregarTrajetosEmLote(numerosCarregados, controlador.signal);
+            }
 
         } catch (erro) {
+            if (erro.name === 'AbortError') return;
             console.error("Erro ao carregar dados de acompanhamento:", erro);
             corpoTabela.innerHTML = `<tr><td colspan="8" style="text-align:center; padding:40px; color:var(--luft-danger);">Erro ao buscar registros. Tente novamente.</td></tr>`;
+        } finally {
+            if (this.controladorBusca === controlador) this.controladorBusca = null;
         }
     }
 
+    montarLinhasAwb(awb) {
+        const idLinha = `row-${awb.CodigoId}`;
+        const corCia = this.obterCorPorCia(awb.CiaAerea);
+
+        let classeCracha = 'luft-badge luft-badge-secondary';
+        const status = awb.Status ? awb.Status.toUpperCase() : '';
+
+        const statusSucesso = ['ENTREGUE', 'CARGA ENTREGUE'];
+        const statusPerigo = ['RETIDA', 'ATRASADO', 'DELAY', 'CANCELADO'];
+        const statusAviso = ['RECEPCAO DOCUMENTAL', 'LIBERADO PELA FISCALIZAÇÃO', 'EM PROCESSO DE LIBERAÇÃO FISCAL'];
+        const statusInfo = ['CARGA ALOCADA', 'EMBARQUE CONFIRMADO', 'AGUARDANDO DESEMBARQUE', 'AGUARDANDO', 'CARGA DESEMBARCADA', 'EMBARQUE SURFACE', 'DESEMBARQUE VÔO', 'EMBARQUE VÔO'];
+
+        if (statusSucesso.some(s => status.includes(s))) classeCracha = 'luft-badge luft-badge-success';
+        else if (statusPerigo.some(s => status.includes(s))) classeCracha = 'luft-badge luft-badge-danger';
+        else if (statusAviso.some(s => status.includes(s))) classeCracha = 'luft-badge luft-badge-warning';
+        else if (statusInfo.some(s => status.includes(s))) classeCracha = 'luft-badge luft-badge-info';
+
+        let htmlVoo = '<span style="color:var(--luft-text-muted);">-</span>';
+        if (awb.Voo && awb.Voo.length > 2) {
+            htmlVoo = `<span class="voo-interativo" title="Duplo clique para detalhes do voo" 
+                       ondblclick="abrirModalVoo('${awb.Voo}', '${awb.DataStatus}', event, '${awb.CiaAerea || ''}')">
+                       <i class="ph-bold ph-airplane-tilt"></i> ${awb.Voo}</span>`;
+        }
+
+        const linhaPrincipal = document.createElement('tr');
+        linhaPrincipal.className = 'row-main';
+        linhaPrincipal.id = idLinha;
+        linhaPrincipal.onclick = (evento) => { 
+            if (!evento.target.closest('.voo-interativo') && !evento.target.closest('td[ondblclick]')) {
+                this.alternarArvore(awb.Numero, idLinha); 
+            }
+        };
+        
+        // Nota: O método AbrirModalAwbDetalhes é presumivelmente uma função global do _ModalAwb.html
+        linhaPrincipal.innerHTML = `
+            <td style="text-align:center;">
+                <i class="ph-bold ph-caret-right transition-transform" id="icon-${idLinha}" style="color:var(--luft-text-muted);"></i>
+            </td>
+            <td style="font-weight:700; color:var(--luft-primary-600); font-family:monospace; cursor:pointer;"
+                title="Duplo clique para ver detalhes completos da Carga"
+                ondblclick="if(typeof AbrirModalAwbDetalhes !== 'undefined') AbrirModalAwbDetalhes('${awb.CodigoId}', event)">
+                ${awb.Numero}
+            </td>
+            <td><span style="font-weight:600; color:${corCia};">${awb.CiaAerea || 'INDEF'}</span></td>
+            <td><span style="font-weight:700;">${awb.Origem}</span> <i class="ph-bold ph-arrow-right" style="font-size:0.8rem; color:var(--luft-text-muted);"></i> <span style="font-weight:700;">${awb.Destino}</span></td>
+            <td>${htmlVoo}</td>
+            <td>${awb.Peso.toFixed(1)} kg</td>
+            <td><span class="${classeCracha}">${awb.Status}</span></td>
+            <td style="color:var(--luft-text-muted); font-size:0.8rem;">${awb.DataStatus}</td>
+        `;
+
+        const linhaDetalhe = document.createElement('tr');
+        linhaDetalhe.id = `detail-${idLinha}`;
+        linhaDetalhe.style.display = 'none';
+        linhaDetalhe.innerHTML = `<td colspan="8" class="detail-cell"><div id="container-${idLinha}" style="min-height:100px; padding:20px;">Carregando...</div></td>`;
+        
+        return [linhaPrincipal, linhaDetalhe];
+    }
+
     plotarRotaResumo(awb) {
         if (awb.RotaMap && awb.RotaMap.Origem) {
             const pontos = this.obterPontosCurva(awb.RotaMap.Origem, awb.RotaMap.Destino);
@@ -188,9 +244,72 @@ class GerenciadorAcompanhamento {
             });
             linha.awbNumero = awb.Numero; 
             linha.addTo(this.camadaGeral);
+            this.linhasResumo.set(awb.Numero, linha);
+        }
+    }
+
+    async carregarTrajetosEmLote(numeros, sinal) {
+        for (let i = 0; i < numeros.length; i += this.tamanhoLoteTrajetos) {
+            const lote = numeros.slice(i, i + this.tamanhoLoteTrajetos);
+            try {
+                const resposta = await fetch(rotasAcompanhamento.historicoLote, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ awbs: lote }),
+                    signal: sinal
+                });
+                if (!resposta.ok) throw new Error(`HTTP ${resposta.status}`);
+                this.plotarTrajetosLote(await resposta.json());
+            } catch (erro) {
+                if (erro.name !== 'AbortError') console.warn("Trajetos em lote indisponíveis; mantendo rotas resumidas.", erro);
+                return;
+            }
         }
     }
 
+    plotarTrajetosLote(dados) {
+        // Formato compacto: Trechos = [origem, destino, voo, partida, chegada]; coordenadas vêm uma vez em Aeroportos
+        const aeroportos = dados.Aeroportos || {};
+
+        Object.entries(dados.Awbs || {}).forEach(([numeroAwb, trajeto]) => {
+            const camadas = [];
+
+            trajeto.Trechos.forEach(([origem, destino, voo]) => {
+                if (!aeroportos[origem] || !aeroportos[destino]) return;
+                camadas.push(L.polyline(this.obterPontosCurva(aeroportos[origem], aeroportos[destino]), {
+                    color: this.obterCorPorCia(voo),
+                    weight: 1.5,
+                    opacity: 0.5,
+                    renderer: this.renderizadorCanvas,
+                    smoothFactor: 1
+                }));
+            });
+
+            if (trajeto.Pendente && aeroportos[trajeto.Pendente[0]] && aeroportos[trajeto.Pendente[1]]) {
+                camadas.push(L.polyline(this.obterPontosCurva(aeroportos[trajeto.Pendente[0]], aeroportos[trajeto.Pendente[1]]), {
+                    color: '#94a3b8',
+                    weight: 1.5,
+                    opacity: 0.5,
+                    dashArray: '3, 6',
+                    renderer: this.renderizadorCanvas,
+                    smoothFactor: 1
+                }));
+            }
+
+            if (camadas.length === 0) return;
+
+            const linhaResumo = this.linhasResumo.get(numeroAwb);
+            if (linhaResumo) {
+                this.camadaGeral.removeLayer(linhaResumo);
+                this.linhasResumo.delete(numeroAwb);
+            }
+            camadas.forEach(camada => {
+                camada.awbNumero = numeroAwb;
+                camada.addTo(this.camadaGeral);
+            });
+        });
+    }
+
     alternarArvore(numeroAwb, idLinha) {
         const linhaPrincipal = document.getElementById(idLinha);
         const linhaDetalhe = document.getElementById(`detail-${idLinha}`);
@@ -234,7 +353,7 @@ class GerenciadorAcompanhamento {
             let displayVoo = '';
             if (registro.Voo && registro.Voo.length > 2) {
                 displayVoo = `<span class="voo-interativo" style="background:rgba(14, 165, 233, 0.1); color:var(--luft-info); padding:2px 8px; border-radius:4px;"
-                              ondblclick="abrirModalVoo('${registro.Voo}', '${registro.Data}', event)">
+                              ondblclick="abrirModalVoo('${registro.Voo}', '${registro.Data}', event, '${dados.CiaAerea || ''}')">
                               <i class="ph-bold ph-airplane-tilt"></i> ${registro.Voo}</span>`;
             }
 
@@ -320,7 +439,7 @@ class GerenciadorAcompanhamento {
         this.mapa.setView([-14.2350, -51.9253], 4);
     }
 
-    async abrirModalVoo(numero, dataRef, evento) {
+    async abrirModalVoo(numero, dataRef, evento, cia) {
         if (evento) { evento.stopPropagation(); evento.preventDefault(); } 
         
         const modal = document.getElementById('modal-voo');
@@ -328,7 +447,8 @@ class GerenciadorAcompanhamento {
         
         document.getElementById('mv-numero').innerText = 'BUSCANDO...';
         
-        const urlReq = `${rotasAcompanhamento.detalhesVoo}?numeroVoo=${numero}&dataRef=${dataRef}`;
+        let urlReq = `${rotasAcompanhamento.detalhesVoo}?numeroVoo=${numero}&dataRef=${dataRef}`;
+        if (cia) urlReq += `&cia=${encodeURIComponent(cia)}`;
 
         try {
             const resposta = await fetch(urlReq);
@@ -380,6 +500,6 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Expõe as funções para a UI que ainda utilizam eventos inline (onclick, ondblclick)
     window.carregarDados = () => gerenciadorAcompanhamento.carregarDados();
-    window.abrirModalVoo = (numero, dataRef, evento) => gerenciadorAcompanhamento.abrirModalVoo(numero, dataRef, evento);
+    window.abrirModalVoo = (numero, dataRef, evento, cia) => gerenciadorAcompanhamento.abrirModalVoo(numero, dataRef, evento, cia);
     window.fecharModalVoo = () => gerenciadorAcompanhamento.fecharModalVoo();
 });
\ No newline at end of file
@@ -33,12 +33,59 @@ class GerenciadorEditor {
             this.aplicarServicosNoResumo();
             this.atualizarBotaoSalvar(null);
             this.abrirModalServicoDestino();
+        } else if (dadosEditor.rotasAssincronas) {
+            this.aplicarServicosNoResumo();
+            this.carregarOpcoesRotas();
         } else {
             this.aplicarServicosNoResumo();
             setTimeout(() => this.selecionarEstrategia('recomendada'), 300);
         }
     }
 
+    // A página abre sem as rotas (busca cara); elas chegam por aqui assim que ficam prontas
+    async carregarOpcoesRotas() {
+        document.getElementById('timeline-content').innerHTML = `
+            <div style="text-align: center; padding: 60px 20px; color: var(--luft-text-muted);">
+                <i class="ph-bold ph-spinner animate-spin text-primary" style="font-size: 2rem; margin-bottom: 10px;"></i>
+                <p class="font-bold text-main">Buscando rotas aéreas...</p>
+                <p class="text-xs">A malha e as tarifas estão sendo analisadas.</p>
+            </div>`;
+        this.atualizarMetricas(null);
+        this.atualizarBotaoSalvar(null);
+
+        try {
+            const resposta = await fetch(rotasEditor.opcoesRotas, {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({
+                    filial: dadosEditor.ctc.filial,
+                    serie: dadosEditor.ctc.serie,
+                    ctc: dadosEditor.ctc.ctc,
+                    servicos_escolhidos: this.estadoAtual.servicosEscolhidos,
+                    usar_cache: true  // contexto montado na abertura da página, segundos antes
+                })
+            });
+            const dados = await resposta.json();
+
+            if (!resposta.ok || !dados.sucesso) {
+                throw new Error(dados.msg || 'Falha ao calcular as rotas.');
+            }
+
+            dadosEditor.opcoesRotas = dados.opcoes_rotas || {};
+            if (dados.ctc) dadosEditor.ctc = dados.ctc;
+
+            const possuiRotas = Object.values(dadosEditor.opcoesRotas).some(lista => lista && lista.length > 0);
+            if (!possuiRotas) {
+                LuftCore.notificar('Atenção: Nenhuma rota aérea ativa foi encontrada para os parâmetros informados.', 'warning');
+            }
+            this.selecionarEstrategia('recomendada');
+        } catch (erro) {
+            console.error(erro);
+            LuftCore.notificar(erro.message || 'Erro ao calcular as rotas.', 'danger');
+            this.selecionarEstrategia('recomendada');
+        }
+    }
+
     possuiPendenciaServico() {
         return Boolean(dadosEditor.ctc && dadosEditor.ctc.servico_pendente);
     }
@@ -77,8 +77,9 @@ class GerenciadorPlanejamento {
             const resposta = await fetch(rotasPlanejamento.listarCtcs);
             if (!resposta.ok) throw new Error("Falha na comunicação com o servidor");
             
-            const dadosNovos = await resposta.json();
-            this.processarDados(dadosNovos);
+            // Quadro colunar (valores crus + dicionários); a formatação é feita em Quadro.js
+            const quadro = await resposta.json();
+            this.processarDados(decodificarQuadroPlanejamento(quadro));
 
         } catch (erro) {
             console.error("Erro ao buscar dados:", erro);
@@ -90,10 +91,7 @@ class GerenciadorPlanejamento {
 
     processarDados(dados) {
         dados.forEach(item => {
-            const partesData = item.data_emissao.split('/'); 
-            const horaLimpa = item.hora_emissao ? item.hora_emissao.replace(':', '') : '0000';
-            
-            item.dataRaw = Number(`${partesData[2]}${partesData[1]}${partesData[0]}${horaLimpa}`);
+            item.dataRaw = item.data_raw;
             item.pesoFisico = Number(item.peso_fisico || 0);
             item.pesoTaxado = Number(item.peso_taxado || 0); 
             item.valorMercadoria = Number(item.raw_val_mercadoria || 0);
@@ -8,6 +8,12 @@ class GerenciadorMapaGlobal {
         this.mapa = null;
         this.camadaMarcadores = null;
         this.filtroAtual = 'TODOS';
+
+        // CTCs do quadro colunar, na mesma ordem dos índices de estado.linhas
+        this.ctcs = decodificarQuadroPlanejamento(dadosMapaGlobal);
+        this.ctcs.forEach(ctc => {
+            ctc.eh_urgente = String(ctc.prioridade || '').toUpperCase().includes('URGENTE');
+        });
     }
 
     inicializar() {
@@ -49,18 +55,15 @@ class GerenciadorMapaGlobal {
     renderizarMapa(filtro) {
         this.camadaMarcadores.clearLayers();
 
-        dadosMapaGlobal.forEach(estado => {
-            const listaFiltrada = estado.lista_ctcs.filter(ctc => {
-                if (filtro === 'TODOS') return true;
-                return ctc.origem_dados === filtro;
-            });
-
-            if (listaFiltrada.length === 0) return;
+        dadosMapaGlobal.ufs.forEach(estado => {
+            // Totais por UF/bloco já vêm agregados do servidor
+            const resumo = estado.resumo[filtro];
+            if (!resumo) return;
 
-            const qtdDocumentos = listaFiltrada.length;
-            const valorTotal = listaFiltrada.reduce((acumulado, atual) => acumulado + (atual.raw_val_mercadoria || 0), 0);
-            const qtdVolumes = listaFiltrada.reduce((acumulado, atual) => acumulado + (atual.volumes || 0), 0);
-            const possuiUrgencia = listaFiltrada.some(ctc => ctc.eh_urgente);
+            const qtdDocumentos = resumo.qtd_docs;
+            const valorTotal = resumo.valor_total;
+            const qtdVolumes = resumo.qtd_vols;
+            const possuiUrgencia = resumo.tem_urgencia;
 
             const classeCss = possuiUrgencia ? 'map-marker is-urgente' : 'map-marker';
             const classeCabecalho = possuiUrgencia ? 'bg-red' : 'bg-blue';
@@ -87,6 +90,9 @@ class GerenciadorMapaGlobal {
             const marcador = L.marker([estado.coords.lat, estado.coords.lon], { icon: iconeCustomizado });
             
             marcador.on('click', () => {
+                const listaFiltrada = estado.linhas
+                    .map(indice => this.ctcs[indice])
+                    .filter(ctc => filtro === 'TODOS' || ctc.origem_dados === filtro);
                 this.carregarBarraLateral(listaFiltrada);
                 this.mapa.flyTo([estado.coords.lat, estado.coords.lon], 6, { duration: 1.2 });
             });
@@ -0,0 +1,86 @@
+/**
+ * Quadro.js - Decodificação do quadro colunar de CTCs (PlanejamentoService._MontarQuadro)
+ * O servidor manda colunas com valores crus e strings repetidas como índice de dicionário;
+ * aqui cada CTC volta a ser um objeto, com a formatação de tela (datas, horas, cidade/UF).
+ * Usado pelo Painel (Index.js) e pelo Mapa Global (Map.js).
+ */
+
+const FormatacaoQuadro = {
+    // 20250314 -> '14/03/2025'
+    data(aaaammdd) {
+        if (!aaaammdd) return '';
+        const texto = String(aaaammdd);
+        return `${texto.slice(6, 8)}/${texto.slice(4, 6)}/${texto.slice(0, 4)}`;
+    },
+
+    // 930 -> '09:30'
+    hora(hhmm) {
+        if (hhmm === null || hhmm === undefined) return '--:--';
+        const texto = String(hhmm).padStart(4, '0');
+        return `${texto.slice(0, 2)}:${texto.slice(2)}`;
+    },
+
+    cidadeUf(cidade, uf) {
+        return `${cidade ?? ''}/${uf ?? ''}`;
+    }
+};
+
+function decodificarQuadroPlanejamento(quadro) {
+    const colunas = quadro.colunas;
+    const valorColuna = {};
+
+    // Coluna codificada -> função que devolve a string do dicionário (null continua null)
+    Object.keys(colunas).forEach(nome => {
+        const nomeDicionario = quadro.codificacao[nome];
+        const valores = colunas[nome];
+        if (nomeDicionario) {
+            const dicionario = quadro.dicionarios[nomeDicionario];
+            valorColuna[nome] = i => (valores[i] === null ? null : dicionario[valores[i]]);
+        } else {
+            valorColuna[nome] = i => valores[i];
+        }
+    });
+
+    const itens = new Array(quadro.total);
+    for (let i = 0; i < quadro.total; i++) {
+        const v = nome => valorColuna[nome](i);
+        const dataEmissao = v('data_emissao');
+        const horaEmissao = v('hora_emissao');
+        const idPlanejamento = v('id_planejamento');
+
+        itens[i] = {
+            indice: i,
+            id_unico: `${v('filial')}-${v('ctc')}`,
+            origem_dados: v('origem_dados'),
+            filial: v('filial'),
+            nomefilial: v('nomefilial'),
+            ctc: v('ctc'),
+            serie: v('serie'),
+            data_emissao: FormatacaoQuadro.data(dataEmissao),
+            hora_emissao: FormatacaoQuadro.hora(horaEmissao),
+            data_raw: dataEmissao ? dataEmissao * 10000 + (horaEmissao || 0) : 0,
+            prioridade: v('prioridade'),
+            motivodoc: v('motivodoc'),
+            status_ctc: v('status_ctc'),
+            origem: FormatacaoQuadro.cidadeUf(v('cidade_origem'), v('uf_origem')),
+            destino: FormatacaoQuadro.cidadeUf(v('cidade_destino'), v('uf_destino')),
+            unid_lastmile: v('unid_lastmile'),
+            cliente_nome: v('cliente_nome'),
+            remetente: v('remetente'),
+            destinatario: v('destinatario'),
+            volumes: v('volumes'),
+            peso_fisico: v('peso_fisico'),
+            peso_taxado: v('peso_taxado'),
+            raw_val_mercadoria: v('valor_mercadoria'),
+            raw_frete_total: v('frete_total'),
+            qtd_notas: v('qtd_notas'),
+            tipo_carga: v('tipo_carga'),
+            tem_planejamento: idPlanejamento !== null,
+            status_planejamento: v('status_planejamento'),
+            id_planejamento: idPlanejamento,
+            custo_planejado: v('custo_planejado'),
+            tarifa_estimada: v('tarifa_estimada')
+        };
+    }
+    return itens;
+}
@@ -0,0 +1,279 @@
+"""
+Modo multiprocesso do servidor (SERVER_WORKERS > 1), iniciado por WSGI.py.
+
+O Windows não tem fork, então em vez de um pre-fork o supervisor sobe N processos waitress
+(WSGI.py --porta <porta interna>), cada um com a aplicação inteira e SERVER_THREADS threads,
+e despacha as conexões TCP da porta pública para o processo com menos conexões abertas.
+Uma busca de rotas pesada (networkx/sklearn/pandas) passa a travar só o GIL do seu processo.
+
+Saúde: a cada SERVER_HEALTH_INTERVAL_SECONDS cada processo recebe GET {prefixo}/Saude.
+Processo que morre é reiniciado (com espera crescente se morrer logo depois de subir);
+processo que falha SERVER_HEALTH_MAX_FAILURES checagens seguidas sai da rotação, termina
+as conexões em andamento e é reiniciado.
+
+O despacho é em nível de conexão: uma conexão keep-alive fica no mesmo processo, e o
+endereço do cliente chega aos processos só pelo X-Forwarded-For do proxy da frente (ProxyFix).
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from Configuracoes import ConfiguracaoAtual
+from Services.LogService import LogService
+
+SCRIPT_WSGI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "WSGI.py")
+
+RESPOSTA_INDISPONIVEL = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain; charset=utf-8\r\n"
+    b"Retry-After: 5\r\n"
+    b"Content-Length: 40\r\n"
+    b"Connection: close\r\n\r\n"
+    b"Servidor reiniciando, tente novamente.\r\n"
+)
+
+
+class _Processo:
+    """Um processo waitress atrás do despachante."""
+
+    def __init__(self, indice, porta):
+        self.Indice = indice
+        self.Porta = porta
+        self.Popen = None
+        self.Saudavel = False       # recebe conexões
+        self.JaRespondeu = False    # passou numa checagem desde que subiu
+        self.Drenando = False
+        self.Falhas = 0
+        self.Conexoes = 0
+        self.Atendidas = 0
+        self.Reinicios = 0
+        self.QuedasSeguidas = 0
+        self.IniciadoEm = 0.0
+        self.ProximoInicio = 0.0
+
+
+class Supervisor:
+    TAMANHO_BLOCO = 64 * 1024
+    TIMEOUT_CONEXAO_SEGUNDOS = 5.0
+    TOLERANCIA_INICIO_SEGUNDOS = 120   # importar a aplicação demora: falhas de checagem não contam antes disso
+    VIDA_MINIMA_SEGUNDOS = 30          # morreu antes disso = queda seguida (espera crescente para reiniciar)
+    ESPERA_MAXIMA_SEGUNDOS = 60
+    DRENAGEM_SEGUNDOS = 30
+    ENCERRAMENTO_SEGUNDOS = 15
+
+    def __init__(self, host, porta, prefixo):
+        self.Host = host
+        self.Porta = porta
+        self.Prefixo = prefixo
+        self.IntervaloSaude = ConfiguracaoAtual.SERVIDOR_SAUDE_INTERVALO
+        self.TimeoutSaude = ConfiguracaoAtual.SERVIDOR_SAUDE_TIMEOUT
+        self.LimiteFalhas = ConfiguracaoAtual.SERVIDOR_SAUDE_FALHAS
+        base = ConfiguracaoAtual.SERVIDOR_PORTA_BASE_PROCESSOS
+        self.Processos = [_Processo(i, base + i) for i in range(1, ConfiguracaoAtual.SERVIDOR_PROCESSOS + 1)]
+        self._encerrar = None
+
+    def Executar(self):
+        os.environ["SERVIDOR_PROCESSO_ID"] = "0"  # logs do supervisor separados dos processos
+        LogService.Inicializar()
+        try:
+            asyncio.run(self._Principal())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._PararTodos()
+            LogService.Info("Supervisor", "Supervisor encerrado.")
+
+    async def _Principal(self):
+        loop = asyncio.get_running_loop()
+        self._encerrar = asyncio.Event()
+        for nome in ("SIGINT", "SIGTERM", "SIGBREAK"):
+            sinal = getattr(signal, nome, None)
+            if sinal is not None:
+                signal.signal(sinal, lambda *_: loop.call_soon_threadsafe(self._encerrar.set))
+
+        for processo in self.Processos:
+            self._Iniciar(processo)
+
+        servidor = await asyncio.start_server(self._Atender, self.Host, self.Porta)
+        LogService.Info(
+            "Supervisor",
+            f"Despachando {self.Host}:{self.Porta} para {len(self.Processos)} processos "
+            f"(portas {self.Processos[0].Porta}-{self.Processos[-1].Porta}, "
+            f"{ConfiguracaoAtual.SERVIDOR_THREADS} threads cada)."
+        )
+        monitor = asyncio.create_task(self._Monitorar())
+        async with servidor:
+            await self._encerrar.wait()
+        monitor.cancel()
+        LogService.Info("Supervisor", "Encerrando: parando os processos.")
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # DESPACHO
+    # ─────────────────────────────────────────────────────────────────────────
+
+    async def _Atender(self, leitor, escritor):
+        candidatos = sorted(
+            (p for p in self.Processos if p.Saudavel),
+            key=lambda p: (p.Conexoes, p.Atendidas)
+        )
+        for processo in candidatos:
+            # Reserva antes de conectar: conexões que chegam juntas não escolhem todas o mesmo processo
+            processo.Conexoes += 1
+            try:
+                leitor_processo, escritor_processo = await asyncio.wait_for(
+                    asyncio.open_connection("127.0.0.1", processo.Porta), self.TIMEOUT_CONEXAO_SEGUNDOS
+                )
+            except (OSError, asyncio.TimeoutError):
+                processo.Conexoes -= 1
+                continue  # a checagem de saúde decide se o processo sai da rotação
+
+            processo.Atendidas += 1
+            try:
+                await asyncio.gather(
+                    self._Copiar(leitor, escritor_processo),
+                    self._Copiar(leitor_processo, escritor),
+                )
+            finally:
+                processo.Conexoes -= 1
+                escritor_processo.close()
+                escritor.close()
+            return
+
+        LogService.Warning("Supervisor", "Nenhum processo disponível: conexão recusada com 503.", Chave="indisponivel")
+        try:
+            escritor.write(RESPOSTA_INDISPONIVEL)
+            await escritor.drain()
+        except OSError:
+            pass
+        finally:
+            escritor.close()
+
+    async def _Copiar(self, leitor, escritor):
+        try:
+            while True:
+                bloco = await leitor.read(self.TAMANHO_BLOCO)
+                if not bloco:
+                    break
+                escritor.write(bloco)
+                await escritor.drain()
+            # Fim do envio de um lado: meio-fechamento, a resposta do outro lado ainda passa
+            if escritor.can_write_eof():
+                escritor.write_eof()
+        except OSError:
+            escritor.close()
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # PROCESSOS
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _Iniciar(self, processo):
+        ambiente = {**os.environ, "SERVIDOR_PROCESSO_ID": str(processo.Indice)}
+        processo.Popen = subprocess.Popen(
+            [sys.executable, SCRIPT_WSGI, "--porta", str(processo.Porta)],
+            env=ambiente,
+            cwd=os.path.dirname(SCRIPT_WSGI),
+        )
+        processo.IniciadoEm = time.monotonic()
+        processo.Saudavel = processo.JaRespondeu = processo.Drenando = False
+        processo.Falhas = 0
+        LogService.Info("Supervisor", f"Processo {processo.Indice} iniciado (pid {processo.Popen.pid}, porta {processo.Porta}).")
+
+    def _Parar(self, processo):
+        if processo.Popen is None or processo.Popen.poll() is not None:
+            return
+        processo.Popen.terminate()
+        try:
+            processo.Popen.wait(self.ENCERRAMENTO_SEGUNDOS)
+        except subprocess.TimeoutExpired:
+            processo.Popen.kill()
+            processo.Popen.wait()
+
+    def _PararTodos(self):
+        for processo in self.Processos:
+            processo.Saudavel = False
+            if processo.Popen is not None and processo.Popen.poll() is None:
+                processo.Popen.terminate()
+        for processo in self.Processos:
+            self._Parar(processo)
+
+    async def _Monitorar(self):
+        while True:
+            await asyncio.gather(*(self._Conferir(p) for p in self.Processos))
+            await asyncio.sleep(self.IntervaloSaude)
+
+    async def _Conferir(self, processo):
+        if processo.Drenando:
+            return
+
+        codigo = processo.Popen.poll() if processo.Popen is not None else None
+        if processo.Popen is None or codigo is not None:
+            if processo.Popen is not None:
+                processo.Saudavel = False
+                processo.Popen = None
+                processo.Reinicios += 1
+                if time.monotonic() - processo.IniciadoEm < self.VIDA_MINIMA_SEGUNDOS:
+                    processo.QuedasSeguidas += 1
+                espera = min(self.ESPERA_MAXIMA_SEGUNDOS, 2 ** processo.QuedasSeguidas - 1)
+                processo.ProximoInicio = time.monotonic() + espera
+                LogService.Warning(
+                    "Supervisor",
+                    f"Processo {processo.Indice} (porta {processo.Porta}) terminou com código {codigo}; "
+                    f"reiniciando em {espera} s."
+                )
+            if time.monotonic() >= processo.ProximoInicio:
+                self._Iniciar(processo)
+            return
+
+        if await self._Sondar(processo):
+            if not processo.Saudavel:
+                LogService.Info("Supervisor", f"Processo {processo.Indice} (porta {processo.Porta}) respondendo; entrou na rotação.")
+            processo.Saudavel = processo.JaRespondeu = True
+            processo.Falhas = processo.QuedasSeguidas = 0
+            return
+
+        if not processo.JaRespondeu and time.monotonic() - processo.IniciadoEm < self.TOLERANCIA_INICIO_SEGUNDOS:
+            return
+        processo.Falhas += 1
+        LogService.Warning(
+            "Supervisor",
+            f"Processo {processo.Indice} (porta {processo.Porta}) não respondeu à checagem de saúde "
+            f"({processo.Falhas}/{self.LimiteFalhas}).",
+            Chave=f"saude-{processo.Indice}"
+        )
+        if processo.Falhas >= self.LimiteFalhas:
+            asyncio.create_task(self._Reciclar(processo))
+
+    async def _Sondar(self, processo):
+        try:
+            leitor, escritor = await asyncio.wait_for(
+                asyncio.open_connection("127.0.0.1", processo.Porta), self.TimeoutSaude
+            )
+        except (OSError, asyncio.TimeoutError):
+            return False
+        try:
+            escritor.write(
+                f"GET {self.Prefixo}/Saude HTTP/1.1\r\nHost: 127.0.0.1:{processo.Porta}\r\n"
+                f"Connection: close\r\n\r\n".encode("ascii")
+            )
+            await escritor.drain()
+            linha = await asyncio.wait_for(leitor.readline(), self.TimeoutSaude)
+            return b" 200 " in linha
+        except (OSError, asyncio.TimeoutError):
+            return False
+        finally:
+            escritor.close()
+
+    async def _Reciclar(self, processo):
+        """Tira da rotação, espera as conexões em andamento (até DRENAGEM_SEGUNDOS) e reinicia."""
+        processo.Drenando = True
+        processo.Saudavel = False
+        limite = time.monotonic() + self.DRENAGEM_SEGUNDOS
+        while processo.Conexoes > 0 and time.monotonic() < limite:
+            await asyncio.sleep(0.5)
+        LogService.Warning("Supervisor", f"Reiniciando processo {processo.Indice} (porta {processo.Porta}) sem resposta.")
+        await asyncio.to_thread(self._Parar, processo)
+        processo.Reinicios += 1
+        self._Iniciar(processo)
@@ -1,6 +1,9 @@
 from datetime import datetime, date
 import re
 
+import numpy as np
+import pandas as pd
+
 def PadronizarData(Valor):
     """
     Recebe uma data suja e retorna um objeto date padrão (sem horário).
@@ -49,4 +52,124 @@ def PadronizarData(Valor):
 
     except Exception as e:
         print(f"⚠️ Erro ao padronizar data '{Valor}': {e}")
-        return None
\ No newline at end of file
+        return None
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  VERSÕES VETORIZADAS (importações em lote)
+#  Mesma regra de PadronizarData, mas aplicada à coluna inteira: cada formato
+#  é uma passada de pd.to_datetime sobre as linhas que ainda estão NaT.
+#  Todas devolvem (resultado, falhas) — falhas = rótulos do índice das linhas
+#  com valor preenchido que nenhum formato conseguiu converter.
+# ─────────────────────────────────────────────────────────────────────────────
+
+MAPA_MESES = {
+    'jan': '01', 'fev': '02', 'mar': '03', 'abr': '04', 'mai': '05', 'jun': '06',
+    'jul': '07', 'ago': '08', 'set': '09', 'out': '10', 'nov': '11', 'dez': '12'
+}
+FORMATOS_DATA = ['%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%y']
+FORMATOS_HORA = ['%H:%M:%S', '%H:%M']
+
+
+def _ValoresPreenchidos(Serie):
+    """Máscara das células com conteúdo (nem NaN/None nem texto vazio)."""
+    Texto = Serie.astype(str).str.strip()
+    return Serie.notna() & (Texto != '') & (Texto.str.lower() != 'nan')
+
+
+def PadronizarDatasSerie(Serie):
+    """
+    Converte uma coluna de datas sujas em datetime64 (só a data, hora zerada).
+    Aceita datetime/date/Timestamp prontos, textos nos FORMATOS_DATA e meses
+    abreviados em português ('05-jan-2025'). Retorna (Serie datetime64, falhas).
+    """
+    Serie = pd.Series(Serie)
+    if pd.api.types.is_datetime64_any_dtype(Serie):
+        Resultado = Serie.dt.normalize()
+        return Resultado, []
+
+    Preenchidos = _ValoresPreenchidos(Serie)
+    Resultado = pd.Series(pd.NaT, index=Serie.index, dtype='datetime64[ns]')
+
+    # 1. Objetos de data já prontos (o Excel costuma entregar assim)
+    Tipos = Serie.map(type)
+    EhData = Tipos.isin([datetime, date, pd.Timestamp])
+    if EhData.any():
+        Resultado[EhData] = pd.to_datetime(Serie[EhData], errors='coerce').dt.normalize()
+
+    # 2. Texto: meses por extenso → número, limpeza e uma passada por formato
+    Textos = Preenchidos & ~EhData
+    if Textos.any():
+        Limpo = Serie[Textos].astype(str).str.strip().str.lower()
+        for MesTexto, MesNum in MAPA_MESES.items():
+            Limpo = Limpo.str.replace(MesTexto, MesNum, regex=False)
+        Limpo = Limpo.str.replace(r'[^0-9/\-]', '', regex=True)
+
+        for Fmt in FORMATOS_DATA:
+            Pendentes = Resultado[Limpo.index].isna()
+            if not Pendentes.any():
+                break
+            Indices = Pendentes[Pendentes].index
+            Resultado[Indices] = pd.to_datetime(Limpo[Indices], format=Fmt, errors='coerce')
+
+    Falhas = Serie.index[Preenchidos & Resultado.isna()].tolist()
+    return Resultado, Falhas
+
+
+def PadronizarHorasSerie(Serie):
+    """
+    Converte uma coluna de horários ('HH:MM', 'HH:MM:SS' ou datetime.time) em
+    objetos datetime.time. Linhas vazias ou inválidas ficam None.
+    Retorna (Serie de time/None, falhas).
+    """
+    Serie = pd.Series(Serie)
+    Preenchidos = _ValoresPreenchidos(Serie)
+    Texto = Serie.astype(str).str.strip()
+
+    Convertido = pd.Series(pd.NaT, index=Serie.index, dtype='datetime64[ns]')
+    for Fmt in FORMATOS_HORA:
+        Pendentes = Preenchidos & Convertido.isna()
+        if not Pendentes.any():
+            break
+        Convertido[Pendentes] = pd.to_datetime(Texto[Pendentes], format=Fmt, errors='coerce')
+
+    Validos = Convertido.notna()
+    Resultado = pd.Series([None] * len(Serie), index=Serie.index, dtype=object)
+    Resultado[Validos] = Convertido[Validos].dt.time
+
+    Falhas = Serie.index[Preenchidos & ~Validos].tolist()
+    return Resultado, Falhas
+
+
+def ConverterDecimaisSerie(Serie):
+    """
+    Converte uma coluna numérica em texto (vírgula ou ponto decimal, aspas
+    residuais) para float64. Vazios e inválidos ficam NaN.
+    Retorna (Serie float64, falhas).
+    """
+    Serie = pd.Series(Serie)
+    if pd.api.types.is_numeric_dtype(Serie):
+        return Serie.astype('float64'), []
+
+    Preenchidos = _ValoresPreenchidos(Serie)
+    Texto = (
+        Serie.astype(str)
+        .str.replace('"', '', regex=False)
+        .str.strip()
+        .str.replace(',', '.', regex=False)
+    )
+    Resultado = pd.to_numeric(Texto.where(Preenchidos), errors='coerce').astype('float64')
+
+    Falhas = Serie.index[Preenchidos & Resultado.isna()].tolist()
+    return Resultado, Falhas
+
+
+def DescreverFalhas(Falhas, Limite=10, Deslocamento=2):
+    """
+    Resumo legível das linhas que não converteram, para log.
+    Deslocamento=2 converte índice do DataFrame em linha da planilha (cabeçalho + base 1).
+    """
+    if not Falhas:
+        return ''
+    Linhas = ', '.join(str(i + Deslocamento) if isinstance(i, (int, np.integer)) else str(i) for i in Falhas[:Limite])
+    Resto = f" (+{len(Falhas) - Limite})" if len(Falhas) > Limite else ''
+    return f"{len(Falhas)} linha(s): {Linhas}{Resto}"
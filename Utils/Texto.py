@@ -18,4 +18,63 @@ def NormalizarTexto(Texto):
         if unicodedata.category(c) != 'Mn'
     )
     
-    return TextoNormalizado
\ No newline at end of file
+    return TextoNormalizado
+
+
+def NormalizarTextoSerie(Serie):
+    """
+    NormalizarTexto aplicado à coluna inteira (pandas .str), para importações em lote.
+    Nulos viram texto vazio, como na versão escalar.
+    """
+    return (
+        Serie.fillna('').astype(str)
+        .str.upper()
+        .str.strip()
+        .str.normalize('NFD')
+        .str.replace(r'[\u0300-\u036f]', '', regex=True)
+    )
+
+
+def ChaveSufixoVoo(NumeroVoo):
+    """
+    Dígitos do número do voo, invertidos (coluna Tb_PLN_Voo.NumeroVooReverso).
+    Inverter transforma a busca por sufixo em busca por prefixo, que usa índice:
+    'G3-1234' -> '43213'; procurar voos terminados em '1234' vira LIKE '4321%'.
+    """
+    if not NumeroVoo:
+        return ""
+    return "".join(c for c in str(NumeroVoo) if c.isdigit())[::-1]
+
+
+# Designadores IATA que aparecem colados no número do voo (TB_AWB_STATUS.VOO, planilha da malha)
+DESIGNADORES_CIA_VOO = ('G3', 'JJ', 'LA', 'AD', 'TP', 'QR', 'H2', 'CM', 'AC', 'AF', 'UX')
+DESIGNADORES_LATAM = ('LA', 'JJ')
+
+
+def SepararNumeroVoo(NumeroVoo):
+    """
+    Separa designador da cia e dígitos do voo: 'LA-03456/15' -> ('LA', '03456').
+    Só o designador do início é removido (o '3' de 'G3' não vira dígito do voo).
+    """
+    if not NumeroVoo:
+        return "", ""
+    Base = str(NumeroVoo).split('/')[0].upper().strip()
+    Designador = next((p for p in DESIGNADORES_CIA_VOO if Base.startswith(p)), "")
+    Digitos = "".join(c for c in Base[len(Designador):] if c.isdigit())
+    return Designador, Digitos
+
+
+def ChaveNumeroVoo(NumeroVoo, CiaAerea=None):
+    """
+    Chave única do voo para cruzar status de AWB com a malha: dígitos sem designador
+    nem zeros à esquerda. Voos LATAM ficam com os 4 últimos dígitos, como o
+    LEFT(2) + RIGHT(4) que a consulta da timeline aplicava.
+    'LA03456' -> '3456' | 'G3-1234/15' -> '1234'
+    A chave não distingue cias (G3 1234 e AD 1234 dão '1234'): confira a cia junto.
+    """
+    Designador, Digitos = SepararNumeroVoo(NumeroVoo)
+    if not Digitos:
+        return ""
+    if Designador in DESIGNADORES_LATAM or (CiaAerea and str(CiaAerea).strip().upper() == 'LATAM'):
+        Digitos = Digitos[-4:]
+    return Digitos.lstrip('0') or '0'
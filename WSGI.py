@@ -5,9 +5,20 @@ import sys
 # Garante que o diretório atual esteja no path para importação correta
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-# Importa a instância 'app' diretamente do seu arquivo App.py
-# (O App.py atual instancia o Flask globalmente, não usa factory 'create_app')
-from App import app
+from Configuracoes import ConfiguracaoAtual
+
+# Modo multiprocesso (SERVER_WORKERS > 1): este processo só supervisiona e despacha (Supervisor.py);
+# quem carrega a aplicação são os processos filhos, iniciados como "WSGI.py --porta <porta interna>".
+PORTA_INTERNA = int(sys.argv[sys.argv.index("--porta") + 1]) if "--porta" in sys.argv else None
+MODO_SUPERVISOR = __name__ == "__main__" and PORTA_INTERNA is None and ConfiguracaoAtual.SERVIDOR_PROCESSOS > 1
+
+# Processos do pool de cálculo de rotas (spawn) reexecutam este script como "__mp_main__":
+# eles importam só os serviços de cálculo, não a aplicação
+if not MODO_SUPERVISOR and __name__ != "__mp_main__":
+    # Importa a instância 'app' diretamente do seu arquivo App.py
+    # (O App.py atual instancia o Flask globalmente, não usa factory 'create_app')
+    from App import app
+    from Services.Logic.RouteComputePool import RouteComputePool
 
 # Tenta importar o Waitress para produção
 try:
@@ -17,22 +28,35 @@ except ImportError:
     print("Instale rodando: pip install waitress")
     sys.exit(1)
 
-if __name__ == "__main__": 
+if __name__ == "__main__":
     # Configurações do ambiente
     host = os.environ.get("HOST", "127.0.0.1")
     port = int(os.environ.get("PORT", "9003"))
 
     # Pega o prefixo usando a mesma lógica do App.py
-    from Configuracoes import ConfiguracaoAtual
     prefix = ConfiguracaoAtual.ROUTE_PREFIX
-    
+
     # Se o prefixo for vazio, definimos o padrão para o ConnectAir
     if not prefix:
         prefix = "/Luft-ConnectAir"
 
+    if not MODO_SUPERVISOR:
+        # Processos de cálculo da busca de rotas aquecidos antes da primeira requisição
+        RouteComputePool.Iniciar()
+
+    if PORTA_INTERNA is not None:
+        # Processo filho do supervisor: só escuta localmente
+        serve(app, host="127.0.0.1", port=PORTA_INTERNA, threads=ConfiguracaoAtual.SERVIDOR_THREADS, url_prefix=prefix)
+        sys.exit(0)
+
     print(f"--> INICIANDO SERVIDOR WSGI (WAITRESS) PARA O Luft-ConnectAir")
     print(f"--> Endereço: http://{host}:{port}{prefix}")
     print(f"--> Modo: Produção (Serviço Windows)")
-    
-    # Inicia o servidor Waitress com o url_prefix!
-    serve(app, host=host, port=port, threads=6, url_prefix=prefix)
+
+    if MODO_SUPERVISOR:
+        print(f"--> Processos: {ConfiguracaoAtual.SERVIDOR_PROCESSOS} x {ConfiguracaoAtual.SERVIDOR_THREADS} threads")
+        from Supervisor import Supervisor
+        Supervisor(host, port, prefix).Executar()
+    else:
+        # Inicia o servidor Waitress com o url_prefix!
+        serve(app, host=host, port=port, threads=ConfiguracaoAtual.SERVIDOR_THREADS, url_prefix=prefix)
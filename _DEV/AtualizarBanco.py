@@ -1,16 +1,297 @@
+"""
+_DEV/AtualizarBanco.py — Atualização de schema do banco
+=======================================================
+
+Aplica, em ordem, as migrações versionadas de SQL/Migracoes (V001__*.sql,
+V002__*.sql, ...) no SQL Server e registra cada uma em
+intec.dbo.Tb_PLN_MigracaoSchema (versão, checksum, data, usuário).
+Migrações já aplicadas são puladas; se o arquivo mudou depois de aplicado,
+o runner avisa e não reaplica.
+
+Cada arquivo é dividido nos separadores GO e executado lote a lote em
+autocommit — as migrações são idempotentes (IF NOT EXISTS / COL_LENGTH),
+então uma execução interrompida pode simplesmente ser repetida.
+
+Com --relatorio-planos, captura o plano estimado (SHOWPLAN_XML) das consultas
+quentes antes e depois de aplicar e grava um comparativo em Logs/.
+
+Uso:
+    python _DEV/AtualizarBanco.py                      # aplica pendentes
+    python _DEV/AtualizarBanco.py --listar             # só mostra o estado
+    python _DEV/AtualizarBanco.py --relatorio-planos   # aplica + relatório antes/depois
+    python _DEV/AtualizarBanco.py --somente-relatorio  # relatório do estado atual
+    python _DEV/AtualizarBanco.py --legado-postgres    # ajuste antigo do Postgres
+"""
+
+import sys
+import os
+import re
+import argparse
+import getpass
+import hashlib
+import xml.etree.ElementTree as ET
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
 from sqlalchemy import text
-from Conexoes import ObterEnginePostgres
+from Conexoes import ObterEnginePostgres, ObterEngineSqlServer
+from Configuracoes import ConfiguracaoAtual
+
+DIR_MIGRACOES  = Path(ConfiguracaoAtual.DIR_BASE) / 'SQL' / 'Migracoes'
+PADRAO_ARQUIVO = re.compile(r'^V(\d{3,})__(.+)\.sql$', re.IGNORECASE)
+SEPARADOR_GO   = re.compile(r'^\s*GO\s*;?\s*$', re.IGNORECASE | re.MULTILINE)
+NS_SHOWPLAN    = {'p': 'http://schemas.microsoft.com/sqlserver/2004/07/showplan'}
+
+SQL_TABELA_CONTROLE = """
+IF OBJECT_ID(N'intec.dbo.Tb_PLN_MigracaoSchema', N'U') IS NULL
+    CREATE TABLE intec.dbo.Tb_PLN_MigracaoSchema (
+        Versao         VARCHAR(10)   NOT NULL,
+        Descricao      VARCHAR(200)  NOT NULL,
+        Checksum       CHAR(64)      NOT NULL,
+        DataAplicacao  DATETIME2     NOT NULL  DEFAULT GETDATE(),
+        Usuario        VARCHAR(50)   NULL,
+        DuracaoMs      INT           NULL,
+        CONSTRAINT PK_PLN_MigracaoSchema PRIMARY KEY (Versao)
+    );
+"""
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# MIGRAÇÕES
+# ─────────────────────────────────────────────────────────────────────────────
+
+def ListarArquivosMigracao():
+    """[(versao, descricao, caminho, checksum)] ordenado pela versão."""
+    migracoes = []
+    for caminho in DIR_MIGRACOES.glob('*.sql'):
+        encontrado = PADRAO_ARQUIVO.match(caminho.name)
+        if not encontrado:
+            print(f"⚠  Ignorado (nome fora do padrão V###__descricao.sql): {caminho.name}")
+            continue
+        conteudo = caminho.read_bytes()
+        migracoes.append((
+            f"V{encontrado.group(1)}",
+            encontrado.group(2).replace('_', ' '),
+            caminho,
+            hashlib.sha256(conteudo).hexdigest(),
+        ))
+    return sorted(migracoes, key=lambda m: int(m[0][1:]))
+
+
+def DividirLotes(sql):
+    """Divide o script nos separadores GO (como o SSMS/sqlcmd), descartando lotes vazios."""
+    return [lote.strip() for lote in SEPARADOR_GO.split(sql) if lote.strip()]
+
+
+def ObterAplicadas(conn):
+    conn.exec_driver_sql(SQL_TABELA_CONTROLE)
+    linhas = conn.exec_driver_sql("SELECT Versao, Checksum FROM intec.dbo.Tb_PLN_MigracaoSchema").fetchall()
+    return {versao: checksum for versao, checksum in linhas}
+
+
+def AplicarMigracoes(engine, somente_listar=False):
+    """Aplica as migrações pendentes. Retorna a quantidade aplicada (ou -1 em erro)."""
+    migracoes = ListarArquivosMigracao()
+    aplicadas_agora = 0
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        aplicadas = ObterAplicadas(conn)
+
+        for versao, descricao, caminho, checksum in migracoes:
+            if versao in aplicadas:
+                if aplicadas[versao].strip() != checksum:
+                    print(f"⚠  {versao} {descricao}: arquivo alterado depois de aplicado (não será reaplicado)")
+                else:
+                    print(f"✔  {versao} {descricao}")
+                continue
+
+            if somente_listar:
+                print(f"…  {versao} {descricao} (pendente)")
+                continue
+
+            print(f"🔨 {versao} {descricao}...")
+            inicio = datetime.now()
+            try:
+                for lote in DividirLotes(caminho.read_text(encoding='utf-8-sig')):
+                    conn.exec_driver_sql(lote)
+            except Exception as e:
+                print(f"❌ Erro em {versao} ({caminho.name}): {e}")
+                print("   Corrija e execute de novo — os lotes já aplicados são idempotentes.")
+                return -1
+
+            duracao_ms = int((datetime.now() - inicio).total_seconds() * 1000)
+            conn.execute(
+                text(
+                    "INSERT INTO intec.dbo.Tb_PLN_MigracaoSchema (Versao, Descricao, Checksum, Usuario, DuracaoMs) "
+                    "VALUES (:versao, :descricao, :checksum, :usuario, :duracao)"
+                ),
+                {
+                    'versao': versao,
+                    'descricao': descricao[:200],
+                    'checksum': checksum,
+                    'usuario': getpass.getuser()[:50],
+                    'duracao': duracao_ms,
+                },
+            )
+            aplicadas_agora += 1
+            print(f"✅ {versao} aplicada em {duracao_ms} ms")
+
+    if not somente_listar:
+        print(f"\n{aplicadas_agora} migração(ões) aplicada(s).")
+    return aplicadas_agora
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# RELATÓRIO DE PLANOS (antes/depois)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def ConsultasMonitoradas():
+    """
+    Consultas quentes das tabelas Tb_PLN_*, com valores representativos.
+    (nome, sql_antes, sql_depois) — 'depois' difere quando a migração muda a forma
+    da consulta na aplicação (ex.: busca por sufixo via NumeroVooReverso).
+    """
+    hoje   = date.today()
+    inicio = hoje.isoformat()
+    fim    = (hoje + timedelta(days=3)).isoformat()
+    ontem  = (hoje - timedelta(days=1)).isoformat()
+
+    busca_rotas = f"""
+        SELECT v.Id, v.CiaAerea, v.NumeroVoo, v.DataPartida, v.AeroportoOrigem,
+               v.HorarioSaida, v.HorarioChegada, v.AeroportoDestino
+        FROM intec.dbo.Tb_PLN_Voo v
+        INNER JOIN intec.dbo.Tb_PLN_RemessaVoo r ON v.IdRemessa = r.Id
+        WHERE r.Ativo = 1 AND v.DataPartida >= '{inicio}' AND v.DataPartida <= '{fim}'
+    """
+    id_voo = f"""
+        SELECT TOP 1 v.Id
+        FROM intec.dbo.Tb_PLN_Voo v
+        INNER JOIN intec.dbo.Tb_PLN_RemessaVoo r ON v.IdRemessa = r.Id
+        WHERE r.Ativo = 1 AND v.CiaAerea = 'GOL' AND v.NumeroVoo = '1234'
+          AND v.DataPartida = '{inicio}' AND v.AeroportoOrigem = 'GRU'
+    """
+    modal_antes = f"""
+        SELECT TOP 1 v.*
+        FROM intec.dbo.Tb_PLN_Voo v
+        INNER JOIN intec.dbo.Tb_PLN_RemessaVoo r ON v.IdRemessa = r.Id
+        WHERE r.Ativo = 1 AND CAST(v.DataPartida AS DATE) = '{inicio}' AND v.NumeroVoo LIKE '%1234'
+    """
+    modal_depois = f"""
+        SELECT TOP 1 v.*
+        FROM intec.dbo.Tb_PLN_Voo v
+        INNER JOIN intec.dbo.Tb_PLN_RemessaVoo r ON v.IdRemessa = r.Id
+        WHERE r.Ativo = 1 AND v.DataPartida IN ('{inicio}', '{ontem}') AND v.NumeroVooReverso LIKE '4321%'
+        ORDER BY v.DataPartida DESC
+    """
+    item_ctc = """
+        SELECT TOP 1 pi.IdItem, pc.IdPlanejamento, pc.Status
+        FROM intec.dbo.Tb_PLN_PlanejamentoItem pi
+        INNER JOIN intec.dbo.Tb_PLN_PlanejamentoCabecalho pc ON pi.IdPlanejamento = pc.IdPlanejamento
+        WHERE pi.Filial = '01' AND pi.Serie = '1' AND pi.Ctc = '123456' AND pc.Status != 'Cancelado'
+    """
+    trechos = """
+        SELECT pt.IdPlanejamento, pt.Ordem, pt.CiaAerea, pt.NumeroVoo, pt.DataPartida
+        FROM intec.dbo.Tb_PLN_PlanejamentoTrecho pt
+        WHERE pt.IdPlanejamento = 1
+        ORDER BY pt.Ordem
+    """
+    return [
+        ("Busca de rotas (faixa de DataPartida + remessa ativa)", busca_rotas, busca_rotas),
+        ("buscar_id_voo (cia, número, data, origem)", id_voo, id_voo),
+        ("Modal de voo (número por sufixo)", modal_antes, modal_depois),
+        ("Item de planejamento por CTC (Filial, Serie, Ctc)", item_ctc, item_ctc),
+        ("Trechos de um planejamento", trechos, trechos),
+    ]
+
+
+def CapturarPlano(engine, sql):
+    """Plano estimado (não executa a consulta): custo total e operadores físicos."""
+    conexao = engine.raw_connection()
+    try:
+        cursor = conexao.cursor()
+        cursor.execute("SET SHOWPLAN_XML ON")
+        try:
+            cursor.execute(sql)
+            xml_plano = cursor.fetchone()[0]
+        finally:
+            cursor.execute("SET SHOWPLAN_XML OFF")
+    except Exception as e:
+        return {'erro': str(e)}
+    finally:
+        conexao.close()
+
+    raiz = ET.fromstring(xml_plano)
+    stmt = raiz.find('.//p:StmtSimple', NS_SHOWPLAN)
+    operadores = []
+    for relop in raiz.iter(f"{{{NS_SHOWPLAN['p']}}}RelOp"):
+        objeto = relop.find('./*/p:Object', NS_SHOWPLAN)
+        alvo = ''
+        if objeto is not None:
+            alvo = f"{objeto.get('Table', '')}.{objeto.get('Index', '')}".replace('[', '').replace(']', '')
+        operadores.append(f"{relop.get('PhysicalOp')}{' ' + alvo if alvo else ''}")
+
+    return {
+        'custo': float(stmt.get('StatementSubTreeCost', 0)) if stmt is not None else None,
+        'operadores': operadores,
+    }
+
+
+def CapturarPlanos(engine, momento):
+    planos = []
+    for nome, sql_antes, sql_depois in ConsultasMonitoradas():
+        planos.append((nome, CapturarPlano(engine, sql_antes if momento == 'antes' else sql_depois)))
+    return planos
+
+
+def _FormatarPlano(plano):
+    if plano is None:
+        return "—", ""
+    if 'erro' in plano:
+        return "erro", plano['erro']
+    custo = f"{plano['custo']:.4f}" if plano['custo'] is not None else "?"
+    return custo, "<br>".join(plano['operadores'])
+
+
+def GravarRelatorioPlanos(antes, depois):
+    """Grava o comparativo em Logs/PlanosConsulta_<data>.md e devolve o caminho."""
+    Path(ConfiguracaoAtual.DIR_LOGS).mkdir(parents=True, exist_ok=True)
+    caminho = Path(ConfiguracaoAtual.DIR_LOGS) / f"PlanosConsulta_{datetime.now():%Y%m%d_%H%M%S}.md"
+
+    linhas = [
+        f"# Planos de consulta — {datetime.now():%d/%m/%Y %H:%M}",
+        "",
+        "Custo estimado (StatementSubTreeCost) e operadores físicos do SHOWPLAN_XML.",
+        "Scan em tabela Tb_PLN_* onde antes havia filtro seletivo indica índice faltando.",
+        "",
+        "| Consulta | Custo antes | Custo depois | Operadores antes | Operadores depois |",
+        "|---|---|---|---|---|",
+    ]
+    mapa_depois = dict(depois or [])
+    for nome, plano_antes in (antes or [(n, None) for n, _ in depois]):
+        custo_a, ops_a = _FormatarPlano(plano_antes)
+        custo_d, ops_d = _FormatarPlano(mapa_depois.get(nome))
+        linhas.append(f"| {nome} | {custo_a} | {custo_d} | {ops_a} | {ops_d} |")
+
+    caminho.write_text("\n".join(linhas) + "\n", encoding='utf-8')
+    return caminho
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# LEGADO (Postgres)
+# ─────────────────────────────────────────────────────────────────────────────
 
 def AtualizarSchema():
     print("🔨 Atualizando estrutura do banco...")
     Engine = ObterEnginePostgres()
-    
+
     if Engine:
         try:
             with Engine.connect() as conn:
                 # Adiciona a coluna se ela não existir
                 Sql = """
-                ALTER TABLE "MalhaAerea"."Tb_RemessaMalha" 
+                ALTER TABLE "MalhaAerea"."Tb_RemessaMalha"
                 ADD COLUMN IF NOT EXISTS "TipoAcao" VARCHAR(50) DEFAULT 'Importacao';
                 """
                 conn.execute(text(Sql))
@@ -19,5 +300,38 @@ def AtualizarSchema():
         except Exception as e:
             print(f"❌ Erro ao atualizar: {e}")
 
+
+def Executar():
+    parser = argparse.ArgumentParser(description="Aplica as migrações de SQL/Migracoes no SQL Server")
+    parser.add_argument('--listar', action='store_true', help="mostra aplicadas/pendentes sem aplicar")
+    parser.add_argument('--relatorio-planos', action='store_true', help="aplica e compara os planos antes/depois")
+    parser.add_argument('--somente-relatorio', action='store_true', help="só captura os planos do estado atual")
+    parser.add_argument('--legado-postgres', action='store_true', help="executa o ajuste antigo do Postgres")
+    args = parser.parse_args()
+
+    if args.legado_postgres:
+        AtualizarSchema()
+        return 0
+
+    Engine = ObterEngineSqlServer()
+    if not Engine:
+        return 1
+
+    if args.somente_relatorio:
+        caminho = GravarRelatorioPlanos(None, CapturarPlanos(Engine, 'depois'))
+        print(f"📄 Relatório de planos: {caminho}")
+        return 0
+
+    antes = CapturarPlanos(Engine, 'antes') if args.relatorio_planos else None
+    resultado = AplicarMigracoes(Engine, somente_listar=args.listar)
+    if resultado < 0:
+        return 1
+
+    if args.relatorio_planos:
+        caminho = GravarRelatorioPlanos(antes, CapturarPlanos(Engine, 'depois'))
+        print(f"📄 Relatório de planos: {caminho}")
+    return 0
+
+
 if __name__ == "__main__":
-    AtualizarSchema()
\ No newline at end of file
+    sys.exit(Executar())
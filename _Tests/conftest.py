@@ -0,0 +1,13 @@
+import importlib
+import os
+import pkgutil
+import sys
+
+# Os testes importam os módulos do projeto a partir da raiz (Services, Utils...), como os scripts de _DEV
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Relacionamentos dos models são declarados pelo nome da classe: carrega todos, como o App faz ao subir
+import Models.SQL_SERVER  # noqa: E402
+
+for _modulo in pkgutil.iter_modules(Models.SQL_SERVER.__path__):
+    importlib.import_module(f'Models.SQL_SERVER.{_modulo.name}')
@@ -0,0 +1,172 @@
+"""
+Paginação por chave (keyset) da listagem de AWBs sobre um SQLite em memória:
+as páginas emendadas pelo cursor têm que reproduzir a lista inteira, sem repetir nem pular.
+"""
+
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import mssql
+from sqlalchemy.orm import sessionmaker
+
+from Models.SQL_SERVER.Awb import Awb, AwbNota
+from Models.SQL_SERVER.Cadastros import CompanhiaAerea
+from Models.SQL_SERVER.MalhaAerea import RemessaMalha, VooMalha
+from Services import AcompanhamentoService as modulo
+from Services.AcompanhamentoService import AcompanhamentoService
+from Utils.Texto import ChaveSufixoVoo
+
+
+@pytest.fixture
+def sessao(monkeypatch):
+    # Tabelas do SQL Server sem o schema 'intec.dbo' e com a collation usada no join da cia
+    engine = create_engine('sqlite://').execution_options(schema_translate_map={'intec.dbo': None})
+
+    @event.listens_for(engine, 'connect')
+    def _collation(conexao, _):
+        conexao.create_collation('DATABASE_DEFAULT', lambda a, b: (a > b) - (a < b))
+
+    tabelas = [Awb.__table__, AwbNota.__table__, CompanhiaAerea.__table__, RemessaMalha.__table__, VooMalha.__table__]
+    with engine.begin() as conexao:
+        Awb.metadata.create_all(conexao, tables=tabelas)
+
+    Sessao = sessionmaker(bind=engine)
+    monkeypatch.setattr(AcompanhamentoService, '_ObterSessaoSql', staticmethod(Sessao))
+    monkeypatch.setattr(modulo, 'ObterSessaoSqlServer', Sessao)
+    monkeypatch.setattr(AcompanhamentoService, '_UltimoStatusPorAwb', staticmethod(lambda session, numeros: {}))
+    monkeypatch.setattr(AcompanhamentoService, '_CoordenadasAeroportos', staticmethod(lambda session, siglas: {}))
+    return Sessao
+
+
+def _inserir_awbs(Sessao):
+    """AWBs com datas repetidas (empate resolvido por codawb) e algumas sem data."""
+    base = datetime.now().replace(hour=10, minute=0, second=0, microsecond=0)
+    session = Sessao()
+    for i in range(23):
+        data = None if i % 7 == 6 else base - timedelta(hours=i // 3)
+        session.add(Awb(codawb=f'C{i:04d}', awb=f'{i:08d}', cia='G3', data=data))
+    session.commit()
+    esperado = sorted(session.query(Awb).all(), key=lambda a: (a.data is not None, a.data or datetime.min, a.codawb), reverse=True)
+    session.close()
+    return [a.codawb for a in esperado], base.date()
+
+
+def test_paginas_pelo_cursor_cobrem_a_lista_inteira(sessao):
+    esperado, hoje = _inserir_awbs(sessao)
+    filtros = {'DataInicio': (hoje - timedelta(days=1)).isoformat(), 'DataFim': hoje.isoformat()}
+    # Os registros sem data ficam de fora do filtro de datas; a busca por número pega todos
+    filtros_numero = {'NumeroAwb': '0'}
+
+    for filtro, codigos in ((filtros_numero, esperado), (filtros, [c for c in esperado if c in _com_data(sessao)])):
+        vistos, cursor, paginas = [], None, 0
+        while True:
+            pagina = AcompanhamentoService.ListarAwbs(filtro, cursor=cursor, limite=4)
+            vistos += [item['CodigoId'] for item in pagina['itens']]
+            paginas += 1
+            cursor = pagina['proximo_cursor']
+            if not cursor: break
+        assert vistos == codigos
+        assert paginas == -(-len(codigos) // 4)
+
+
+def test_streaming_percorre_as_mesmas_paginas(sessao):
+    esperado, _ = _inserir_awbs(sessao)
+    itens = list(AcompanhamentoService.IterarAwbs({'NumeroAwb': '0'}, tamanho_lote=5))
+    assert [item['CodigoId'] for item in itens] == esperado
+
+
+def test_streaming_sinaliza_erro_no_meio(sessao, monkeypatch):
+    _inserir_awbs(sessao)
+    original = AcompanhamentoService._BuscarPaginaAwbs
+    chamadas = []
+
+    def FalharNaSegunda(session, filtros, posicao, limite):
+        chamadas.append(posicao)
+        if len(chamadas) > 1: raise RuntimeError('conexão perdida')
+        return original(session, filtros, posicao, limite)
+
+    monkeypatch.setattr(AcompanhamentoService, '_BuscarPaginaAwbs', staticmethod(FalharNaSegunda))
+    itens = list(AcompanhamentoService.IterarAwbs({'NumeroAwb': '0'}, tamanho_lote=5))
+    assert len(itens) == 6
+    assert 'erro' in itens[-1]
+
+
+def test_cursor_invalido_volta_ao_inicio(sessao):
+    esperado, _ = _inserir_awbs(sessao)
+    pagina = AcompanhamentoService.ListarAwbs({'NumeroAwb': '0'}, cursor='@@@', limite=3)
+    assert [item['CodigoId'] for item in pagina['itens']] == esperado[:3]
+
+
+def test_empate_em_milissegundos_nao_pula_nem_repete(sessao):
+    # DATETIME do SQL Server termina em .xx0/.xx3/.xx7 ms; várias AWBs no mesmo instante
+    base = datetime(2026, 3, 10, 10, 0, 0)
+    session = sessao()
+    for i in range(9):
+        data = base + timedelta(microseconds=(3000, 7000, 10000)[i % 3])
+        session.add(Awb(codawb=f'M{i:04d}', awb=f'9{i:07d}', cia='G3', data=data))
+    session.commit()
+    esperado = [a.codawb for a in sorted(session.query(Awb).all(), key=lambda a: (a.data, a.codawb), reverse=True)]
+    session.close()
+
+    vistos, cursor = [], None
+    while True:
+        pagina = AcompanhamentoService.ListarAwbs({'NumeroAwb': '9'}, cursor=cursor, limite=2)
+        vistos += [item['CodigoId'] for item in pagina['itens']]
+        cursor = pagina['proximo_cursor']
+        if not cursor: break
+    assert vistos == esperado
+
+
+def test_posicao_do_cursor_vai_como_datetime_no_sql_server():
+    posicao = (datetime(2026, 3, 10, 10, 0, 0, 3000), 'M0001')
+    sql = str(AcompanhamentoService._FiltroAposPosicao(posicao).compile(dialect=mssql.dialect()))
+    assert sql.count('AS DATETIME)') == 2
+
+
+def _com_data(Sessao):
+    session = Sessao()
+    try: return {a.codawb for a in session.query(Awb).filter(Awb.data.isnot(None))}
+    finally: session.close()
+
+
+def _inserir_malha(Sessao, dia, voos):
+    session = Sessao()
+    remessa = RemessaMalha(MesReferencia=dia.replace(day=1), Ativo=True)
+    session.add(remessa)
+    session.flush()
+    for cia, numero in voos:
+        session.add(VooMalha(
+            IdRemessa=remessa.Id, CiaAerea=cia, NumeroVoo=numero, NumeroVooReverso=ChaveSufixoVoo(numero),
+            DataPartida=dia, AeroportoOrigem='GRU', AeroportoDestino='REC',
+            HorarioSaida=time(8, 0), HorarioChegada=time(11, 0),
+        ))
+    session.commit()
+    session.close()
+
+
+@pytest.fixture
+def modal_sem_indice(sessao, monkeypatch):
+    # Índice da malha indisponível: o modal cai na consulta por NumeroVooReverso
+    monkeypatch.setattr(modulo.IndiceVoosMalhaService, 'BuscarTrechos', classmethod(lambda cls, *args, **kwargs: None))
+    monkeypatch.setattr(modulo.AeroportoService, 'BuscarPorSigla', staticmethod(lambda sigla: None))
+    return sessao
+
+
+def test_modal_sem_indice_mantem_zeros_do_sufixo(modal_sem_indice):
+    dia = date(2026, 3, 10)
+    _inserir_malha(modal_sem_indice, dia, [('GOL', '1234')])
+
+    assert AcompanhamentoService.BuscarDetalhesVooModal('0034', dia.isoformat()) is None
+
+    _inserir_malha(modal_sem_indice, dia, [('AZUL', '0034')])
+    voo = AcompanhamentoService.BuscarDetalhesVooModal('0034', dia.isoformat())
+    assert (voo['Cia'], voo['Numero']) == ('AZUL', '0034')
+
+
+def test_modal_sem_indice_filtra_pela_cia(modal_sem_indice):
+    dia = date(2026, 3, 10)
+    _inserir_malha(modal_sem_indice, dia, [('GOL', '1234')])
+
+    assert AcompanhamentoService.BuscarDetalhesVooModal('1234', dia.isoformat(), cia='AD') is None
+    assert AcompanhamentoService.BuscarDetalhesVooModal('1234', dia.isoformat(), cia='G3')['Cia'] == 'GOL'
@@ -0,0 +1,189 @@
+"""
+Testes do CacheCompartilhadoService sobre um diretório temporário: trava em arquivo,
+publicação/abertura de versões, limpeza das antigas e despacho dos sinais de invalidação.
+Nenhum teste abre conexão: a sessão do banco é substituída por um objeto vazio.
+"""
+
+import os
+import time
+
+import numpy as np
+import pytest
+
+import Services.Shared.CacheCompartilhadoService as modulo
+from Services.Shared.CacheCompartilhadoService import CacheCompartilhadoService
+
+
+class _SessaoFalsa:
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(modulo, 'ObterSessaoSqlServer', lambda: _SessaoFalsa())
+    monkeypatch.setattr(CacheCompartilhadoService, 'DIR', str(tmp_path))
+    monkeypatch.setattr(CacheCompartilhadoService, 'ATIVO', True)
+    monkeypatch.setattr(CacheCompartilhadoService, 'INTERVALO_SEGUNDOS', 0.01)
+    for atributo in ('_definicoes', '_abertos', '_proxima_leitura', '_verificacoes',
+                     '_publicadores', '_invalidados', '_assinantes', '_sinais_vistos', '_exportadores'):
+        monkeypatch.setattr(CacheCompartilhadoService, atributo, {})
+    monkeypatch.setattr(CacheCompartilhadoService, '_republicar', set())
+    return CacheCompartilhadoService
+
+
+def _registrar(cache, nome='teste', valores=(1, 2, 3)):
+    dados = {'valores': list(valores)}
+    cache.Registrar(
+        nome,
+        lambda Sessao: ({'Valor': np.array(dados['valores'], dtype=np.int64)}, {'origem': 'teste'}),
+        lambda Sessao: (len(dados['valores']),),
+    )
+    return dados
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# TRAVA
+# ─────────────────────────────────────────────────────────────────────────────
+
+def test_travar_nao_pega_trava_recente_de_outro_processo(cache):
+    assert cache._Travar('teste')
+    assert not cache._Travar('teste')
+    cache._Destravar('teste')
+    assert cache._Travar('teste')
+
+
+def test_travar_assume_trava_abandonada(cache):
+    caminho = os.path.join(cache.DIR, 'teste', '.trava')
+    assert cache._Travar('teste')
+    antiga = time.time() - cache.VALIDADE_TRAVA_SEGUNDOS - 5
+    os.utime(caminho, (antiga, antiga))
+
+    assert cache._Travar('teste')
+    assert time.time() - os.path.getmtime(caminho) < cache.VALIDADE_TRAVA_SEGUNDOS
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PUBLICAÇÃO E VERSÕES
+# ─────────────────────────────────────────────────────────────────────────────
+
+def test_publicar_grava_colunas_e_ponteiro(cache):
+    _registrar(cache, valores=(4, 5, 6))
+    versao = cache.Publicar('teste')
+
+    assert versao is not None
+    assert cache._LerArquivo(os.path.join(cache.DIR, 'teste', 'ATUAL')) == versao
+    assert not os.path.exists(os.path.join(cache.DIR, 'teste', '.trava'))
+
+    snapshot = cache.ObterVersao('teste', versao)
+    assert snapshot.Versao == versao
+    assert snapshot.Colunas['Valor'].tolist() == [4, 5, 6]
+    assert isinstance(snapshot.Colunas['Valor'], np.memmap)
+    assert snapshot.Meta['linhas'] == 3
+    assert snapshot.Meta['origem'] == 'teste'
+    assert snapshot.Meta['assinatura'] == [3]
+
+
+def test_publicar_desiste_com_trava_ocupada(cache):
+    _registrar(cache)
+    assert cache._Travar('teste')
+    assert cache.Publicar('teste') is None
+
+
+def test_obter_versao_mantem_a_mais_recente_aberta(cache):
+    dados = _registrar(cache, valores=(1,))
+    antiga = cache.Publicar('teste')
+    dados['valores'] = [1, 2]
+    nova = cache.Publicar('teste')
+
+    assert cache.ObterVersao('teste', nova).Colunas['Valor'].tolist() == [1, 2]
+    # Abrir uma versão antiga (processo de cálculo) não troca a aberta pela antiga
+    assert cache.ObterVersao('teste', antiga).Colunas['Valor'].tolist() == [1]
+    assert cache._abertos['teste'].Versao == nova
+
+
+def test_obter_versao_inexistente(cache):
+    _registrar(cache)
+    cache.Publicar('teste')
+    assert cache.ObterVersao('teste', 'ffffffffffffffff') is None
+
+
+def test_limpar_versoes_mantem_as_mais_recentes(cache):
+    dados = _registrar(cache)
+    versoes = []
+    for n in range(cache.VERSOES_MANTIDAS + 2):
+        dados['valores'] = list(range(n + 1))
+        versoes.append(cache.Publicar('teste'))
+
+    pasta = os.path.join(cache.DIR, 'teste')
+    restantes = sorted((e.name for e in os.scandir(pasta) if e.is_dir()), key=lambda v: int(v, 16))
+    assert restantes == versoes[-cache.VERSOES_MANTIDAS:]
+
+
+def test_invalidar_deixa_de_servir_a_versao_antiga(cache, monkeypatch):
+    dados = _registrar(cache, valores=(1,))
+    cache.Publicar('teste')
+    assert cache.Obter('teste').Colunas['Valor'].tolist() == [1]
+
+    # Sem publicador: a versão antiga não pode voltar enquanto a nova não sai
+    monkeypatch.setattr(cache, '_AgendarPublicacao', lambda nome: None)
+    dados['valores'] = [1, 2]
+    cache.Invalidar('teste')
+    assert cache.Obter('teste') is None
+
+    cache.Publicar('teste')
+    assert cache.Obter('teste').Colunas['Valor'].tolist() == [1, 2]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SINAIS DE INVALIDAÇÃO
+# ─────────────────────────────────────────────────────────────────────────────
+
+def test_despachar_sinais_chama_callbacks_de_sinal_novo(cache):
+    chamadas = []
+    cache.AoInvalidar('indice', lambda: chamadas.append('indice'))
+    cache.AoInvalidar('outro', lambda: chamadas.append('outro'))
+
+    cache._GravarArquivo(os.path.join(cache.DIR, '_sinais', 'indice'), 'outro-processo:1')
+    cache._DespacharSinais()
+    assert chamadas == ['indice']
+
+    # Mesmo sinal: nada de novo
+    cache._DespacharSinais()
+    assert chamadas == ['indice']
+
+    cache._GravarArquivo(os.path.join(cache.DIR, '_sinais', 'indice'), 'outro-processo:2')
+    cache._DespacharSinais()
+    assert chamadas == ['indice', 'indice']
+
+
+def test_despachar_sinais_ignora_o_proprio_sinal_e_segue_apos_erro(cache):
+    chamadas = []
+
+    def Falhar():
+        raise RuntimeError('falha na recarga')
+
+    cache.AoInvalidar('indice', Falhar)
+    cache.AoInvalidar('indice', lambda: chamadas.append('segundo'))
+
+    # Quem invalida já refez o próprio índice: o sinal gravado por ele não volta como callback
+    cache.Invalidar('indice')
+    cache._DespacharSinais()
+    assert chamadas == []
+
+    cache._GravarArquivo(os.path.join(cache.DIR, '_sinais', 'indice'), 'outro-processo:1')
+    cache._DespacharSinais()
+    assert chamadas == ['segundo']
+
+
+def test_observador_despacha_em_segundo_plano(cache):
+    recebidos = []
+    cache.AoInvalidar('indice', lambda: recebidos.append(True))
+    cache._GravarArquivo(os.path.join(cache.DIR, '_sinais', 'indice'), 'outro-processo:1')
+    cache._sinais_vistos['indice'] = 'outro-processo:0'
+
+    cache.Iniciar()
+    limite = time.monotonic() + 2
+    while not recebidos and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert recebidos
@@ -0,0 +1,85 @@
+"""
+CalcularCustoRotasEmLote contra CalcularCustoRota, candidato a candidato e trecho a trecho,
+num cenário sintético fixo (seed). Sem banco: só o cache de tarifas em memória.
+"""
+import random
+from datetime import date, time
+
+import pytest
+
+from Services.Logic.RouteConfig import ContextoRota, resolver_contexto
+from Services.Logic.RouteFlight import montar_voos_rota
+from Services.Logic.RouteIntelligenceService import RouteIntelligenceService
+
+PESO = 137.5
+
+
+class _Linha:
+    def __init__(self, **campos):
+        self.__dict__.update(campos)
+
+
+def _GerarCenario(qtd_rotas, seed):
+    rnd = random.Random(seed)
+    iatas = ['GRU', 'GIG', 'BSB', 'SSA', 'REC', 'MAO', 'POA', 'CWB', 'FOR', 'BEL']
+    cias = ['GOL', 'LATAM', 'AZUL', 'la ', 'G3']
+    servicos = ['GOL LOG SAÚDE', 'GOL LOG RAPIDO', 'GOL LOG ECONOMICO (SBY)',
+                'LATAM CONVENCIONAL (ESTANDAR MEDS)', 'LATAM EXPRESSO (VELOZ)', 'STD']
+
+    linhas = [
+        _Linha(
+            Id=i,
+            CiaAerea=rnd.choice(cias),
+            NumeroVoo=str(1000 + i),
+            DataPartida=date(2026, 1, rnd.randint(1, 28)),
+            AeroportoOrigem=rnd.choice(iatas),
+            HorarioSaida=time(rnd.randint(0, 23), rnd.choice([0, 15, 30, 45])),
+            HorarioChegada=time(rnd.randint(0, 23), rnd.choice([0, 15, 30, 45])),
+            AeroportoDestino=rnd.choice(iatas),
+        )
+        for i in range(400)
+    ]
+    voos = montar_voos_rota(linhas)
+
+    # ~70 % dos pares (cia, origem, destino) com tarifa
+    cache = {}
+    for voo in voos:
+        chave = (voo.CiaTarifaria, voo.AeroportoOrigem, voo.AeroportoDestino)
+        if chave not in cache and rnd.random() < 0.7:
+            cache[chave] = {
+                'id_frete':       len(cache) + 1,
+                'tarifa_base':    round(rnd.uniform(1.5, 45.0), 2),
+                'servico':        rnd.choice(servicos),
+                'cia_tarifaria':  voo.CiaTarifaria,
+                'tarifa_missing': False,
+            }
+
+    rotas = [rnd.sample(voos, rnd.randint(1, 3)) for _ in range(qtd_rotas)]
+    return rotas, cache
+
+
+@pytest.mark.parametrize('seed', [7, 42])
+def test_lote_identico_ao_calculo_por_rota(seed):
+    rotas, cache = _GerarCenario(500, seed)
+    servicos_alvo, _ = resolver_contexto(ContextoRota('PERECIVEL', 'EXPRESSO'))
+    assert cache and any(len(voos) > 1 for voos in rotas)
+
+    lote = RouteIntelligenceService.CalcularCustoRotasEmLote(rotas, PESO, servicos_alvo, cache)
+
+    for idx, voos in enumerate(rotas):
+        ref = RouteIntelligenceService.CalcularCustoRota(voos, PESO, servicos_alvo, cache_tarifas=cache)
+        alinhado = RouteIntelligenceService._servico_alinhado(ref['detalhes'], servicos_alvo)
+
+        assert float(lote['custo_total'][idx]) == ref['custo_total'], idx
+        assert bool(lote['sem_tarifa'][idx]) == ref['sem_tarifa'], idx
+        assert bool(lote['servico_alinhado'][idx]) == alinhado, idx
+        assert RouteIntelligenceService._detalhes_do_lote(lote, idx, len(voos)) == ref['detalhes'], idx
+
+
+def test_cenario_cobre_rotas_sem_tarifa():
+    rotas, cache = _GerarCenario(500, 42)
+    servicos_alvo, _ = resolver_contexto(ContextoRota('PERECIVEL', 'EXPRESSO'))
+    lote = RouteIntelligenceService.CalcularCustoRotasEmLote(rotas, PESO, servicos_alvo, cache)
+
+    sem_tarifa = [bool(v) for v in lote['sem_tarifa']]
+    assert any(sem_tarifa) and not all(sem_tarifa)
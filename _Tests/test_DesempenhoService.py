@@ -0,0 +1,53 @@
+import pytest
+from flask import Flask, g
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+from Services.DesempenhoService import DesempenhoService
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    # Só neste engine: os testes não dependem de Configurar() nem mexem nos eventos globais
+    event.listen(engine, 'before_cursor_execute', DesempenhoService._AntesQuery)
+    event.listen(engine, 'after_cursor_execute', DesempenhoService._DepoisQuery)
+    event.listen(engine, 'handle_error', DesempenhoService._ErroQuery)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def requisicao():
+    app = Flask(__name__)
+    with app.test_request_context('/'):
+        DesempenhoService._IniciarRequisicao()
+        yield
+
+
+def test_query_conta_tempo_e_repeticoes(engine, requisicao):
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+        conn.execute(text('SELECT 1'))
+        assert conn.connection.info['desempenho_queries'] == []
+
+    assert g.desempenho_queries == 2
+    assert g.desempenho_sqls == {'SELECT 1': 2}
+
+
+def test_query_com_erro_sai_da_pilha(engine, requisicao):
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text('SELECT * FROM tabela_inexistente'))
+        assert conn.connection.info['desempenho_queries'] == []
+
+        conn.execute(text('SELECT 1'))
+        assert conn.connection.info['desempenho_queries'] == []
+
+    assert g.desempenho_queries == 2
+
+
+def test_fora_de_requisicao_nao_acumula_na_conexao(engine):
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+        assert conn.connection.info.get('desempenho_queries', []) == []
@@ -0,0 +1,59 @@
+"""Busca de trechos no índice da malha: o número do voo sozinho não separa as cias."""
+
+from datetime import date, time, timedelta
+
+import pytest
+
+from Services.Shared.IndiceVoosMalhaService import IndiceVoosMalhaService, TrechoMalha
+from Utils.Texto import ChaveNumeroVoo
+
+HOJE = date(2026, 3, 10)
+ONTEM = HOJE - timedelta(days=1)
+
+
+@pytest.fixture
+def indice(monkeypatch):
+    trechos = [
+        TrechoMalha('GOL', 'G3-1234', HOJE, 'GRU', 'REC', time(8), time(11)),
+        TrechoMalha('AZUL', 'AD1234', HOJE, 'VCP', 'POA', time(9), time(10)),
+        TrechoMalha('AZUL', 'AD1234', ONTEM, 'VCP', 'POA', time(9), time(10)),
+        TrechoMalha('LATAM', 'LA3456', HOJE, 'CGH', 'SDU', time(7), time(8)),
+    ]
+    dados = {}
+    for t in trechos:
+        dados.setdefault(ChaveNumeroVoo(t.NumeroVoo, t.Cia), {}).setdefault(t.DataPartida, []).append(t)
+    monkeypatch.setattr(IndiceVoosMalhaService, '_ObterIndice', classmethod(lambda cls: dados))
+    return IndiceVoosMalhaService
+
+
+@pytest.mark.parametrize('cia, esperado', [
+    ('G3', 'GOL'), ('GLO', 'GOL'), ('Gol Linhas Aereas', 'GOL'),
+    ('AD', 'AZUL'), ('TAM', 'LATAM'), ('LATAM AIRLINES', 'LATAM'), ('', ''), (None, ''),
+])
+def test_cia_da_malha(cia, esperado):
+    assert IndiceVoosMalhaService.CiaDaMalha(cia) == esperado
+
+
+def test_filtra_pela_cia_da_awb(indice):
+    trechos = indice.BuscarTrechos('1234', [HOJE], 'GLO')
+    assert [(t.Cia, t.Origem) for t in trechos] == [('GOL', 'GRU')]
+
+
+def test_designador_do_numero_vale_sem_cia(indice):
+    trechos = indice.BuscarTrechos('AD-1234', [HOJE])
+    assert [t.Cia for t in trechos] == ['AZUL']
+
+
+def test_nao_troca_de_cia_quando_a_dela_nao_voa_no_dia(indice):
+    # Ontem só a AZUL tem o 1234: para uma AWB da GOL não há trecho
+    assert indice.BuscarTrechos('1234', [ONTEM], 'G3') == []
+    assert [t.Cia for t in indice.BuscarTrechos('1234', [ONTEM, HOJE], 'G3')] == ['GOL']
+
+
+def test_sem_data_nao_devolve_trechos(indice):
+    assert indice.BuscarTrechos('1234', [], 'G3') == []
+    assert indice.BuscarTrechos('1234', None, 'G3') == []
+
+
+def test_latam_usa_os_quatro_ultimos_digitos(indice):
+    assert [t.Destino for t in indice.BuscarTrechos('03456', [HOJE], 'LATAM')] == ['SDU']
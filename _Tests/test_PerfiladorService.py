@@ -0,0 +1,24 @@
+import pytest
+
+from Services.PerfiladorService import PerfiladorService
+
+
+@pytest.fixture(autouse=True)
+def alvo_limpo(monkeypatch):
+    monkeypatch.setattr(PerfiladorService, 'MULTIPROCESSO', False)
+    monkeypatch.setattr(PerfiladorService, 'MAX_REQUISICOES', 20)
+    yield
+    PerfiladorService._alvo = None
+
+
+@pytest.mark.parametrize('quantidade', [0, -1, 21, 'abc'])
+def test_armar_recusa_quantidade_fora_do_limite(quantidade):
+    with pytest.raises(ValueError):
+        PerfiladorService.Armar('rota', '', quantidade)
+    assert PerfiladorService._alvo is None
+
+
+@pytest.mark.parametrize('quantidade', [1, '20'])
+def test_armar_aceita_quantidade_dentro_do_limite(quantidade):
+    PerfiladorService.Armar('rota', '', quantidade)
+    assert PerfiladorService._alvo['Restantes'] == int(quantidade)
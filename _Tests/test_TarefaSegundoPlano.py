@@ -0,0 +1,38 @@
+import threading
+
+from Services.Shared.TarefaSegundoPlano import TarefaSegundoPlano
+
+
+def test_dispara_uma_vez_por_intervalo():
+    tarefa = TarefaSegundoPlano('teste-intervalo', 60)
+    rodou = threading.Event()
+
+    assert tarefa.Agendar(rodou.set)
+    assert rodou.wait(2)
+    assert not tarefa.Vencida()
+    assert not tarefa.Agendar(rodou.set)
+
+
+def test_nao_dispara_com_execucao_anterior_em_andamento():
+    tarefa = TarefaSegundoPlano('teste-em-andamento', 0)
+    liberar = threading.Event()
+
+    assert tarefa.Agendar(lambda: liberar.wait(2))
+    assert not tarefa.Agendar(lambda: None)
+    liberar.set()
+    tarefa._thread.join(2)
+    assert tarefa.Agendar(lambda: None)
+
+
+def test_antes_roda_na_thread_de_quem_agenda_antes_do_alvo():
+    tarefa = TarefaSegundoPlano('teste-antes', 60)
+    ordem = []
+    fim = threading.Event()
+
+    def alvo():
+        ordem.append('alvo')
+        fim.set()
+
+    assert tarefa.Agendar(alvo, antes=lambda: ordem.append(('antes', threading.current_thread().name)))
+    assert fim.wait(2)
+    assert ordem == [('antes', threading.current_thread().name), 'alvo']